@@ -29,6 +29,11 @@ BUILDINGS_FILE = os.path.join(OUTPUT_DIR, 'buildings.geojson')
 # Add temporal data paths
 ROAD_USAGE_PATH = os.path.join(OUTPUT_DIR, 'road_usage_trips.geojson')
 
+# Trip counts by POI, direction, mode group and time bin that the temporal CSVs are written from
+TEMPORAL_CUBE_FILE = os.path.join(OUTPUT_DIR, 'temporal_cube.npz')
+# Width of the temporal cube's time bins in minutes (15, 30 or 60)
+TEMPORAL_BIN_MINUTES = int(os.getenv('TEMPORAL_BIN_MINUTES', '60'))
+
 # Temporal distribution files
 TEMPORAL_FILES = {
     'BGU': {
@@ -9,8 +9,11 @@ from datetime import time
 
 sys.path.append(str(Path(__file__).parent.parent))
 # Add parent directory to path for imports
-from config import OUTPUT_DIR, DATA_DIR, RAW_TRIPS_FILE
+from config import OUTPUT_DIR, DATA_DIR, RAW_TRIPS_FILE, TEMPORAL_CUBE_FILE, TEMPORAL_BIN_MINUTES
 from utils.data_standards import DataStandardizer
+from utils.temporal_cube import (
+    build_temporal_cube, hourly_counts, save_temporal_cube, MODE_MAPPING, DIRECTIONS, CUBE_MODES
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,14 +26,6 @@ POI_MAPPING = {
     'Soroka-Medical-Center': 'Soroka Hospital'
 }
 
-# Mode mapping
-MODE_MAPPING = {
-    'car': ['car'],
-    'pedestrian': ['ped'],
-    'public_transit': ['bus', 'train', 'link'],
-    'bike': ['bike']
-}
-
 def load_raw_trip_data():
     """Load raw trip data with temporal information"""
     logger.info(f"Loading raw trip data from: {RAW_TRIPS_FILE}")
@@ -39,8 +34,9 @@ def load_raw_trip_data():
         df = pd.read_excel(RAW_TRIPS_FILE, sheet_name='StageB1')
         logger.info(f"Loaded {len(df)} trips")
         
-        # Convert time_bin to hour
+        # Convert time_bin to hour and minute of day
         df['hour'] = df['time_bin'].apply(lambda x: x.hour if isinstance(x, time) else 0)
+        df['minute'] = df['time_bin'].apply(lambda x: x.hour * 60 + x.minute if isinstance(x, time) else 0)
         
         # Convert mode to lowercase
         df['mode'] = df['mode'].str.lower()
@@ -116,6 +112,14 @@ def process_temporal_data():
     logger.info(f"\nProcessing temporal distributions for {len(all_poi_names)} POIs:")
     logger.info(', '.join(sorted(all_poi_names)))
     
+    # Trip counts for every raw name of every POI, computed once and saved at the configured
+    # bin width; the CSVs stay hourly
+    raw_poi_names = sorted(DataStandardizer.POI_NAME_MAPPING)
+    cube = build_temporal_cube(raw_trips, raw_poi_names, bin_minutes=TEMPORAL_BIN_MINUTES)
+    save_temporal_cube(TEMPORAL_CUBE_FILE, cube, raw_poi_names, TEMPORAL_BIN_MINUTES)
+    logger.info(f"Saved temporal cube {cube.shape} ({TEMPORAL_BIN_MINUTES}-minute bins) to: {TEMPORAL_CUBE_FILE}")
+    hourly = hourly_counts(cube, TEMPORAL_BIN_MINUTES)
+    
     # Track city-wide averages
     city_averages = [0] * 24
     valid_poi_count = 0
@@ -145,7 +149,7 @@ def process_temporal_data():
                 
                 for raw_name in raw_names:
                     temporal_dist = calculate_poi_temporal_distributions_raw(
-                        raw_trips, raw_name, trip_type
+                        hourly[raw_poi_names.index(raw_name), DIRECTIONS.index(trip_type)], raw_name, trip_type
                     )
                     
                     # Only include distributions that have actual trips
@@ -219,74 +223,50 @@ def process_temporal_data():
     
     return "Processing complete"
 
-def calculate_poi_temporal_distributions_raw(df, raw_poi_name, trip_type='inbound'):
-    """Calculate hourly distribution for POIs using raw names directly"""
-    temporal_dist = {}
+def calculate_poi_temporal_distributions_raw(counts, raw_poi_name, trip_type='inbound'):
+    """Calculate hourly distribution for POIs using raw names directly.
     
-    name_col = 'to_name' if trip_type == 'inbound' else 'from_name'
-    poi_trips = df[df[name_col] == raw_poi_name].copy()
+    counts is the POI's (mode group x hour) slice of the temporal cube.
+    """
+    temporal_dist = {}
     
     # Skip problematic POIs
     if raw_poi_name in ['Ramat Hovav Industry', 'Ramat Hovav']:
         logger.warning(f"Skipping known problematic POI: {raw_poi_name}")
         return {}
     
+    hourly_total = counts.sum(axis=0)
+    total_trips = hourly_total.sum()
+    
     # Validate midnight trips
-    midnight_trips = poi_trips[poi_trips['hour'] == 0]
-    if len(midnight_trips) > 0:
-        total_trips = poi_trips['count'].sum()
-        midnight_total = midnight_trips['count'].sum()
-        midnight_pct = midnight_total / total_trips if total_trips > 0 else 0
-        if midnight_pct > 0.05:  # Flag if midnight has more than 5% of POI's trips
-            logger.warning(f"High midnight traffic for {raw_poi_name}: {midnight_pct:.1%}")
-            logger.warning("Sample of midnight trips:")
-            logger.warning(midnight_trips[['mode', 'count', 'time_bin']].head())
-            
-            # If midnight traffic is extremely high (over 20%), skip this POI
-            if midnight_pct > 0.20:
-                logger.error(f"Skipping {raw_poi_name} due to abnormal midnight traffic distribution")
-                return {}
+    midnight_pct = hourly_total[0] / total_trips if total_trips > 0 else 0
+    if midnight_pct > 0.05:  # Flag if midnight has more than 5% of POI's trips
+        logger.warning(f"High midnight traffic for {raw_poi_name}: {midnight_pct:.1%}")
+        logger.warning("Midnight trips by mode: " + ', '.join(
+            f"{mode} {counts[m, 0]:.1f}" for m, mode in enumerate(CUBE_MODES)
+        ))
+        
+        # If midnight traffic is extremely high (over 20%), skip this POI
+        if midnight_pct > 0.20:
+            logger.error(f"Skipping {raw_poi_name} due to abnormal midnight traffic distribution")
+            return {}
     
     logger.info(f"Processing {trip_type} trips for POI {raw_poi_name}")
-    logger.info(f"Found {len(poi_trips)} total trips")
     
     # Skip if no trips found
-    if len(poi_trips) == 0:
+    if total_trips <= 0:
         logger.warning(f"No {trip_type} trips found for {raw_poi_name}")
         return {}
     
-    # First calculate total distribution across all modes
-    hourly_total = poi_trips.groupby('hour')['count'].sum()
-    total_trips = hourly_total.sum()
-    
-    if total_trips > 0:
-        # Calculate raw distribution
-        total_dist = [float(hourly_total.get(hour, 0)) / total_trips for hour in range(24)]
-        # Normalize to ensure sum is exactly 1.0
-        sum_dist = sum(total_dist)
-        temporal_dist['all'] = [d/sum_dist for d in total_dist] if sum_dist > 0 else [0] * 24
-        logger.info(f"Total trips: {total_trips:.1f}")
-        logger.info(f"Distribution sum for all modes: {sum(temporal_dist['all']):.6f}")
-    else:
-        return {}  # Return empty if no trips
+    # Distribution across all modes, then per mode group, by array division
+    temporal_dist['all'] = list(hourly_total / total_trips)
+    logger.info(f"Total trips: {total_trips:.1f}")
     
-    # Then calculate per-mode distributions
-    for std_mode, raw_modes in MODE_MAPPING.items():
-        # Filter trips for this mode
-        mode_trips = poi_trips[poi_trips['mode'].isin(raw_modes)]
-        
-        # Group by hour and sum counts
-        hourly_trips = mode_trips.groupby('hour')['count'].sum()
-        mode_total = hourly_trips.sum()
-        
-        logger.info(f"Mode {std_mode}: {mode_total:.1f} total trips")
-        
-        # Calculate distribution
-        if mode_total > 0:
-            dist = [float(hourly_trips.get(hour, 0)) / mode_total for hour in range(24)]
-            temporal_dist[std_mode] = dist
-        else:
-            temporal_dist[std_mode] = [0] * 24
+    mode_totals = counts.sum(axis=1, keepdims=True)
+    dists = np.divide(counts, mode_totals, out=np.zeros_like(counts), where=mode_totals > 0)
+    for m, std_mode in enumerate(MODE_MAPPING):
+        logger.info(f"Mode {std_mode}: {mode_totals[m, 0]:.1f} total trips")
+        temporal_dist[std_mode] = list(dists[m])
             
     return temporal_dist
 
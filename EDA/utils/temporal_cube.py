@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+# Mode mapping
+MODE_MAPPING = {
+    'car': ['car'],
+    'pedestrian': ['ped'],
+    'public_transit': ['bus', 'train', 'link'],
+    'bike': ['bike']
+}
+
+DIRECTIONS = ('inbound', 'outbound')
+# Mode axis of the temporal cube: the MODE_MAPPING groups plus raw modes outside them
+CUBE_MODES = tuple(MODE_MAPPING) + ('other',)
+
+
+def build_temporal_cube(df, raw_poi_names, bin_minutes=60):
+    """Trip counts by (raw POI name, direction, mode group, time bin) from a single groupby.
+
+    Inbound trips are matched on to_name and outbound trips on from_name;
+    raw modes outside MODE_MAPPING are counted under 'other'. Trips are binned
+    by their minute of day into bins of bin_minutes (15, 30 or 60).
+    """
+    if bin_minutes <= 0 or 60 % bin_minutes:
+        raise ValueError(f"Temporal bin width must divide 60 minutes, got {bin_minutes}")
+    poi_codes = {raw_name: i for i, raw_name in enumerate(raw_poi_names)}
+    mode_codes = {raw_mode: CUBE_MODES.index(mode) for mode, raw_modes in MODE_MAPPING.items() for raw_mode in raw_modes}
+
+    # Each trip contributes once as inbound (to its destination) and once as outbound (from its origin)
+    mode = df['mode'].map(mode_codes).fillna(CUBE_MODES.index('other')).astype(int)
+    long = pd.concat([
+        pd.DataFrame({
+            'poi': df[name_col].map(poi_codes),
+            'direction': direction,
+            'mode': mode,
+            'bin': df['minute'] // bin_minutes,
+            'count': df['count']
+        })
+        for direction, name_col in enumerate(['to_name', 'from_name'])
+    ], ignore_index=True).dropna(subset=['poi'])
+
+    grouped = long.groupby(['poi', 'direction', 'mode', 'bin'])['count'].sum()
+    counts = np.zeros((len(raw_poi_names), len(DIRECTIONS), len(CUBE_MODES), 24 * 60 // bin_minutes))
+    index = tuple(grouped.index.get_level_values(level).to_numpy(dtype=int) for level in range(4))
+    counts[index] = grouped.to_numpy()
+    return counts
+
+
+def hourly_counts(counts, bin_minutes):
+    """Cube counts with their time bins summed to hours"""
+    return counts.reshape(counts.shape[:-1] + (24, 60 // bin_minutes)).sum(axis=-1)
+
+
+def save_temporal_cube(path, counts, pois, bin_minutes):
+    """Save the cube in the .npz layout the data-viz TemporalCube loads"""
+    np.savez_compressed(path, counts=counts.astype(np.float32), pois=list(pois),
+                        directions=list(DIRECTIONS), modes=list(CUBE_MODES), bin_minutes=bin_minutes)
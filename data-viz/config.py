@@ -25,10 +25,25 @@ FINAL_ZONES_FILE = os.path.join(OUTPUT_DIR, 'zones.geojson')
 FINAL_TRIPS_PATTERN = os.path.join(OUTPUT_DIR, '*_trips.csv')
 
 BUILDINGS_FILE = os.path.join(OUTPUT_DIR, 'buildings.geojson')
+# Flattened, POI-tagged building footprints for the 3D building layers (see trips_preprocessing/building_preprocessing.py)
+BUILDINGS_ARTIFACT_FILE = os.path.join(OUTPUT_DIR, 'buildings_artifact.npz')
 
 # Add temporal data paths
 ROAD_USAGE_PATH = os.path.join(OUTPUT_DIR, 'road_usage_trips.geojson')
 
+# Routing backend for trip generation: 'otp' (server on localhost:8080) or 'local'
+ROUTING_BACKEND = os.getenv('ROUTING_BACKEND', 'otp')
+# OSM extract used by the local routing backend (.osm.pbf, .osm or exported edges)
+OSM_EXTRACT_FILE = os.getenv('OSM_EXTRACT_FILE', os.path.join(DATA_DIR, 'osm', 'beer-sheva.osm.pbf'))
+# Worker processes for zone-sharded trip generation (1 = serial) and the base seed for sharded runs
+TRIP_WORKERS = int(os.getenv('TRIP_WORKERS', '1'))
+TRIP_SEED = int(os.getenv('TRIP_SEED', '0'))
+# Concurrent route requests when car routes are batched per POI (1 = one request at a time)
+ROUTE_BATCH_WORKERS = int(os.getenv('ROUTE_BATCH_WORKERS', '8'))
+# Generated route file format ('parquet', 'fgb' or 'geojson') and whether to also export GeoJSON
+ROUTE_FORMAT = os.getenv('ROUTE_FORMAT', 'parquet')
+ROUTE_GEOJSON_EXPORT = os.getenv('ROUTE_GEOJSON_EXPORT', 'false').lower() == 'true'
+
 # Temporal distribution files
 TEMPORAL_FILES = {
     'BGU': {
@@ -44,6 +59,10 @@ TEMPORAL_FILES = {
         'outbound': os.path.join(OUTPUT_DIR, 'soroka_medical_center_outbound_temporal.csv')
     }
 }
+# Trip counts by POI, direction, mode group and time bin that the temporal CSVs are written from
+TEMPORAL_CUBE_FILE = os.path.join(OUTPUT_DIR, 'temporal_cube.npz')
+# Width of the temporal cube's time bins in minutes (15, 30 or 60)
+TEMPORAL_BIN_MINUTES = int(os.getenv('TEMPORAL_BIN_MINUTES', '60'))
 
 # POI name standardization
 POI_NAME_MAPPING = {
@@ -74,6 +93,13 @@ CHART_COLORS = ['#007BFF', '#DC3545', '#28A745', '#FFC107', '#17A2B8', '#6C757D'
 
 # Your public Mapbox API key
 MAPBOX_API_KEY = os.getenv('MAPBOX_API_KEY', 'your_sample_api_key_here')
+# How the deck.gl HTML outputs carry their layer data: 'json' (inlined), 'base64' (inlined binary
+# chunks) or 'bin' (a sidecar .bin file next to the page, which must then be served over HTTP)
+HTML_DATA_TRANSPORT = os.getenv('HTML_DATA_TRANSPORT', 'json')
+
+# Minimum zoom of each level of detail of the road-usage segment layers, coarsest first;
+# the last level shows the raw segments (see utils/segment_tiles.py)
+SEGMENT_LOD_ZOOMS = [int(zoom) for zoom in os.getenv('SEGMENT_LOD_ZOOMS', '0,12,14').split(',')]
 
 # POI Coordinates
 POI_LOCATIONS = [
@@ -14,6 +14,14 @@ import random
 from shapely.geometry import Point
 from typing import Dict, List, Tuple, Optional, Union
 
+# Add parent directory to Python path to access shared utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.route_writer import load_routes
+from utils.temporal_cube import TemporalCube, MINUTES_PER_DAY
+from utils.route_geometry import ragged_coordinates, truncate_routes
+from utils.binary_transport import BinaryBundle, BINARY_LOADER_JS, check_transport
+from config import HTML_DATA_TRANSPORT
+
 logger = logging.getLogger(__name__)
 # Configure logging to display to console
 logging.basicConfig(
@@ -22,6 +30,16 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
+# Temporal cube POI names and their keys in the animation
+CUBE_POI_KEYS = {
+    'Ben-Gurion-University': 'BGU',
+    'Gav-Yam-High-Tech-Park': 'Gav Yam',
+    'Soroka-Medical-Center': 'Soroka Hospital'
+}
+
+# Routes are cut at the first vertex this many kilometers along them
+MAX_ROUTE_KM = 5.0
+
 # Output directory
 OUTPUT_DIR = '/Users/noamgal/DSProjects/BeerShevaMobility/data-viz/output/dashboard_data'
 
@@ -252,7 +270,7 @@ def load_temporal_distributions(mode: str, direction: str, output_dir: str) -> D
         output_dir: Directory containing temporal distribution files
     
     Returns:
-        Dictionary mapping POI names to hourly distributions
+        Dictionary mapping POI names to per-bin distributions (24 bins for hourly data)
     """
     distributions = {}
     
@@ -268,6 +286,22 @@ def load_temporal_distributions(mode: str, direction: str, output_dir: str) -> D
     
     logger.info(f"\nLoading temporal distributions for {mode} {direction}")
     
+    # The temporal cube carries the configured (possibly sub-hour) bins; the CSVs are hourly
+    cube_file = os.path.join(output_dir, 'temporal_cube.npz')
+    if os.path.exists(cube_file):
+        cube = TemporalCube.load(cube_file)
+        logger.info(f"Using {cube.bin_minutes}-minute temporal bins from {cube_file}")
+        for poi_name, poi_key in CUBE_POI_KEYS.items():
+            if poi_name not in cube.pois:
+                logger.warning(f"POI {poi_name} not found in temporal cube")
+                continue
+            dist = cube.distribution(poi_name, direction, mode_column[:-len('_dist')])
+            if dist.sum() <= 0:
+                logger.warning(f"Zero sum distribution for {poi_key}, using uniform distribution")
+                dist = np.ones(len(dist)) / len(dist)
+            distributions[poi_key] = dist
+        return distributions
+    
     for file_prefix, poi_key in file_mapping.items():
         distribution_file = os.path.join(output_dir, f"{file_prefix}_{direction}_temporal.csv")
         
@@ -351,8 +385,12 @@ def process_trips(trips_gdf: gpd.GeoDataFrame,
                  mode: str,
                  animation_config: Dict,
                  poi_polygons: Optional[gpd.GeoDataFrame] = None,
-                 poi_id_map: Optional[Dict] = None) -> Tuple[List[Dict], Dict]:
-    """Process trips with proper temporal distribution accounting for mode differences"""
+                 poi_id_map: Optional[Dict] = None) -> Tuple[List[List], List[Dict], Dict]:
+    """Process trips with proper temporal distribution accounting for mode differences.
+
+    Returns the unique truncated paths, trip records that reference them by
+    path_index, and debug counts; a car route's hourly trips share one path.
+    """
     
     routes_data = []
     animation_duration = animation_config['animation_duration']
@@ -378,65 +416,6 @@ def process_trips(trips_gdf: gpd.GeoDataFrame,
             logger.debug(f"Available columns: {row.index.tolist()}")
             return None
 
-    # Function to calculate route distance in kilometers
-    def calculate_route_distance(geometry):
-        # Calculate total distance of the route in kilometers
-        total_distance = 0
-        coords = list(geometry.coords)
-        
-        for i in range(1, len(coords)):
-            # Calculate Haversine distance between consecutive points
-            lon1, lat1 = coords[i-1]
-            lon2, lat2 = coords[i]
-            
-            # Convert to radians
-            lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
-            
-            # Haversine formula
-            dlon = lon2 - lon1
-            dlat = lat2 - lat1
-            a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
-            c = 2 * np.arcsin(np.sqrt(a))
-            r = 6371  # Radius of earth in kilometers
-            distance = c * r
-            
-            total_distance += distance
-            
-        return total_distance
-
-    # Function to truncate route at 5km
-    def truncate_route_at_5km(coords):
-        # Calculate cumulative distances
-        cumulative_distance = [0]  # Start with 0 for first point
-        total_distance = 0
-        
-        for i in range(1, len(coords)):
-            # Calculate Haversine distance between consecutive points
-            lon1, lat1 = coords[i-1]
-            lon2, lat2 = coords[i]
-            
-            # Convert to radians
-            lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
-            
-            # Haversine formula
-            dlon = lon2 - lon1
-            dlat = lat2 - lat1
-            a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
-            c = 2 * np.arcsin(np.sqrt(a))
-            r = 6371  # Radius of earth in kilometers
-            distance = c * r
-            
-            total_distance += distance
-            cumulative_distance.append(total_distance)
-            
-            # If we've reached 5km, truncate here
-            if total_distance >= 5:
-                # Include this point but none after
-                return coords[:i+1], True
-        
-        # If we never reach 5km, return the original coords
-        return coords, False
-
     # Convert temporal_dist values from DataFrame to array if needed
     processed_temporal_dist = {}
     for poi, dist_data in temporal_dist.items():
@@ -446,11 +425,31 @@ def process_trips(trips_gdf: gpd.GeoDataFrame,
         else:
             processed_temporal_dist[poi] = dist_data
     
-    for idx, row in trips_gdf.iterrows():
+    # Car trips are emitted once per hour; with sub-hour bins each hour's trips
+    # start at the trip-weighted mean of its bins' start offsets
+    hour_offsets = {}
+    for poi, dist in processed_temporal_dist.items():
+        per_hour = len(dist) // 24
+        by_hour = np.asarray(dist, dtype=float).reshape(24, per_hour)
+        hour_totals = by_hour.sum(axis=1)
+        offsets = by_hour @ (np.arange(per_hour) / per_hour)
+        hour_offsets[poi] = (hour_totals, np.divide(offsets, hour_totals, out=np.zeros(24), where=hour_totals > 0))
+    
+    # One path per distinct route, so trips sharing a route table geometry (and
+    # a car route's hourly trips) reference it by index; every path is cut at
+    # MAX_ROUTE_KM in one vectorized pass
+    route_keys = trips_gdf['route_key'] if 'route_key' in trips_gdf.columns else trips_gdf.index
+    route_codes, _ = pd.factorize(np.asarray(route_keys))
+    first_rows = pd.Series(np.arange(len(trips_gdf))).groupby(route_codes).first().to_numpy()
+    path_coords, path_offsets = ragged_coordinates(trips_gdf.geometry.values[first_rows])
+    path_coords, path_offsets, truncated = truncate_routes(path_coords, path_offsets, MAX_ROUTE_KM)
+    path_coords = path_coords.tolist()
+    paths = [path_coords[start:end] for start, end in zip(path_offsets[:-1].tolist(), path_offsets[1:].tolist())]
+    
+    for position, (idx, row) in enumerate(trips_gdf.iterrows()):
         try:
-            # Check if route is longer than 5km and truncate if needed
-            coords = list(row.geometry.coords)
-            truncated_coords, was_truncated = truncate_route_at_5km(coords)
+            path_index = int(route_codes[position])
+            was_truncated = truncated[path_index]
             
             if was_truncated:
                 debug['truncated_trips'] += 1
@@ -474,40 +473,38 @@ def process_trips(trips_gdf: gpd.GeoDataFrame,
             # 3. Handle mode-specific route generation
             if mode == 'walk':
                 # For walking, each route represents exactly one trip
-                # Find the most likely hour based on distribution
-                hour = np.random.choice(24, p=hourly_dist)
+                # Draw its time bin from the distribution
+                n_bins = len(hourly_dist)
+                time_bin = np.random.choice(n_bins, p=hourly_dist)
                 
                 # UPDATED: Use speed_factor instead of speed_multiplier
                 speed_factor = mode_settings.get('speed_factor', 1.0)
                 
                 route = {
-                    'path': [[float(p[0]), float(p[1])] for p in truncated_coords],
-                    'startTime': int(hour * frames_per_hour),
+                    'path_index': path_index,
+                    'startTime': int(time_bin * animation_duration / n_bins),
                     'duration': int(frames_per_hour * speed_factor),
                     'numTrips': 1,  # Always 1 for walking
-                    'mode': mode,
-                    'poi': poi_name,
-                    'truncated': was_truncated
+                    'poi': poi_name
                 }
                 routes_data.append(route)
                 debug['distributed_total'] += 1
                 
             else:  # car mode
                 # For cars, distribute the base trips across hours
+                hour_totals, offsets = hour_offsets[poi_name]
                 for hour in range(24):
-                    trips_in_hour = base_trips * hourly_dist[hour]
+                    trips_in_hour = base_trips * hour_totals[hour]
                     if trips_in_hour > 0:
                         # UPDATED: Use speed_factor instead of speed_multiplier
                         speed_factor = mode_settings.get('speed_factor', 1.0)
                         
                         route = {
-                            'path': [[float(p[0]), float(p[1])] for p in truncated_coords],
-                            'startTime': int(hour * frames_per_hour),
+                            'path_index': path_index,
+                            'startTime': int((hour + offsets[hour]) * frames_per_hour),
                             'duration': int(frames_per_hour * speed_factor),
                             'numTrips': float(trips_in_hour),
-                            'mode': mode,
-                            'poi': poi_name,
-                            'truncated': was_truncated
+                            'poi': poi_name
                         }
                         routes_data.append(route)
                         debug['distributed_total'] += trips_in_hour
@@ -521,11 +518,12 @@ def process_trips(trips_gdf: gpd.GeoDataFrame,
     logger.info(f"Original total trips: {debug['original_total']:.2f}")
     logger.info(f"Distributed total trips: {debug['distributed_total']:.2f}")
     logger.info(f"Difference: {(debug['distributed_total'] - debug['original_total']):.2f}")
-    logger.info(f"Trips truncated at 5km: {debug['truncated_trips']}")
+    logger.info(f"Trips truncated at {MAX_ROUTE_KM:g}km: {debug['truncated_trips']}")
+    logger.info(f"{len(routes_data)} trip records share {len(paths)} unique paths")
     if debug['skipped_pois']:
         logger.warning(f"Skipped POIs: {', '.join(debug['skipped_pois'])}")
 
-    return routes_data, debug
+    return paths, routes_data, debug
 
 def validate_generated_trips(routes_data: List[Dict], original_counts: Dict[str, float],
                            debug_info: Dict, max_increase: float = 1.2):
@@ -574,19 +572,18 @@ def validate_generated_trips(routes_data: List[Dict], original_counts: Dict[str,
         logger.info(f"  Change:    {(result['increase']-1)*100:+.1f}%")
         logger.info(f"  Status:    {result['status']}")
 
-def randomize_trip_timing(routes_data, animation_config):
+def randomize_trip_timing(routes_data, animation_config, bin_minutes=60):
     """
     Randomize trip timing without duplicating routes or increasing trip counts.
     This makes traffic patterns more natural without inflating file size.
+    Start times are jittered by ±20% of the temporal bin width, so finer
+    bins keep the timing they already carry.
     """
     frames_per_hour = animation_config['frames_per_hour']
     
     for route in routes_data:
-        # Get the hour segment this trip belongs to
-        hour = int(route['startTime'] / frames_per_hour)
-        
-        # Add random offset within the hour (±20% of hour)
-        offset_range = frames_per_hour * 0.4
+        # Add random offset within the bin (±20% of its width)
+        offset_range = frames_per_hour * bin_minutes / 60 * 0.4
         offset = (random.random() - 0.5) * offset_range
         
         # Apply offset but keep within valid range
@@ -605,8 +602,28 @@ def randomize_trip_timing(routes_data, animation_config):
 # HTML Generation
 #############################################
 
-def create_deck_html(routes_data, animation_duration, poi_colors, viewport, mode, direction, model_outline, model_size='big'):
-    """Create HTML visualization with natural trip distribution and unified speed control."""
+def build_binary_bundle(paths, routes_data):
+    """Unique paths and per-trip path index, timing and POI as typed tables"""
+    poi_names = sorted({route['poi'] for route in routes_data})
+    poi_index = {name: i for i, name in enumerate(poi_names)}
+
+    bundle = BinaryBundle()
+    bundle.add_paths('paths', paths)
+    trips = bundle.add_table('trips', len(routes_data))
+    trips.add('path_index', [route['path_index'] for route in routes_data], np.uint32)
+    for key in ['startTime', 'duration', 'numTrips']:
+        trips.add(key, [route[key] for route in routes_data], np.float32)
+    trips.add('poi', [poi_index[route['poi']] for route in routes_data], np.uint8)
+    return bundle, poi_names
+
+def create_deck_html(paths, routes_data, animation_duration, poi_colors, viewport, mode, direction, model_outline, model_size='big',
+                     html_path=None, transport=HTML_DATA_TRANSPORT):
+    """Create HTML visualization with natural trip distribution and unified speed control.
+
+    Trips reference their path in paths by path_index; the page attaches the
+    shared path arrays to the trips once on load. With the 'bin' or 'base64'
+    transport both are written as typed tables for the page at html_path.
+    """
     # Log the model size
     logger.info(f"Creating visualization with model_size: {model_size}")
     
@@ -620,7 +637,14 @@ def create_deck_html(routes_data, animation_duration, poi_colors, viewport, mode
         'properties': {}
     }
 
-    # Prepare JSON data
+    # Prepare JSON data, or typed tables plus their manifest
+    routes_manifest, route_pois = None, []
+    if check_transport(transport) != 'json':
+        bundle, route_pois = build_binary_bundle(paths, routes_data)
+        routes_manifest = bundle.write(html_path, transport)
+        bundle.report(json.dumps({'paths': paths, 'routes': routes_data}), routes_manifest)
+        paths, routes_data = [], []
+    paths_json = json.dumps(paths)
     routes_json = json.dumps(routes_data)
     poi_colors_json = json.dumps(poi_colors)
     viewport_json = json.dumps(viewport)
@@ -674,18 +698,17 @@ def create_deck_html(routes_data, animation_duration, poi_colors, viewport, mode
             }};
             
             // Pre-process route paths for more uniform movement
-            if (!window.pathsProcessed) {{
-                // Create a distance array for each path
-                ROUTES_DATA.forEach(route => {{
-                    if (!route.path || route.path.length < 2) return;
-                    
+            function preprocessPaths() {{
+                if (window.pathsProcessed) return;
+                // Create a distance array once for each unique path
+                const pathDistances = ROUTE_PATHS.map(path => {{
                     // Calculate cumulative distance for each point in path
                     const distances = [0]; // First point has distance 0
                     let totalDistance = 0;
                     
-                    for (let i = 1; i < route.path.length; i++) {{
-                        const prevPoint = route.path[i-1];
-                        const currPoint = route.path[i];
+                    for (let i = 1; i < path.length; i++) {{
+                        const prevPoint = path[i-1];
+                        const currPoint = path[i];
                         
                         // Calculate distance between points using Haversine formula
                         const dx = currPoint[0] - prevPoint[0];
@@ -695,8 +718,16 @@ def create_deck_html(routes_data, animation_duration, poi_colors, viewport, mode
                         totalDistance += distance;
                         distances.push(totalDistance);
                     }}
+                    return {{distances, totalDistance}};
+                }});
+                
+                ROUTES_DATA.forEach(route => {{
+                    // Trips share their path's coordinates and distances
+                    route.path = ROUTE_PATHS[route.path_index];
+                    route.mode = ROUTE_MODE;
+                    if (!route.path || route.path.length < 2) return;
                     
-                    // Store distance information with the route
+                    const {{distances, totalDistance}} = pathDistances[route.path_index];
                     route.pathDistances = distances;
                     route.totalDistance = totalDistance;
                     
@@ -923,8 +954,36 @@ canvas{{background:#000!important}}
 
 <script>
 const ANIMATION_DURATION={animation_duration};
-const ROUTES_DATA={routes_json};
+// Unique route paths, and trip records that reference them by path_index
+let ROUTE_PATHS={paths_json};
+let ROUTES_DATA={routes_json};
+const ROUTE_MODE='{mode}';
 const POI_COLORS={poi_colors_json};
+// Typed-array routes (null when the paths and trips are inlined above)
+const ROUTES_MANIFEST={json.dumps(routes_manifest)};
+const ROUTE_POIS={json.dumps(route_pois)};
+{BINARY_LOADER_JS}
+
+// Paths and trip records from the typed 'paths' and 'trips' tables
+function pathRecords(table) {{
+    const {{positions}} = table.columns;
+    const starts = table.startIndices;
+    return Array.from({{length: table.length}}, (_, i) => {{
+        const end = i + 1 < starts.length ? starts[i + 1] : positions.length / 2;
+        return Array.from({{length: end - starts[i]}}, (_, j) => [positions[2 * (starts[i] + j)], positions[2 * (starts[i] + j) + 1]]);
+    }});
+}}
+
+function routeRecords(table) {{
+    const {{path_index, startTime, duration, numTrips, poi}} = table.columns;
+    return Array.from({{length: table.length}}, (_, i) => ({{
+        path_index: path_index[i],
+        startTime: startTime[i],
+        duration: duration[i],
+        numTrips: numTrips[i],
+        poi: ROUTE_POIS[poi[i]]
+    }}));
+}}
 
 // Set up lighting
 const ambientLight=new deck.AmbientLight({{color:[255,255,255],intensity:1.0}});
@@ -952,8 +1011,17 @@ const deckgl=new deck.DeckGL({{
 // Add animation code
 {animation_js}
 
-// Start animation
-setTimeout(()=>{{animate();window.animationStarted=true}},1000);
+// Start animation once the routes are loaded
+const routesReady = ROUTES_MANIFEST
+    ? loadBinaryTables(ROUTES_MANIFEST).then(({{tables}}) => {{
+        ROUTE_PATHS = pathRecords(tables.paths);
+        ROUTES_DATA = routeRecords(tables.trips);
+    }})
+    : Promise.resolve();
+routesReady.then(() => {{
+    preprocessPaths();
+    setTimeout(()=>{{animate();window.animationStarted=true}},1000);
+}});
 
 // Setup speed control
 document.addEventListener('DOMContentLoaded', function() {{
@@ -1036,7 +1104,7 @@ def load_trip_data(mode, direction):
     
     try:
         # Load base data
-        trips_gdf = gpd.read_file(file_path)
+        trips_gdf = load_routes(file_path)
         logger.info(f"Processing {mode} {direction} trips")
         logger.info(f"Loaded {len(trips_gdf)} trips from {file_path}")
         
@@ -1051,7 +1119,7 @@ def load_trip_data(mode, direction):
         
         # Process trips based on mode WITHOUT enhanced simultaneity
         if mode == 'walk':
-            routes_data, debug_info = process_trips(
+            paths, routes_data, debug_info = process_trips(
                 trips_gdf=trips_gdf,
                 temporal_dist=temporal_dist,
                 mode_settings=mode_settings,
@@ -1068,7 +1136,7 @@ def load_trip_data(mode, direction):
             poi_polygons = poi_polygons[poi_polygons['ID'].isin([11, 12, 7])]
             POI_ID_MAP = {7: 'BGU', 12: 'Gav Yam', 11: 'Soroka Hospital'}
 
-            routes_data, debug_info = process_trips(
+            paths, routes_data, debug_info = process_trips(
                 trips_gdf=trips_gdf,
                 temporal_dist=temporal_dist,
                 mode_settings=mode_settings,
@@ -1080,12 +1148,13 @@ def load_trip_data(mode, direction):
             )
 
         # Randomize timing without duplicating trips
-        routes_data = randomize_trip_timing(routes_data, ANIMATION_CONFIG)
+        bin_minutes = MINUTES_PER_DAY // len(next(iter(temporal_dist.values()))) if temporal_dist else 60
+        routes_data = randomize_trip_timing(routes_data, ANIMATION_CONFIG, bin_minutes)
         
         # Validate generated trips
         validate_generated_trips(routes_data, original_counts, debug_info)
         
-        return routes_data, ANIMATION_CONFIG['animation_duration'], ANIMATION_CONFIG['poi_colors']
+        return paths, routes_data, ANIMATION_CONFIG['animation_duration'], ANIMATION_CONFIG['poi_colors']
         
     except Exception as e:
         logger.error(f"Error loading trip data: {str(e)}")
@@ -1104,7 +1173,7 @@ def main():
                 logger.info(f"Loading trip data for {mode}-{direction}")
                 trip_data = load_trip_data(mode, direction)
                 logger.info(f"Trip data loaded successfully")
-                routes_data, animation_duration, poi_colors = trip_data
+                paths, routes_data, animation_duration, poi_colors = trip_data
                 
                 for model_size in models:
                     # Load model outline and create viewport
@@ -1127,6 +1196,7 @@ def main():
                     logger.info(f"Creating HTML content for {html_path}")
                     # Create HTML content
                     html_content = create_deck_html(
+                        paths,
                         routes_data,
                         animation_duration,
                         poi_colors,
@@ -1134,7 +1204,8 @@ def main():
                         mode,
                         direction,
                         model_outline,
-                        model_size
+                        model_size,
+                        html_path=html_path
                     )
                     
                     # Save HTML file
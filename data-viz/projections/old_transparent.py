@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import json
 import logging
 from config import OUTPUT_DIR
+from utils.route_writer import load_routes
 from shapely.geometry import Point
 from animation_config import ANIMATION_CONFIG, calculate_animation_duration
 
@@ -119,7 +120,7 @@ def load_trip_data():
         attractions = gpd.read_file("shapes/data/maps/Be'er_Sheva_Shapefiles_Attraction_Centers.shp")
         poi_polygons = attractions[attractions['ID'].isin([11, 12, 7])]
         
-        trips_gdf = gpd.read_file(file_path)
+        trips_gdf = load_routes(file_path)
         raw_trip_count = trips_gdf['num_trips'].sum()
         
         routes_data = []
@@ -3,17 +3,19 @@ import geopandas as gpd
 import os
 import sys
 import math
-from collections import defaultdict
 from shapely.ops import split, linemerge
 from shapely.geometry import Point, MultiLineString
 import numpy as np
-from pyproj import Transformer
 # Add parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import OUTPUT_DIR, MAPBOX_API_KEY, BUILDINGS_FILE, POI_LOCATIONS
+from config import OUTPUT_DIR, MAPBOX_API_KEY, BUILDINGS_FILE, BUILDINGS_ARTIFACT_FILE, POI_LOCATIONS
 from shapely.geometry import Polygon
 from geopy.distance import geodesic
 from data_loader import DataLoader
+from utils.segment_engine import aggregate_segments
+from utils.colormap import road_usage_colors
+from utils.building_artifact import BuildingArtifact, DEFAULT_BUILDING_COLOR
+from utils.route_writer import load_routes
 
 # Add at the top with other imports
 attractions = gpd.read_file("shapes/data/maps/Be'er_Sheva_Shapefiles_Attraction_Centers.shp")
@@ -42,26 +44,13 @@ POI_RADIUS = 0.0018  # about 200 meters in decimal degrees
 def load_road_usage():
     """Load the trips data"""
     file_path = os.path.join(OUTPUT_DIR, "road_usage_trips.geojson")
-    trips = gpd.read_file(file_path)
+    trips = load_routes(file_path)
     print(f"Loaded {len(trips)} unique trip routes")
     return trips
 
 def create_segment_data(trips_data):
     """Break down routes into segments and aggregate trip counts"""
-    # Dictionary to store segment data: (start_coord, end_coord) -> trips
-    segments = defaultdict(float)
-    
-    for _, row in trips_data.iterrows():
-        coords = list(row.geometry.coords)
-        num_trips = row['num_trips']
-        
-        # Break down each route into segments
-        for i in range(len(coords) - 1):
-            # Sort coordinates to ensure consistent segment keys
-            segment = tuple(sorted([coords[i], coords[i + 1]]))
-            segments[segment] += num_trips
-    
-    return segments
+    return aggregate_segments(trips_data.geometry.values, trips_data['num_trips'].to_numpy())
 
 def get_route_distance(coords):
     """Calculate total route distance"""
@@ -72,61 +61,6 @@ def get_route_distance(coords):
         total_distance += math.sqrt(dx*dx + dy*dy)
     return total_distance
 
-def cube_root_scale(t):
-        """Apply cube root scale to compress high values"""
-        return np.cbrt(t)
-
-def interpolate_color(t, distance_ratio):
-    """Color interpolation based on trip count and distance ratio
-    
-    Color Scheme:
-    - Base colors progress from dark blue -> light blue -> purple -> pink -> bright red
-    - Brightness increases with trip count
-    - Opacity varies smoothly between segments to reduce blockiness
-    
-    Args:
-        t (float): Normalized trip count (0-1)
-        distance_ratio (float): Position along segment (0-1)
-    """
-    # Apply cube root scaling to trip ratio for better distribution
-    t = cube_root_scale(t)
-    
-    # Base colors (from low to high trip counts, with increasing brightness)
-    colors = {
-    0.0: [20, 42, 120],     # Dark blue
-    0.2: [40, 80, 180],     # Medium blue
-    0.4: [65, 182, 196],    # Light blue
-    0.6: [120, 200, 150],   # Blue-green
-    0.8: [200, 220, 100],   # Yellow-green
-    1.0: [255, 255, 0]      # Bright yellow
-        }
-    
-    # Find and interpolate colors
-    lower_t = max([k for k in colors.keys() if k <= t])
-    upper_t = min([k for k in colors.keys() if k >= t])
-    
-    c1 = colors[lower_t]
-    c2 = colors[upper_t]
-    
-    # Smooth transition between segments
-    ratio = (t - lower_t) / (upper_t - lower_t) if upper_t != lower_t else 0
-    
-    # Add gaussian-like falloff for smoother segment transitions
-    smoothing = math.exp(-4 * (distance_ratio - 0.5)**2)
-    brightness = 0.7 + 0.3 * smoothing
-    
-    rgb = [
-        min(255, int((c1[0] + (c2[0] - c1[0]) * ratio) * brightness)),
-        min(255, int((c1[1] + (c2[1] - c1[1]) * ratio) * brightness)),
-        min(255, int((c1[2] + (c2[2] - c1[2]) * ratio) * brightness))
-    ]
-    
-    # Smooth opacity transition between segments
-    base_opacity = 0.7 + 0.3 * smoothing
-    opacity = min(255, int(255 * base_opacity))
-    
-    return rgb + [opacity]
-
 def get_route_distance_ratio(coord, start_coord, end_coord):
     """Calculate distance ratio with bias towards destination"""
     dist_to_start = math.sqrt((coord[0] - start_coord[0])**2 + (coord[1] - start_coord[1])**2)
@@ -153,7 +87,8 @@ def create_line_layer(trips_data, bounds):
     """Create a deck.gl visualization with smooth segment transitions"""
     segments = create_segment_data(trips_data)
     line_data = []
-    max_trips = max(segments.values())
+    trip_ratios, mid_positions = [], []
+    max_trips = segments.trips.max()
     
     # Calculate total unique trips (sum of num_trips for each route)
     total_trips = trips_data['num_trips'].sum()
@@ -162,7 +97,7 @@ def create_line_layer(trips_data, bounds):
     segment_length = 1.995  # Slightly shorter to create gaps (99.75% of original 2.0)
     step_size = 2.0
     
-    for (start_coord, end_coord), trip_count in segments.items():
+    for start_coord, end_coord, trip_count in zip(segments.start, segments.end, segments.trips):
         trip_ratio = trip_count / max_trips
         total_distance = math.sqrt(
             (end_coord[0] - start_coord[0])**2 + 
@@ -200,15 +135,19 @@ def create_line_layer(trips_data, bounds):
             ]
             
             mid_pos = (start_pos + end_pos) / 2
-            color = interpolate_color(trip_ratio, mid_pos)
+            trip_ratios.append(trip_ratio)
+            mid_positions.append(mid_pos)
             
             line_data.append({
                 "start": start,
                 "end": end,
-                "trips": int(trip_count),
-                "color": color
+                "trips": int(trip_count)
             })
 
+    # Color every segment in one lookup-table pass
+    for feature, color in zip(line_data, road_usage_colors(trip_ratios, mid_positions).tolist()):
+        feature["color"] = color
+
     # Create the layers
     building_layer = create_building_layer(bounds)
     line_layer = pdk.Layer(
@@ -344,15 +283,10 @@ def create_html_description(low_trips, med_trips, high_trips, total_trips):
 
 def create_building_layer(bounds):
     """Create a building layer with highlighted POI buildings"""
-    buildings_gdf = gpd.read_file(BUILDINGS_FILE)
-    building_features = []
-    text_features = []
+    buildings = BuildingArtifact.cached(BUILDINGS_ARTIFACT_FILE, BUILDINGS_FILE, poi_polygons)
     poi_borders = []
     poi_fills = []
     
-    # Create a transformer for coordinate systems if needed
-    transformer = Transformer.from_crs("EPSG:4326", buildings_gdf.crs, always_xy=True)
-    
     # Process POI polygons first
     for poi_idx, poi_polygon in poi_polygons.iterrows():
         numeric_id = int(poi_polygon['ID'])
@@ -371,39 +305,19 @@ def create_building_layer(bounds):
                 "color": color + [100]  # Medium opacity for fills
             })
     
-    # Process buildings
-    for idx, building in buildings_gdf.iterrows():
-        building_color = [74, 80, 87, 160]  # Default color
-        try:
-            height = float(building.get('height', 20))
-            building_height = height * 1.5
-            
-            # Check if building intersects with any POI polygon
-            for poi_idx, poi_polygon in poi_polygons.iterrows():
-                if building.geometry.intersects(poi_polygon.geometry):
-                    numeric_id = int(poi_polygon['ID'])
-                    poi_name = POI_ID_MAP.get(numeric_id)
-                    
-                    if poi_name:
-                        building_height = min(40, height * 1000)
-                        building_color = POI_INFO[poi_name]['color']
-                        
-                        # Add text label for POI
-                        text_features.append({
-                            "position": [*building.geometry.centroid.coords[0], building_height + 10],
-                            "text": poi_name,
-                            "color": [150, 150, 150, 255]
-                        })
-                        break
-            
-            building_features.append({
-                "polygon": building.geometry.exterior.coords[:],
-                "height": building_height,
-                "color": building_color
-            })
-        except Exception as e:
-            print(f"Skipping building due to error: {e}")
-            continue
+    # Buildings in a POI polygon are raised and colored by their POI
+    poi_names = buildings.poi_names(POI_ID_MAP)
+    in_poi = np.isin(buildings.poi_ids, list(POI_ID_MAP))
+    heights = np.where(in_poi, np.minimum(40, buildings.heights * 1000), buildings.heights * 1.5)
+    colors = [POI_INFO[name]['color'] if name else DEFAULT_BUILDING_COLOR for name in poi_names]
+    building_features = buildings.features(heights, colors)
+    
+    # Text label for every POI building
+    text_features = [{
+        "position": [*buildings.centroids[i].tolist(), heights[i] + 10],
+        "text": poi_names[i],
+        "color": [150, 150, 150, 255]
+    } for i in np.nonzero(in_poi)[0]]
     
     # Create layers
     building_layer = pdk.Layer(
@@ -1,4 +1,6 @@
 import json
+from utils.binary_transport import BINARY_LOADER_JS
+from utils.segment_tiles import LEVEL_SELECT_JS, LEVEL_LOADER_JS
 def create_html_template(template_data):
     return """
     <!DOCTYPE html>
@@ -155,7 +157,18 @@ def create_html_template(template_data):
             const temporalStats = %(temporal_stats)s;
             const buildingLayers = %(building_layers)s;
             const initialViewState = %(initial_view_state)s;
+            // Minimum zoom of each level of detail of lineData, coarsest first; the shown level follows the zoom
+            const LINE_ZOOMS = %(line_zooms)s;
+            // Files of the levels not inlined in lineData, fetched when the zoom first reaches them
+            const LINE_URLS = %(line_urls)s;
+            %(level_select)s
+            %(level_loader)s
+            let currentLevel = levelForZoom(LINE_ZOOMS, initialViewState.zoom);
+            // Typed-array layer data (null when the data is inlined as JSON above)
+            const BINARY_MANIFEST = %(binary_manifest)s;
+            let binaryTables = null;
             let deckgl = null;
+            %(binary_loader)s
             
             // Animation state
             let currentHour = 6;
@@ -171,6 +184,24 @@ def create_html_template(template_data):
             });
 
             function createBuildingLayer() {
+                if (binaryTables) {
+                    return new deck.SolidPolygonLayer({
+                        id: 'buildings',
+                        data: binaryLayerData(binaryTables.buildings, {
+                            getPolygon: 'positions', getFillColor: 'colors', getElevation: 'heights'
+                        }),
+                        _normalize: false,
+                        extruded: true,
+                        wireframe: true,
+                        opacity: 1.0,
+                        material: {
+                            ambient: 0.2,
+                            diffuse: 0.8,
+                            shininess: 32,
+                            specularColor: [60, 64, 70]
+                        }
+                    });
+                }
                 return new deck.PolygonLayer({
                     id: 'buildings',
                     data: buildingLayers,
@@ -190,10 +221,26 @@ def create_html_template(template_data):
                 });
             }
 
+            // Segments of an hour at the current level: JSON features (of a coarser level until the
+            // current one is loaded), or the level's shared binary positions with that hour's colors
+            function hourLineData(hour) {
+                if (binaryTables) {
+                    return binaryLayerData(binaryTables[`segments_${currentLevel}`], {
+                        getSourcePosition: 'sourcePositions',
+                        getTargetPosition: 'targetPositions',
+                        getColor: `colors_${hour}`
+                    });
+                }
+                const level = shownLevel(lineData, LINE_URLS, currentLevel, loaded => {
+                    if (loaded === currentLevel && !isTransitioning) updateVisualization(currentHour);
+                });
+                return (lineData[level] || {})[hour.toString()] || [];
+            }
+
             function createLineLayer(hour) {
                 return new deck.LineLayer({
                     id: 'trip-lines',
-                    data: lineData[hour.toString()] || [],
+                    data: hourLineData(hour),
                     getSourcePosition: d => d.start,
                     getTargetPosition: d => d.end,
                     getColor: d => d.color,
@@ -241,8 +288,8 @@ def create_html_template(template_data):
 
                 const duration = transitionSpeed * 1000; // Convert to milliseconds
                 const startTime = performance.now();
-                const startData = lineData[currentHour.toString()] || [];
-                const endData = lineData[targetHour.toString()] || [];
+                const startData = hourLineData(currentHour);
+                const endData = hourLineData(targetHour);
 
                 function animate(currentTime) {
                     const elapsed = currentTime - startTime;
@@ -322,11 +369,24 @@ def create_html_template(template_data):
                             bearing: viewState.bearing,
                             pitch: viewState.pitch
                         });
+                        // Swap in the level of detail of the new zoom (a running transition picks it up when done)
+                        const level = levelForZoom(LINE_ZOOMS, viewState.zoom);
+                        if (level !== currentLevel) {
+                            currentLevel = level;
+                            if (!isTransitioning) updateVisualization(currentHour);
+                        }
                     }
                 });
                 
-                // Initial visualization
-                updateVisualization(currentHour);
+                // Initial visualization, once the typed arrays are loaded when the data is binary
+                if (BINARY_MANIFEST) {
+                    loadBinaryTables(BINARY_MANIFEST).then(({tables}) => {
+                        binaryTables = tables;
+                        updateVisualization(currentHour);
+                    });
+                } else {
+                    updateVisualization(currentHour);
+                }
             });
         </script>
     </body>
@@ -336,5 +396,11 @@ def create_html_template(template_data):
         'line_data': json.dumps(template_data['line_data']),
         'temporal_stats': json.dumps(template_data['temporal_stats']),
         'building_layers': json.dumps(template_data['building_layers']),
-        'initial_view_state': json.dumps(template_data['initial_view_state'])
+        'initial_view_state': json.dumps(template_data['initial_view_state']),
+        'binary_manifest': json.dumps(template_data.get('binary_manifest')),
+        'binary_loader': BINARY_LOADER_JS,
+        'line_zooms': json.dumps(template_data['line_zooms']),
+        'line_urls': json.dumps(template_data.get('line_urls', [])),
+        'level_select': LEVEL_SELECT_JS,
+        'level_loader': LEVEL_LOADER_JS
     }
\ No newline at end of file
@@ -4,12 +4,17 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import math
-from collections import defaultdict
-from shapely.geometry import Point
 import numpy as np
 import json
 import pandas as pd
-from config import OUTPUT_DIR, BUILDINGS_FILE
+from config import OUTPUT_DIR, BUILDINGS_FILE, BUILDINGS_ARTIFACT_FILE, HTML_DATA_TRANSPORT, SEGMENT_LOD_ZOOMS
+from utils.segment_engine import load_color_scale
+from utils.segment_tiles import build_levels, used_segments, write_level_files
+from utils.poi_assignment import assign_pois
+from utils.building_artifact import BuildingArtifact, DEFAULT_BUILDING_COLOR
+from utils.binary_transport import BinaryBundle, check_transport
+from utils.colormap import temporal_load_colors
+from utils.route_writer import load_routes
 
 # Constants
 POI_INFO = {
@@ -24,7 +29,6 @@ POI_ID_MAP = {
     11: 'Soroka Hospital'
 }
 
-POI_RADIUS = 0.0018  # about 200 meters in decimal degrees
 
 def load_temporal_distributions():
     """Load temporal distribution data for each POI"""
@@ -54,125 +58,59 @@ def load_poi_data():
     attractions = gpd.read_file("shapes/data/maps/Be'er_Sheva_Shapefiles_Attraction_Centers.shp")
     return attractions[attractions['ID'].isin([11, 12, 7])]
 
-def create_hourly_segment_data(trips_data, hour, temporal_dist, poi_polygons):
-    """Create segment data for a specific hour"""
-    segments = defaultdict(float)
-    
-    for _, row in trips_data.iterrows():
-        coords = list(row.geometry.coords)
-        base_trips = row['num_trips']
-        
-        # Find destination POI
-        end_point = Point(coords[-1])
-        poi_name = None
-        for idx, poi_polygon in poi_polygons.iterrows():
-            if end_point.distance(poi_polygon.geometry) < POI_RADIUS:
-                poi_name = POI_ID_MAP[int(poi_polygon['ID'])]
-                break
-        
-        if not poi_name or poi_name not in temporal_dist:
-            continue
-        
-        # Apply temporal distribution
-        hour_index = hour - 6
-        hour_factor = temporal_dist[poi_name][hour_index]
-        adjusted_trips = base_trips * hour_factor
-        
-        # Create segments with trip count and POI info
-        for i in range(len(coords) - 1):
-            segment = (coords[i], coords[i + 1])
-            segments[segment] += adjusted_trips
-    
-    return segments
+def hourly_route_weights(trips_data, destination_pois, temporal_dist, hours):
+    """(routes x hours) trips per route and hour: num_trips times the destination POI's hourly factor"""
+    weights = np.zeros((len(trips_data), len(hours)))
+    num_trips = trips_data['num_trips'].to_numpy(dtype=float)
+    hour_index = np.asarray(hours) - 6
+    for poi_name, dist in temporal_dist.items():
+        routes = destination_pois == poi_name
+        weights[routes] = num_trips[routes, None] * np.asarray(dist)[hour_index][None, :]
+    return weights
 
-def calculate_temporal_weight(hour, prev_segments, next_segments, segment, current_value):
-    """Calculate temporal weight based on changes from previous and next hour"""
-    prev_value = prev_segments.get(segment, 0) if prev_segments else 0
-    next_value = next_segments.get(segment, 0) if next_segments else 0
+def calculate_temporal_weights(hour_loads):
+    """Temporal weights from the change to the previous and next hour, for a (segments x hours) load array"""
+    prev_loads = np.zeros_like(hour_loads)
+    prev_loads[:, 1:] = hour_loads[:, :-1]
+    next_loads = np.zeros_like(hour_loads)
+    next_loads[:, :-1] = hour_loads[:, 1:]
     
     # Calculate relative changes
-    prev_change = (current_value - prev_value) / (prev_value + 1)  # Add 1 to avoid division by zero
-    next_change = (next_value - current_value) / (current_value + 1)
+    prev_change = (hour_loads - prev_loads) / (prev_loads + 1)  # Add 1 to avoid division by zero
+    next_change = (next_loads - hour_loads) / (hour_loads + 1)
     
     # Weight factor based on how dramatic the changes are
-    temporal_weight = (abs(prev_change) + abs(next_change)) / 2
-    return temporal_weight
+    return (np.abs(prev_change) + np.abs(next_change)) / 2
 
-def calculate_global_statistics(all_segments):
+def calculate_global_statistics(hour_loads):
     """Calculate global statistics for consistent color scaling"""
-    all_trips = []
-    for hour_segments in all_segments.values():
-        all_trips.extend(hour_segments.values())
-    
-    all_trips = np.array(all_trips)
-    global_mean = np.mean(all_trips)
-    global_std = np.std(all_trips)
-    global_max = np.max(all_trips)
-    
-    # Create logarithmic bins
-    lower_bins = np.logspace(0, np.log10(global_mean), num=5)
-    upper_bins = np.logspace(np.log10(global_mean), np.log10(global_max), num=3)
-    bins = np.unique(np.concatenate([lower_bins, upper_bins]))
-    
-    return global_mean, global_std, global_max, bins
+    return load_color_scale(hour_loads)
 
-def get_enhanced_color_for_value(value, global_stats, temporal_weight=0):
-    """Get enhanced color with more gradients and temporal weighting"""
-    global_mean, global_std, global_max, bins = global_stats
-    
-    # Enhanced color scale definition with more gradients
-    colors = {
-        0.0: [10, 20, 90],      # Dark blue
-        0.15: [65, 105, 225],   # Royal blue
-        0.3: [30, 144, 255],    # Dodger blue
-        0.45: [0, 191, 255],    # Deep sky blue
-        0.6: [0, 255, 255],     # Cyan
-        0.7: [50, 205, 50],     # Lime green
-        0.8: [255, 215, 0],     # Gold
-        0.9: [255, 140, 0],     # Dark orange
-        1.0: [255, 69, 0]       # Red-orange
-    }
-    
-    # Find which bin the value falls into
-    bin_index = np.digitize(value, bins) - 1
-    position = bin_index / (len(bins) - 1)
-    
-    # Apply enhanced sigmoid transformation for better contrast
-    position = 1 / (1 + np.exp(-5 * (position - 0.5)))
-    
-    # Adjust position based on temporal weight
-    temporal_factor = min(0.3, temporal_weight)  # Cap the temporal influence
-    position = position * (1 + temporal_factor)
-    position = min(1.0, position)  # Ensure we don't exceed 1.0
-    
-    # Get color positions
-    color_positions = sorted(colors.keys())
-    
-    # Find appropriate color interval
-    for i in range(len(color_positions) - 1):
-        if position <= color_positions[i + 1]:
-            lower_pos = color_positions[i]
-            upper_pos = color_positions[i + 1]
-            lower_color = colors[lower_pos]
-            upper_color = colors[upper_pos]
-            
-            # Enhanced interpolation with temporal weight influence
-            factor = (position - lower_pos) / (upper_pos - lower_pos)
-            
-            # Add slight saturation boost for segments with high temporal change
-            saturation_boost = 1 + (temporal_weight * 0.2)
-            
-            color = [
-                min(255, int((lower_color[0] + (upper_color[0] - lower_color[0]) * factor) * saturation_boost)),
-                min(255, int((lower_color[1] + (upper_color[1] - lower_color[1]) * factor) * saturation_boost)),
-                min(255, int((lower_color[2] + (upper_color[2] - lower_color[2]) * factor) * saturation_boost))
-            ]
-            
-            # Adjust alpha based on temporal weight
-            alpha = int(200 + (temporal_weight * 55))  # More temporal change = more opacity
-            return color + [min(255, alpha)]
-    
-    return colors[1.0] + [255]
+def hourly_line_features(level, hours, weights, matched, global_stats):
+    """Per-hour line features of a level's segments used by matched routes, and their (segments x hours) loads"""
+    used = used_segments(level, matched)
+    hour_loads = level.loads(weights)[used]
+    starts, ends = level.start[used], level.end[used]
+    temporal_weights = calculate_temporal_weights(hour_loads)
+    
+    # Enhanced colors with temporal weighting for every segment and hour, in one lookup-table pass
+    colors = temporal_load_colors(hour_loads.ravel(), global_stats, temporal_weights.ravel()).reshape(*hour_loads.shape, 4)
+    
+    features_by_hour = {}
+    for h, hour in enumerate(hours):
+        features_by_hour[str(hour)] = [
+            {
+                "start": [start[0], start[1], 5],
+                "end": [end[0], end[1], 5],
+                "trips": int(trips),
+                "color": color,
+                "temporal_weight": float(temporal_weight)
+            }
+            for start, end, trips, temporal_weight, color in zip(
+                starts.tolist(), ends.tolist(), hour_loads[:, h].tolist(), temporal_weights[:, h].tolist(),
+                colors[:, h].tolist())
+        ]
+    return features_by_hour, hour_loads
 
 def create_line_layer(trips_data, bounds):
     """Create visualization data for all hours with enhanced temporal coloring"""
@@ -182,64 +120,40 @@ def create_line_layer(trips_data, bounds):
     poi_polygons = load_poi_data()
     temporal_dist = load_temporal_distributions()
     
-    # First pass: collect all segment data
-    all_segments = {}
-    total_trips = trips_data['num_trips'].sum()
-    
-    for hour in range(6, 23):
-        print(f"\nCollecting data for hour {hour:02d}:00...")
-        segments = create_hourly_segment_data(trips_data, hour, temporal_dist, poi_polygons)
-        if segments:
-            all_segments[hour] = segments
-    
-    # Calculate global statistics for consistent color scaling
-    global_stats = calculate_global_statistics(all_segments)
-    
-    # Second pass: create features with enhanced temporal coloring
-    all_line_data = {}
+    # Route-by-segment incidence of every zoom level of detail (raw segments last), each built once
+    # per route set and cached
+    levels = build_levels(trips_data.geometry.values, zooms=SEGMENT_LOD_ZOOMS, directed=True,
+                          cache_prefix=os.path.join(OUTPUT_DIR, "road_usage_incidence"))
+    
+    # Segment x hour loads as one product with the (routes x hours) weights;
+    # segments used by any route with a known destination POI are shown every hour
+    hours = list(range(6, 23))
+    destination_pois = assign_pois(
+        trips_data, poi_polygons, labels=[POI_ID_MAP[int(poi_id)] for poi_id in poi_polygons['ID']]
+    ).to_numpy()
+    matched = np.isin(destination_pois, list(temporal_dist))
+    weights = hourly_route_weights(trips_data, destination_pois, temporal_dist, hours)
+    hour_trips = weights.sum(axis=0)
+    
+    # Calculate global statistics of the raw segments for consistent color scaling at every level
+    raw_level = levels[-1]
+    global_stats = calculate_global_statistics(raw_level.loads(weights)[used_segments(raw_level, matched)])
+    
+    level_line_data = []
+    for level in levels:
+        features_by_hour, hour_loads = hourly_line_features(level, hours, weights, matched, global_stats)
+        level_line_data.append(features_by_hour)
+        print(f"Zoom {level.min_zoom}+: {len(hour_loads)} segments")
+    
+    # Statistics are those of the raw segments (the last level, whose hour_loads remain)
+    all_line_data = level_line_data[-1]
     max_trips_per_hour = {}
     
-    for hour, segments in all_segments.items():
-        print(f"Processing visualization for hour {hour:02d}:00...")
-        features = []
-        
-        # Get adjacent hour segments for temporal comparison
-        prev_segments = all_segments.get(hour - 1, {})
-        next_segments = all_segments.get(hour + 1, {})
-        
-        # Calculate trips for this hour
-        hour_trips = 0
-        for _, row in trips_data.iterrows():
-            # Find destination POI
-            end_point = Point(list(row.geometry.coords)[-1])
-            for _, poi_polygon in poi_polygons.iterrows():
-                if end_point.distance(poi_polygon.geometry) < POI_RADIUS:
-                    poi_name = POI_ID_MAP[int(poi_polygon['ID'])]
-                    if poi_name in temporal_dist:
-                        hour_trips += row['num_trips'] * temporal_dist[poi_name][hour-6]
-                    break
-        
-        max_trips_per_hour[hour] = max(segments.values())
-        
-        for segment, trips in segments.items():
-            # Calculate temporal weight based on changes from previous and next hour
-            temporal_weight = calculate_temporal_weight(hour, prev_segments, next_segments, segment, trips)
-            
-            # Get enhanced color with temporal weighting
-            color = get_enhanced_color_for_value(trips, global_stats, temporal_weight)
-            
-            start, end = segment
-            features.append({
-                "start": [start[0], start[1], 5],
-                "end": [end[0], end[1], 5],
-                "trips": int(trips),
-                "color": color,
-                "temporal_weight": float(temporal_weight)
-            })
-        
-        all_line_data[str(hour)] = features
-        print(f"Hour {hour:02d}:00 - Generated {len(features)} segments with {hour_trips:.0f} trips")
-        total_unique_trips = hour_trips
+    for h, hour in enumerate(hours):
+        features = all_line_data[str(hour)]
+        max_trips_per_hour[hour] = hour_loads[:, h].max()
+        print(f"Hour {hour:02d}:00 - Generated {len(features)} segments with {hour_trips[h]:.0f} trips")
+        total_unique_trips = hour_trips[h]
     # Create initial view state and building layers
     initial_view_state = {
         'latitude': (bounds[1] + bounds[3]) / 2,
@@ -275,7 +189,8 @@ def create_line_layer(trips_data, bounds):
     template_data = {
         'initial_view_state': initial_view_state,
         'total_trips': total_unique_trips,
-        'line_data': all_line_data,
+        'line_data': level_line_data,
+        'line_zooms': [level.min_zoom for level in levels],
         'temporal_stats': temporal_stats,
         'building_layers': building_layers,
         'color_scale': color_scale_info
@@ -285,46 +200,36 @@ def create_line_layer(trips_data, bounds):
 
 def create_building_layer(bounds):
     """Create building layer with POI highlights"""
-    # Load building data
-    buildings_gdf = gpd.read_file(BUILDINGS_FILE)
-    building_features = []
-    
-    # Load POI data
     poi_polygons = load_poi_data()
-    
-    # Process buildings and POIs
-    for idx, building in buildings_gdf.iterrows():
-        try:
-            height = float(building.get('height', 20))
-            color = [74, 80, 87, 160]  # Default color
-            
-            # Check POI intersections
-            for poi_idx, poi_polygon in poi_polygons.iterrows():
-                if building.geometry.intersects(poi_polygon.geometry):
-                    poi_id = int(poi_polygon['ID'])
-                    poi_name = POI_ID_MAP.get(poi_id)
-                    if poi_name:
-                        color = POI_INFO[poi_name]['color']
-                        height = min(40, height * 2)
-            
-            building_features.append({
-                "polygon": list(building.geometry.exterior.coords),
-                "height": height,
-                "color": color
-            })
-            
-        except Exception as e:
-            print(f"Skipping building: {e}")
-            continue
-    
-    return building_features
+    buildings = BuildingArtifact.cached(BUILDINGS_ARTIFACT_FILE, BUILDINGS_FILE, poi_polygons)
+    
+    # Buildings in a POI polygon are raised and colored by their POI
+    poi_names = buildings.poi_names(POI_ID_MAP)
+    in_poi = np.isin(buildings.poi_ids, list(POI_ID_MAP))
+    heights = np.where(in_poi, np.minimum(40, buildings.heights * 2), buildings.heights)
+    colors = [POI_INFO[name]['color'] if name else DEFAULT_BUILDING_COLOR for name in poi_names]
+    return buildings.features(heights, colors)
+
+def build_binary_bundle(template_data):
+    """Per level of detail, segment positions once and each hour's segment colors; and the buildings, as typed tables"""
+    bundle = BinaryBundle()
+    for i, line_data in enumerate(template_data['line_data']):
+        first_hour = line_data[min(line_data, key=int)] if line_data else []
+        segments = bundle.add_table(f'segments_{i}', len(first_hour))
+        segments.add('sourcePositions', np.array([feature['start'] for feature in first_hour]).reshape(-1, 3), np.float32)
+        segments.add('targetPositions', np.array([feature['end'] for feature in first_hour]).reshape(-1, 3), np.float32)
+        # Every hour lists the same segments in the same order
+        for hour, features in line_data.items():
+            segments.add(f'colors_{hour}', np.array([feature['color'] for feature in features]).reshape(-1, 4), np.uint8)
+    bundle.add_polygon_features('buildings', template_data['building_layers'])
+    return bundle
 
 def main():
     print("\nStarting temporal trip route visualization...")
     
     # Load and filter trips data
     file_path = os.path.join(OUTPUT_DIR, "road_usage_trips.geojson")
-    trips_data = gpd.read_file(file_path)
+    trips_data = load_routes(file_path)
     bounds = (34.65, 31.15, 34.95, 31.35)
     trips_data = trips_data.cx[bounds[0]:bounds[2], bounds[1]:bounds[3]]
     print(f"Processing {len(trips_data)} routes after filtering")
@@ -332,12 +237,26 @@ def main():
     # Create visualization data
     template_data = create_line_layer(trips_data, bounds)
     
+    output_path = os.path.join(OUTPUT_DIR, "temporal_trip_routes.html")
+    
+    # Typed-array transport: the page gets a manifest and loads the tables instead of inline JSON
+    transport = check_transport(HTML_DATA_TRANSPORT)
+    if transport != 'json':
+        bundle = build_binary_bundle(template_data)
+        template_data['binary_manifest'] = bundle.write(output_path, transport)
+        bundle.report(json.dumps({'line_data': template_data['line_data'],
+                                  'building_layers': template_data['building_layers']}),
+                      template_data['binary_manifest'])
+        template_data['line_data'], template_data['building_layers'] = [], []
+    else:
+        # Only the coarsest level is inlined; the page fetches the finer ones when the zoom first reaches them
+        template_data['line_data'], template_data['line_urls'] = write_level_files(output_path, template_data['line_data'])
+    
     # Generate HTML using template
     from line_roads_html import create_html_template
     html = create_html_template(template_data)
     
     # Save file
-    output_path = os.path.join(OUTPUT_DIR, "temporal_trip_routes.html")
     with open(output_path, 'w') as f:
         f.write(html)
     
@@ -1,55 +1,61 @@
-import geopandas as gpd
 import os
 import sys
 import json
-from collections import defaultdict
 import numpy as np
 
 # Add parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import OUTPUT_DIR
+from config import OUTPUT_DIR, SEGMENT_LOD_ZOOMS
+from utils.segment_tiles import build_levels, write_level_files, LEVEL_SELECT_JS, LEVEL_LOADER_JS
+from utils.route_writer import load_routes
 
 def load_road_usage():
     """Load the trips data"""
     file_path = os.path.join(OUTPUT_DIR, "road_usage_trips.geojson")
-    trips = gpd.read_file(file_path)
+    trips = load_routes(file_path)
     print(f"Loaded {len(trips)} unique trip routes")
     return trips
 
 def prepare_line_data(trips_data, bounds):
-    """Prepare the line data for visualization"""
-    segments = defaultdict(float)
+    """Prepare the line data of every zoom level of detail for visualization"""
+    # Aggregate trip counts for the segments of every level, coarsest first and raw last
+    levels = build_levels(trips_data.geometry.values, zooms=SEGMENT_LOD_ZOOMS)
+    num_trips = trips_data['num_trips'].to_numpy()
+    max_trips = levels[-1].loads(num_trips).max()
     
-    # Aggregate trip counts for segments
-    for _, row in trips_data.iterrows():
-        coords = list(row.geometry.coords)
-        num_trips = row['num_trips']
-        
-        for i in range(len(coords) - 1):
-            segment = tuple(sorted([coords[i], coords[i + 1]]))
-            segments[segment] += num_trips
-    
-    max_trips = max(segments.values())
-    line_data = []
-    
-    # Create visualization data
-    for (start_coord, end_coord), trip_count in segments.items():
-        # Single logarithm with scaling factor for moderate compression
+    line_levels = []
+    for level in levels:
+        trips = level.loads(num_trips)
+        used = trips > 0
+        # Single logarithm with scaling factor for moderate compression, against the raw
+        # segments' maximum so colors stay put across levels (merged segments are capped at 1)
         # Using log1p (log(x+1)) to handle zero values
-        trip_ratio = (np.log1p(trip_count * 1.5)) / (np.log1p(max_trips * 1.5))
-        line_data.append({
-            "start": [float(start_coord[0]), float(start_coord[1]), 0],
-            "end": [float(end_coord[0]), float(end_coord[1]), 0],
-            "trips": int(trip_count),
-            "ratio": float(trip_ratio)
-        })
+        ratios = np.minimum(1.0, np.log1p(trips[used] * 1.5) / np.log1p(max_trips * 1.5))
+        line_data = [
+            {
+                "start": [start[0], start[1], 0],
+                "end": [end[0], end[1], 0],
+                "trips": int(trip_count),
+                "ratio": ratio
+            }
+            for start, end, trip_count, ratio in zip(
+                level.start[used].tolist(), level.end[used].tolist(), trips[used].tolist(), ratios.tolist()
+            )
+        ]
+        print(f"Zoom {level.min_zoom}+: {len(line_data)} segments")
+        line_levels.append({"minZoom": level.min_zoom, "data": line_data})
 
-    return line_data, max_trips
+    return line_levels, max_trips
 
 def create_html_file(trips_data, bounds, output_prefix):
     """Create the HTML file with the visualization"""
     # Prepare data
-    line_data, max_trips = prepare_line_data(trips_data, bounds)
+    line_levels, max_trips = prepare_line_data(trips_data, bounds)
+    output_file = os.path.join(OUTPUT_DIR, f"{output_prefix}.html")
+    
+    # Only the coarsest level is inlined; the page fetches the finer ones when the zoom first reaches them
+    level_zooms = [level["minZoom"] for level in line_levels]
+    level_data, level_urls = write_level_files(output_file, [level["data"] for level in line_levels])
     
     # Calculate view state
     center_lon = (bounds[0] + bounds[2]) / 2
@@ -149,7 +155,15 @@ def create_html_file(trips_data, bounds, output_prefix):
             </p>
         </div>
         <script type="text/javascript">
-            const lineData = {json.dumps(line_data)};
+            // Segment sets per level of detail, coarsest first; the one shown follows the zoom.
+            // Only the coarsest is inlined, the others are loaded from levelUrls when first needed
+            const levelZooms = {json.dumps(level_zooms)};
+            const lineLevels = {json.dumps(level_data)};
+            const levelUrls = {json.dumps(level_urls)};
+            {LEVEL_SELECT_JS}
+            {LEVEL_LOADER_JS}
+            let currentLevel = levelForZoom(levelZooms, 12);
+            let currentThreshold = 0;
             
             function interpolateColor(t) {{
                 // No need for additional scaling since we're already using log scale
@@ -187,7 +201,11 @@ def create_html_file(trips_data, bounds, output_prefix):
             }}
             
             function createLineLayer(threshold) {{
-                const filteredData = lineData.filter(d => d.ratio >= threshold);
+                // Redraw when the wanted level arrives, if the zoom still wants it
+                const level = shownLevel(lineLevels, levelUrls, currentLevel, loaded => {{
+                    if (loaded === currentLevel) deckgl.setProps({{ layers: [createLineLayer(currentThreshold)] }});
+                }});
+                const filteredData = lineLevels[level].filter(d => d.ratio >= threshold);
                 document.getElementById('route-count').textContent = filteredData.length.toLocaleString();
                 
                 return new deck.LineLayer({{
@@ -212,7 +230,14 @@ def create_html_file(trips_data, bounds, output_prefix):
                     bearing: 0
                 }},
                 controller: true,
-                layers: [createLineLayer(0)]
+                layers: [createLineLayer(0)],
+                onViewStateChange: ({{viewState}}) => {{
+                    const level = levelForZoom(levelZooms, viewState.zoom);
+                    if (level !== currentLevel) {{
+                        currentLevel = level;
+                        deckgl.setProps({{ layers: [createLineLayer(currentThreshold)] }});
+                    }}
+                }}
             }});
 
             // Set up slider interaction
@@ -220,9 +245,9 @@ def create_html_file(trips_data, bounds, output_prefix):
             const value = document.getElementById('intensity-value');
             
             slider.addEventListener('input', function() {{
-                const threshold = this.value / 100;
+                currentThreshold = this.value / 100;
                 value.textContent = this.value + '%';
-                deckgl.setProps({{ layers: [createLineLayer(threshold)] }});
+                deckgl.setProps({{ layers: [createLineLayer(currentThreshold)] }});
             }});
         </script>
     </body>
@@ -230,7 +255,6 @@ def create_html_file(trips_data, bounds, output_prefix):
     """
     
     # Save the HTML file
-    output_file = os.path.join(OUTPUT_DIR, f"{output_prefix}.html")
     with open(output_file, 'w') as f:
         f.write(html_content)
     
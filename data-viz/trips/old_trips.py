@@ -1,7 +1,6 @@
 # for reference on motion viz
 import pydeck as pdk
 import pandas as pd
-import geopandas as gpd
 import numpy as np
 import os
 import sys
@@ -9,7 +8,6 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import json
 import logging
 from config import BUILDINGS_FILE
-from shapely.geometry import Point
 from pyproj import Transformer
 
 # Configure logging
@@ -18,7 +16,9 @@ logger = logging.getLogger(__name__)
 
 # Add parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import MAPBOX_API_KEY, OUTPUT_DIR
+from config import MAPBOX_API_KEY, OUTPUT_DIR, BUILDINGS_ARTIFACT_FILE
+from utils.building_artifact import BuildingArtifact, DEFAULT_BUILDING_COLOR
+from utils.route_writer import load_routes
 
 POI_RADIUS = 0.0018  # about 200 meters in decimal degrees
 
@@ -35,7 +35,7 @@ def load_trip_data():
     logger.info(f"Loading trip data from: {file_path}")
     
     try:
-        trips_gdf = gpd.read_file(file_path)
+        trips_gdf = load_routes(file_path)
         raw_trip_count = trips_gdf['num_trips'].sum()
         logger.info(f"Loaded {len(trips_gdf)} routes representing {raw_trip_count:,} total trips")
     except Exception as e:
@@ -85,47 +85,26 @@ def load_building_data():
     logger.info(f"Loading building data from: {file_path}")
     
     try:
-        buildings_gdf = gpd.read_file(BUILDINGS_FILE)
+        buildings = BuildingArtifact.cached(BUILDINGS_ARTIFACT_FILE, BUILDINGS_FILE)
         
-        # Convert to format needed for deck.gl
-        buildings_data = []
-        text_features = []
+        # POI locations in the buildings' coordinate system
+        transformer = Transformer.from_crs("EPSG:4326", buildings.crs or "EPSG:4326", always_xy=True)
+        poi_names = list(POI_INFO)
+        poi_points = [transformer.transform(info['lon'], info['lat']) for info in POI_INFO.values()]
         
-        # Create a transformer for POI coordinates
-        transformer = Transformer.from_crs("EPSG:4326", buildings_gdf.crs, always_xy=True)
+        # Buildings whose centroid is within radius of a main POI are raised and colored by it
+        near_poi = buildings.near(poi_points, POI_RADIUS)
+        in_poi = near_poi >= 0
+        heights = np.where(in_poi, np.minimum(40, buildings.heights * 1000), buildings.heights * 1.5)  # Match line_roads.py height scaling
+        colors = [POI_INFO[poi_names[poi]]['color'] if poi >= 0 else DEFAULT_BUILDING_COLOR for poi in near_poi.tolist()]
+        buildings_data = buildings.features(heights, colors)
         
-        for idx, building in buildings_gdf.iterrows():
-            building_color = [74, 80, 87, 160]  # Default color
-            try:
-                # Get actual height from building data, default to 20 if not found
-                height = float(building.get('height', 20))
-                building_height = height * 1.5  # Scale height to match line_roads.py
-                
-                # Check if building is within radius of main POIs
-                for poi_name, info in POI_INFO.items():
-                    poi_x, poi_y = transformer.transform(info['lon'], info['lat'])
-                    poi_point = Point(poi_x, poi_y)
-                    
-                    if building.geometry.centroid.distance(poi_point) <= POI_RADIUS:
-                        building_height = min(40, height * 1000)  # Match line_roads.py height scaling
-                        building_color = info['color']
-                        
-                        # Add text label for POI
-                        text_features.append({
-                            "position": [poi_x, poi_y, building_height + 10],
-                            "text": poi_name,
-                            "color": [255, 255, 255, 255]  # Bright white text
-                        })
-                        break
-                
-                buildings_data.append({
-                    "polygon": list(building.geometry.exterior.coords),
-                    "height": building_height,
-                    "color": building_color
-                })
-            except Exception as e:
-                logger.error(f"Skipping building due to error: {e}")
-                continue
+        # Text label at the POI for every POI building
+        text_features = [{
+            "position": [*poi_points[near_poi[i]], heights[i] + 10],
+            "text": poi_names[near_poi[i]],
+            "color": [255, 255, 255, 255]  # Bright white text
+        } for i in np.nonzero(in_poi)[0]]
         
         logger.info(f"Loaded {len(buildings_data)} buildings")
         return buildings_data, text_features
@@ -1,19 +1,21 @@
 import pydeck as pdk
-import geopandas as gpd
 import os
 import sys
 import math
-from collections import defaultdict
 from shapely.ops import split, linemerge
-from shapely.geometry import Point, MultiLineString
+from shapely.geometry import MultiLineString
 import numpy as np
 # Add parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from pyproj import Transformer
-from config import OUTPUT_DIR, MAPBOX_API_KEY, BUILDINGS_FILE, POI_LOCATIONS
+from config import OUTPUT_DIR, MAPBOX_API_KEY, BUILDINGS_FILE, BUILDINGS_ARTIFACT_FILE, POI_LOCATIONS
 from shapely.geometry import Polygon
 from geopy.distance import geodesic
 from data_loader import DataLoader
+from utils.segment_engine import aggregate_segments
+from utils.colormap import road_usage_colors
+from utils.building_artifact import BuildingArtifact, DEFAULT_BUILDING_COLOR
+from utils.route_writer import load_routes
 
 
 # Style link
@@ -24,28 +26,13 @@ POI_RADIUS = 0.0018  # about 200 meters in decimal degrees
 def load_road_usage():
     """Load the trips data"""
     file_path = os.path.join(OUTPUT_DIR, "road_usage_trips.geojson")
-    trips = gpd.read_file(file_path)
+    trips = load_routes(file_path)
     print(f"Loaded {len(trips)} unique trip routes")
     return trips
 
 def create_segment_data(trips_data):
     """Break down routes into segments and aggregate trip counts"""
-    # Dictionary to store segment data: (start_coord, end_coord) -> (trips, route_points)
-    segments = defaultdict(lambda: {"trips": 0.0, "routes": []})
-    
-    for _, row in trips_data.iterrows():
-        coords = list(row.geometry.coords)
-        num_trips = row['num_trips']
-        
-        # Break down each route into segments
-        for i in range(len(coords) - 1):
-            # Sort coordinates to ensure consistent segment keys
-            segment = tuple(sorted([coords[i], coords[i + 1]]))
-            segments[segment]["trips"] += num_trips
-            # Store the original sequence of points for this route
-            segments[segment]["routes"].append(coords)
-    
-    return segments
+    return aggregate_segments(trips_data.geometry.values, trips_data['num_trips'].to_numpy())
 
 def get_route_distance(coords):
     """Calculate total route distance"""
@@ -56,51 +43,6 @@ def get_route_distance(coords):
         total_distance += math.sqrt(dx*dx + dy*dy)
     return total_distance
 
-def cube_root_scale(t):
-        """Apply cube root scale to compress high values"""
-        return np.cbrt(t)
-
-def interpolate_color(t, distance_ratio):
-    """Color interpolation based on trip count and distance ratio"""
-    # Apply cube root scaling to trip ratio for better distribution
-    t = cube_root_scale(t)
-    
-    # Base colors (from low to high trip counts, with increasing brightness)
-    colors = {
-        0.0: [20, 42, 120],     # Dark blue
-        0.2: [40, 80, 180],     # Medium blue
-        0.4: [65, 182, 196],    # Light blue
-        0.6: [120, 200, 150],   # Blue-green
-        0.8: [200, 220, 100],   # Yellow-green
-        1.0: [255, 255, 0]      # Bright yellow
-    }
-    
-    # Find and interpolate colors
-    lower_t = max([k for k in colors.keys() if k <= t])
-    upper_t = min([k for k in colors.keys() if k >= t])
-    
-    c1 = colors[lower_t]
-    c2 = colors[upper_t]
-    
-    # Smooth transition between segments
-    ratio = (t - lower_t) / (upper_t - lower_t) if upper_t != lower_t else 0
-    
-    # Add gaussian-like falloff for smoother segment transitions
-    smoothing = math.exp(-4 * (distance_ratio - 0.5)**2)
-    brightness = 0.7 + 0.3 * smoothing
-    
-    rgb = [
-        min(255, int((c1[0] + (c2[0] - c1[0]) * ratio) * brightness)),
-        min(255, int((c1[1] + (c2[1] - c1[1]) * ratio) * brightness)),
-        min(255, int((c1[2] + (c2[2] - c1[2]) * ratio) * brightness))
-    ]
-    
-    # Smooth opacity transition between segments
-    base_opacity = 0.7 + 0.3 * smoothing
-    opacity = min(255, int(255 * base_opacity))
-    
-    return rgb + [opacity]
-
 def get_route_distance_ratio(coord, start_coord, end_coord):
     """Calculate distance ratio with bias towards destination"""
     dist_to_start = math.sqrt((coord[0] - start_coord[0])**2 + (coord[1] - start_coord[1])**2)
@@ -143,17 +85,19 @@ def get_control_point(p1, p2, next_p):
 def create_line_layer(trips_data, bounds):
     segments = create_segment_data(trips_data)
     polygon_data = []
-    max_trips = max(seg["trips"] for seg in segments.values())
-    total_trips = sum(seg["trips"] for seg in segments.values())
+    max_trips = segments.trips.max()
+    total_trips = segments.trips.sum()
+    geometries = trips_data.geometry.values
+    # Segment colors in one lookup-table pass
+    colors = road_usage_colors(segments.trips / max_trips, 0.5).tolist()
     
-    for segment, data in segments.items():
-        start_coord, end_coord = segment
-        trip_count = data["trips"]
+    for start_coord, end_coord, trip_count, first_route, color in zip(
+            segments.start, segments.end, segments.trips, segments.first_route, colors):
         trip_ratio = trip_count / max_trips
         height = 100 * (trip_ratio ** 0.5)
         
         # Use the first route's points for this segment to generate smooth curves
-        route_points = data["routes"][0]  # Take the first route as reference
+        route_points = list(geometries[first_route].coords)  # Take the first route as reference
         curve_points = []
         
         for i in range(len(route_points)-1):
@@ -223,8 +167,6 @@ def create_line_layer(trips_data, bounds):
         # Combine bottom and top points
         all_points = polygon_points + top_points
         
-        color = interpolate_color(trip_ratio, 0.5)
-        
         polygon_data.append({
             "polygon": all_points,
             "trips": int(trip_count),
@@ -348,7 +290,7 @@ def create_line_layer(trips_data, bounds):
 
 def create_building_layer(bounds):
     """Create a deck.gl layer for buildings with highlighted POIs"""
-    buildings_gdf = gpd.read_file(BUILDINGS_FILE)
+    buildings = BuildingArtifact.cached(BUILDINGS_ARTIFACT_FILE, BUILDINGS_FILE)
     
     # Define POI colors with subtle tones that match building aesthetic
     poi_info = {
@@ -357,44 +299,24 @@ def create_building_layer(bounds):
         'Soroka Hospital': {'color': [140, 140, 140, 160], 'lat': 31.2579375, 'lon': 34.8003125}  # Muted white
     }
     
-    # Create a transformer for POI coordinates
-    transformer = Transformer.from_crs("EPSG:4326", buildings_gdf.crs, always_xy=True)
+    # POI locations in the buildings' coordinate system
+    transformer = Transformer.from_crs("EPSG:4326", buildings.crs or "EPSG:4326", always_xy=True)
+    poi_names = list(poi_info)
+    poi_points = [transformer.transform(info['lon'], info['lat']) for info in poi_info.values()]
     
-    building_data = []
-    text_features = []
+    # Buildings whose centroid is within radius of a main POI are raised and colored by it
+    near_poi = buildings.near(poi_points, POI_RADIUS)
+    in_poi = near_poi >= 0
+    heights = np.where(in_poi, np.minimum(80, buildings.heights * 2000), buildings.heights * 2)
+    colors = [poi_info[poi_names[poi]]['color'] if poi >= 0 else DEFAULT_BUILDING_COLOR for poi in near_poi.tolist()]
+    building_data = buildings.features(heights, colors)
     
-    for _, building in buildings_gdf.iterrows():
-        try:
-            building_color = [74, 80, 87, 160]  # Default color
-            coords = list(building.geometry.exterior.coords)
-            height = float(building.get('height', 20))
-            building_height = height * 2  # Double the height as before
-            
-            # Check if building is within radius of main POIs
-            for poi_name, info in poi_info.items():
-                poi_x, poi_y = transformer.transform(info['lon'], info['lat'])
-                poi_point = Point(poi_x, poi_y)
-                
-                if building.geometry.centroid.distance(poi_point) <= POI_RADIUS:
-                    building_height = min(80, height * 2000)  # Increased height for POIs
-                    building_color = info['color']
-                    
-                    # Add text label for POI
-                    text_features.append({
-                        "position": [poi_x, poi_y, building_height + 10],
-                        "text": poi_name,
-                        "color": [150, 150, 150, 255]
-                    })
-                    break
-            
-            building_data.append({
-                "polygon": [[float(x), float(y)] for x, y in coords],
-                "height": building_height,
-                "color": building_color
-            })
-        except Exception as e:
-            print(f"Skipping building due to error: {e}")
-            continue
+    # Text label at the POI for every POI building
+    text_features = [{
+        "position": [*poi_points[near_poi[i]], heights[i] + 10],
+        "text": poi_names[near_poi[i]],
+        "color": [150, 150, 150, 255]
+    } for i in np.nonzero(in_poi)[0]]
     
     building_layer = pdk.Layer(
         "PolygonLayer",
@@ -164,6 +164,9 @@ HTML_TEMPLATE = """
             const SOROKA_INFO = %(soroka_info)s;
             const ANIMATION_DURATION = %(animation_duration)d;
             const LOOP_LENGTH = %(loopLength)d;
+            // Typed-array layer data (null when the data is inlined as JSON above)
+            const BINARY_MANIFEST = %(binary_manifest)s;
+            %(binary_loader)s
             
             // POI Colors
             const POI_COLORS = {
@@ -181,6 +184,8 @@ HTML_TEMPLATE = """
             // Precomputed state
             let precomputedTrips = new Map();
             let hourlyTripTotals = [];
+            let binaryTrips = null;
+            let binaryBuildings = null;
             
             // Animation state
             let trailLength = 5;
@@ -229,6 +234,27 @@ HTML_TEMPLATE = """
                 'Soroka Hospital': 0
             }));
 
+            if (BINARY_MANIFEST) {
+                loadingProgress.textContent = 'Loading binary trip data...';
+                const {tables, ms} = await loadBinaryTables(BINARY_MANIFEST);
+                const trips = tables.trips;
+                const poiNames = Object.keys(POI_COLORS);
+                for (let i = 0; i < trips.length; i++) {
+                    const hour = Math.floor(trips.columns.startTime[i] / FRAMES_PER_HOUR);
+                    if (hour >= 0 && hour < HOURS_PER_DAY) {
+                        hourlyTripTotals[hour][poiNames[trips.columns.poi[i]]] += trips.columns.numTrips[i];
+                    }
+                }
+                // TripsLayer itself only draws the part of each path inside the trail window
+                binaryTrips = binaryLayerData(trips, {
+                    getPath: 'positions', getTimestamps: 'timestamps', getColor: 'colors', getWidth: 'widths'
+                });
+                binaryBuildings = binaryLayerData(tables.buildings, {
+                    getPolygon: 'positions', getFillColor: 'colors', getElevation: 'heights'
+                });
+                loadingProgress.textContent = `Loaded binary data in ${Math.round(ms)} ms`;
+            }
+
             TRIPS_DATA.forEach(trip => {
                 if (trip.poi) {
                     const hour = Math.floor(trip.startTime / FRAMES_PER_HOUR);
@@ -330,7 +356,21 @@ HTML_TEMPLATE = """
                         updateCounters();
                         
                         const layers = [
-                            new deck.PolygonLayer({
+                            binaryBuildings ? new deck.SolidPolygonLayer({
+                                id: 'buildings',
+                                data: binaryBuildings,
+                                _normalize: false,
+                                extruded: true,
+                                wireframe: true,
+                                opacity: 0.8,
+                                getLineColor: [255, 255, 255, 50],
+                                material: {
+                                    ambient: 0.2,
+                                    diffuse: 0.8,
+                                    shininess: 32,
+                                    specularColor: [60, 64, 70]
+                                }
+                            }) : new deck.PolygonLayer({
                                 id: 'buildings',
                                 data: BUILDINGS_DATA,
                                 extruded: true,
@@ -348,7 +388,16 @@ HTML_TEMPLATE = """
                                     specularColor: [60, 64, 70]
                                 }
                             }),
-                            new deck.TripsLayer({
+                            binaryTrips ? new deck.TripsLayer({
+                                id: 'trips',
+                                data: binaryTrips,
+                                _pathType: 'open',
+                                opacity: 0.8,
+                                widthMinPixels: 2,
+                                rounded: true,
+                                trailLength,
+                                currentTime: currentFrame
+                            }) : new deck.TripsLayer({
                                 id: 'trips',
                                 data: activeTrips,
                                 getPath: d => d.path,
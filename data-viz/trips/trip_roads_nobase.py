@@ -8,7 +8,6 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import json
 import logging
 from config import BUILDINGS_FILE
-from shapely.geometry import Point
 from pyproj import Transformer
 import re
 import trip_nobase_html_template
@@ -19,12 +18,15 @@ logger = logging.getLogger(__name__)
 
 # Add parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import MAPBOX_API_KEY, OUTPUT_DIR
+from config import MAPBOX_API_KEY, OUTPUT_DIR, BUILDINGS_ARTIFACT_FILE
+from utils.poi_assignment import assign_pois
+from utils.building_artifact import BuildingArtifact
+from utils.route_writer import load_routes
 
 attractions = gpd.read_file("shapes/data/maps/Be'er_Sheva_Shapefiles_Attraction_Centers.shp")
 poi_polygons = attractions[attractions['ID'].isin([11, 12, 7])]  # POI polygons
 poi_polygons_json = poi_polygons.to_json()
-POI_RADIUS = 0.0018  # about 200 meters in decimal degrees
+POI_RADIUS = 0.0018  # about 200 meters in decimal degrees, for the HTML template
 
 # Update POI_INFO with even more contrasting colors and darker base buildings
 POI_INFO = {
@@ -74,7 +76,7 @@ def load_trip_data():
     logger.info(f"Loading trip data from: {file_path}")
     
     try:
-        trips_gdf = gpd.read_file(file_path)
+        trips_gdf = load_routes(file_path)
         raw_trip_count = trips_gdf['num_trips'].sum()
         logger.info(f"Loaded {len(trips_gdf)} routes representing {raw_trip_count:,} total trips")
         
@@ -101,6 +103,9 @@ def load_trip_data():
         routes_data = []
         processed_trips = 0
         
+        # POI of every route from its endpoint, in one spatial query
+        route_pois = assign_pois(trips_gdf, poi_polygons, labels=[POI_ID_MAP[int(poi_id)] for poi_id in poi_polygons['ID']])
+        
         for idx, row in trips_gdf.iterrows():
             try:
                 coords = list(row.geometry.coords)
@@ -109,14 +114,7 @@ def load_trip_data():
                 if num_trips <= 0 or len(coords) < 2:
                     continue
                 
-                # Determine POI for this route
-                dest_point = Point(coords[-1])
-                poi_name = None
-                for poi_poly_idx, poi_polygon in poi_polygons.iterrows():
-                    if dest_point.distance(poi_polygon.geometry) < POI_RADIUS:
-                        poi_name = POI_ID_MAP[int(poi_polygon['ID'])]
-                        break
-                
+                poi_name = route_pois[idx]
                 if not poi_name:
                     continue
                 
@@ -168,60 +166,25 @@ def load_building_data():
     logger.info(f"Loading building data from: {file_path}")
     
     try:
-        buildings_gdf = gpd.read_file(BUILDINGS_FILE)
-        
-        # Convert to format needed for deck.gl
-        buildings_data = []
-        text_features = []
+        buildings = BuildingArtifact.cached(BUILDINGS_ARTIFACT_FILE, BUILDINGS_FILE, poi_polygons)
         
         # Debug logging for POI polygons
-        logger.info(f"POI polygons IDs: {[p['ID'] for idx, p in poi_polygons.iterrows()]}")
+        logger.info(f"POI polygons IDs: {poi_polygons['ID'].tolist()}")
         
-        for idx, building in buildings_gdf.iterrows():
-            try:
-                # Skip buildings that don't intersect with any POI
-                building_in_poi = False
-                building_color = None
-                poi_name = None
-                
-                # Check if building intersects with any POI polygon
-                for poi_idx, poi_polygon in poi_polygons.iterrows():
-                    if building.geometry.intersects(poi_polygon.geometry):
-                        numeric_id = int(poi_polygon['ID'])
-                        poi_name = POI_ID_MAP.get(numeric_id)
-                        
-                        if poi_name:
-                            logger.debug(f"Building intersects with POI {numeric_id} ({poi_name})")
-                            building_in_poi = True
-                            building_color = POI_INFO[poi_name]['color']
-                            break
-                
-                # Skip if building is not in a POI area
-                if not building_in_poi:
-                    continue
-                
-                # Get actual height from building data, default to 20 if not found
-                height = float(building.get('height', 20))
-                building_height = min(40, height * 1000)
-                
-                # Add building data
-                buildings_data.append({
-                    "polygon": list(building.geometry.exterior.coords),
-                    "height": building_height,
-                    "color": building_color
-                })
-                
-                # Add text label for POI (only once per POI)
-                if poi_name and not any(t['text'] == poi_name for t in text_features):
-                    text_features.append({
-                        "position": list(building.geometry.centroid.coords)[0] + (building_height + 10,),
-                        "text": poi_name,
-                        "color": [255, 255, 255, 255]
-                    })
-                    
-            except Exception as e:
-                logger.error(f"Skipping building due to error: {e}")
-                continue
+        # Keep only buildings in a POI polygon, raised and colored by their POI
+        poi_names = buildings.poi_names(POI_ID_MAP)
+        in_poi = np.isin(buildings.poi_ids, list(POI_ID_MAP))
+        heights = np.minimum(40, buildings.heights * 1000)
+        colors = [POI_INFO[name]['color'] if name else None for name in poi_names]
+        buildings_data = buildings.features(heights, colors, mask=in_poi)
+        
+        # Text label for each POI, at its first building
+        _, first_building = np.unique(poi_names[in_poi], return_index=True)
+        text_features = [{
+            "position": [*buildings.centroids[i].tolist(), heights[i] + 10],
+            "text": poi_names[i],
+            "color": [255, 255, 255, 255]
+        } for i in np.sort(np.nonzero(in_poi)[0][first_building])]
         
         # Prepare POI polygon borders and fills
         poi_borders = []
@@ -7,7 +7,6 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import json
 import logging
 from config import BUILDINGS_FILE
-from shapely.geometry import Point
 from pyproj import Transformer
 import re
 import trip_html_template
@@ -18,12 +17,16 @@ logger = logging.getLogger(__name__)
 
 # Add parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import MAPBOX_API_KEY, OUTPUT_DIR
+from config import MAPBOX_API_KEY, OUTPUT_DIR, BUILDINGS_ARTIFACT_FILE, HTML_DATA_TRANSPORT
+from utils.poi_assignment import assign_pois
+from utils.building_artifact import BuildingArtifact
+from utils.binary_transport import BinaryBundle, BINARY_LOADER_JS, check_transport, per_vertex
+from utils.route_writer import load_routes
 
 attractions = gpd.read_file("shapes/data/maps/Be'er_Sheva_Shapefiles_Attraction_Centers.shp")
 poi_polygons = attractions[attractions['ID'].isin([11, 12, 7])]  # POI polygons
 poi_polygons_json = poi_polygons.to_json()
-POI_RADIUS = 0.0018  # about 200 meters in decimal degrees
+POI_RADIUS = 0.0018  # about 200 meters in decimal degrees, for the HTML template
 
 # Update POI_INFO with even more contrasting colors and darker base buildings
 POI_INFO = {
@@ -73,7 +76,7 @@ def load_trip_data():
     logger.info(f"Loading trip data from: {file_path}")
     
     try:
-        trips_gdf = gpd.read_file(file_path)
+        trips_gdf = load_routes(file_path)
         raw_trip_count = trips_gdf['num_trips'].sum()
         logger.info(f"Loaded {len(trips_gdf)} routes representing {raw_trip_count:,} total trips")
         
@@ -100,6 +103,9 @@ def load_trip_data():
         routes_data = []
         processed_trips = 0
         
+        # POI of every route from its endpoint, in one spatial query
+        route_pois = assign_pois(trips_gdf, poi_polygons, labels=[POI_ID_MAP[int(poi_id)] for poi_id in poi_polygons['ID']])
+        
         for idx, row in trips_gdf.iterrows():
             try:
                 coords = list(row.geometry.coords)
@@ -108,14 +114,7 @@ def load_trip_data():
                 if num_trips <= 0 or len(coords) < 2:
                     continue
                 
-                # Determine POI for this route
-                dest_point = Point(coords[-1])
-                poi_name = None
-                for poi_poly_idx, poi_polygon in poi_polygons.iterrows():
-                    if dest_point.distance(poi_polygon.geometry) < POI_RADIUS:
-                        poi_name = POI_ID_MAP[int(poi_polygon['ID'])]
-                        break
-                
+                poi_name = route_pois[idx]
                 if not poi_name:
                     continue
                 
@@ -167,46 +166,24 @@ def load_building_data():
     logger.info(f"Loading building data from: {file_path}")
     
     try:
-        buildings_gdf = gpd.read_file(BUILDINGS_FILE)
-        
-        # Convert to format needed for deck.gl
-        buildings_data = []
-        text_features = []
+        buildings = BuildingArtifact.cached(BUILDINGS_ARTIFACT_FILE, BUILDINGS_FILE, poi_polygons)
         
         # Debug logging for POI polygons
-        logger.info(f"POI polygons IDs: {[p['ID'] for idx, p in poi_polygons.iterrows()]}")
+        logger.info(f"POI polygons IDs: {poi_polygons['ID'].tolist()}")
         
-        for idx, building in buildings_gdf.iterrows():
-            try:
-                # Check if building intersects with any POI polygon
-                for poi_idx, poi_polygon in poi_polygons.iterrows():
-                    if building.geometry.intersects(poi_polygon.geometry):
-                        numeric_id = int(poi_polygon['ID'])
-                        poi_name = POI_ID_MAP.get(numeric_id)
-                        
-                        if poi_name:
-                            # Get actual height from building data, default to 20 if not found
-                            height = float(building.get('height', 20))
-                            building_height = min(40, height * 1000)
-                            building_color = POI_INFO[poi_name]['color']
-                            
-                            buildings_data.append({
-                                "polygon": list(building.geometry.exterior.coords),
-                                "height": building_height,
-                                "color": building_color
-                            })
-                            
-                            # Add text label for POI
-                            text_features.append({
-                                "position": list(building.geometry.centroid.coords)[0] + (building_height + 10,),
-                                "text": poi_name,
-                                "color": [255, 255, 255, 255]
-                            })
-                            break
-                            
-            except Exception as e:
-                logger.error(f"Skipping building due to error: {e}")
-                continue
+        # Only buildings in a POI polygon are shown, raised and colored by their POI
+        poi_names = buildings.poi_names(POI_ID_MAP)
+        in_poi = np.isin(buildings.poi_ids, list(POI_ID_MAP))
+        heights = np.minimum(40, buildings.heights * 1000)
+        colors = [POI_INFO[name]['color'] if name else None for name in poi_names]
+        buildings_data = buildings.features(heights, colors, mask=in_poi)
+        
+        # Text label for every POI building
+        text_features = [{
+            "position": [*buildings.centroids[i].tolist(), heights[i] + 10],
+            "text": poi_names[i],
+            "color": [255, 255, 255, 255]
+        } for i in np.nonzero(in_poi)[0]]
         
         # Prepare POI polygon borders and fills
         poi_borders = []
@@ -244,6 +221,33 @@ def load_building_data():
 
 
 
+def build_binary_bundle(trips_data, buildings_data):
+    """Trip patterns and buildings as typed tables for the binary HTML transport"""
+    bundle = BinaryBundle()
+    trips = bundle.add_paths('trips', [trip['path'] for trip in trips_data])
+    offsets = trips.offsets
+    lengths = np.diff(offsets)
+    start_times = np.array([trip['startTime'] for trip in trips_data], dtype=float)
+    durations = np.array([trip['duration'] for trip in trips_data], dtype=float)
+    num_trips = np.array([trip['numTrips'] for trip in trips_data], dtype=float)
+    
+    # Vertex timestamps spread evenly over each pattern's duration, as the page does for JSON data
+    vertex_index = np.arange(offsets[-1]) - per_vertex(offsets[:-1], offsets)
+    fraction = vertex_index / per_vertex(np.maximum(lengths - 1, 1), offsets)
+    trips.add('timestamps', per_vertex(start_times, offsets) + fraction * per_vertex(durations, offsets), np.float32)
+    
+    poi_names = list(POI_INFO)
+    poi_index = np.array([poi_names.index(trip['poi']) for trip in trips_data], dtype=np.uint8)
+    poi_colors = np.array([POI_INFO[name]['color'][:3] + [255] for name in poi_names], dtype=np.uint8)
+    trips.add('colors', per_vertex(poi_colors[poi_index], offsets), np.uint8)
+    trips.add('widths', per_vertex(np.sqrt(np.maximum(num_trips, 1)), offsets), np.float32)
+    trips.add('startTime', start_times, np.uint32)
+    trips.add('numTrips', num_trips, np.float32)
+    trips.add('poi', poi_index, np.uint8)
+    
+    bundle.add_polygon_features('buildings', buildings_data)
+    return bundle
+
 # Update the create_animation function to match parameter names
 def create_animation(html_template, map_style, output_suffix):
     trips_data, center_lat, center_lon, total_trips, animation_duration = load_trip_data()
@@ -251,6 +255,16 @@ def create_animation(html_template, map_style, output_suffix):
     
     hours_simulated = 12
     frames_per_hour = animation_duration // hours_simulated
+    output_path = os.path.join(OUTPUT_DIR, f"trip_animation_time_{output_suffix}.html")
+    
+    # Typed-array transport: the page gets a manifest and loads the tables instead of inline JSON
+    binary_manifest = None
+    transport = check_transport(HTML_DATA_TRANSPORT)
+    if transport != 'json':
+        bundle = build_binary_bundle(trips_data, buildings_data)
+        binary_manifest = bundle.write(output_path, transport)
+        bundle.report(json.dumps({'trips': trips_data, 'buildings': buildings_data}), binary_manifest)
+        trips_data, buildings_data = [], []
     
     format_values = {
         'total_trips': total_trips,
@@ -268,12 +282,13 @@ def create_animation(html_template, map_style, output_suffix):
         'start_hour': 7,  # Changed from 6 to 7
         'end_hour': 19,   # Changed from 22 to 19
         'frames_per_hour': frames_per_hour,
-        'map_style': map_style
+        'map_style': map_style,
+        'binary_manifest': json.dumps(binary_manifest),
+        'binary_loader': BINARY_LOADER_JS
     }
     
     try:
         formatted_html = html_template % format_values
-        output_path = os.path.join(OUTPUT_DIR, f"trip_animation_time_{output_suffix}.html")
         with open(output_path, 'w') as f:
             f.write(formatted_html)
         logger.info(f"Animation saved to: {output_path}")
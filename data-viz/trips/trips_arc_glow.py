@@ -1,12 +1,14 @@
 import pandas as pd
-import geopandas as gpd
 import numpy as np
 import os
 import logging
 import json
+import re
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import OUTPUT_DIR
+from config import OUTPUT_DIR, HTML_DATA_TRANSPORT
+from utils.temporal_store import TemporalStore, ENDPOINT_COLUMNS
+from utils.binary_transport import BinaryBundle, BINARY_LOADER_JS, check_transport
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -190,8 +192,24 @@ def get_html_template():
         </p>
     </div>
     <script>
-        // Arc data
-        const arcData = ARCDATA;
+        // Arc data (empty when it travels as typed arrays, see ARC_MANIFEST)
+        let arcData = ARCDATA;
+        const ARC_MANIFEST = ARCMANIFEST;
+        const ARC_DESTINATIONS = ARCDESTINATIONS;
+        BINARYLOADER
+        
+        // Arc records from the typed 'arcs' table: endpoints, departure time and destination index
+        function arcRecords(table) {
+            const {source_lon, source_lat, target_lon, target_lat, departure_time, destination} = table.columns;
+            return Array.from({length: table.length}, (_, i) => ({
+                source_lon: source_lon[i],
+                source_lat: source_lat[i],
+                target_lon: target_lon[i],
+                target_lat: target_lat[i],
+                departure_time: departure_time[i],
+                destination: ARC_DESTINATIONS[destination[i]]
+            }));
+        }
         
         // Time window in hours for showing active trips
         const TIME_WINDOW = 0.25;  // 15 minutes for trip visibility
@@ -397,63 +415,80 @@ def get_html_template():
         speedSlider.value = "0.5";  // Start at half speed
         animationSpeed = 0.5;  // Set initial animation speed
         
-        // Initial update
-        updateVisualization(currentTime);
+        // Initial update, once the typed arrays are loaded when the data is binary
+        if (ARC_MANIFEST) {
+            loadBinaryTables(ARC_MANIFEST).then(({tables}) => {
+                arcData = arcRecords(tables.arcs);
+                updateVisualization(currentTime);
+            });
+        } else {
+            updateVisualization(currentTime);
+        }
     </script>
 </body>
 </html>
 """
 
-def create_arc_visualization(input_file, output_dir):
-    """Create arc visualization from pre-processed temporal data"""
+def build_binary_bundle(arcs, destinations):
+    """Arc endpoints and departure hours as Float32 columns, destinations as Uint8 indices into destinations"""
+    bundle = BinaryBundle()
+    table = bundle.add_table('arcs', len(arcs))
+    for column in ENDPOINT_COLUMNS + ['departure_time']:
+        table.add(column, arcs[column].to_numpy(), np.float32)
+    table.add('destination', pd.Categorical(arcs['destination'], categories=destinations).codes, np.uint8)
+    return bundle
+
+def create_arc_visualization(input_file, output_dir, transport=HTML_DATA_TRANSPORT):
+    """Create arc visualization from a pre-processed temporal store (base path)"""
     logger.info(f"Loading temporal data from: {input_file}")
     
     try:
-        # Load temporal arc data
-        gdf = gpd.read_file(input_file)
+        # Departure schedule plus route endpoints; route geometries are never read
+        store = TemporalStore(input_file)
+        schedule = store.schedule()
+        routes = store.routes(columns=ENDPOINT_COLUMNS + ['destination'], geometry=False)
+        arcs = schedule.merge(routes, on='route_id', how='inner')
+        arcs = arcs.loc[arcs.index.repeat(arcs['count'])].reset_index(drop=True)
         
-        # Convert GeoDataFrame to arc format
-        arc_data = []
-        for _, row in gdf.iterrows():
-            # Convert departure_time to hours since midnight
-            departure_time = pd.to_datetime(row['departure_time'])
-            # Add random minutes within the hour
-            random_minutes = np.random.uniform(0, 60)
-            hours = departure_time.hour + (departure_time.minute + random_minutes) / 60
-            
-            # Extract coordinates from geometry
-            coords = list(row['geometry'].coords)
-            source_coords = coords[0]
-            target_coords = coords[-1]
-            
-            # Validate coordinates
-            if not (isinstance(source_coords[0], (int, float)) and 
-                   isinstance(source_coords[1], (int, float)) and
-                   isinstance(target_coords[0], (int, float)) and
-                   isinstance(target_coords[1], (int, float))):
-                logger.warning(f"Invalid coordinates found: {source_coords}, {target_coords}")
-                continue
-                
-            arc_data.append({
-                'source_lon': float(source_coords[0]),  # Ensure float
-                'source_lat': float(source_coords[1]),
-                'target_lon': float(target_coords[0]),
-                'target_lat': float(target_coords[1]),
-                'departure_time': float(hours),  # Ensure float
-                'destination': str(row['destination'])  # Ensure string
-            })
+        # Departure in hours since midnight, at the minute the schedule assigned
+        arcs['departure_time'] = arcs['departure_seconds'].to_numpy() / 3600
+        
+        # Drop arcs with missing coordinates
+        valid = arcs[ENDPOINT_COLUMNS].notna().all(axis=1)
+        if not valid.all():
+            logger.warning(f"Skipping {int((~valid).sum())} arcs with invalid coordinates")
+        arcs = arcs[valid]
+        
+        arc_data = arcs[ENDPOINT_COLUMNS + ['departure_time', 'destination']].astype({
+            'destination': str
+        }).to_dict(orient='records')
         
         logger.info(f"Processed {len(arc_data)} temporal arcs")
         
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
+        output_file = os.path.join(output_dir, "walking_arc_visualization_glow.html")
+        
+        # Typed-array transport: the page gets a manifest and rebuilds the arcs from the tables
+        manifest = None
+        destinations = sorted(set(arcs['destination'].astype(str)))
+        if check_transport(transport) != 'json':
+            bundle = build_binary_bundle(arcs.astype({'destination': str}), destinations)
+            manifest = bundle.write(output_file, transport)
+            bundle.report(json.dumps(arc_data), manifest)
+            arc_data = []
         
-        # Get template and replace placeholders
+        # Get template and replace placeholders in one pass, so no inserted data is scanned again
+        placeholders = {
+            'ARCDATA': json.dumps(arc_data),
+            'ARCMANIFEST': json.dumps(manifest),
+            'ARCDESTINATIONS': json.dumps(destinations),
+            'BINARYLOADER': BINARY_LOADER_JS
+        }
         template = get_html_template()
-        html_content = template.replace('ARCDATA', json.dumps(arc_data))
+        html_content = re.sub('|'.join(placeholders), lambda match: placeholders[match.group(0)], template)
         
         # Save visualization
-        output_file = os.path.join(output_dir, "walking_arc_visualization_glow.html")
         with open(output_file, 'w') as f:
             f.write(html_content)
             
@@ -466,7 +501,7 @@ def create_arc_visualization(input_file, output_dir):
 
 if __name__ == "__main__":
     # Example usage
-    input_file = os.path.join(OUTPUT_DIR, "temporal_arcs.json")
+    input_file = os.path.join(OUTPUT_DIR, "temporal_arcs")
     output_dir = OUTPUT_DIR
     
     try:
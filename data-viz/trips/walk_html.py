@@ -122,6 +122,11 @@ HTML_TEMPLATE = """
         const POI_BORDERS = %(poi_borders)s;
         const POI_FILLS = %(poi_fills)s;
         const POI_RADIUS = %(poi_radius)f;
+        // Typed-array layer data (null when the data is inlined as JSON above)
+        const BINARY_MANIFEST = %(binary_manifest)s;
+        let binaryTrips = null;
+        let binaryBuildings = null;
+        %(binary_loader)s
 
         // Animation constants
         const START_HOUR = 7;
@@ -158,7 +163,7 @@ HTML_TEMPLATE = """
             HOURS_PER_DAY,
             ANIMATION_DURATION,
             MS_PER_HOUR,
-            'Total Trips': TRIPS_DATA.length
+            'Total Trips': BINARY_MANIFEST ? BINARY_MANIFEST.tables.trips.length : TRIPS_DATA.length
         });
 
         log('Initial Trip Distribution:', {
@@ -309,7 +314,15 @@ HTML_TEMPLATE = """
                     }
                     
                     const layers = [
-                        new deck.PolygonLayer({
+                        binaryBuildings ? new deck.SolidPolygonLayer({
+                            id: 'buildings',
+                            data: binaryBuildings,
+                            _normalize: false,
+                            extruded: true,
+                            wireframe: true,
+                            opacity: 0.9,
+                            getLineColor: [255, 255, 255, 30]
+                        }) : new deck.PolygonLayer({
                             id: 'buildings',
                             data: BUILDINGS_DATA,
                             extruded: true,
@@ -323,7 +336,8 @@ HTML_TEMPLATE = """
                         }),
                         new deck.TripsLayer({
                             id: 'trips',
-                            data: TRIPS_DATA,
+                            data: binaryTrips || TRIPS_DATA,
+                            _pathType: binaryTrips ? 'open' : null,
                             getPath: d => d.path,
                             getTimestamps: d => d.timestamps.flat(),
                             getColor: d => getPathColor(d),
@@ -378,8 +392,20 @@ HTML_TEMPLATE = """
             animate();
         };
 
-        // Start animation
-        animate();
+        // Start animation, once the typed arrays are loaded when the data is binary
+        if (BINARY_MANIFEST) {
+            loadBinaryTables(BINARY_MANIFEST).then(({tables}) => {
+                binaryTrips = binaryLayerData(tables.trips, {
+                    getPath: 'positions', getTimestamps: 'timestamps', getColor: 'colors'
+                });
+                binaryBuildings = binaryLayerData(tables.buildings, {
+                    getPolygon: 'positions', getFillColor: 'colors', getElevation: 'heights'
+                });
+                animate();
+            });
+        } else {
+            animate();
+        }
     </script>
 </body>
 </html>
@@ -20,7 +20,10 @@ logger = logging.getLogger(__name__)
 
 # Add parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import MAPBOX_API_KEY, OUTPUT_DIR
+from config import MAPBOX_API_KEY, OUTPUT_DIR, BUILDINGS_ARTIFACT_FILE, HTML_DATA_TRANSPORT
+from utils.route_writer import load_routes
+from utils.building_artifact import BuildingArtifact
+from utils.binary_transport import BinaryBundle, BINARY_LOADER_JS, check_transport, per_vertex
 
 # Load attraction centers shapefile for POI polygons
 attractions = gpd.read_file("shapes/data/maps/Be'er_Sheva_Shapefiles_Attraction_Centers.shp")
@@ -69,7 +72,7 @@ def load_trip_data():
     }
     
     try:
-        trips_gdf = gpd.read_file(file_path)
+        trips_gdf = load_routes(file_path)
         raw_trip_count = trips_gdf['num_trips'].sum()
         logger.info(f"Loaded {len(trips_gdf)} walking routes representing {raw_trip_count:,} total trips")
         
@@ -111,10 +114,16 @@ def load_trip_data():
         hourly_totals = {hour: {'Ben-Gurion-University': 0, 'Soroka-Medical-Center': 0} 
                          for hour in range(7, 20)}
         
+        # Serialized path per distinct route, shared by every trip on it
+        path_cache = {}
+        
         for idx, row in trips_gdf.iterrows():
             try:
-                coords = list(row.geometry.coords)
-                trip_duration = len(coords)
+                route_key = row.get('route_key', idx)
+                if route_key not in path_cache:
+                    path_cache[route_key] = [[float(x), float(y)] for x, y in row.geometry.coords]
+                path = path_cache[route_key]
+                trip_duration = len(path)
                 num_trips = int(row['num_trips'])
                 
                 raw_destination = row['destination']
@@ -148,7 +157,7 @@ def load_trip_data():
                             timestamps.append([time])
                         
                         trips_data.append({
-                            'path': [[float(x), float(y)] for x, y in coords],
+                            'path': path,
                             'timestamps': timestamps,
                             'destination': destination,
                             'startTime': start_time,
@@ -180,46 +189,20 @@ def load_trip_data():
 def load_building_data():
     """Load building data for 3D visualization"""
     try:
-        buildings_gdf = gpd.read_file(BUILDINGS_FILE)
+        buildings = BuildingArtifact.cached(BUILDINGS_ARTIFACT_FILE, BUILDINGS_FILE, poi_polygons)
         
         # Convert to format needed for deck.gl
-        buildings_data = []
         entrance_features = []  # For entrance icons
         
         # Debug logging for POI polygons
-        logger.info(f"POI polygons IDs: {[p['ID'] for idx, p in poi_polygons.iterrows()]}")
+        logger.info(f"POI polygons IDs: {poi_polygons['ID'].tolist()}")
         
-        # Process buildings
-        for idx, building in buildings_gdf.iterrows():
-            try:
-                # Check if building intersects with any POI polygon
-                intersects_poi = False
-                building_color = None
-                building_height = None
-                
-                for poi_idx, poi_polygon in poi_polygons.iterrows():
-                    if building.geometry.intersects(poi_polygon.geometry):
-                        intersects_poi = True
-                        numeric_id = int(poi_polygon['ID'])
-                        poi_name = POI_ID_MAP.get(numeric_id)
-                        
-                        if poi_name:
-                            logger.debug(f"Building intersects with POI {numeric_id} ({poi_name})")
-                            height = float(building.get('height', 20))
-                            building_height = min(40, height * 1000)
-                            building_color = POI_INFO[poi_name]['color']
-                            break
-                
-                # Only add building if it intersects with a POI
-                if intersects_poi and building_color and building_height:
-                    buildings_data.append({
-                        "polygon": list(building.geometry.exterior.coords),
-                        "height": building_height,
-                        "color": building_color
-                    })
-            except Exception as e:
-                logger.error(f"Skipping building due to error: {e}")
-                continue
+        # Only buildings in a POI polygon are shown, raised and colored by their POI
+        poi_names = buildings.poi_names(POI_ID_MAP)
+        in_poi = np.isin(buildings.poi_ids, list(POI_ID_MAP))
+        heights = np.minimum(40, buildings.heights * 1000)
+        colors = [POI_INFO[name]['color'] if name else None for name in poi_names]
+        buildings_data = buildings.features(heights, colors, mask=in_poi & (heights > 0))
         
         # Load entrances and create icon features
         entrances_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
@@ -268,6 +251,26 @@ def load_building_data():
         raise
 
 
+def build_binary_bundle(trips_data, buildings_data):
+    """Walking trips and POI buildings as typed tables for the binary HTML transport"""
+    bundle = BinaryBundle()
+    trips = bundle.add_paths('trips', [trip['path'] for trip in trips_data])
+    # Millisecond timestamps travel as Uint32 and become floats in the page
+    timestamps = [time for trip in trips_data for (time,) in trip['timestamps']]
+    trips.add('timestamps', np.round(timestamps), np.uint32, as_float=True)
+    
+    # Path colors by destination, as getPathColor picks them for JSON data
+    destination_colors = {
+        'Ben-Gurion-University': POI_INFO['BGU']['color'][:3] + [255],
+        'Soroka-Medical-Center': POI_INFO['Soroka Hospital']['color'][:3] + [255]
+    }
+    colors = [destination_colors.get(trip['destination'], [255, 255, 255, 255]) for trip in trips_data]
+    trips.add('colors', per_vertex(np.array(colors, dtype=np.uint8).reshape(-1, 4), trips.offsets), np.uint8)
+    
+    bundle.add_polygon_features('buildings', buildings_data)
+    return bundle
+
+
 def create_animation():
     trips_data, center_lat, center_lon, total_trips, hourly_totals = load_trip_data()
     buildings_data, entrance_features, poi_borders, poi_fills = load_building_data()
@@ -283,6 +286,16 @@ def create_animation():
         elif trip['destination'] == 'Soroka Hospital':
             trip['destination'] = 'Soroka-Medical-Center'
     
+    # Typed-array transport: the page gets a manifest and loads the tables instead of inline JSON
+    output_path = os.path.join(OUTPUT_DIR, "walking_trip_animation.html")
+    binary_manifest = None
+    transport = check_transport(HTML_DATA_TRANSPORT)
+    if transport != 'json':
+        bundle = build_binary_bundle(trips_data, buildings_data)
+        binary_manifest = bundle.write(output_path, transport)
+        bundle.report(json.dumps({'trips': trips_data, 'buildings': buildings_data}), binary_manifest)
+        trips_data, buildings_data = [], []
+    
     # Find all placeholders in the template
     placeholders = set(re.findall(r'%\(([^)]+)\)[sdfg]', html_template))
     logger.info(f"All template placeholders: {sorted(placeholders)}")
@@ -302,7 +315,9 @@ def create_animation():
         # Fix these values using single pass substitution
         'center_lon': center_lon,
         'center_lat': center_lat,
-        'mapbox_api_key': MAPBOX_API_KEY if 'MAPBOX_API_KEY' in globals() else ''
+        'mapbox_api_key': MAPBOX_API_KEY if 'MAPBOX_API_KEY' in globals() else '',
+        'binary_manifest': json.dumps(binary_manifest),
+        'binary_loader': BINARY_LOADER_JS
     }
     
     # Check for missing placeholders
@@ -324,7 +339,6 @@ def create_animation():
                 logger.info(f"  - {key}: {value}")
         
         formatted_html = html_template % format_values
-        output_path = os.path.join(OUTPUT_DIR, "walking_trip_animation.html")
         with open(output_path, 'w') as f:
             f.write(formatted_html)
             
@@ -0,0 +1,71 @@
+"""
+Spatial index over amenity stops for detour-constrained stop sampling.
+
+A trip may stop at an amenity when origin -> amenity -> destination is at most
+max_detour_factor times the direct distance, i.e. when the amenity lies inside
+the ellipse with the origin and destination as foci. Candidates are fetched
+once per zone from an STRtree, then narrowed per trip by the ellipse's bounding
+box before the exact distance test.
+"""
+import numpy as np
+import shapely
+from shapely import STRtree
+
+
+class AmenityIndex:
+    """STRtree over amenity points with detour ellipse queries"""
+
+    def __init__(self, amenities_gdf):
+        geometries = amenities_gdf.geometry.values
+        self.coords = shapely.get_coordinates(geometries).reshape(-1, 2)
+        self.tree = STRtree(geometries)
+
+    def __len__(self):
+        return len(self.coords)
+
+    def zone_candidates(self, zone_bounds, endpoints, max_detour_factor=1.5):
+        """Sorted indices of amenities that can be a valid stop for any trip
+        between a point in the zone bounds and any of the endpoints.
+
+        Each detour ellipse lies within its semi-major axis (max_detour_factor / 2
+        times the trip length) of its center, so expanding the box around the
+        zone and endpoints by that reach for the longest possible trip is safe.
+        """
+        xs = [zone_bounds[0], zone_bounds[2]] + [p.x for p in endpoints]
+        ys = [zone_bounds[1], zone_bounds[3]] + [p.y for p in endpoints]
+        minx, maxx, miny, maxy = min(xs), max(xs), min(ys), max(ys)
+        reach = max_detour_factor / 2 * np.hypot(maxx - minx, maxy - miny)
+        query = shapely.box(minx - reach, miny - reach, maxx + reach, maxy + reach)
+        return np.sort(self.tree.query(query))
+
+    def ellipse_candidates(self, origin_point, destination_point, max_detour_factor=1.5, candidates=None):
+        """Sorted indices of amenities within the detour ellipse of one trip"""
+        if candidates is None:
+            candidates = np.arange(len(self.coords))
+        direct_distance = origin_point.distance(destination_point)
+        origin_arr = np.array([origin_point.x, origin_point.y])
+        dest_arr = np.array([destination_point.x, destination_point.y])
+
+        # Axis-aligned bounding box of the (rotated) ellipse
+        semi_major = direct_distance * max_detour_factor / 2
+        semi_minor = np.sqrt(max(semi_major ** 2 - (direct_distance / 2) ** 2, 0.0))
+        if direct_distance > 0:
+            cos, sin = (dest_arr - origin_arr) / direct_distance
+        else:
+            cos, sin = 1.0, 0.0
+        half_width = np.hypot(semi_major * cos, semi_minor * sin) + 1e-12
+        half_height = np.hypot(semi_major * sin, semi_minor * cos) + 1e-12
+        center = (origin_arr + dest_arr) / 2
+
+        coords = self.coords[candidates]
+        in_box = (
+            (np.abs(coords[:, 0] - center[0]) <= half_width) &
+            (np.abs(coords[:, 1] - center[1]) <= half_height)
+        )
+        candidates, coords = candidates[in_box], coords[in_box]
+
+        total_distances = (
+            np.sqrt(np.sum((coords - origin_arr)**2, axis=1)) +
+            np.sqrt(np.sum((coords - dest_arr)**2, axis=1))
+        )
+        return candidates[total_distances <= (direct_distance * max_detour_factor)]
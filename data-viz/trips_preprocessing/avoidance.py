@@ -0,0 +1,125 @@
+"""
+Cached POI avoidance sets for route requests and route validation.
+
+Each (origin POI, destination POI) pair maps to one AvoidanceSet holding the
+polygons to avoid, their OTP `avoid` parameter string and prepared geometries,
+so nothing is rebuilt or re-parsed per request.
+"""
+import logging
+import numpy as np
+import shapely
+
+logger = logging.getLogger(__name__)
+
+# POI name -> attraction polygon ID
+POI_NAME_TO_ID = {
+    'Ben-Gurion-University': 7,
+    'Soroka-Medical-Center': 11
+}
+
+# Penalties passed to OTP for crossing an avoided polygon
+WALK_PENALTY = 1000000
+CAR_BASE_PENALTY = 1e8
+CAR_AREA_PENALTY = 1e7
+
+
+def crossing_matrix(lines, geometries, poly_bounds):
+    """Boolean (lines x polygons) intersection matrix.
+
+    A bounding-box overlap test selects candidate pairs, which are then
+    checked exactly in a single vectorized intersects call.
+    """
+    lines = np.asarray(lines, dtype=object)
+    hits = np.zeros((len(lines), len(geometries)), dtype=bool)
+    if len(lines) == 0 or len(geometries) == 0:
+        return hits
+
+    line_bounds = shapely.bounds(lines)
+    overlap = (
+        (line_bounds[:, None, 0] <= poly_bounds[None, :, 2]) &
+        (line_bounds[:, None, 2] >= poly_bounds[None, :, 0]) &
+        (line_bounds[:, None, 1] <= poly_bounds[None, :, 3]) &
+        (line_bounds[:, None, 3] >= poly_bounds[None, :, 1])
+    )
+    rows, cols = np.nonzero(overlap)
+    if len(rows):
+        hits[rows, cols] = shapely.intersects(lines[rows], geometries[cols])
+    return hits
+
+
+class AvoidanceSet:
+    """Polygons to avoid for one request type, with cached OTP parameters"""
+
+    def __init__(self, ids, geometries, bounds, penalties):
+        self.ids = list(ids)
+        self.geometries = geometries
+        self.bounds = bounds
+        self.polygons = [
+            {'id': poly_id, 'polygon': geometry, 'penalty': penalty}
+            for poly_id, geometry, penalty in zip(self.ids, geometries, penalties)
+        ]
+        self.avoid_str = '|'.join(f"{geometry.wkt}::{penalty}" for geometry, penalty in zip(geometries, penalties))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def crossed(self, route_line):
+        """ID of the first avoided polygon the route crosses, or None"""
+        hits = crossing_matrix([route_line], self.geometries, self.bounds)[0]
+        if hits.any():
+            return self.ids[int(np.argmax(hits))]
+        return None
+
+
+class AvoidanceIndex:
+    """Avoidance sets for the POI polygons, cached per origin/destination POI pair"""
+
+    def __init__(self, poi_polygons):
+        geometries = poi_polygons.geometry.values
+        self.ids = np.asarray(poi_polygons['ID'].values)
+        self.geometries = np.array(
+            [g if g.is_valid else g.buffer(0) for g in geometries], dtype=object
+        )
+        shapely.prepare(self.geometries)
+        self.bounds = shapely.bounds(self.geometries)
+        self.areas = shapely.area(self.geometries)
+        self._cache = {}
+
+    def _subset(self, mask, penalties):
+        return AvoidanceSet(self.ids[mask], self.geometries[mask], self.bounds[mask], penalties[mask])
+
+    def _allowed_mask(self, *poi_names):
+        allowed_ids = [POI_NAME_TO_ID.get(name) for name in poi_names if name]
+        return np.isin(self.ids, allowed_ids)
+
+    def walk(self, destination_poi=None, origin_poi=None):
+        """Polygons to avoid on foot: every POI except the origin and destination POI"""
+        key = ('walk', origin_poi, destination_poi)
+        if key not in self._cache:
+            penalties = np.full(len(self.ids), WALK_PENALTY)
+            self._cache[key] = self._subset(~self._allowed_mask(origin_poi, destination_poi), penalties)
+        return self._cache[key]
+
+    def car(self, point_origin, point_dest, destination_poi=None):
+        """Polygons to avoid by car: every POI except the destination and any containing an endpoint"""
+        contains = (
+            shapely.contains_xy(self.geometries, point_origin.x, point_origin.y) |
+            shapely.contains_xy(self.geometries, point_dest.x, point_dest.y)
+        )
+        key = ('car', destination_poi, tuple(np.nonzero(contains)[0]))
+        if key not in self._cache:
+            penalties = CAR_BASE_PENALTY + self.areas * CAR_AREA_PENALTY
+            self._cache[key] = self._subset(~(self._allowed_mask(destination_poi) | contains), penalties)
+        return self._cache[key]
+
+    def crossings(self, lines, allowed_pois=None):
+        """ID of the first unauthorized POI each line crosses (-1 for none).
+
+        allowed_pois gives, per line, the POI name the line may cross.
+        """
+        hits = crossing_matrix(lines, self.geometries, self.bounds)
+        if allowed_pois is not None:
+            allowed_ids = np.array([POI_NAME_TO_ID.get(name, -1) for name in allowed_pois])
+            hits &= allowed_ids[:, None] != self.ids[None, :]
+        first = np.argmax(hits, axis=1)
+        return np.where(hits.any(axis=1), self.ids[first], -1)
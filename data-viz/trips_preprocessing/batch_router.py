@@ -0,0 +1,103 @@
+"""
+Batched routing between many points and one shared endpoint.
+
+BatchRouter routes a list of origins to one destination (or one origin to a
+list of destinations). Backends with native batch support (LocalRouter's
+route_many_to_one / route_one_to_many) answer each group of points sharing an
+avoidance set from a single shortest-path tree. Any other client falls back
+to concurrent per-pair route calls on a thread pool, still paced by the
+client's request governor.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from shapely.geometry import Point
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+
+class BatchRouter:
+    """Many-to-one and one-to-many routing over a routing client"""
+
+    def __init__(self, client, workers=8, progress=True):
+        self.client = client
+        self.workers = workers
+        self.progress = progress
+
+    @property
+    def native(self):
+        """Whether the client can answer a batch from one shortest-path tree"""
+        return hasattr(self.client, 'route_many_to_one') and hasattr(self.client, 'avoidance')
+
+    def many_to_one(self, origins, to_lat, to_lon, mode='car', destination_poi=None):
+        """Routes from each (lat, lon) origin to one destination.
+
+        Returns a list aligned with origins holding OTP-shaped responses or None.
+        """
+        pairs = [(origin, (to_lat, to_lon)) for origin in origins]
+        if self.native:
+            return self._native(pairs, mode, destination_poi, shared='destination')
+        return self._parallel(pairs, mode, destination_poi)
+
+    def one_to_many(self, from_lat, from_lon, destinations, mode='car', destination_poi=None):
+        """Routes from one origin to each (lat, lon) destination"""
+        pairs = [((from_lat, from_lon), destination) for destination in destinations]
+        if self.native:
+            return self._native(pairs, mode, destination_poi, shared='origin')
+        return self._parallel(pairs, mode, destination_poi)
+
+    def _route(self, pair, mode, destination_poi):
+        (from_lat, from_lon), (to_lat, to_lon) = pair
+        if mode == 'walk':
+            return self.client.get_walking_route(from_lat, from_lon, to_lat, to_lon, destination_poi=destination_poi)
+        return self.client.get_car_route(from_lat, from_lon, to_lat, to_lon, destination_poi=destination_poi)
+
+    def _parallel(self, pairs, mode, destination_poi):
+        """Per-pair route calls, run concurrently when workers > 1"""
+        governor = getattr(self.client, 'governor', None)
+        results = [None] * len(pairs)
+        with tqdm(total=len(pairs), desc=f"Routing {len(pairs)} {mode} pairs",
+                  disable=not self.progress) as pbar:
+            def run(i):
+                results[i] = self._route(pairs[i], mode, destination_poi)
+                pbar.update(1)
+                if governor is not None:
+                    pbar.set_postfix_str(governor.postfix(), refresh=False)
+
+            if self.workers > 1 and len(pairs) > 1:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    list(executor.map(run, range(len(pairs))))
+            else:
+                for i in range(len(pairs)):
+                    run(i)
+        return results
+
+    def _avoidance_set(self, pair, mode, destination_poi):
+        (from_lat, from_lon), (to_lat, to_lon) = pair
+        if mode == 'walk':
+            return self.client.avoidance.walk(destination_poi)
+        return self.client.avoidance.car(Point(from_lon, from_lat), Point(to_lon, to_lat), destination_poi)
+
+    def _native(self, pairs, mode, destination_poi, shared):
+        """One tree per avoidance set: avoidance sets are cached, so identity groups pairs"""
+        groups = {}
+        for i, pair in enumerate(pairs):
+            avoidance = self._avoidance_set(pair, mode, destination_poi)
+            groups.setdefault(id(avoidance), (avoidance, []))[1].append(i)
+
+        results = [None] * len(pairs)
+        for avoidance, indices in groups.values():
+            if shared == 'destination':
+                to_lat, to_lon = pairs[indices[0]][1]
+                routed = self.client.route_many_to_one(
+                    mode, [pairs[i][0] for i in indices], to_lat, to_lon, avoidance
+                )
+            else:
+                from_lat, from_lon = pairs[indices[0]][0]
+                routed = self.client.route_one_to_many(
+                    mode, from_lat, from_lon, [pairs[i][1] for i in indices], avoidance
+                )
+            for i, route in zip(indices, routed):
+                results[i] = route
+        logger.debug(f"Routed {len(pairs)} {mode} pairs from {len(groups)} shortest-path trees")
+        return results
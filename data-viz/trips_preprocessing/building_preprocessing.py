@@ -0,0 +1,41 @@
+"""
+One-time building preprocessing for the 3D building layers.
+
+Reads buildings.geojson, tags every building with the POI polygon it
+intersects and writes the flattened footprints to BUILDINGS_ARTIFACT_FILE.
+The visualization scripts also rebuild the artifact on demand when
+buildings.geojson is newer than it.
+"""
+import os
+import sys
+import logging
+import geopandas as gpd
+# Add parent directory to Python path to access config and shared utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import BUILDINGS_FILE, BUILDINGS_ARTIFACT_FILE
+from utils.building_artifact import BuildingArtifact
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Attraction-center polygons and the IDs of the POIs highlighted in the building layers
+ATTRACTIONS_FILE = "shapes/data/maps/Be'er_Sheva_Shapefiles_Attraction_Centers.shp"
+POI_IDS = [11, 12, 7]
+
+
+def load_poi_polygons():
+    """POI polygons the building layers highlight"""
+    attractions = gpd.read_file(ATTRACTIONS_FILE)
+    return attractions[attractions['ID'].isin(POI_IDS)]
+
+
+def main():
+    logger.info(f"Loading buildings from {BUILDINGS_FILE}")
+    poi_polygons = load_poi_polygons()
+    artifact = BuildingArtifact.from_geodataframe(gpd.read_file(BUILDINGS_FILE), poi_polygons)
+    artifact.save(BUILDINGS_ARTIFACT_FILE, poi_polygons['ID'])
+    logger.info(f"Wrote {len(artifact)} buildings to {BUILDINGS_ARTIFACT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+In-memory street graph access checks for sampled trip endpoints.
+
+GraphSnapIndex answers "is this point within max_distance meters of a routable
+edge" from the edges of a local OSM extract (or a one-time edge export, see
+export_edges), so candidate points can be screened without a round-trip to OTP.
+Answers are cached per grid cell of cell_size meters and evaluated at the cell
+center, so a point's answer may be off by up to half a cell diagonal.
+"""
+import os
+import logging
+import numpy as np
+import shapely
+from shapely import STRtree
+from pyproj import Transformer
+
+try:
+    from .local_router import load_osm_edges, mode_edges
+except ImportError:
+    from local_router import load_osm_edges, mode_edges
+
+logger = logging.getLogger(__name__)
+
+# Metric CRS for snapping distances (Israeli TM Grid)
+METRIC_CRS = "EPSG:2039"
+
+
+def export_edges(osm_path, output_path):
+    """Export the street edges of an OSM extract to GeoParquet for fast reloading"""
+    edges = load_osm_edges(osm_path)
+    edges.to_parquet(output_path)
+    logger.info(f"Exported {len(edges)} street edges to {output_path}")
+    return output_path
+
+
+class GraphSnapIndex:
+    """Grid-cached distance-to-edge checks against a street network"""
+
+    def __init__(self, edges, mode='car', max_distance=50.0, cell_size=10.0):
+        edges = mode_edges(edges, mode).to_crs(METRIC_CRS)
+        self.mode = mode
+        self.max_distance = max_distance
+        self.cell_size = cell_size
+        self.tree = STRtree(edges.geometry.values)
+        self.transformer = Transformer.from_crs("EPSG:4326", METRIC_CRS, always_xy=True)
+        self._cells = {}
+        self.hits = 0
+        self.misses = 0
+        logger.info(f"Built {mode} snap index over {len(edges)} edges "
+                    f"({max_distance:.0f} m reach, {cell_size:.0f} m cells)")
+
+    @classmethod
+    def from_file(cls, path, mode='car', **kwargs):
+        """Snap index for an OSM extract or exported edge file"""
+        return cls(load_osm_edges(path), mode=mode, **kwargs)
+
+    def _cell_keys(self, lats, lons):
+        x, y = self.transformer.transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        return np.floor(np.column_stack([x, y]) / self.cell_size).astype(np.int64)
+
+    def _evaluate(self, cells):
+        """Whether each cell center lies within max_distance of an edge"""
+        centers = shapely.points((cells + 0.5) * self.cell_size)
+        point_idx, _ = self.tree.query(centers, predicate='dwithin', distance=self.max_distance)
+        accessible = np.zeros(len(cells), dtype=bool)
+        accessible[point_idx] = True
+        return accessible
+
+    def accessible_many(self, lats, lons):
+        """Boolean array: which (lat, lon) points are within reach of the graph"""
+        keys = [tuple(cell) for cell in self._cell_keys(np.atleast_1d(lats), np.atleast_1d(lons))]
+        missing = list({key for key in keys if key not in self._cells})
+        if missing:
+            for key, value in zip(missing, self._evaluate(np.array(missing))):
+                self._cells[key] = bool(value)
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        return np.array([self._cells[key] for key in keys], dtype=bool)
+
+    def accessible(self, lat, lon):
+        """Whether a point is within reach of a routable edge"""
+        return bool(self.accessible_many([lat], [lon])[0])
+
+
+class GraphAccess:
+    """Snap indexes per travel mode for one street network file, built on first use.
+
+    If the file does not exist, access screening is disabled: every point is
+    accepted and a warning is logged once.
+    """
+
+    def __init__(self, path, indexes=(), **index_kwargs):
+        self.path = path
+        self.index_kwargs = index_kwargs
+        self.indexes = {index.mode: index for index in indexes}
+        self.disabled = False
+        self._edges = None
+
+    def index(self, mode):
+        """Snap index for a travel mode, or None while screening is disabled"""
+        if mode not in self.indexes and not self.disabled:
+            if self._edges is None:
+                if not self.path or not os.path.exists(self.path):
+                    logger.warning(f"Street network {self.path} not found (set OSM_EXTRACT_FILE): graph access "
+                                   f"screening is disabled and every sampled point is accepted")
+                    self.disabled = True
+                    return None
+                self._edges = load_osm_edges(self.path)
+            self.indexes[mode] = GraphSnapIndex(self._edges, mode=mode, **self.index_kwargs)
+        return self.indexes.get(mode)
+
+    def accessible(self, lat, lon, mode):
+        """Whether a point is within reach of an edge routable in mode (True while screening is disabled)"""
+        index = self.index(mode)
+        return index is None or index.accessible(lat, lon)
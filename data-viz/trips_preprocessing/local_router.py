@@ -0,0 +1,403 @@
+"""
+In-process routing backend built on a CSR street graph.
+
+LocalRouter answers the same get_walking_route / get_car_route calls as the
+OTP clients, but from a street network loaded out of a local OSM extract.
+Every request is served from a cached Dijkstra tree rooted at the endpoint
+that repeats across requests (the POI entrance), so one tree covers every
+zone that routes to or from it.
+"""
+import os
+import logging
+from collections import OrderedDict
+import numpy as np
+import geopandas as gpd
+import polyline
+import shapely
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+from shapely.geometry import LineString, Point
+
+try:
+    from .avoidance import AvoidanceIndex
+except ImportError:
+    from avoidance import AvoidanceIndex
+
+logger = logging.getLogger(__name__)
+
+# Walking speed used by the OTP walk requests (m/s)
+WALK_SPEED = 1.4
+
+# Free-flow driving speeds by OSM highway class (km/h)
+CAR_SPEEDS = {
+    'motorway': 90, 'motorway_link': 60,
+    'trunk': 80, 'trunk_link': 50,
+    'primary': 60, 'primary_link': 40,
+    'secondary': 50, 'secondary_link': 40,
+    'tertiary': 40, 'tertiary_link': 30,
+    'unclassified': 30, 'residential': 30,
+    'living_street': 10, 'service': 15, 'road': 30
+}
+DEFAULT_CAR_SPEED = 30
+
+# Highway classes each mode may not use
+WALK_EXCLUDED = {'motorway', 'motorway_link', 'trunk', 'trunk_link', 'construction', 'proposed'}
+CAR_ALLOWED = set(CAR_SPEEDS)
+
+# Largest distance (m) between a requested point and its snapped graph node
+MAX_SNAP_DISTANCE = 500
+
+
+def load_osm_edges(osm_path):
+    """Load the street network of an OSM extract as an edge GeoDataFrame.
+
+    Returns a GeoDataFrame in EPSG:4326 with columns u, v, highway, oneway,
+    length (meters) and geometry. .pbf extracts are read with pyrosm, .osm/.xml
+    extracts with osmnx, and anything else is treated as a previously exported
+    edge file readable by geopandas.
+    """
+    logger.info(f"Loading street network from {osm_path}")
+    ext = os.path.splitext(osm_path)[1].lower()
+
+    if ext == '.pbf':
+        from pyrosm import OSM
+        _, edges = OSM(osm_path).get_network(network_type='all', nodes=True)
+    elif ext in ('.osm', '.xml'):
+        import osmnx as ox
+        graph = ox.graph_from_xml(osm_path, simplify=False, retain_all=True)
+        edges = ox.graph_to_gdfs(graph, nodes=False).reset_index()
+    elif ext == '.parquet':
+        edges = gpd.read_parquet(osm_path)
+    else:
+        edges = gpd.read_file(osm_path)
+
+    if edges.crs is None or edges.crs.to_string() != "EPSG:4326":
+        edges = edges.to_crs("EPSG:4326")
+
+    edges = edges[['u', 'v', 'highway', 'oneway', 'length', 'geometry']].copy()
+    edges['highway'] = edges['highway'].apply(lambda h: h[0] if isinstance(h, list) else h)
+    logger.info(f"Loaded {len(edges)} street edges")
+    return edges
+
+
+def mode_edges(edges, mode):
+    """Edges a travel mode ('walk' or 'car') may use"""
+    highway = edges['highway'].astype(str)
+    if mode == 'walk':
+        return edges[~highway.isin(WALK_EXCLUDED)]
+    return edges[highway.isin(CAR_ALLOWED)]
+
+
+def _oneway_direction(value):
+    """Map an OSM oneway tag to 1 (forward only), -1 (reverse only) or 0 (both)"""
+    if isinstance(value, (bool, np.bool_)):
+        return 1 if value else 0
+    value = str(value).strip().lower()
+    if value in ('yes', 'true', '1'):
+        return 1
+    if value == '-1':
+        return -1
+    return 0
+
+
+class StreetGraph:
+    """Directed CSR graph for a single travel mode"""
+
+    def __init__(self, edges, mode):
+        self.mode = mode
+        edges = mode_edges(edges, mode).reset_index(drop=True)
+
+        # Node coordinates come from the edge geometry endpoints
+        node_ids, inverse = np.unique(
+            np.concatenate([edges['u'].values, edges['v'].values]), return_inverse=True
+        )
+        n_edges = len(edges)
+        u_idx, v_idx = inverse[:n_edges], inverse[n_edges:]
+        self.geometries = edges.geometry.values
+        starts = shapely.get_coordinates(shapely.get_point(self.geometries, 0))
+        ends = shapely.get_coordinates(shapely.get_point(self.geometries, -1))
+        self.node_coords = np.zeros((len(node_ids), 2))
+        self.node_coords[u_idx] = starts
+        self.node_coords[v_idx] = ends
+        self.n_nodes = len(node_ids)
+
+        # Travel time in seconds for each edge
+        length = edges['length'].astype(float).values
+        if mode == 'walk':
+            seconds = length / WALK_SPEED
+            direction = np.zeros(n_edges, dtype=int)
+        else:
+            speeds = edges['highway'].map(CAR_SPEEDS).fillna(DEFAULT_CAR_SPEED).values
+            seconds = length / (speeds / 3.6)
+            direction = np.array([_oneway_direction(v) for v in edges['oneway'].values])
+
+        # Expand undirected edges into directed arcs, remembering traversal direction
+        edge_index = np.arange(n_edges)
+        fwd = direction >= 0
+        rev = direction <= 0
+        src = np.concatenate([u_idx[fwd], v_idx[rev]])
+        dst = np.concatenate([v_idx[fwd], u_idx[rev]])
+        arc_edge = np.concatenate([edge_index[fwd], edge_index[rev]])
+        arc_reversed = np.concatenate([np.zeros(fwd.sum(), bool), np.ones(rev.sum(), bool)])
+        arc_seconds = np.concatenate([seconds[fwd], seconds[rev]])
+        arc_length = np.concatenate([length[fwd], length[rev]])
+
+        # Arcs sorted by node pair; parallel arcs are all kept, since which one is
+        # cheapest depends on the avoidance penalties (see pair_arcs)
+        keys = src.astype(np.int64) * self.n_nodes + dst
+        order = np.lexsort((arc_seconds, keys))
+
+        self.arc_keys = keys[order]
+        self.arc_src = src[order]
+        self.arc_dst = dst[order]
+        self.arc_edge = arc_edge[order]
+        self.arc_reversed = arc_reversed[order]
+        self.arc_seconds = arc_seconds[order]
+        self.arc_length = arc_length[order]
+
+        # Snap index in locally scaled degrees (roughly isotropic around Beer Sheva)
+        self._lon_scale = np.cos(np.radians(self.node_coords[:, 1].mean())) if self.n_nodes else 1.0
+        self._tree = cKDTree(self.node_coords * [self._lon_scale, 1.0])
+
+        self._penalty_cache = {}
+        self._pair_cache = {}
+        self._matrix_cache = {}
+        logger.info(f"Built {mode} graph with {self.n_nodes} nodes and {len(self.arc_keys)} arcs")
+
+    def snap(self, lat, lon, max_distance=MAX_SNAP_DISTANCE):
+        """Return the nearest graph node to a point, or None if it is too far away"""
+        dist, node = self._tree.query([lon * self._lon_scale, lat])
+        if dist * 111000 > max_distance:
+            return None
+        return int(node)
+
+    def _polygon_hits(self, poly_id, geometry):
+        """Boolean mask of arcs whose edge geometry crosses an avoided polygon"""
+        if poly_id not in self._penalty_cache:
+            edge_hits = shapely.intersects(self.geometries, geometry)
+            self._penalty_cache[poly_id] = edge_hits[self.arc_edge]
+        return self._penalty_cache[poly_id]
+
+    def pair_arcs(self, avoid_polygons=()):
+        """Node pair keys and the cheapest arc of each pair once avoidance penalties are added, with its weight"""
+        avoid_key = tuple((p['id'], p['penalty']) for p in avoid_polygons)
+        if avoid_key not in self._pair_cache:
+            # Zero-length arcs still need a stored (positive) weight to count as edges
+            weights = np.maximum(self.arc_seconds, 1e-3)
+            for p in avoid_polygons:
+                weights[self._polygon_hits(p['id'], p['polygon'])] += p['penalty']
+            order = np.lexsort((weights, self.arc_keys))
+            keys = self.arc_keys[order]
+            first = np.concatenate([[True], keys[1:] != keys[:-1]])
+            arcs = order[first]
+            self._pair_cache[avoid_key] = (keys[first], arcs, weights[arcs])
+        return self._pair_cache[avoid_key]
+
+    def matrix(self, avoid_polygons=(), reverse=False):
+        """CSR cost matrix of the cheapest arc per node pair, with avoidance penalties added to crossing arcs"""
+        avoid_key = tuple((p['id'], p['penalty']) for p in avoid_polygons)
+        cache_key = (avoid_key, reverse)
+        if cache_key not in self._matrix_cache:
+            _, arcs, weights = self.pair_arcs(avoid_polygons)
+            src, dst = (self.arc_dst, self.arc_src) if reverse else (self.arc_src, self.arc_dst)
+            self._matrix_cache[cache_key] = csr_matrix(
+                (weights, (src[arcs], dst[arcs])), shape=(self.n_nodes, self.n_nodes)
+            )
+        return self._matrix_cache[cache_key]
+
+    def arc_lookup(self, src_nodes, dst_nodes, avoid_polygons=()):
+        """Arc indices for consecutive node pairs along a path routed with avoid_polygons"""
+        pair_keys, arcs, _ = self.pair_arcs(avoid_polygons)
+        keys = np.asarray(src_nodes, dtype=np.int64) * self.n_nodes + np.asarray(dst_nodes)
+        return arcs[np.searchsorted(pair_keys, keys)]
+
+    def path_coords(self, nodes, avoid_polygons=()):
+        """Concatenate arc geometries along a node path into (lon, lat) coordinates"""
+        if len(nodes) < 2:
+            return self.node_coords[nodes].tolist()
+        arcs = self.arc_lookup(nodes[:-1], nodes[1:], avoid_polygons)
+        coords = []
+        for arc in arcs:
+            arc_coords = shapely.get_coordinates(self.geometries[self.arc_edge[arc]])
+            if self.arc_reversed[arc]:
+                arc_coords = arc_coords[::-1]
+            coords.extend(arc_coords[1:].tolist() if coords else arc_coords.tolist())
+        return coords
+
+
+class LocalRouter:
+    """Drop-in replacement for the OTP clients backed by local shortest-path trees"""
+    is_remote = False
+
+    def __init__(self, osm_path=None, edges=None, poi_polygons=None, max_cached_trees=64):
+        if edges is None:
+            edges = load_osm_edges(osm_path)
+        self.edges = edges
+        self._graphs = {}
+        self._trees = OrderedDict()
+        self.max_cached_trees = max_cached_trees
+        self._endpoint_counts = {}
+
+        if poi_polygons is None:
+            attractions = gpd.read_file("shapes/data/maps/Be'er_Sheva_Shapefiles_Attraction_Centers.shp")
+            # BGU (7) and Soroka (11)
+            poi_polygons = attractions[attractions['ID'].isin([11, 7])].copy()
+        if poi_polygons.crs is None or poi_polygons.crs.to_string() != "EPSG:4326":
+            poi_polygons = poi_polygons.to_crs("EPSG:4326")
+        self.poi_polygons = poi_polygons
+        self.avoidance = AvoidanceIndex(poi_polygons)
+
+    def graph(self, mode):
+        """Lazily build the graph for a travel mode"""
+        if mode not in self._graphs:
+            self._graphs[mode] = StreetGraph(self.edges, mode)
+        return self._graphs[mode]
+
+    def shortest_path_tree(self, mode, root, avoid_polygons=(), reverse=False):
+        """Dijkstra tree rooted at a node.
+
+        With reverse=False the tree holds paths from the root to every node;
+        with reverse=True it holds paths from every node to the root. Trees are
+        kept in a small LRU cache so repeated endpoints cost one Dijkstra run.
+        """
+        key = (mode, root, tuple((p['id'], p['penalty']) for p in avoid_polygons), reverse)
+        if key in self._trees:
+            self._trees.move_to_end(key)
+            return self._trees[key]
+
+        matrix = self.graph(mode).matrix(avoid_polygons, reverse=reverse)
+        dist, pred = dijkstra(matrix, directed=True, indices=root, return_predecessors=True)
+        self._trees[key] = (dist, pred)
+        if len(self._trees) > self.max_cached_trees:
+            self._trees.popitem(last=False)
+        return dist, pred
+
+    @staticmethod
+    def _tree_path(pred, root, node, reverse):
+        """Node sequence between a tree root and a node, in travel order"""
+        path = [node]
+        while path[-1] != root:
+            nxt = pred[path[-1]]
+            if nxt < 0:
+                return None
+            path.append(nxt)
+        return path if reverse else path[::-1]
+
+    def _itinerary(self, mode, nodes, from_point, to_point, avoidance=None):
+        """Build an OTP-shaped /plan response for a node path found with an avoidance set.
+
+        Avoidance only penalizes arcs, so where no detour exists the path still
+        runs through an avoided polygon. Such paths are rejected with None, as
+        the OTP clients reject routes that cross one.
+        """
+        graph = self.graph(mode)
+        avoid_polygons = avoidance.polygons if avoidance is not None else ()
+        coords = [from_point] + graph.path_coords(nodes, avoid_polygons) + [to_point]
+        if avoidance is not None:
+            crossed_id = avoidance.crossed(LineString(coords))
+            if crossed_id is not None:
+                logger.warning(f"Route intersects avoided polygon {crossed_id}")
+                return None
+        if len(nodes) > 1:
+            arcs = graph.arc_lookup(nodes[:-1], nodes[1:], avoid_polygons)
+            duration = float(graph.arc_seconds[arcs].sum())
+            distance = float(graph.arc_length[arcs].sum())
+        else:
+            duration = distance = 0.0
+        points = polyline.encode([(lat, lon) for lon, lat in coords])
+        otp_mode = 'WALK' if mode == 'walk' else 'CAR'
+        leg = {
+            'mode': otp_mode,
+            'duration': duration,
+            'distance': distance,
+            'legGeometry': {'points': points, 'length': len(coords)}
+        }
+        return {'plan': {'itineraries': [{'duration': duration, 'legs': [leg]}]}}
+
+    def _choose_root(self, mode, origin, destination):
+        """Root the tree at whichever endpoint has recurred most often"""
+        counts = self._endpoint_counts
+        counts[(mode, 'from', origin)] = counts.get((mode, 'from', origin), 0) + 1
+        counts[(mode, 'to', destination)] = counts.get((mode, 'to', destination), 0) + 1
+        return counts[(mode, 'from', origin)] <= counts[(mode, 'to', destination)]
+
+    def _route(self, mode, from_lat, from_lon, to_lat, to_lon, avoidance):
+        graph = self.graph(mode)
+        origin = graph.snap(from_lat, from_lon)
+        destination = graph.snap(to_lat, to_lon)
+        if origin is None or destination is None:
+            logger.warning("Point could not be snapped to the street graph")
+            return None
+
+        reverse = self._choose_root(mode, origin, destination)
+        root, node = (destination, origin) if reverse else (origin, destination)
+        dist, pred = self.shortest_path_tree(mode, root, avoidance.polygons, reverse=reverse)
+        if not np.isfinite(dist[node]):
+            logger.warning("No path found in local street graph")
+            return None
+
+        nodes = self._tree_path(pred, root, node, reverse)
+        if nodes is None:
+            return None
+        return self._itinerary(mode, nodes, (from_lon, from_lat), (to_lon, to_lat), avoidance)
+
+    def test_point_access(self, lat, lon, mode='car'):
+        """Whether a point can be snapped to the street graph"""
+        return self.graph(mode).snap(lat, lon) is not None
+
+    def get_walking_route(self, from_lat, from_lon, to_lat, to_lon, destination_poi=None, origin_poi=None):
+        """Walking route with the same avoidance rules and response shape as OTP"""
+        avoidance = self.avoidance.walk(destination_poi, origin_poi)
+        return self._route('walk', from_lat, from_lon, to_lat, to_lon, avoidance)
+
+    def get_car_route(self, from_lat, from_lon, to_lat, to_lon, destination_poi=None):
+        """Driving route with the same avoidance rules and response shape as OTP"""
+        avoidance = self.avoidance.car(Point(from_lon, from_lat), Point(to_lon, to_lat), destination_poi)
+        return self._route('car', from_lat, from_lon, to_lat, to_lon, avoidance)
+
+    def route_many_to_one(self, mode, origins, to_lat, to_lon, avoidance=None):
+        """Routes from many (lat, lon) origins to one destination from a single tree.
+
+        Returns a list aligned with origins holding OTP-shaped responses, or
+        None where no path avoids the polygons of the avoidance set.
+        """
+        graph = self.graph(mode)
+        destination = graph.snap(to_lat, to_lon)
+        if destination is None:
+            return [None] * len(origins)
+        avoid_polygons = avoidance.polygons if avoidance is not None else ()
+        dist, pred = self.shortest_path_tree(mode, destination, avoid_polygons, reverse=True)
+
+        results = []
+        for lat, lon in origins:
+            node = graph.snap(lat, lon)
+            if node is None or not np.isfinite(dist[node]):
+                results.append(None)
+                continue
+            nodes = self._tree_path(pred, destination, node, reverse=True)
+            results.append(
+                self._itinerary(mode, nodes, (lon, lat), (to_lon, to_lat), avoidance) if nodes else None
+            )
+        return results
+
+    def route_one_to_many(self, mode, from_lat, from_lon, destinations, avoidance=None):
+        """Routes from one origin to many (lat, lon) destinations from a single tree"""
+        graph = self.graph(mode)
+        origin = graph.snap(from_lat, from_lon)
+        if origin is None:
+            return [None] * len(destinations)
+        avoid_polygons = avoidance.polygons if avoidance is not None else ()
+        dist, pred = self.shortest_path_tree(mode, origin, avoid_polygons, reverse=False)
+
+        results = []
+        for lat, lon in destinations:
+            node = graph.snap(lat, lon)
+            if node is None or not np.isfinite(dist[node]):
+                results.append(None)
+                continue
+            nodes = self._tree_path(pred, origin, node, reverse=False)
+            results.append(
+                self._itinerary(mode, nodes, (from_lon, from_lat), (lon, lat), avoidance) if nodes else None
+            )
+        return results
@@ -0,0 +1,270 @@
+"""
+Lightweight stand-in for the OTP server used by the route generators.
+
+Serves /plan and /serverinfo under any router prefix (e.g.
+http://localhost:8081/otp/routers/default/plan) from recorded responses or
+from a synthetic street grid, with configurable latency, error rate and
+429 rate limiting. Recorded fixtures are JSON lines of
+{"params": {...}, "response": {...}} and can be captured from a live OTP by
+running the server with --upstream.
+
+Usage:
+    python mock_otp_server.py --port 8081 --latency 0.02 --rate-limit-rate 0.05
+"""
+import json
+import math
+import random
+import threading
+import time
+import logging
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+import polyline
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Travel speeds used for synthetic durations (m/s)
+SYNTHETIC_SPEEDS = {'WALK': 1.4, 'CAR': 11.0}
+
+# Grid spacing of the synthetic street network (degrees, about 100 meters)
+GRID_STEP = 0.001
+
+
+def _fixture_key(params):
+    """Stable lookup key for a /plan request, ignoring volatile parameters"""
+    return (
+        params.get('fromPlace', ''),
+        params.get('toPlace', ''),
+        params.get('mode', 'WALK')
+    )
+
+
+class FixtureStore:
+    """Recorded /plan responses keyed by origin, destination and mode"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.responses = {}
+        self._lock = threading.Lock()
+        if path:
+            try:
+                with open(path) as f:
+                    for line in f:
+                        if line.strip():
+                            record = json.loads(line)
+                            self.responses[_fixture_key(record['params'])] = record['response']
+                logger.info(f"Loaded {len(self.responses)} recorded OTP responses from {path}")
+            except FileNotFoundError:
+                logger.info(f"No fixtures at {path}, starting empty")
+
+    def get(self, params):
+        return self.responses.get(_fixture_key(params))
+
+    def record(self, params, response):
+        """Store a response and append it to the fixtures file"""
+        with self._lock:
+            self.responses[_fixture_key(params)] = response
+            if self.path:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps({'params': params, 'response': response}) + '\n')
+
+
+def synthetic_plan(params):
+    """Plan along a Manhattan path on a regular street grid between two points"""
+    try:
+        from_lat, from_lon = (float(v) for v in params['fromPlace'].split(','))
+        to_lat, to_lon = (float(v) for v in params['toPlace'].split(','))
+    except (KeyError, ValueError):
+        return {'error': {'id': 400, 'msg': 'LOCATION_NOT_FOUND'}}
+
+    mode = params.get('mode', 'WALK').split(',')[0]
+
+    def snap(value):
+        return round(value / GRID_STEP) * GRID_STEP
+
+    # Follow the origin's north-south street, then the destination's east-west street
+    points = [
+        (from_lat, from_lon),
+        (snap(from_lat), snap(from_lon)),
+        (snap(to_lat), snap(from_lon)),
+        (snap(to_lat), snap(to_lon)),
+        (to_lat, to_lon)
+    ]
+    meters_per_degree_lon = 111000 * math.cos(math.radians(from_lat))
+    distance = sum(
+        math.hypot((b[0] - a[0]) * 111000, (b[1] - a[1]) * meters_per_degree_lon)
+        for a, b in zip(points[:-1], points[1:])
+    )
+    duration = distance / SYNTHETIC_SPEEDS.get(mode, SYNTHETIC_SPEEDS['WALK'])
+    leg = {
+        'mode': mode,
+        'duration': duration,
+        'distance': distance,
+        'legGeometry': {'points': polyline.encode(points), 'length': len(points)}
+    }
+    return {
+        'requestParameters': params,
+        'plan': {'itineraries': [{'duration': duration, 'legs': [leg]}]}
+    }
+
+
+class MockOTPConfig:
+    """Fault injection and response source settings for the mock server"""
+
+    def __init__(self, latency=0.0, latency_jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 fixtures=None, synthetic=True, upstream=None, seed=0):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.fixtures = fixtures if fixtures is not None else FixtureStore()
+        self.synthetic = synthetic
+        self.upstream = upstream
+        self.random = random.Random(seed)
+
+
+class MockOTPHandler(BaseHTTPRequestHandler):
+    """Request handler serving /plan and /serverinfo"""
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        config = server.config
+        url = urlparse(self.path)
+        params = dict(parse_qsl(url.query))
+
+        with server.stats_lock:
+            roll = config.random.random()
+            delay = max(0.0, config.latency + config.random.uniform(-1, 1) * config.latency_jitter)
+        time.sleep(delay)
+
+        if url.path.endswith('/serverinfo'):
+            server.count('serverinfo')
+            self._send_json(200, {'serverVersion': {'version': 'mock'}, 'cpuName': 'mock'})
+            return
+
+        if not url.path.endswith('/plan'):
+            server.count('not_found')
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        if roll < config.rate_limit_rate:
+            server.count('rate_limited')
+            self._send_json(429, {'error': 'Too Many Requests'})
+            return
+        if roll < config.rate_limit_rate + config.error_rate:
+            server.count('server_error')
+            self._send_json(500, {'error': 'Internal Server Error'})
+            return
+
+        response = config.fixtures.get(params)
+        if response is not None:
+            server.count('fixture')
+        elif config.upstream:
+            upstream = requests.get(f"{config.upstream}/plan", params=params, timeout=30)
+            response = upstream.json()
+            config.fixtures.record(params, response)
+            server.count('recorded')
+        elif config.synthetic:
+            response = synthetic_plan(params)
+            server.count('synthetic')
+        else:
+            response = {'error': {'id': 404, 'msg': 'PATH_NOT_FOUND'}}
+            server.count('missing')
+        self._send_json(200, response)
+
+
+class MockOTPServer:
+    """Threaded mock OTP server, usable as a context manager"""
+
+    def __init__(self, host='127.0.0.1', port=0, config=None, router='default'):
+        self.config = config if config is not None else MockOTPConfig()
+        self.httpd = ThreadingHTTPServer((host, port), MockOTPHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = self.config
+        self.httpd.stats = {}
+        self.httpd.stats_lock = threading.Lock()
+        self.httpd.count = self._count
+        self.router = router
+        self._thread = None
+
+    def _count(self, key):
+        with self.httpd.stats_lock:
+            self.httpd.stats[key] = self.httpd.stats.get(key, 0) + 1
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/otp/routers/{self.router}"
+
+    @property
+    def stats(self):
+        with self.httpd.stats_lock:
+            return dict(self.httpd.stats)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Mock OTP server listening at {self.base_url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OTP server for offline routing runs")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help="Mean response latency (s)")
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help="Uniform latency jitter (s)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of /plan calls answered with 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of /plan calls answered with 429")
+    parser.add_argument('--fixtures', help="JSON lines file of recorded responses")
+    parser.add_argument('--no-synthetic', action='store_true', help="Return PATH_NOT_FOUND for unrecorded requests")
+    parser.add_argument('--upstream', help="Live OTP router URL to record missing responses from")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = MockOTPConfig(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        fixtures=FixtureStore(args.fixtures),
+        synthetic=not args.no_synthetic,
+        upstream=args.upstream,
+        seed=args.seed
+    )
+    server = MockOTPServer(args.host, args.port, config)
+    logger.info(f"Serving mock OTP at {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        logger.info(f"Stopping mock OTP server, request counts: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,11 @@ import logging
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from data_loader import DataLoader
 from pyproj import Transformer
-from config import BASE_DIR, OUTPUT_DIR, FINAL_ZONES_FILE, POI_FILE, FINAL_TRIPS_PATTERN, BUILDINGS_FILE
+from config import (
+    BASE_DIR, OUTPUT_DIR, FINAL_ZONES_FILE, POI_FILE, FINAL_TRIPS_PATTERN, BUILDINGS_FILE,
+    ROUTE_FORMAT, ROUTE_GEOJSON_EXPORT
+)
+from utils.route_writer import RouteTableWriter, route_path, CAR_ROUTE_FIELDS
 import polyline  
 
 
@@ -451,7 +455,8 @@ if __name__ == "__main__":
     modeler = RouteModeler()
     road_usage = modeler.process_routes()
     
-    # Save the results
-    output_file = os.path.join(modeler.output_dir, "road_usage_trips.geojson")
-    road_usage.to_file(output_file, driver="GeoJSON")
+    # Save the results as a route table in ROUTE_FORMAT, which the trips scripts read with load_routes
+    output_file = route_path(modeler.output_dir, "road_usage_trips", ROUTE_FORMAT)
+    with RouteTableWriter(output_file, CAR_ROUTE_FIELDS, geojson_export=ROUTE_GEOJSON_EXPORT) as writer:
+        writer.write_many(road_usage.to_dict('records'))
     print(f"\nRoad usage data saved to: {output_file}")
\ No newline at end of file
@@ -5,29 +5,42 @@ import json
 from shapely.geometry import Point, LineString
 import numpy as np
 from datetime import datetime
-import time
-from tqdm import tqdm
-from shapely import wkt
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from data_loader import DataLoader
 from pyproj import Transformer
-from config import BASE_DIR, OUTPUT_DIR
+from config import (
+    BASE_DIR, OUTPUT_DIR, ROUTING_BACKEND, OSM_EXTRACT_FILE, ROUTE_FORMAT, ROUTE_GEOJSON_EXPORT,
+    ROUTE_BATCH_WORKERS
+)
+from utils.route_writer import RouteTableWriter, route_path, CAR_ROUTE_FIELDS
 import polyline
 import logging
 from coordinate_utils import CoordinateValidator
+from local_router import LocalRouter
+from avoidance import AvoidanceIndex
+from request_governor import RequestGovernor
+from telemetry import RunTelemetry
+from graph_snapping import GraphAccess
+from batch_router import BatchRouter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class OTPClient:
-    def __init__(self, base_url="http://localhost:8080/otp/routers/default", max_retries=5, retry_delay=0.5):
+    is_remote = True
+
+    def __init__(self, base_url="http://localhost:8080/otp/routers/default", max_retries=5, poi_polygons=None, governor=None, telemetry=None, snap_index=None):
         self.base_url = base_url
         self.max_retries = max_retries
-        self.retry_delay = retry_delay
         self.session = requests.Session()
+        # Paces requests and backs off while OTP is struggling
+        self.governor = governor if governor is not None else RequestGovernor(rate=10.0)
+        self.telemetry = telemetry if telemetry is not None else RunTelemetry()
+        # Street graph access checks per travel mode, built from the OSM extract on first use
+        self.graph_access = GraphAccess(OSM_EXTRACT_FILE, [snap_index] if snap_index is not None else [])
         
         # Beer Sheva region bounds (slightly expanded)
         self.bounds = {
@@ -38,10 +51,13 @@ class OTPClient:
         }
         
         # Load and store POI polygons
-        attractions = gpd.read_file("shapes/data/maps/Be'er_Sheva_Shapefiles_Attraction_Centers.shp")
-        self.poi_polygons = attractions[attractions['ID'].isin([7, 11])]  # BGU (7) and Soroka (11)
+        if poi_polygons is None:
+            attractions = gpd.read_file("shapes/data/maps/Be'er_Sheva_Shapefiles_Attraction_Centers.shp")
+            poi_polygons = attractions[attractions['ID'].isin([7, 11])]  # BGU (7) and Soroka (11)
+        self.poi_polygons = poi_polygons
         if self.poi_polygons.crs is None or self.poi_polygons.crs.to_string() != "EPSG:4326":
             self.poi_polygons = self.poi_polygons.to_crs("EPSG:4326")
+        self.avoidance = AvoidanceIndex(self.poi_polygons)
             
         # Verify OTP server and log bounds
         try:
@@ -63,6 +79,14 @@ class OTPClient:
             logger.debug(f"Longitude adjusted to: {lon}")
             
         return lat, lon
+
+    def test_point_access(self, lat, lon, mode='car'):
+        """Whether a point is close enough to a routable edge to route from, answered locally.
+
+        Points are accepted when no street network file is available.
+        """
+        return self.graph_access.accessible(lat, lon, mode)
+
     def get_car_route(self, from_lat, from_lon, to_lat, to_lon, destination_poi=None):
         """
         Query OTP for a driving route with enhanced avoidance parameters.
@@ -75,37 +99,8 @@ class OTPClient:
         point_origin = Point(from_lon, from_lat)
         point_dest = Point(to_lon, to_lat)
         
-        # Map POI names to IDs
-        poi_name_to_id = {
-            'Ben-Gurion-University': 7,
-            'Soroka-Medical-Center': 11
-        }
-        
-        # Determine which polygons to avoid with specific penalties
-        avoid_polygons = []
-        for _, poi in self.poi_polygons.iterrows():
-            # Only allow routing through POI if it's explicitly the destination POI
-            if (destination_poi and poi_name_to_id.get(destination_poi) == poi['ID']):
-                continue
-            
-            # If this POI contains either the origin or destination, allow routing through it
-            if poi.geometry.contains(point_origin) or poi.geometry.contains(point_dest):
-                continue
-            
-            # Ensure the polygon is valid and properly formatted
-            if not poi.geometry.is_valid:
-                poi.geometry = poi.geometry.buffer(0)
-            
-            # Calculate penalty based on area and add huge base penalty
-            area_penalty = poi.geometry.area * 1e7  # Scale penalty by area
-            base_penalty = 1e8  # Increase base penalty significantly
-            
-            # Add polygon to avoidance list with combined penalty
-            avoid_polygons.append({
-                'geometry': poi.geometry.wkt,
-                'id': poi['ID'],
-                'penalty': base_penalty + area_penalty
-            })
+        # Polygons to avoid with area-scaled penalties, cached per destination POI
+        avoidance = self.avoidance.car(point_origin, point_dest, destination_poi)
         
         params = {
             'fromPlace': f"{from_lat},{from_lon}",
@@ -118,11 +113,9 @@ class OTPClient:
         }
         
         # Add enhanced avoidance parameters
-        if avoid_polygons:
-            # Create avoidance string with penalties
-            avoid_str = '|'.join(f"{p['geometry']}::{p['penalty']}" for p in avoid_polygons)
+        if avoidance:
             params.update({
-                'avoid': avoid_str,
+                'avoid': avoidance.avoid_str,
                 'walkReluctance': 50,              # Increased from 20
                 'turnReluctance': 4,               # Increased from 2
                 'traversalCostMultiplier': 100,    # Increased from 5
@@ -138,17 +131,23 @@ class OTPClient:
         logger.debug(f"Requesting route with params: {params}")
         
         for attempt in range(self.max_retries):
+            if attempt:
+                self.telemetry.retry('car')
+            response = self.governor.request(
+                self.session, f"{self.base_url}/plan", params, timeout=10,
+                telemetry=self.telemetry, kind='car'
+            )
+            if response is None:
+                continue
+            
             try:
-                response = self.session.get(
-                    f"{self.base_url}/plan", 
-                    params=params, 
-                    timeout=10
-                )
-                
                 if response.status_code == 200:
                     data = response.json()
                     if 'error' in data or 'plan' not in data:
                         logger.warning(f"OTP returned invalid response: {data.get('error', 'No plan found')}")
+                        error = data.get('error')
+                        reason = error.get('msg', 'unknown') if isinstance(error, dict) else 'no plan'
+                        self.telemetry.route_failure(f"OTP error: {reason}")
                         return None
                     
                     # Validate the route doesn't cross avoided areas
@@ -158,23 +157,21 @@ class OTPClient:
                         route_line = LineString([(lon, lat) for lat, lon in route_points])
                         
                         # Check if route intersects with any avoided polygons
-                        for avoid_poly in avoid_polygons:
-                            if route_line.intersects(wkt.loads(avoid_poly['geometry'])):
-                                logger.warning(f"Route intersects avoided polygon {avoid_poly['id']}, retrying...")
-                                return None
+                        crossed_id = avoidance.crossed(route_line)
+                        if crossed_id is not None:
+                            logger.warning(f"Route intersects avoided polygon {crossed_id}, retrying...")
+                            self.telemetry.route_failure(f"Crosses avoided polygon {crossed_id}")
+                            return None
                     
                     return data
                     
                 elif response.status_code == 429:  # Too Many Requests
-                    wait_time = (attempt + 1) * self.retry_delay
-                    logger.warning(f"Rate limited. Waiting {wait_time} seconds...")
-                    time.sleep(wait_time)
-                    continue
+                    logger.warning(f"Rate limited, backing off ({self.governor.postfix()})")
                     
             except Exception as e:
                 logger.error(f"Error getting route (attempt {attempt + 1}): {str(e)}")
-                time.sleep(self.retry_delay)
                 
+        self.telemetry.route_failure('Retries exhausted')
         return None
 
     def _adjust_coordinates(self, params):
@@ -216,12 +213,25 @@ class OTPClient:
             return None
 
 class RouteModeler:
-    def __init__(self):
+    def __init__(self, backend=ROUTING_BACKEND, otp_client=None, load=True, batch_workers=ROUTE_BATCH_WORKERS):
         self.base_dir = BASE_DIR
         self.output_dir = OUTPUT_DIR
         self.transformer = Transformer.from_crs("EPSG:2039", "EPSG:4326", always_xy=True)
-        self.otp_client = OTPClient(base_url="http://localhost:8080/otp/routers/default")
-        self.load_data()
+        if otp_client is not None:
+            self.otp_client = otp_client
+            self.telemetry = getattr(otp_client, 'telemetry', None) or RunTelemetry()
+        else:
+            # Per-zone records and the run summary go to a JSON-lines report next to the routes
+            self.telemetry = RunTelemetry(os.path.join(self.output_dir, "car_routes_report.jsonl"))
+            if backend == 'local':
+                self.otp_client = LocalRouter(OSM_EXTRACT_FILE)
+            else:
+                self.otp_client = OTPClient(base_url="http://localhost:8080/otp/routers/default",
+                                            telemetry=self.telemetry)
+        # All zones of a POI and direction share one endpoint, so they are routed as one batch
+        self.batch_router = BatchRouter(self.otp_client, workers=batch_workers)
+        if load:
+            self.load_data()
         
     def load_data(self):
         """Load and process required data"""
@@ -273,7 +283,11 @@ class RouteModeler:
             origin_lat, origin_lon,
             dest_lat, dest_lon
         )
-        
+        return self._decode_route(route)
+
+    @staticmethod
+    def _decode_route(route):
+        """Route points and duration from an OTP /plan response, or None"""
         if route and 'plan' in route and route['plan'].get('itineraries'):
             try:
                 leg = route['plan']['itineraries'][0]['legs'][0]
@@ -287,9 +301,22 @@ class RouteModeler:
         return None
 
     def process_routes(self):
-        """Process routes for all zones to each POI"""
-        trips = []
+        """Process routes for all zones to each POI, streaming them to per-direction route files.
+
+        Zones of one POI and direction share an endpoint, so their uncached
+        routes are requested as one batch through the batch router.
+        Returns the number of routes written.
+        """
+        writers = {
+            direction: RouteTableWriter(
+                route_path(self.output_dir, f"car_routes_{direction}", ROUTE_FORMAT),
+                CAR_ROUTE_FIELDS,
+                geojson_export=ROUTE_GEOJSON_EXPORT
+            )
+            for direction in ['inbound', 'outbound']
+        }
         route_cache = {}
+        num_routes = 0
         departure_time = datetime.now().replace(hour=8, minute=0, second=0)
         
         main_pois = ['Ben-Gurion-University', 'Soroka-Medical-Center']
@@ -324,41 +351,52 @@ class RouteModeler:
                 total_car_trips = (trip_df['total_trips'] * trip_df['mode_car'] / 100).sum()
                 logger.info(f"Processing {int(total_car_trips)} car trips for {poi_name} - {direction}")
                 
-                for _, zone_data in tqdm(trip_df.iterrows(), total=len(trip_df)):
+                # Zone endpoints for this POI and direction, in trip table order
+                zone_jobs = []
+                for _, zone_data in trip_df.iterrows():
                     zone_id = zone_data['tract']
                     car_trips = zone_data['total_trips'] * (zone_data['mode_car'] / 100)
                     
                     if car_trips < 0.5:
                         continue
                     
-                    num_trips = int(round(car_trips))
                     zone = self.zones[self.zones['YISHUV_STAT11'] == zone_id]
-                    
                     if len(zone) == 0:
                         continue
                     
                     centroid = zone.geometry.iloc[0].centroid
+                    zone_lat, zone_lon = self.transform_coords(centroid.x, centroid.y)
+                    if zone_lat is None:
+                        continue
                     
                     if direction == 'inbound':
-                        origin_lat, origin_lon = self.transform_coords(centroid.x, centroid.y)
-                        if origin_lat is None:
-                            continue
-                        dest_lat, dest_lon = poi_lat, poi_lon
+                        cache_key = f"{zone_lat},{zone_lon}-{poi_lat},{poi_lon}"
                     else:
-                        origin_lat, origin_lon = poi_lat, poi_lon
-                        dest_lat, dest_lon = self.transform_coords(centroid.x, centroid.y)
-                        if dest_lat is None:
-                            continue
-                    
-                    cache_key = f"{origin_lat},{origin_lon}-{dest_lat},{dest_lon}"
+                        cache_key = f"{poi_lat},{poi_lon}-{zone_lat},{zone_lon}"
+                    zone_jobs.append((zone_id, int(round(car_trips)), (zone_lat, zone_lon), cache_key))
+                
+                with self.telemetry.zone(poi=poi_name, direction=direction, zones=len(zone_jobs)) as record:
+                    # Route every zone endpoint not already cached in one batch
+                    pending = {}
+                    for _, _, zone_point, cache_key in zone_jobs:
+                        cached = cache_key in route_cache or cache_key in pending
+                        self.telemetry.cache_lookup('car', cached)
+                        if not cached:
+                            pending[cache_key] = zone_point
                     
-                    if cache_key not in route_cache:
-                        route_data = self.get_route(origin_lat, origin_lon, dest_lat, dest_lon)
+                    if direction == 'inbound':
+                        responses = self.batch_router.many_to_one(list(pending.values()), poi_lat, poi_lon)
+                    else:
+                        responses = self.batch_router.one_to_many(poi_lat, poi_lon, list(pending.values()))
+                    for cache_key, response in zip(pending, responses):
+                        route_data = self._decode_route(response)
                         if route_data:
                             route_cache[cache_key] = route_data
-                        time.sleep(0.1)  # Rate limiting
                     
-                    if cache_key in route_cache:
+                    record['routes'] = 0
+                    for zone_id, num_trips, _, cache_key in zone_jobs:
+                        if cache_key not in route_cache:
+                            continue
                         route_data = route_cache[cache_key]
                         
                         trip_info = {
@@ -367,195 +405,25 @@ class RouteModeler:
                             'arrival_time': departure_time + pd.Timedelta(seconds=route_data['duration']),
                             'origin_zone': zone_id if direction == 'inbound' else poi_name,
                             'destination': poi_name if direction == 'inbound' else zone_id,
-                            'route_id': f"{zone_id}-{poi_name}-{direction}-{len(trips)}",
+                            'route_id': f"{zone_id}-{poi_name}-{direction}-{num_routes}",
                             'num_trips': num_trips,
                             'direction': direction
                         }
                         
-                        trips.append(trip_info)
+                        writers[direction].write(trip_info)
+                        num_routes += 1
+                        record['routes'] += 1
         
-        if trips:
-            trips_gdf = gpd.GeoDataFrame(trips, crs="EPSG:4326")
-            
-            for direction in ['inbound', 'outbound']:
-                direction_gdf = trips_gdf[trips_gdf['direction'] == direction]
-                output_file = os.path.join(self.output_dir, f"car_routes_{direction}.geojson")
-                direction_gdf.to_file(output_file, driver="GeoJSON")
-                logger.info(f"Saved {len(direction_gdf)} {direction} routes to {output_file}")
-            
-            return trips_gdf
-        
-        logger.warning("No routes were generated!")
-        return gpd.GeoDataFrame(geometry=[], crs="EPSG:4326")
-
-    def _generate_unique_point(self, zone_id, geometry, max_attempts=500):  # Increased attempts
-        """Generate a unique random point within a geometry with more attempts and edge buffering"""
-        used_points = self._get_used_points(zone_id)
+        for direction, writer in writers.items():
+            output_file = writer.close()
+            if output_file:
+                logger.info(f"Saved {writer.rows} {direction} routes ({writer.unique_routes} distinct) to {output_file}")
         
-        # Buffer the geometry slightly inward to avoid edge cases
-        buffered_geometry = geometry.buffer(-0.0001)  # About 10m buffer
-        if buffered_geometry.is_empty:
-            buffered_geometry = geometry  # Fall back to original if buffer makes it empty
-        
-        minx, miny, maxx, maxy = buffered_geometry.bounds
-        
-        # Create a list to store failed points for debugging
-        failed_points = []
-        
-        # Try different sampling strategies
-        strategies = [
-            ('random', int(max_attempts * 0.6)),  # 60% random sampling
-            ('grid', int(max_attempts * 0.3)),    # 30% grid sampling
-            ('edge', int(max_attempts * 0.1))     # 10% edge sampling
-        ]
-        
-        for strategy, attempts in strategies:
-            logger.debug(f"Trying {strategy} sampling for zone {zone_id}")
-            
-            for attempt in range(attempts):
-                if strategy == 'random':
-                    point = Point(
-                        np.random.uniform(minx, maxx),
-                        np.random.uniform(miny, maxy)
-                    )
-                elif strategy == 'grid':
-                    # Create a grid of points
-                    grid_size = int(np.sqrt(attempts))
-                    x_points = np.linspace(minx, maxx, grid_size)
-                    y_points = np.linspace(miny, maxy, grid_size)
-                    grid_x = x_points[attempt % grid_size]
-                    grid_y = y_points[(attempt // grid_size) % grid_size]
-                    point = Point(grid_x, grid_y)
-                else:  # edge sampling
-                    # Sample points along the geometry's boundary
-                    boundary_point = geometry.boundary.interpolate(
-                        np.random.random(), normalized=True
-                    )
-                    # Move slightly inward
-                    point = Point(
-                        boundary_point.x + np.random.uniform(-0.0005, 0.0005),
-                        boundary_point.y + np.random.uniform(-0.0005, 0.0005)
-                    )
-                
-                if buffered_geometry.contains(point):
-                    # Check if point is within any POI polygon
-                    if any(poi.geometry.contains(point) for _, poi in self.otp_client.poi_polygons.iterrows()):
-                        failed_points.append((point, f"Inside POI polygon ({strategy})"))
-                        continue
-                    
-                    # Check if point is sufficiently far from used points (10 meters ≈ 0.0001 degrees)
-                    if all(point.distance(p) > 0.0001 for p in used_points):
-                        # Verify the point has graph access
-                        lat, lon = point.y, point.x
-                        if self.otp_client.test_point_access(lat, lon):
-                            logger.debug(f"Found valid point using {strategy} sampling: ({lat}, {lon})")
-                            return point
-                        else:
-                            failed_points.append((point, f"No graph access ({strategy})"))
-                    else:
-                        failed_points.append((point, f"Too close to used points ({strategy})"))
-                
-                if attempt % 50 == 0:  # Log progress periodically
-                    logger.debug(f"Tried {attempt} points with {strategy} sampling")
-        
-        # If we get here, we failed to find a valid point
-        logger.warning(f"Failed to find valid point in zone {zone_id} after trying multiple strategies")
-        logger.debug(f"Failed points: {len(failed_points)} total")
-        
-        # Try points near the centroid as a last resort
-        centroid = geometry.centroid
-        for offset in [(0,0), (0.001,0), (0,-0.001), (0.001,0.001), (-0.001,-0.001)]:
-            point = Point(centroid.x + offset[0], centroid.y + offset[1])
-            if buffered_geometry.contains(point):
-                # Check if point is within any POI polygon
-                if any(poi.geometry.contains(point) for _, poi in self.otp_client.poi_polygons.iterrows()):
-                    continue
-                
-                lat, lon = point.y, point.x
-                if self.otp_client.test_point_access(lat, lon):
-                    logger.warning(f"Falling back to adjusted centroid point: ({lat}, {lon})")
-                    return point
-        
-        # Absolute last resort - return centroid even if it might not work
-        logger.error(f"All point generation strategies failed for zone {zone_id}, using raw centroid")
-        return Point(centroid.x, centroid.y)
-
-    def process_zone_trips(self, zone_id, num_trips, poi_name, entrances, zone_data, direction='inbound', fixed_origin=None):
-        """Process all trips for a single zone"""
-        zone = self.zones[self.zones['YISHUV_STAT11'] == zone_id]
-        if len(zone) == 0:
-            return []
-        
-        zone_geometry = zone.geometry.iloc[0]
-        successful_routes = []
-        departure_time = datetime.now().replace(hour=8, minute=0, second=0)
-        
-        max_point_attempts = 5  # Try up to 5 different points before giving up
-        
-        with tqdm(total=num_trips, desc=f"Zone {zone_id} {direction}") as pbar:
-            trips_remaining = num_trips
-            while trips_remaining > 0:
-                route_found = False
-                
-                # Try different points within the zone
-                for point_attempt in range(max_point_attempts):
-                    if direction == 'inbound':
-                        origin_point = self._generate_unique_point(zone_id, zone_geometry)
-                        if not origin_point:
-                            logger.warning(f"Could not generate unique point for zone {zone_id}")
-                            break
-                        best_entrance = self._find_closest_entrance(origin_point, entrances)
-                        destination_point = best_entrance.geometry
-                    else:  # outbound
-                        destination_point = self._generate_unique_point(zone_id, zone_geometry)
-                        if not destination_point:
-                            logger.warning(f"Could not generate unique point for zone {zone_id}")
-                            break
-                        origin_point = fixed_origin.geometry
-                    
-                    route_data = self._get_valid_route(
-                        origin_point,
-                        destination_point
-                    )
-                    
-                    if route_data:
-                        route_found = True
-                        route_info = {
-                            'geometry': LineString([(lon, lat) for lat, lon in route_data['points']]),
-                            'departure_time': departure_time,
-                            'arrival_time': departure_time + pd.Timedelta(seconds=route_data['duration']),
-                            'origin_zone': zone_id if direction == 'inbound' else poi_name,
-                            'destination': poi_name if direction == 'inbound' else zone_id,
-                            'entrance': fixed_origin['Name'] if direction == 'outbound' else best_entrance['Name'],
-                            'route_id': f"{zone_id}-{poi_name}-{direction}-{len(successful_routes)}",
-                            'num_trips': 1,
-                            'origin_x': origin_point.x,
-                            'origin_y': origin_point.y,
-                            'direction': direction,
-                            'zone_total_trips': zone_data['total_trips'],
-                            'zone_ped_trips': zone_data['ped_trips']
-                        }
-                        
-                        successful_routes.append(route_info)
-                        if direction == 'inbound':
-                            self._get_used_points(zone_id).add(origin_point)
-                        else:
-                            self._get_used_points(zone_id).add(destination_point)
-                        trips_remaining -= 1
-                        pbar.update(1)
-                        break  # Exit point attempt loop if route is found
-                    
-                    else:
-                        logger.debug(f"Failed to find route with point attempt {point_attempt + 1}/{max_point_attempts}")
-                
-                if not route_found:
-                    logger.warning(f"Failed to find valid route after {max_point_attempts} point attempts for zone {zone_id}")
-                    break  # Exit trip generation for this zone if we can't find any valid points
-                
-                time.sleep(0.05)  # Sleep time between successful routes
-            
-        return successful_routes
+        if num_routes == 0:
+            logger.warning("No routes were generated!")
+        self.telemetry.close()
+        return num_routes
 
 if __name__ == "__main__":
     modeler = RouteModeler()
-    road_usage = modeler.process_routes()
\ No newline at end of file
+    num_routes = modeler.process_routes()
\ No newline at end of file
@@ -3,10 +3,8 @@ import geopandas as gpd
 import requests
 import json
 from shapely.geometry import Point, LineString
-from shapely import wkt
 import numpy as np
 from datetime import datetime
-import time
 from tqdm import tqdm
 import os
 import polyline
@@ -14,61 +12,65 @@ from rtree import index
 from scipy.spatial import cKDTree
 import logging
 import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from coordinate_utils import CoordinateValidator
+from local_router import LocalRouter
+from avoidance import AvoidanceIndex
+from amenity_index import AmenityIndex
+from request_governor import RequestGovernor
+from telemetry import RunTelemetry
+from graph_snapping import GraphAccess
 
 # Add parent directory to Python path to access data_loader
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from data_loader import DataLoader
-from config import OUTPUT_DIR
+from config import (
+    OUTPUT_DIR, ROUTING_BACKEND, OSM_EXTRACT_FILE, TRIP_WORKERS, TRIP_SEED,
+    ROUTE_FORMAT, ROUTE_GEOJSON_EXPORT
+)
+from utils.route_writer import RouteTableWriter, route_path, WALK_ROUTE_FIELDS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class OTPClient:
-    def __init__(self, base_url="http://localhost:8080/otp/routers/default", max_retries=3, retry_delay=0.1):
+    is_remote = True
+
+    def __init__(self, base_url="http://localhost:8080/otp/routers/default", max_retries=3, poi_polygons=None, governor=None, telemetry=None, snap_index=None):
         self.base_url = base_url
         self.max_retries = max_retries
-        self.retry_delay = retry_delay
+        self.session = requests.Session()
+        # Paces requests and backs off while OTP is struggling
+        self.governor = governor if governor is not None else RequestGovernor(rate=20.0)
+        self.telemetry = telemetry if telemetry is not None else RunTelemetry()
+        # Street graph access checks per travel mode, built from the OSM extract on first use
+        self.graph_access = GraphAccess(OSM_EXTRACT_FILE, [snap_index] if snap_index is not None else [])
         
         # Load and store POI polygons with their IDs
-        attractions = gpd.read_file("shapes/data/maps/Be'er_Sheva_Shapefiles_Attraction_Centers.shp")
-        # BGU (7) and Soroka (11)
-        self.poi_polygons = attractions[attractions['ID'].isin([11, 7])].copy()
+        if poi_polygons is None:
+            attractions = gpd.read_file("shapes/data/maps/Be'er_Sheva_Shapefiles_Attraction_Centers.shp")
+            # BGU (7) and Soroka (11)
+            poi_polygons = attractions[attractions['ID'].isin([11, 7])]
+        self.poi_polygons = poi_polygons.copy()
         if self.poi_polygons.crs is None or self.poi_polygons.crs.to_string() != "EPSG:4326":
             self.poi_polygons = self.poi_polygons.to_crs("EPSG:4326")
+        self.avoidance = AvoidanceIndex(self.poi_polygons)
+    
+    def test_point_access(self, lat, lon, mode='walk'):
+        """Whether a point is close enough to a walkable edge to route from, answered locally.
+
+        Points are accepted when no street network file is available.
+        """
+        return self.graph_access.accessible(lat, lon, mode)
     
     def get_walking_route(self, from_lat, from_lon, to_lat, to_lon, destination_poi=None, origin_poi=None):
         """
         Query OTP for a walking route with enhanced avoidance parameters.
         """
-        point_origin = Point(from_lon, from_lat)
-        point_dest = Point(to_lon, to_lat)
-        
-        # Map POI names to IDs
-        poi_name_to_id = {
-            'Ben-Gurion-University': 7,
-            'Soroka-Medical-Center': 11
-        }
-        
-        # Determine which polygons to avoid
-        avoid_polygons = []
-        for _, poi in self.poi_polygons.iterrows():
-            # Only allow routing through POI if it's explicitly the origin or destination POI
-            if (origin_poi and poi_name_to_id.get(origin_poi) == poi['ID']) or \
-               (destination_poi and poi_name_to_id.get(destination_poi) == poi['ID']):
-                continue
-            
-            # Ensure the polygon is valid and properly formatted
-            if not poi.geometry.is_valid:
-                poi.geometry = poi.geometry.buffer(0)
-            
-            # Add polygon to avoidance list with specific cost multiplier
-            avoid_polygons.append({
-                'geometry': poi.geometry.wkt,
-                'id': poi['ID'],
-                'penalty': 1000000  # Very high penalty for crossing avoided areas
-            })
+        # Polygons to avoid, cached per origin/destination POI pair
+        avoidance = self.avoidance.walk(destination_poi, origin_poi)
         
         # Create enhanced routing parameters
         params = {
@@ -89,11 +91,9 @@ class OTPClient:
         }
         
         # Add avoidance parameters
-        if avoid_polygons:
-            # Create more aggressive avoidance strings
-            avoid_str = '|'.join(f"{p['geometry']}::{p['penalty']}" for p in avoid_polygons)
+        if avoidance:
             params.update({
-                'avoid': avoid_str,
+                'avoid': avoidance.avoid_str,
                 'walkOnStreetReluctance': 1,    # Normal street walking
                 'turnReluctance': 1,            # Normal turns
                 'traversalCostMultiplier': 1,   # Normal traversal
@@ -102,17 +102,23 @@ class OTPClient:
             })
         
         for attempt in range(self.max_retries):
+            if attempt:
+                self.telemetry.retry('walk')
+            response = self.governor.request(
+                self.session, f"{self.base_url}/plan", params, timeout=10,
+                telemetry=self.telemetry, kind='walk'
+            )
+            if response is None:
+                continue
+            
             try:
-                response = requests.get(
-                    f"{self.base_url}/plan", 
-                    params=params, 
-                    timeout=10
-                )
-                
                 if response.status_code == 200:
                     data = response.json()
                     if 'error' in data or 'plan' not in data:
                         logger.warning(f"OTP returned invalid response: {data.get('error', 'No plan found')}")
+                        error = data.get('error')
+                        reason = error.get('msg', 'unknown') if isinstance(error, dict) else 'no plan'
+                        self.telemetry.route_failure(f"OTP error: {reason}")
                         return None
                     
                     # Validate the route doesn't cross avoided areas
@@ -122,32 +128,21 @@ class OTPClient:
                         route_line = LineString([(lon, lat) for lat, lon in route_points])
                         
                         # Check if route intersects with any avoided polygons
-                        for avoid_poly in avoid_polygons:
-                            if route_line.intersects(wkt.loads(avoid_poly['geometry'])):
-                                logger.warning(f"Route intersects avoided polygon {avoid_poly['id']}, retrying...")
-                                return None
+                        crossed_id = avoidance.crossed(route_line)
+                        if crossed_id is not None:
+                            logger.warning(f"Route intersects avoided polygon {crossed_id}, retrying...")
+                            self.telemetry.route_failure(f"Crosses avoided polygon {crossed_id}")
+                            return None
                     
                     return data
                 elif response.status_code == 429:  # Too Many Requests
-                    wait_time = (attempt + 1) * self.retry_delay
-                    logger.warning(f"Rate limited. Waiting {wait_time} seconds...")
-                    time.sleep(wait_time)
-                    continue
+                    logger.warning(f"Rate limited, backing off ({self.governor.postfix()})")
                 else:
                     logger.warning(f"OTP request failed with status {response.status_code}")
-                    
-            except requests.exceptions.Timeout:
-                logger.warning("OTP request timed out")
-            except requests.exceptions.RequestException as e:
-                logger.error(f"OTP request failed: {str(e)}")
             except Exception as e:
                 logger.error(f"Unexpected error: {str(e)}")
                 
-            if attempt < self.max_retries - 1:
-                wait_time = (attempt + 1) * self.retry_delay
-                logger.warning(f"Retrying in {wait_time} seconds... (Attempt {attempt + 1}/{self.max_retries})")
-                time.sleep(wait_time)
-                
+        self.telemetry.route_failure('Retries exhausted')
         return None
 
 class EntranceManager:
@@ -167,7 +162,11 @@ class ImprovedTripGenerator:
         self.otp_client = otp_client
         self.entrance_manager = entrance_manager
         self.amenities = self._filter_clustered_amenities(amenities_gdf.to_crs("EPSG:4326"))
+        self.amenity_index = AmenityIndex(self.amenities)
         self.zone_used_points = {}  # Track used points per zone
+        self.rng = np.random  # Global RNG unless a per-zone generator is assigned
+        self.progress = True
+        self.telemetry = getattr(otp_client, 'telemetry', None) or RunTelemetry()
         
     def _filter_clustered_amenities(self, amenities_gdf, distance_threshold=25):
         """Filter amenities to keep only those that are part of clusters"""
@@ -200,17 +199,28 @@ class ImprovedTripGenerator:
         
         for _ in range(max_attempts):
             point = Point(
-                np.random.uniform(minx, maxx),
-                np.random.uniform(miny, maxy)
+                self.rng.uniform(minx, maxx),
+                self.rng.uniform(miny, maxy)
             )
-            if geometry.contains(point):
-                # Check if point is within any POI polygon
-                if any(poi.geometry.contains(point) for _, poi in self.otp_client.poi_polygons.iterrows()):
-                    continue
-                
-                # Check if point is sufficiently far from used points (10 meters ≈ 0.0001 degrees)
-                if not any(point.distance(p) < 0.0001 for p in used_points):
-                    return point
+            if not geometry.contains(point):
+                self.telemetry.point_failure("Outside zone")
+                continue
+            
+            # Check if point is within any POI polygon
+            if any(poi.geometry.contains(point) for _, poi in self.otp_client.poi_polygons.iterrows()):
+                self.telemetry.point_failure("Inside POI polygon")
+                continue
+            
+            # Check if point is sufficiently far from used points (10 meters ≈ 0.0001 degrees)
+            if any(point.distance(p) < 0.0001 for p in used_points):
+                self.telemetry.point_failure("Too close to used points")
+                continue
+            
+            # Check the point can be routed from, against the local street graph index
+            if not self.otp_client.test_point_access(point.y, point.x, mode='walk'):
+                self.telemetry.point_failure("No graph access")
+                continue
+            return point
         return None
         
     def _find_closest_entrance(self, point, entrances):
@@ -219,34 +229,24 @@ class ImprovedTripGenerator:
         closest_idx = np.argmin(distances)
         return entrances.iloc[closest_idx]
     
-    def _find_suitable_amenity(self, origin_point, destination_point, max_detour_factor=1.5):
-        """Find a suitable amenity that doesn't create too much of a detour"""
+    def _find_suitable_amenity(self, origin_point, destination_point, max_detour_factor=1.5, candidates=None):
+        """Find a suitable amenity that doesn't create too much of a detour.
+
+        candidates optionally restricts the search to precomputed zone candidates
+        from AmenityIndex.zone_candidates.
+        """
         if self.amenities.empty:
             return None
-            
-        direct_distance = origin_point.distance(destination_point)
-        
-        origin_arr = np.array([origin_point.x, origin_point.y])
-        dest_arr = np.array([destination_point.x, destination_point.y])
         
-        amenity_coords = np.column_stack((
-            self.amenities.geometry.x.values,
-            self.amenities.geometry.y.values
-        ))
-        
-        total_distances = (
-            np.sqrt(np.sum((amenity_coords - origin_arr)**2, axis=1)) +
-            np.sqrt(np.sum((amenity_coords - dest_arr)**2, axis=1))
+        valid_indices = self.amenity_index.ellipse_candidates(
+            origin_point, destination_point, max_detour_factor, candidates
         )
         
-        valid_amenities = total_distances <= (direct_distance * max_detour_factor)
-        
-        if np.any(valid_amenities):
-            valid_indices = np.where(valid_amenities)[0]
-            chosen_idx = np.random.choice(valid_indices)
+        if len(valid_indices):
+            chosen_idx = self.rng.choice(valid_indices)
             chosen_amenity = self.amenities.iloc[chosen_idx]
             return {
-                'geometry': Point(amenity_coords[chosen_idx]),
+                'geometry': Point(self.amenity_index.coords[chosen_idx]),
                 'amenity_id': chosen_amenity.name,
                 'amenity_type': chosen_amenity['top_classi']
             }
@@ -320,11 +320,16 @@ class ImprovedTripGenerator:
         
         # Determine how many trips should include amenity stops
         num_amenity_trips = int(num_trips * 0.5)
+        max_detour_factor = 1.5
+        
+        # Amenities reachable within the detour limit from anywhere in the zone
+        endpoints = entrances.geometry if direction == 'inbound' else [fixed_origin.geometry]
+        amenity_candidates = self.amenity_index.zone_candidates(zone_geometry.bounds, endpoints, max_detour_factor)
         
         max_consecutive_failures = 5  # Add failure threshold
         consecutive_failures = 0
         
-        with tqdm(total=num_trips, desc=f"Zone {zone_id} {direction}") as pbar:
+        with tqdm(total=num_trips, desc=f"Zone {zone_id} {direction}", disable=not self.progress) as pbar:
             trips_remaining = num_trips
             while trips_remaining > 0:
                 if direction == 'inbound':
@@ -348,7 +353,8 @@ class ImprovedTripGenerator:
                     amenity_stop = self._find_suitable_amenity(
                         origin_point,
                         destination_point,
-                        max_detour_factor=1.5
+                        max_detour_factor=max_detour_factor,
+                        candidates=amenity_candidates
                     )
                     if amenity_stop:
                         route_data = self._get_valid_route(
@@ -403,12 +409,157 @@ class ImprovedTripGenerator:
                     if consecutive_failures >= max_consecutive_failures:
                         logger.warning(f"Too many consecutive failures for zone {zone_id}. Skipping remaining trips.")
                         break
-                    
-                time.sleep(0.05)  # Sleep time
+                
+                governor = getattr(self.otp_client, 'governor', None)
+                if governor is not None:
+                    pbar.set_postfix_str(governor.postfix(), refresh=False)
                 
         return successful_routes
 
-def main():
+def create_otp_client(backend=ROUTING_BACKEND, **client_kwargs):
+    """Routing client for the configured backend"""
+    if backend == 'local':
+        return LocalRouter(OSM_EXTRACT_FILE, **client_kwargs)
+    return OTPClient(**client_kwargs)
+
+def collect_zone_jobs(trip_data, target_pois):
+    """List zone trip jobs in serial generation order (POI, direction, zone)"""
+    jobs = []
+    for poi_name in target_pois:
+        for direction in ['inbound', 'outbound']:
+            if (poi_name, direction) not in trip_data:
+                logger.warning(f"No {direction} trip data found for {poi_name}")
+                continue
+            
+            df = trip_data[(poi_name, direction)]
+            
+            # Verify required columns exist
+            if 'total_trips' not in df.columns or 'mode_ped' not in df.columns:
+                logger.warning(f"Missing required columns in {direction} data for {poi_name}")
+                continue
+            
+            # Calculate and filter pedestrian trips
+            df['ped_trips'] = df['total_trips'] * (df['mode_ped'] / 100)
+            df = df[df['ped_trips'] >= 1]  # Only include zones with at least 1 pedestrian trip
+            
+            if df.empty:
+                logger.warning(f"No pedestrian trips found for {poi_name} - {direction}")
+                continue
+            
+            logger.info(f"Found {int(df['ped_trips'].sum())} pedestrian trips for {poi_name} - {direction}")
+            
+            for _, zone_data in df.iterrows():
+                num_ped_trips = int(round(zone_data['ped_trips']))
+                if num_ped_trips < 1:
+                    continue
+                jobs.append({
+                    'order': len(jobs),
+                    'poi_name': poi_name,
+                    'direction': direction,
+                    'zone_id': zone_data['tract'],
+                    'num_trips': num_ped_trips,
+                    'zone_data': zone_data.to_dict()
+                })
+    return jobs
+
+def run_zone_job(trip_generator, job, fixed_origin=None):
+    """Generate the trips for one (POI, direction, zone) job"""
+    entrances = trip_generator.entrance_manager.get_entrances_for_poi(job['poi_name'])
+    if entrances.empty:
+        logger.warning(f"No entrances found for {job['poi_name']}")
+        return []
+    if job['direction'] == 'outbound' and fixed_origin is None:
+        # Select a random entrance as the origin
+        fixed_origin = entrances.iloc[trip_generator.rng.choice(len(entrances))]
+    with trip_generator.telemetry.zone(zone_id=job['zone_id'], poi=job['poi_name'],
+                                       direction=job['direction'], requested=job['num_trips']) as record:
+        trips = trip_generator.process_zone_trips(
+            job['zone_id'],
+            job['num_trips'],
+            job['poi_name'],
+            entrances,
+            job['zone_data'],
+            direction=job['direction'],
+            fixed_origin=fixed_origin
+        )
+        record['routes'] = len(trips)
+    return trips
+
+def zone_seed(seed, zone_id):
+    """Deterministic per-zone RNG seed, independent of worker assignment"""
+    return zlib.crc32(f"{seed}:{zone_id}".encode())
+
+# Trip generator owned by each worker process in sharded mode
+_worker_generator = None
+
+def _init_worker(backend, client_kwargs, zones, entrances, amenities):
+    """Build a worker-local routing client (own connection pool) and generator"""
+    global _worker_generator
+    otp_client = create_otp_client(backend, **client_kwargs)
+    _worker_generator = ImprovedTripGenerator(zones, otp_client, EntranceManager(entrances), amenities)
+    _worker_generator.progress = False
+
+def _run_zone_shard(zone_id, jobs, seed):
+    """Generate every job for one zone with a zone-local RNG and used-point registry.
+
+    Returns the per-job trips and the telemetry recorded for the zone.
+    """
+    generator = _worker_generator
+    generator.rng = np.random.default_rng(zone_seed(seed, zone_id))
+    generator.zone_used_points = {}
+    results = [(job['order'], run_zone_job(generator, job)) for job in jobs]
+    return results, generator.telemetry.drain()
+
+def generate_serial(trip_generator, jobs, seed=TRIP_SEED):
+    """Generate trips in this process, job by job in serial order.
+
+    Each zone gets the same RNG stream (seeded from the zone ID) and its own
+    used-point registry, as in generate_sharded, so a serial run samples the
+    same points as a sharded run with the same seed.
+    """
+    zone_rngs = {}
+    trip_generator.zone_used_points = {}
+    for job in tqdm(jobs, desc="Processing zones", disable=not trip_generator.progress):
+        zone_id = job['zone_id']
+        if zone_id not in zone_rngs:
+            zone_rngs[zone_id] = np.random.default_rng(zone_seed(seed, zone_id))
+        trip_generator.rng = zone_rngs[zone_id]
+        yield run_zone_job(trip_generator, job)
+
+def generate_sharded(jobs, zones, entrances, amenities, workers, seed=TRIP_SEED,
+                     backend=ROUTING_BACKEND, client_kwargs=None, telemetry=None):
+    """Generate trips with zones partitioned across worker processes.
+
+    All jobs for a zone run in one shard, in serial order, seeded from the zone
+    ID, so results depend only on the seed and not on scheduling. Yields each
+    job's trips in serial job order as soon as all earlier jobs are done.
+    Worker telemetry is merged into telemetry, if given.
+    """
+    shards = {}
+    for job in jobs:
+        shards.setdefault(job['zone_id'], []).append(job)
+    
+    results = {}
+    next_order = 0
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(backend, client_kwargs or {}, zones, entrances, amenities)
+    ) as executor:
+        futures = [executor.submit(_run_zone_shard, zone_id, zone_jobs, seed)
+                   for zone_id, zone_jobs in shards.items()]
+        with tqdm(total=len(futures), desc=f"Processing zones ({workers} workers)") as pbar:
+            for future in as_completed(futures):
+                shard_results, shard_telemetry = future.result()
+                results.update(shard_results)
+                if telemetry is not None:
+                    telemetry.merge(shard_telemetry)
+                pbar.update(1)
+                while next_order in results:
+                    yield results.pop(next_order)
+                    next_order += 1
+
+def main(backend=ROUTING_BACKEND, workers=TRIP_WORKERS, seed=TRIP_SEED):
     # Initialize components
     loader = DataLoader()
     zones = loader.load_zones()
@@ -427,111 +578,54 @@ def main():
     )
     entrances = gpd.read_file(entrances_path)
     
-    otp_client = OTPClient()
-    entrance_manager = EntranceManager(entrances)
-    trip_generator = ImprovedTripGenerator(zones, otp_client, entrance_manager, amenities)
-    
     target_pois = ['Ben-Gurion-University', 'Soroka-Medical-Center']
-    all_trips = []
+    jobs = collect_zone_jobs(trip_data, target_pois)
     
-    total_pois = len(target_pois) * 2  # *2 for inbound/outbound
-    with tqdm(total=total_pois, desc="Processing POIs") as poi_pbar:
-        # Process each POI
-        for poi_name in target_pois:
-            # Process both inbound and outbound trips
-            for direction in ['inbound', 'outbound']:
-                logger.info(f"\nProcessing {poi_name} - {direction}")
-                if (poi_name, direction) not in trip_data:
-                    logger.warning(f"No {direction} trip data found for {poi_name}")
-                    poi_pbar.update(1)
-                    continue
-                
-                df = trip_data[(poi_name, direction)]
-                
-                # Verify required columns exist
-                if 'total_trips' not in df.columns or 'mode_ped' not in df.columns:
-                    logger.warning(f"Missing required columns in {direction} data for {poi_name}")
-                    poi_pbar.update(1)
-                    continue
-                
-                # Calculate and filter pedestrian trips
-                df['ped_trips'] = df['total_trips'] * (df['mode_ped'] / 100)
-                df = df[df['ped_trips'] >= 1]  # Only include zones with at least 1 pedestrian trip
-                
-                if df.empty:
-                    logger.warning(f"No pedestrian trips found for {poi_name} - {direction}")
-                    poi_pbar.update(1)
-                    continue
-                
-                logger.info(f"Processing {int(df['ped_trips'].sum())} pedestrian trips for {poi_name} - {direction}")
-                
-                entrances = entrance_manager.get_entrances_for_poi(poi_name)
-                if entrances.empty:
-                    logger.warning(f"No entrances found for {poi_name}")
-                    poi_pbar.update(1)
-                    continue
-                
-                # Process each zone
-                for _, zone_data in df.iterrows():
-                    num_ped_trips = int(round(zone_data['ped_trips']))
-                    if num_ped_trips < 1:
-                        continue
-                        
-                    if direction == 'outbound':
-                        # Select a random entrance as the origin
-                        entrance = entrances.sample(n=1).iloc[0]
-                        zone_trips = trip_generator.process_zone_trips(
-                            zone_data['tract'],
-                            num_ped_trips,
-                            poi_name,
-                            entrances,
-                            zone_data,
-                            direction='outbound',
-                            fixed_origin=entrance
-                        )
-                    else:
-                        zone_trips = trip_generator.process_zone_trips(
-                            zone_data['tract'],
-                            num_ped_trips,
-                            poi_name,
-                            entrances,
-                            zone_data,
-                            direction='inbound'
-                        )
-                    all_trips.extend(zone_trips)
-                
-                poi_pbar.update(1)
+    # Per-zone records and the run summary go to a JSON-lines report next to the routes
+    telemetry = RunTelemetry(os.path.join(OUTPUT_DIR, "walk_routes_report.jsonl"))
     
-    # Create and save GeoDataFrames separately for inbound and outbound
-    if all_trips:
-        trips_gdf = gpd.GeoDataFrame(all_trips, crs="EPSG:4326")
-        
-        # Split into inbound and outbound
-        inbound_trips = trips_gdf[trips_gdf['direction'] == 'inbound']
-        outbound_trips = trips_gdf[trips_gdf['direction'] == 'outbound']
-        
-        # Save inbound trips
-        inbound_file = os.path.join(OUTPUT_DIR, "walk_routes_inbound.geojson")
-        inbound_trips.to_file(inbound_file, driver="GeoJSON")
-        
-        # Save outbound trips
-        outbound_file = os.path.join(OUTPUT_DIR, "walk_routes_outbound.geojson")
-        outbound_trips.to_file(outbound_file, driver="GeoJSON")
-        
-        # Log statistics
-        logger.info(f"\nSaved {len(inbound_trips)} inbound walking routes representing {sum(t['num_trips'] for t in inbound_trips.to_dict('records')):,} trips")
-        logger.info(f"Saved {len(outbound_trips)} outbound walking routes representing {sum(t['num_trips'] for t in outbound_trips.to_dict('records')):,} trips")
-        logger.info(f"Inbound trips saved to: {inbound_file}")
-        logger.info(f"Outbound trips saved to: {outbound_file}")
-        
-        # Log statistics about amenity stops for each direction
-        inbound_amenities = sum(1 for t in inbound_trips.to_dict('records') if t['has_amenity_stop'])
-        outbound_amenities = sum(1 for t in outbound_trips.to_dict('records') if t['has_amenity_stop'])
-        
-        logger.info(f"Inbound trips with amenity stops: {inbound_amenities} ({inbound_amenities/len(inbound_trips)*100:.1f}%)")
-        logger.info(f"Outbound trips with amenity stops: {outbound_amenities} ({outbound_amenities/len(outbound_trips)*100:.1f}%)")
+    if workers > 1:
+        logger.info(f"Sharding {len(jobs)} zone jobs across {workers} workers (seed {seed})")
+        job_results = generate_sharded(jobs, zones, entrances, amenities, workers, seed=seed,
+                                       backend=backend, telemetry=telemetry)
     else:
+        client_kwargs = {} if backend == 'local' else {'telemetry': telemetry}
+        trip_generator = ImprovedTripGenerator(zones, create_otp_client(backend, **client_kwargs),
+                                               EntranceManager(entrances), amenities)
+        trip_generator.telemetry = telemetry
+        job_results = generate_serial(trip_generator, jobs, seed=seed)
+    
+    # Stream routes to separate inbound and outbound route tables as zones complete
+    writers = {
+        direction: RouteTableWriter(
+            route_path(OUTPUT_DIR, f"walk_routes_{direction}", ROUTE_FORMAT),
+            WALK_ROUTE_FIELDS,
+            geojson_export=ROUTE_GEOJSON_EXPORT,
+            sum_fields=('num_trips', 'has_amenity_stop')
+        )
+        for direction in ['inbound', 'outbound']
+    }
+    for zone_trips in job_results:
+        for trip in zone_trips:
+            writers[trip['direction']].write(trip)
+    
+    telemetry.close()
+    
+    if not any(writer.rows for writer in writers.values()):
         logger.warning("\nNo walking routes were generated!")
+        return
+    
+    for direction, writer in writers.items():
+        output_file = writer.close()
+        if output_file is None:
+            logger.warning(f"No {direction} walking routes were generated")
+            continue
+        
+        # Log statistics from the writer's running counters
+        logger.info(f"\nSaved {writer.rows} {direction} walking routes ({writer.unique_routes} distinct) representing {writer.sums['num_trips']:,} trips")
+        logger.info(f"{direction.capitalize()} trips saved to: {output_file}")
+        amenity_stops = writer.sums['has_amenity_stop']
+        logger.info(f"{direction.capitalize()} trips with amenity stops: {amenity_stops} ({amenity_stops/writer.rows*100:.1f}%)")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,163 @@
+"""
+Adaptive pacing and circuit breaking for OTP requests.
+
+RequestGovernor spaces requests to a target rate that grows additively after
+each healthy response and shrinks multiplicatively after a 429, 5xx, timeout
+or slow response (AIMD). After failure_threshold consecutive failures the
+circuit opens: requests wait out a cool-down, then a single probe is let
+through (half-open) and its outcome decides whether to resume or to open again
+with a longer cool-down. Rolling latency and error rate over the last `window`
+requests are exposed through status() and postfix() for progress bars.
+"""
+import time
+import logging
+import threading
+from collections import deque
+import numpy as np
+import requests
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class RequestGovernor:
+    """AIMD request pacing with a circuit breaker, shared by the OTP clients"""
+
+    def __init__(self, rate=10.0, min_rate=0.5, max_rate=50.0, increase=2.0, decrease=0.7,
+                 slow_latency=5.0, window=50, failure_threshold=5, open_seconds=2.0,
+                 max_open_seconds=60.0, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_latency = slow_latency
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.clock = clock
+        self.sleep = sleep
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_seconds = open_seconds
+        self.counts = {'requests': 0, 'failures': 0, 'circuit_opened': 0}
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)
+        self._next_send = 0.0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the next request may be sent"""
+        while True:
+            with self._lock:
+                now = self.clock()
+                if self.state == OPEN:
+                    wait = self._opened_at + self.open_seconds - now
+                    if wait <= 0:
+                        logger.info("OTP circuit half-open, sending probe request")
+                        self.state = HALF_OPEN
+                        self._probe_in_flight = False
+                        continue
+                elif self.state == HALF_OPEN:
+                    if not self._probe_in_flight:
+                        self._probe_in_flight = True
+                        self.counts['requests'] += 1
+                        return
+                    wait = 1.0 / self.max_rate
+                else:
+                    wait = self._next_send - now
+                    if wait <= 0:
+                        self._next_send = max(self._next_send, now - 1.0 / self.rate) + 1.0 / self.rate
+                        self.counts['requests'] += 1
+                        return
+            self.sleep(wait)
+
+    def record(self, latency, ok):
+        """Update pacing and breaker state with the outcome of one request"""
+        with self._lock:
+            self._latencies.append(latency)
+            self._outcomes.append(ok)
+            if ok:
+                self.consecutive_failures = 0
+                if self.state == HALF_OPEN:
+                    logger.info("OTP probe succeeded, closing circuit")
+                    self.state = CLOSED
+                    self.open_seconds = self.base_open_seconds
+                    self._next_send = self.clock()
+                if latency > self.slow_latency:
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+                else:
+                    self.rate = min(self.max_rate, self.rate + self.increase)
+                return
+
+            self.counts['failures'] += 1
+            self.consecutive_failures += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            if self.state == HALF_OPEN:
+                self.open_seconds = min(self.max_open_seconds, self.open_seconds * 2)
+                self._open()
+            elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = self.clock()
+        self.counts['circuit_opened'] += 1
+        logger.warning(f"OTP circuit open after {self.consecutive_failures} consecutive failures, "
+                       f"pausing {self.open_seconds:.1f}s")
+
+    def request(self, session, url, params, timeout=10, telemetry=None, kind='plan'):
+        """Send one governed GET; returns the response, or None on timeout/connection error.
+
+        Outcomes are also recorded in telemetry (a RunTelemetry) under kind, if given.
+        """
+        self.acquire()
+        start = time.perf_counter()
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except requests.exceptions.Timeout:
+            latency = time.perf_counter() - start
+            self.record(latency, ok=False)
+            if telemetry is not None:
+                telemetry.request(kind, latency, 'timeout')
+            logger.warning("OTP request timed out")
+            return None
+        except requests.exceptions.RequestException as e:
+            latency = time.perf_counter() - start
+            self.record(latency, ok=False)
+            if telemetry is not None:
+                telemetry.request(kind, latency, 'error')
+            logger.error(f"OTP request failed: {str(e)}")
+            return None
+        latency = time.perf_counter() - start
+        # Anything but throttling and server errors means the server is healthy
+        healthy = response.status_code != 429 and response.status_code < 500
+        self.record(latency, ok=healthy)
+        if telemetry is not None:
+            telemetry.request(kind, latency, response.status_code)
+        return response
+
+    def status(self):
+        """Rolling view of server health and the current pacing"""
+        with self._lock:
+            latencies = list(self._latencies)
+            outcomes = list(self._outcomes)
+            return {
+                'state': self.state,
+                'rate': self.rate,
+                'p50_latency': float(np.median(latencies)) if latencies else None,
+                'error_rate': 1 - sum(outcomes) / len(outcomes) if outcomes else 0.0,
+                **self.counts
+            }
+
+    def postfix(self):
+        """Short status string for tqdm postfixes"""
+        status = self.status()
+        p50 = f"{status['p50_latency'] * 1000:.0f}ms" if status['p50_latency'] is not None else "-"
+        return f"otp={status['state']} {status['rate']:.1f}/s p50={p50} err={status['error_rate']:.0%}"
@@ -0,0 +1,256 @@
+"""
+Offline throughput benchmark for the trip generators.
+
+Runs otp_walk and otp_car_proj route generation against the mock OTP server
+on a small synthetic study area and reports routes per second, retries,
+rate-limited/failed requests and route cache hit rate.
+
+The car scenario runs twice: one zone request at a time (the per-zone loop)
+and batched per POI with BENCHMARK_BATCH_WORKERS concurrent requests.
+
+Usage:
+    python routing_benchmark.py
+    MOCK_OTP_LATENCY=0.02 MOCK_OTP_RATE_LIMIT=0.05 python routing_benchmark.py
+"""
+import os
+import sys
+import time
+import json
+import tempfile
+import logging
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import Point, box
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mock_otp_server import MockOTPServer, MockOTPConfig
+import otp_walk
+import otp_car_proj
+from telemetry import RunTelemetry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Study area around Soroka / BGU in ITM (EPSG:2039)
+AREA_ORIGIN = (180500, 571500)
+ZONE_SIZE = 600  # meters
+ZONE_GRID = 3
+
+
+class CountingClient:
+    """Proxy that counts route calls made by a generator"""
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name in ('get_walking_route', 'get_car_route'):
+            def counted(*args, **kwargs):
+                self.calls += 1
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+def build_study_area():
+    """Synthetic zones, entrances, amenities and POI polygons"""
+    zones = []
+    for i in range(ZONE_GRID):
+        for j in range(ZONE_GRID):
+            x0 = AREA_ORIGIN[0] + j * ZONE_SIZE
+            y0 = AREA_ORIGIN[1] + i * ZONE_SIZE
+            zones.append({
+                'YISHUV_STAT11': 90000000 + i * ZONE_GRID + j,
+                'geometry': box(x0, y0, x0 + ZONE_SIZE, y0 + ZONE_SIZE)
+            })
+    zones = gpd.GeoDataFrame(zones, crs="EPSG:2039")
+
+    # BGU east of the zone grid, Soroka south of it
+    extent = ZONE_GRID * ZONE_SIZE
+    x0, y0 = AREA_ORIGIN
+    bgu = box(x0 + extent + 100, y0 + 600, x0 + extent + 500, y0 + 1000)
+    soroka = box(x0 + 600, y0 - 500, x0 + 1000, y0 - 100)
+    poi_polygons = gpd.GeoDataFrame({'ID': [7, 11]}, geometry=[bgu, soroka], crs="EPSG:2039").to_crs("EPSG:4326")
+
+    entrances = gpd.GeoDataFrame({
+        'Name': ['Uni_North', 'Uni_West', 'Hospital_Main'],
+        'geometry': [
+            Point(bgu.centroid.x, bgu.bounds[3]),
+            Point(bgu.bounds[0], bgu.centroid.y),
+            Point(soroka.bounds[0], soroka.centroid.y)
+        ]
+    }, crs="EPSG:2039")
+
+    rng = np.random.default_rng(0)
+    amenity_xy = rng.uniform(
+        [AREA_ORIGIN[0], AREA_ORIGIN[1]],
+        [AREA_ORIGIN[0] + extent, AREA_ORIGIN[1] + extent],
+        size=(100, 2)
+    )
+    # Pair each amenity with a close neighbour so the cluster filter keeps them
+    amenity_xy = np.vstack([amenity_xy, amenity_xy + 5])
+    amenities = gpd.GeoDataFrame({
+        'top_classi': rng.choice(['food', 'retail', 'services'], size=len(amenity_xy)),
+        'geometry': [Point(x, y) for x, y in amenity_xy]
+    }, crs="EPSG:2039")
+
+    return zones, poi_polygons, entrances, amenities
+
+
+def build_trip_data(zones, poi_df, trips_per_zone=4):
+    """Trip tables in the shape DataLoader.load_trip_data returns"""
+    # Each zone is listed twice so repeated origin/destination pairs hit the route cache
+    tracts = np.repeat(zones['YISHUV_STAT11'].values, 2)
+    trip_data = {}
+    for poi_name in poi_df['name']:
+        for direction in ['inbound', 'outbound']:
+            trip_data[(poi_name, direction)] = pd.DataFrame({
+                'tract': tracts,
+                'total_trips': trips_per_zone,
+                'mode_car': 50.0,
+                'mode_ped': 50.0
+            })
+    return trip_data
+
+
+def request_stats(before, after):
+    keys = set(before) | set(after)
+    return {k: after.get(k, 0) - before.get(k, 0) for k in keys}
+
+
+def bench_walk(server, zones, poi_polygons, entrances, amenities, trips_per_zone=2):
+    """Generate walking trips for every zone to BGU"""
+    telemetry = RunTelemetry()
+    client = CountingClient(otp_walk.OTPClient(base_url=server.base_url, poi_polygons=poi_polygons,
+                                               telemetry=telemetry))
+    generator = otp_walk.ImprovedTripGenerator(
+        zones, client, otp_walk.EntranceManager(entrances), amenities
+    )
+    poi_name = 'Ben-Gurion-University'
+    poi_entrances = generator.entrance_manager.get_entrances_for_poi(poi_name)
+
+    before = server.stats
+    start = time.perf_counter()
+    routes = []
+    for zone_id in zones['YISHUV_STAT11']:
+        zone_data = {'total_trips': trips_per_zone, 'ped_trips': trips_per_zone}
+        routes.extend(generator.process_zone_trips(
+            zone_id, trips_per_zone, poi_name, poi_entrances, zone_data, direction='inbound'
+        ))
+    elapsed = time.perf_counter() - start
+    return summarize('walk', len(routes), client.calls, elapsed, request_stats(before, server.stats), telemetry)
+
+
+def bench_car(server, zones, poi_polygons, trips_per_zone=4, batch_workers=1):
+    """Generate car routes for every zone to and from both POIs.
+
+    batch_workers=1 requests one zone at a time, like the original per-zone loop.
+    """
+    telemetry = RunTelemetry()
+    client = CountingClient(otp_car_proj.OTPClient(base_url=server.base_url, poi_polygons=poi_polygons,
+                                                   telemetry=telemetry))
+    modeler = otp_car_proj.RouteModeler(otp_client=client, load=False, batch_workers=batch_workers)
+    centroids = poi_polygons.to_crs("EPSG:2039").centroid.to_crs("EPSG:4326")
+    modeler.poi_df = pd.DataFrame({
+        'name': ['Ben-Gurion-University', 'Soroka-Medical-Center'],
+        'lat': centroids.y.values,
+        'lon': centroids.x.values
+    })
+    modeler.zones = zones
+    modeler.trip_data = build_trip_data(zones, modeler.poi_df, trips_per_zone)
+
+    before = server.stats
+    with tempfile.TemporaryDirectory() as output_dir:
+        modeler.output_dir = output_dir
+        start = time.perf_counter()
+        num_routes = modeler.process_routes()
+        elapsed = time.perf_counter() - start
+    name = 'car' if batch_workers == 1 else f'car_batch_{batch_workers}'
+    return summarize(name, num_routes, client.calls, elapsed, request_stats(before, server.stats), telemetry)
+
+
+def bench_walk_sharded(server, zones, poi_polygons, entrances, amenities, workers=2, seed=0):
+    """Zone-sharded walking generation across worker processes for both POIs"""
+    poi_df = pd.DataFrame({'name': ['Ben-Gurion-University', 'Soroka-Medical-Center']})
+    jobs = otp_walk.collect_zone_jobs(build_trip_data(zones, poi_df), poi_df['name'])
+    client_kwargs = {'base_url': server.base_url, 'poi_polygons': poi_polygons}
+    telemetry = RunTelemetry()
+
+    before = server.stats
+    start = time.perf_counter()
+    routes = [
+        trip
+        for zone_trips in otp_walk.generate_sharded(
+            jobs, zones, entrances, amenities, workers,
+            seed=seed, backend='otp', client_kwargs=client_kwargs, telemetry=telemetry
+        )
+        for trip in zone_trips
+    ]
+    elapsed = time.perf_counter() - start
+    return summarize(f'walk_sharded_{workers}', len(routes), None, elapsed, request_stats(before, server.stats),
+                     telemetry)
+
+
+def summarize(name, num_routes, client_calls, elapsed, stats, telemetry):
+    server_requests = sum(v for k, v in stats.items() if k != 'serverinfo')
+    if client_calls is None:
+        # Calls made inside worker processes are only visible as answered requests
+        client_calls = server_requests - stats.get('rate_limited', 0) - stats.get('server_error', 0)
+    # Route cache lookups counted by the generator; None for generators without a route cache
+    lookups = sum(telemetry.cache.values())
+    cache_hits = sum(count for (_, result), count in telemetry.cache.items() if result == 'hit')
+    return {
+        'benchmark': name,
+        'routes': num_routes,
+        'seconds': round(elapsed, 3),
+        'routes_per_second': round(num_routes / elapsed, 2) if elapsed > 0 else None,
+        'client_calls': client_calls,
+        'server_requests': server_requests,
+        'retries': max(0, server_requests - client_calls),
+        'rate_limited': stats.get('rate_limited', 0),
+        'server_errors': stats.get('server_error', 0),
+        'cache_hit_rate': round(cache_hits / lookups, 3) if lookups else None
+    }
+
+
+def run_benchmarks(latency=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=0, workers=2, batch_workers=8):
+    """Run all benchmark scenarios against a fresh mock server"""
+    np.random.seed(seed)
+    zones, poi_polygons, entrances, amenities = build_study_area()
+    config = MockOTPConfig(
+        latency=latency, error_rate=error_rate, rate_limit_rate=rate_limit_rate, seed=seed
+    )
+    with MockOTPServer(config=config) as server:
+        results = [
+            bench_walk(server, zones, poi_polygons, entrances, amenities),
+            bench_walk_sharded(server, zones, poi_polygons, entrances, amenities, workers=workers, seed=seed),
+            bench_car(server, zones, poi_polygons),
+            bench_car(server, zones, poi_polygons, batch_workers=batch_workers)
+        ]
+    return results
+
+
+def main():
+    results = run_benchmarks(
+        latency=float(os.getenv('MOCK_OTP_LATENCY', 0.0)),
+        error_rate=float(os.getenv('MOCK_OTP_ERROR_RATE', 0.0)),
+        rate_limit_rate=float(os.getenv('MOCK_OTP_RATE_LIMIT', 0.0)),
+        seed=int(os.getenv('MOCK_OTP_SEED', 0)),
+        workers=int(os.getenv('BENCHMARK_WORKERS', 2)),
+        batch_workers=int(os.getenv('BENCHMARK_BATCH_WORKERS', 8))
+    )
+    print("\nRouting benchmark results:")
+    print(pd.DataFrame(results).to_string(index=False))
+
+    output_file = os.getenv('BENCHMARK_OUTPUT')
+    if output_file:
+        with open(output_file, 'w') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Saved benchmark results to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
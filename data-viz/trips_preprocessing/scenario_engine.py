@@ -0,0 +1,273 @@
+"""
+What-if scenarios on road loads, without re-routing.
+
+A scenario is a list of reweighting rules applied to the generated routes'
+trips. Each trip's baseline weight per time bin is its num_trips times its
+POI's temporal distribution (from the temporal cube) for its direction and
+mode. Rules select trips by POI, mode, direction and hour range and either
+scale them (e.g. 0.8 when 20% of BGU car trips move to transit) or shift
+their departures (e.g. Soroka starting an hour later). Segment loads for the
+baseline and the scenario are sparse products with each route set's cached
+segment incidence matrix, so comparing a scenario takes seconds.
+
+Scenario files are JSON:
+
+    {"name": "bgu_car_to_transit",
+     "rules": [{"poi": "Ben-Gurion-University", "mode": "car", "scale": 0.8}]}
+
+Usage: python scenario_engine.py scenario.json [more.json ...]
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+# Add parent directory to Python path to access config and shared utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import OUTPUT_DIR, ROUTE_FORMAT, TEMPORAL_CUBE_FILE
+from utils.route_writer import load_routes, route_path
+from utils.segment_engine import SegmentIncidence, load_color_scale
+from utils.temporal_cube import TemporalCube
+
+logger = logging.getLogger(__name__)
+
+# Route-set mode and its mode group in the temporal cube
+CUBE_MODES = {'car': 'car', 'walk': 'pedestrian'}
+
+# Rule keys that select trips, and the adjustments a rule can apply
+RULE_FILTERS = ('poi', 'mode', 'direction', 'hours')
+RULE_ACTIONS = ('scale', 'shift_hours')
+
+
+class Scenario:
+    """A named list of reweighting rules, applied in order.
+
+    A rule selects trips with any of poi, mode ('car' or 'walk'), direction
+    ('inbound' or 'outbound') and hours ([start, end) departure hours; for
+    shifts, the hours the moved trips leave from) and applies scale (a
+    factor) and/or shift_hours (departures moved by that many hours,
+    wrapping around midnight).
+    """
+
+    def __init__(self, name, rules):
+        self.name = name
+        self.rules = [dict(rule) for rule in rules]
+        for rule in self.rules:
+            unknown = set(rule) - set(RULE_FILTERS) - set(RULE_ACTIONS)
+            if unknown:
+                raise ValueError(f"Scenario {name}: unknown rule keys {sorted(unknown)}")
+            if not set(rule) & set(RULE_ACTIONS):
+                raise ValueError(f"Scenario {name}: rule {rule} has neither scale nor shift_hours")
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data.get('rules', []))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+class RouteSetLoads:
+    """Baseline trip weights and segment incidence for one mode's generated routes.
+
+    trips has one row per trip (e.g. from load_routes) with direction,
+    origin_zone, destination and num_trips; trips sharing a route_key share
+    one geometry in the incidence matrix.
+    """
+
+    def __init__(self, mode, trips, cube, incidence_path=None):
+        self.mode = mode
+        self.bin_minutes = cube.bin_minutes
+        self.direction = trips['direction'].to_numpy()
+        self.poi = np.where(self.direction == 'inbound', trips['destination'], trips['origin_zone'])
+
+        # Distinct geometries: one per route_key if the trips came from a route table
+        if 'route_key' in trips.columns:
+            self.route_index, _ = pd.factorize(trips['route_key'])
+            first = pd.Series(np.arange(len(trips))).groupby(self.route_index).first().to_numpy()
+            geometries = trips.geometry.values[first]
+        else:
+            self.route_index = np.arange(len(trips))
+            geometries = trips.geometry.values
+        self.n_routes = len(geometries)
+        self.incidence = (SegmentIncidence.cached(geometries, incidence_path) if incidence_path
+                          else SegmentIncidence.from_routes(geometries))
+
+        self.baseline = self._baseline_weights(trips['num_trips'].to_numpy(dtype=float), cube)
+
+    def _baseline_weights(self, num_trips, cube):
+        """(trips x bins) weights from the temporal cube; trips of POIs missing from it are spread evenly"""
+        n_bins = cube.counts.shape[-1]
+        dist = np.full((len(num_trips), n_bins), 1.0 / n_bins)
+        mode = CUBE_MODES[self.mode]
+        unknown = set(self.poi) - set(cube.pois)
+        if unknown:
+            logger.warning(f"No temporal distribution for {sorted(unknown)}, spreading their {self.mode} trips evenly")
+        for poi in set(self.poi) & set(cube.pois):
+            for direction in set(self.direction):
+                rows = (self.poi == poi) & (self.direction == direction)
+                poi_dist = cube.distribution(poi, direction, mode)
+                if poi_dist.sum() > 0:
+                    dist[rows] = poi_dist
+        return num_trips[:, None] * dist
+
+    def _bins(self, hours):
+        """Boolean mask of the bins in an hour range [start, end)"""
+        starts = np.arange(self.baseline.shape[1]) * self.bin_minutes / 60
+        if hours is None:
+            return np.ones(len(starts), dtype=bool)
+        return (starts >= hours[0]) & (starts < hours[1])
+
+    def apply(self, scenario):
+        """(trips x bins) weights with the scenario's rules applied"""
+        weights = self.baseline.copy()
+        for rule in scenario.rules:
+            if rule.get('mode', self.mode) != self.mode:
+                continue
+            rows = np.ones(len(weights), dtype=bool)
+            if 'poi' in rule:
+                rows &= self.poi == rule['poi']
+            if 'direction' in rule:
+                rows &= self.direction == rule['direction']
+            bins = self._bins(rule.get('hours'))
+            selected = weights[rows] * bins
+            if 'shift_hours' in rule:
+                shift = int(round(rule['shift_hours'] * 60 / self.bin_minutes))
+                weights[rows] += np.roll(selected, shift, axis=1) - selected
+                selected = np.roll(selected, shift, axis=1)
+            if 'scale' in rule:
+                weights[rows] += selected * (rule['scale'] - 1)
+        return weights
+
+    def segment_loads(self, weights):
+        """(segments x bins) loads for (trips x bins) weights"""
+        route_weights = np.zeros((self.n_routes, weights.shape[1]))
+        np.add.at(route_weights, self.route_index, weights)
+        return self.incidence.loads(route_weights)
+
+
+class ScenarioComparison:
+    """Baseline and scenario loads for every route set"""
+
+    def __init__(self, scenario, route_sets):
+        self.scenario = scenario
+        self.results = {}
+        for name, route_set in route_sets.items():
+            weights = route_set.apply(scenario)
+            self.results[name] = {
+                'route_set': route_set,
+                'baseline_trips': route_set.baseline.sum(axis=0),
+                'scenario_trips': weights.sum(axis=0),
+                'baseline_loads': route_set.segment_loads(route_set.baseline),
+                'scenario_loads': route_set.segment_loads(weights)
+            }
+
+    def segments(self, name):
+        """Per-segment daily and peak-bin loads with deltas, as a GeoDataFrame"""
+        result = self.results[name]
+        incidence = result['route_set'].incidence
+        baseline = result['baseline_loads'].sum(axis=1)
+        scenario = result['scenario_loads'].sum(axis=1)
+        return gpd.GeoDataFrame({
+            'baseline_trips': baseline,
+            'scenario_trips': scenario,
+            'delta': scenario - baseline,
+            'delta_pct': np.divide(scenario - baseline, baseline, out=np.zeros_like(baseline), where=baseline > 0) * 100,
+            'baseline_peak': result['baseline_loads'].max(axis=1),
+            'scenario_peak': result['scenario_loads'].max(axis=1)
+        }, geometry=shapely.linestrings(np.stack([incidence.start, incidence.end], axis=1)), crs="EPSG:4326")
+
+    def hourly(self):
+        """Trips per time bin for every route set, baseline vs scenario"""
+        frames = []
+        for name, result in self.results.items():
+            bin_minutes = result['route_set'].bin_minutes
+            frames.append(pd.DataFrame({
+                'route_set': name,
+                'minute': np.arange(len(result['baseline_trips'])) * bin_minutes,
+                'baseline_trips': result['baseline_trips'],
+                'scenario_trips': result['scenario_trips'],
+                'delta': result['scenario_trips'] - result['baseline_trips']
+            }))
+        return pd.concat(frames, ignore_index=True)
+
+    def summary(self):
+        """Totals and color scales of every route set, baseline vs scenario"""
+        summary = {'scenario': self.scenario.name, 'rules': self.scenario.rules, 'route_sets': {}}
+        for name, result in self.results.items():
+            stats = {}
+            for kind in ['baseline', 'scenario']:
+                loads = result[f'{kind}_loads']
+                mean, std, maximum, bins = load_color_scale(loads[loads > 0]) if (loads > 0).any() else (0, 0, 0, [])
+                stats[kind] = {
+                    'total_trips': float(result[f'{kind}_trips'].sum()),
+                    'peak_minute': int(np.argmax(result[f'{kind}_trips']) * result['route_set'].bin_minutes),
+                    'color_scale': {'mean': float(mean), 'std': float(std), 'max': float(maximum),
+                                    'bin_edges': [float(b) for b in bins]}
+                }
+            stats['delta_trips'] = stats['scenario']['total_trips'] - stats['baseline']['total_trips']
+            summary['route_sets'][name] = stats
+        return summary
+
+    def write(self, output_dir):
+        """Write <scenario>_<route set>_segments.parquet, <scenario>_hourly.csv and <scenario>_summary.json"""
+        os.makedirs(output_dir, exist_ok=True)
+        prefix = os.path.join(output_dir, self.scenario.name)
+        paths = []
+        for name in self.results:
+            path = f"{prefix}_{name}_segments.parquet"
+            self.segments(name).to_parquet(path)
+            paths.append(path)
+        self.hourly().to_csv(f"{prefix}_hourly.csv", index=False)
+        with open(f"{prefix}_summary.json", 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        paths += [f"{prefix}_hourly.csv", f"{prefix}_summary.json"]
+        logger.info(f"Wrote scenario {self.scenario.name} outputs: {', '.join(paths)}")
+        return paths
+
+
+def load_route_sets(output_dir=OUTPUT_DIR, cube=None, modes=('car', 'walk'), directions=('inbound', 'outbound')):
+    """RouteSetLoads for every generated route file found, keyed '<mode>_<direction>'"""
+    cube = cube if cube is not None else TemporalCube.load(TEMPORAL_CUBE_FILE)
+    route_sets = {}
+    for mode in modes:
+        for direction in directions:
+            name = f"{mode}_{direction}"
+            path = route_path(output_dir, f"{mode}_routes_{direction}", ROUTE_FORMAT)
+            try:
+                trips = load_routes(path)
+            except Exception as e:
+                logger.warning(f"Skipping {name} routes: {str(e)}")
+                continue
+            route_sets[name] = RouteSetLoads(
+                mode, trips, cube, incidence_path=os.path.join(output_dir, f"{name}_incidence.npz")
+            )
+            logger.info(f"Loaded {len(trips)} {name} trips over {route_sets[name].n_routes} routes")
+    return route_sets
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Compare road loads under what-if scenarios")
+    parser.add_argument('scenarios', nargs='+', help="Scenario JSON files")
+    parser.add_argument('--output-dir', default=os.path.join(OUTPUT_DIR, 'scenarios'))
+    args = parser.parse_args()
+
+    route_sets = load_route_sets()
+    for path in args.scenarios:
+        comparison = ScenarioComparison(Scenario.load(path), route_sets)
+        comparison.write(args.output_dir)
+        for name, stats in comparison.summary()['route_sets'].items():
+            logger.info(f"{comparison.scenario.name} {name}: {stats['baseline']['total_trips']:.0f} -> "
+                        f"{stats['scenario']['total_trips']:.0f} trips ({stats['delta_trips']:+.0f})")
+
+
+if __name__ == "__main__":
+    main()
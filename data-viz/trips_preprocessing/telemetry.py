@@ -0,0 +1,191 @@
+"""
+Structured instrumentation for route-generation runs.
+
+RunTelemetry collects per-request latency histograms and status counts, retry
+counts, route cache hits, point-sampling and routing failures by reason, and
+per-zone wall time. Zone records and a final summary are appended to a
+JSON-lines report; close() also logs the summary as a table. Worker processes
+keep their own instance and hand drained snapshots back to the parent, which
+merges them.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the request latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RunTelemetry:
+    """Counters, histograms and zone timings for one route-generation run"""
+
+    def __init__(self, report_path=None):
+        self.report_path = report_path
+        self._lock = threading.Lock()
+        self._reset()
+        if report_path:
+            # Start a fresh report for this run
+            os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+            open(report_path, 'w').close()
+
+    def _reset(self):
+        self.latency = {}  # kind -> counts per LATENCY_BUCKETS bucket
+        self.latency_total = Counter()
+        self.statuses = Counter()  # (kind, status) -> count
+        self.retries = Counter()
+        self.cache = Counter()  # (kind, 'hit'|'miss') -> count
+        self.point_failures = Counter()
+        self.route_failures = Counter()
+        self.zones = []
+
+    def request(self, kind, latency, status):
+        """Record one request; status is the HTTP status code, 'timeout' or 'error'"""
+        with self._lock:
+            self.statuses[(kind, str(status))] += 1
+            if latency is not None:
+                buckets = self.latency.setdefault(kind, [0] * (len(LATENCY_BUCKETS) + 1))
+                buckets[int(np.searchsorted(LATENCY_BUCKETS, latency))] += 1
+                self.latency_total[kind] += latency
+
+    def retry(self, kind):
+        with self._lock:
+            self.retries[kind] += 1
+
+    def cache_lookup(self, kind, hit):
+        with self._lock:
+            self.cache[(kind, 'hit' if hit else 'miss')] += 1
+
+    def point_failure(self, reason):
+        """Record a rejected origin/destination sample"""
+        with self._lock:
+            self.point_failures[reason] += 1
+
+    def route_failure(self, reason):
+        """Record a route request that produced no usable route"""
+        with self._lock:
+            self.route_failures[reason] += 1
+
+    @contextmanager
+    def zone(self, **fields):
+        """Time one zone's generation; callers may add fields (e.g. routes) to the yielded record"""
+        record = dict(fields)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 4)
+            self._add_zone(record)
+
+    def _add_zone(self, record):
+        with self._lock:
+            self.zones.append(record)
+        self._write({'event': 'zone', **record})
+
+    def _write(self, record):
+        if self.report_path:
+            with self._lock, open(self.report_path, 'a') as f:
+                f.write(json.dumps(record, default=str) + '\n')
+
+    def drain(self):
+        """Snapshot of everything recorded so far, resetting the counters"""
+        with self._lock:
+            snapshot = {
+                'latency': self.latency,
+                'latency_total': self.latency_total,
+                'statuses': self.statuses,
+                'retries': self.retries,
+                'cache': self.cache,
+                'point_failures': self.point_failures,
+                'route_failures': self.route_failures,
+                'zones': self.zones
+            }
+            self._reset()
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add a drained snapshot from another instance, e.g. a worker process"""
+        with self._lock:
+            for kind, buckets in snapshot['latency'].items():
+                merged = self.latency.setdefault(kind, [0] * (len(LATENCY_BUCKETS) + 1))
+                self.latency[kind] = [a + b for a, b in zip(merged, buckets)]
+            for name in ['latency_total', 'statuses', 'retries', 'cache', 'point_failures', 'route_failures']:
+                getattr(self, name).update(snapshot[name])
+        for record in snapshot['zones']:
+            self._add_zone(record)
+
+    def latency_quantile(self, kind, q):
+        """Approximate latency quantile (bucket upper bound) for a request kind"""
+        buckets = np.array(self.latency.get(kind, []))
+        if not buckets.sum():
+            return None
+        index = int(np.searchsorted(np.cumsum(buckets), q * buckets.sum()))
+        return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else float('inf')
+
+    def summary(self):
+        """Aggregated run statistics per request kind plus failure breakdowns"""
+        with self._lock:
+            kinds = sorted({kind for kind, _ in self.statuses} | set(self.retries) | {kind for kind, _ in self.cache})
+            requests_by_kind = {
+                kind: {
+                    'requests': sum(n for (k, _), n in self.statuses.items() if k == kind),
+                    'statuses': {s: n for (k, s), n in self.statuses.items() if k == kind},
+                    'retries': self.retries[kind],
+                    'cache_hits': self.cache[(kind, 'hit')],
+                    'cache_misses': self.cache[(kind, 'miss')],
+                    'latency_buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['inf'],
+                                                self.latency.get(kind, []))),
+                    'mean_latency': (self.latency_total[kind] / sum(self.latency[kind])
+                                     if sum(self.latency.get(kind, [])) else None)
+                }
+                for kind in kinds
+            }
+            zone_seconds = [z['seconds'] for z in self.zones]
+            summary = {
+                'requests': requests_by_kind,
+                'point_failures': dict(self.point_failures),
+                'route_failures': dict(self.route_failures),
+                'zones': len(self.zones),
+                'zone_seconds_total': round(sum(zone_seconds), 3),
+                'zone_seconds_max': round(max(zone_seconds), 3) if zone_seconds else None
+            }
+        for kind, stats in summary['requests'].items():
+            stats['p50_latency'] = self.latency_quantile(kind, 0.5)
+            stats['p95_latency'] = self.latency_quantile(kind, 0.95)
+        return summary
+
+    def summary_table(self):
+        """Summary as a two-column (metric, value) table"""
+        summary = self.summary()
+        rows = []
+        for kind, stats in summary['requests'].items():
+            rows += [
+                (f"{kind} requests", stats['requests']),
+                (f"{kind} retries", stats['retries']),
+                (f"{kind} p50 / p95 latency (s)", f"{stats['p50_latency']} / {stats['p95_latency']}"),
+                (f"{kind} statuses", ', '.join(f"{s}: {n}" for s, n in sorted(stats['statuses'].items())))
+            ]
+            lookups = stats['cache_hits'] + stats['cache_misses']
+            if lookups:
+                rows.append((f"{kind} cache hit rate", f"{stats['cache_hits'] / lookups:.1%}"))
+        rows += [(f"point rejected: {reason}", n) for reason, n in sorted(summary['point_failures'].items())]
+        rows += [(f"route failed: {reason}", n) for reason, n in sorted(summary['route_failures'].items())]
+        rows += [
+            ("zones", summary['zones']),
+            ("zone wall time total / max (s)", f"{summary['zone_seconds_total']} / {summary['zone_seconds_max']}")
+        ]
+        return pd.DataFrame(rows, columns=['metric', 'value'])
+
+    def close(self):
+        """Append the summary to the report and log it as a table"""
+        self._write({'event': 'summary', **self.summary()})
+        logger.info("\nRouting run summary:\n" + self.summary_table().to_string(index=False))
+        if self.report_path:
+            logger.info(f"Run report written to {self.report_path}")
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pytest
+from shapely.geometry import LineString, box
+
+
+@pytest.fixture
+def poi_boxes():
+    """Three POI polygons around central Beer Sheva, tagged with their IDs"""
+    return gpd.GeoDataFrame({'ID': [7, 11, 12]}, geometry=[
+        box(34.795, 31.259, 34.802, 31.265),
+        box(34.799, 31.255, 34.804, 31.258),
+        box(34.810, 31.262, 34.816, 31.267)
+    ], crs="EPSG:4326")
+
+
+@pytest.fixture
+def random_routes():
+    """Factory of random walks on a street grid, so routes share segments in both directions"""
+    moves = np.array([[1, 0], [-1, 0], [0, 1], [0, -1]])
+
+    def make_routes(n=300, step=1e-4):
+        rng = np.random.default_rng(0)
+        routes = []
+        for _ in range(n):
+            walk = moves[rng.integers(0, 4, rng.integers(5, 80))] * step
+            start = np.round(rng.uniform(0, 100, 2)) * 1e-4
+            routes.append(LineString(np.vstack([start, start + np.cumsum(walk, axis=0)]) + [34.78, 31.25]))
+        return routes
+    return make_routes
+
+
+@pytest.fixture
+def walk_inputs():
+    """Five walking routes from two zones and hourly pedestrian distributions for their POIs"""
+    routes = pd.DataFrame({
+        'route_id': [f"r{i}" for i in range(5)],
+        'route_key': ['a', 'b', 'a', 'c', 'd'],
+        'origin_zone': [1, 1, 1, 2, 2],
+        'destination': ['BGU', 'BGU', 'BGU', 'BGU', 'Soroka'],
+        'num_trips': [1, 2, 1, 1, 3]
+    })
+    hours = np.arange(24)
+    temporal = pd.concat([
+        pd.DataFrame({'hour': hours, 'destination': 'BGU',
+                      'pedestrian_dist': np.where((hours >= 7) & (hours < 11), 0.25, 0.0)}),
+        pd.DataFrame({'hour': hours, 'destination': 'Soroka',
+                      'pedestrian_dist': np.where(hours == 9, 1.0, 0.0)})
+    ])
+    return routes, temporal
@@ -0,0 +1,41 @@
+import numpy as np
+import geopandas as gpd
+from shapely.geometry import Point, box
+from ..amenity_index import AmenityIndex
+
+
+def brute_force(coords, origin, destination, max_detour_factor):
+    total = (
+        np.sqrt(np.sum((coords - [origin.x, origin.y])**2, axis=1)) +
+        np.sqrt(np.sum((coords - [destination.x, destination.y])**2, axis=1))
+    )
+    return np.where(total <= origin.distance(destination) * max_detour_factor)[0]
+
+
+class TestAmenityIndex:
+    def setup_method(self):
+        rng = np.random.default_rng(3)
+        self.coords = rng.uniform([34.75, 31.22], [34.85, 31.30], size=(2000, 2))
+        self.index = AmenityIndex(gpd.GeoDataFrame(geometry=[Point(xy) for xy in self.coords], crs="EPSG:4326"))
+        self.rng = rng
+
+    def test_matches_full_scan(self):
+        """Zone prefilter and ellipse bounding box never drop a valid amenity"""
+        zone = box(34.78, 31.24, 34.79, 31.25)
+        entrances = [Point(34.80, 31.262), Point(34.81, 31.255)]
+        for factor in [1.0, 1.2, 1.5, 2.0]:
+            candidates = self.index.zone_candidates(zone.bounds, entrances, factor)
+            for _ in range(50):
+                origin = Point(self.rng.uniform(34.78, 34.79), self.rng.uniform(31.24, 31.25))
+                destination = entrances[self.rng.integers(len(entrances))]
+                expected = brute_force(self.coords, origin, destination, factor)
+                np.testing.assert_array_equal(
+                    self.index.ellipse_candidates(origin, destination, factor, candidates), expected
+                )
+                np.testing.assert_array_equal(self.index.ellipse_candidates(origin, destination, factor), expected)
+
+    def test_zone_candidates_are_a_subset(self):
+        zone = box(34.78, 31.24, 34.79, 31.25)
+        candidates = self.index.zone_candidates(zone.bounds, [Point(34.795, 31.245)], 1.5)
+        assert 0 < len(candidates) < len(self.index)
+        assert np.all(np.diff(candidates) > 0)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import geopandas as gpd
+from shapely.geometry import LineString, Point, box
+from ..avoidance import AvoidanceIndex
+
+
+class TestAvoidanceIndex:
+    @pytest.fixture
+    def index(self):
+        """BGU (7) west of Soroka (11), 0.01 degrees apart"""
+        poi_polygons = gpd.GeoDataFrame(
+            {'ID': [7, 11]},
+            geometry=[box(34.79, 31.26, 34.80, 31.27), box(34.81, 31.26, 34.82, 31.27)],
+            crs="EPSG:4326"
+        )
+        return AvoidanceIndex(poi_polygons)
+
+    def test_walk_sets_are_cached_per_poi_pair(self, index):
+        """The avoid string is built once per origin/destination pair"""
+        to_bgu = index.walk(destination_poi='Ben-Gurion-University')
+        assert index.walk(destination_poi='Ben-Gurion-University') is to_bgu
+        assert to_bgu.ids == [11]
+        assert to_bgu.avoid_str.endswith('::1000000')
+        assert len(index.walk()) == 2
+
+    def test_car_set_skips_polygons_containing_endpoints(self, index):
+        """Car requests may cross a POI they start or end in"""
+        avoidance = index.car(Point(34.795, 31.265), Point(34.85, 31.265))
+        assert avoidance.ids == [11]
+        assert avoidance.polygons[0]['penalty'] == pytest.approx(1e8 + 1e-4 * 1e7)
+
+    def test_crossed_uses_exact_intersection(self, index):
+        """Lines whose bounding box overlaps a polygon but never enter it are allowed"""
+        avoidance = index.walk()
+        assert avoidance.crossed(LineString([(34.785, 31.265), (34.805, 31.265)])) == 7
+        # Diagonal line whose bounds cover the Soroka box corner but passes beside it
+        assert avoidance.crossed(LineString([(34.805, 31.255), (34.812, 31.259), (34.83, 31.259)])) is None
+
+    def test_crossings_respect_allowed_poi_per_route(self, index):
+        """Whole-file validation allows each route to cross its own POI"""
+        lines = [
+            LineString([(34.785, 31.265), (34.795, 31.265)]),  # enters BGU
+            LineString([(34.785, 31.265), (34.795, 31.265)]),
+            LineString([(34.785, 31.25), (34.83, 31.25)])      # clear of both
+        ]
+        allowed = ['Ben-Gurion-University', 'Soroka-Medical-Center', None]
+        np.testing.assert_array_equal(index.crossings(lines, allowed), [-1, 7, -1])
@@ -0,0 +1,44 @@
+import threading
+import geopandas as gpd
+import pytest
+from shapely.geometry import Polygon
+from ..batch_router import BatchRouter
+from ..local_router import LocalRouter
+from .test_local_router import make_grid_edges
+
+
+class RecordingClient:
+    """Per-pair client without native batch support"""
+
+    def __init__(self):
+        self.threads = set()
+
+    def get_car_route(self, from_lat, from_lon, to_lat, to_lon, destination_poi=None):
+        self.threads.add(threading.get_ident())
+        return {'from': (from_lat, from_lon), 'to': (to_lat, to_lon)}
+
+
+class TestBatchRouter:
+    def test_parallel_fallback_keeps_order(self):
+        client = RecordingClient()
+        origins = [(31.25 + i * 1e-4, 34.79) for i in range(40)]
+        results = BatchRouter(client, workers=4, progress=False).many_to_one(origins, 31.26, 34.80)
+
+        assert [r['from'] for r in results] == origins
+        assert all(r['to'] == (31.26, 34.80) for r in results)
+        assert len(client.threads) > 1
+
+    def test_native_batch_matches_single_routes(self):
+        """One shortest-path tree per avoidance set gives the same routes as per-pair calls"""
+        soroka = Polygon([(34.7915, 31.2515), (34.7925, 31.2515), (34.7925, 31.2525), (34.7915, 31.2525)])
+        poi_polygons = gpd.GeoDataFrame({'ID': [11]}, geometry=[soroka], crs="EPSG:4326")
+        router = LocalRouter(edges=make_grid_edges(), poi_polygons=poi_polygons)
+        batch = BatchRouter(router, progress=False)
+        assert batch.native
+
+        destinations = [(31.25, 34.79), (31.254, 34.794), (31.252, 34.79), (31.252, 34.792)]  # Last one inside Soroka
+        batched = batch.one_to_many(31.254, 34.79, destinations)
+        for (lat, lon), route in zip(destinations, batched):
+            single = router.get_car_route(31.254, 34.79, lat, lon)
+            leg = route['plan']['itineraries'][0]['legs'][0]
+            assert leg['duration'] == pytest.approx(single['plan']['itineraries'][0]['legs'][0]['duration'])
@@ -0,0 +1,97 @@
+import os
+import base64
+import numpy as np
+import pytest
+from utils.binary_transport import (
+    BinaryBundle, ALIGNMENT, check_transport, counter_clockwise, flatten_paths
+)
+
+
+def decode(manifest, sidecar=None):
+    """Buffers of a manifest as {(table, column): array}, as the page loader reads them"""
+    arrays = {}
+    for entry in manifest['buffers']:
+        dtype = {'Float32Array': np.float32, 'Uint32Array': np.uint32, 'Uint8Array': np.uint8}[entry['type']]
+        if sidecar is not None:
+            values = np.frombuffer(sidecar, dtype=dtype, count=entry['count'], offset=entry['offset'])
+        else:
+            values = np.frombuffer(base64.b64decode(entry['base64']), dtype=dtype)
+        arrays[entry['table'], entry['column']] = values
+    return arrays
+
+
+def make_bundle():
+    bundle = BinaryBundle()
+    trips = bundle.add_paths('trips', [[[34.7, 31.2], [34.8, 31.3]], [[34.75, 31.25], [34.76, 31.26], [34.77, 31.27]]])
+    trips.add('timestamps', [0, 1000, 2000, 2500, 3000], np.uint32, as_float=True)
+    trips.add('colors', np.full((5, 4), 200), np.uint8)
+    trips.add('poi', [1, 0], np.uint8)
+    return bundle
+
+
+class TestBinaryTransport:
+    def test_flatten_paths(self):
+        positions, offsets = flatten_paths([[[0, 0], [1, 1]], [], [[2, 2, 5], [3, 3, 5], [4, 4, 5]]], dims=3)
+        assert offsets.tolist() == [0, 2, 2, 5]
+        assert positions.dtype == np.float32
+        assert positions[:, 2].tolist() == [0, 0, 5, 5, 5]
+
+    def test_counter_clockwise(self):
+        clockwise = [[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]
+        ccw = [[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]
+        positions, offsets = flatten_paths([clockwise, ccw])
+        result = counter_clockwise(positions, offsets)
+        assert result[:5].tolist() == clockwise[::-1]
+        assert result[5:].tolist() == ccw
+
+    def test_bin_sidecar_round_trip(self, tmp_path):
+        html_path = os.path.join(tmp_path, 'page.html')
+        manifest = make_bundle().write(html_path, 'bin')
+        assert manifest['url'] == 'page.bin'
+        assert manifest['tables'] == {'trips': {'length': 2, 'paths': True}}
+        with open(os.path.join(tmp_path, 'page.bin'), 'rb') as f:
+            sidecar = f.read()
+        assert all(entry['offset'] % ALIGNMENT == 0 for entry in manifest['buffers'])
+
+        arrays = decode(manifest, sidecar)
+        assert arrays['trips', 'startIndices'].tolist() == [0, 2]
+        assert arrays['trips', 'timestamps'].tolist() == [0, 1000, 2000, 2500, 3000]
+        np.testing.assert_allclose(arrays['trips', 'positions'].reshape(-1, 2)[2], [34.75, 31.25], rtol=1e-6)
+        timestamps = next(entry for entry in manifest['buffers'] if entry['column'] == 'timestamps')
+        assert timestamps['float'] and timestamps['type'] == 'Uint32Array'
+
+    def test_base64_round_trip(self, tmp_path):
+        manifest = make_bundle().write(os.path.join(tmp_path, 'page.html'), 'base64')
+        assert 'url' not in manifest and os.listdir(tmp_path) == []
+        arrays = decode(manifest)
+        assert arrays['trips', 'poi'].tolist() == [1, 0]
+        colors = next(entry for entry in manifest['buffers'] if entry['column'] == 'colors')
+        assert colors['size'] == 4 and colors['count'] == 20
+
+    def test_report_compares_sizes(self, tmp_path):
+        bundle = make_bundle()
+        payload = '{"trips": [[34.7, 31.2], [34.8, 31.3]]}'
+        stats = bundle.report(payload, bundle.write(os.path.join(tmp_path, 'page.html'), 'bin'))
+        assert stats['json_bytes'] == len(payload)
+        assert stats['sidecar_bytes'] == bundle.nbytes
+        assert bundle.report(payload, bundle.write(os.path.join(tmp_path, 'page.html'), 'base64'))['sidecar_bytes'] == 0
+
+    def test_polygon_features_per_vertex(self):
+        bundle = BinaryBundle()
+        table = bundle.add_polygon_features('buildings', [
+            {'polygon': [[0, 0], [0, 1], [1, 1], [0, 0]], 'height': 12.0, 'color': [1, 2, 3, 4]},
+            {'polygon': [[5, 5], [6, 5], [6, 6], [5, 6], [5, 5]], 'height': 30.0, 'color': [9, 9, 9, 9]}
+        ])
+        assert table.offsets.tolist() == [0, 4, 9]
+        assert table.columns['heights'].tolist() == [12.0] * 4 + [30.0] * 5
+        assert table.columns['colors'][3].tolist() == [1, 2, 3, 4]
+        # The clockwise first ring is reversed for deck.gl
+        assert table.columns['positions'][1].tolist() == [1, 1]
+
+    def test_rejects_bad_input(self):
+        with pytest.raises(ValueError):
+            check_transport('msgpack')
+        with pytest.raises(ValueError):
+            make_bundle().tables['trips'].add('widths', [1, 2, 3], np.float32)
+        with pytest.raises(ValueError):
+            make_bundle().write('page.html', 'json')
@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import geopandas as gpd
+import pytest
+from shapely.geometry import box, MultiPolygon
+from utils.building_artifact import BuildingArtifact, NO_POI
+
+
+class TestBuildingArtifact:
+    @pytest.fixture
+    def pois(self, poi_boxes):
+        return poi_boxes.iloc[:2]
+
+    @pytest.fixture
+    def make_buildings(self):
+        """Factory of random box footprints with heights, partly inside the POIs"""
+        def make_buildings(n=300):
+            rng = np.random.default_rng(0)
+            x, y = rng.uniform(34.79, 34.81, n), rng.uniform(31.25, 31.27, n)
+            return gpd.GeoDataFrame({'height': rng.uniform(3, 30, n)},
+                                    geometry=[box(a, b, a + 0.0004, b + 0.0003) for a, b in zip(x, y)],
+                                    crs="EPSG:4326")
+        return make_buildings
+
+    def test_matches_per_building_loop(self, make_buildings, pois):
+        buildings = make_buildings()
+        artifact = BuildingArtifact.from_geodataframe(buildings, pois)
+        assert len(artifact) == len(buildings)
+
+        rings = artifact.rings()
+        for i, building in buildings.iterrows():
+            expected = NO_POI
+            for _, poi in pois.iterrows():
+                if building.geometry.intersects(poi.geometry):
+                    expected = poi['ID']
+                    break
+            assert artifact.poi_ids[i] == expected
+            assert rings[i] == [list(c) for c in building.geometry.exterior.coords]
+            np.testing.assert_allclose(artifact.centroids[i], building.geometry.centroid.coords[0])
+        np.testing.assert_allclose(artifact.heights, buildings['height'])
+        assert (artifact.poi_ids != NO_POI).any()
+
+    def test_features_and_near(self, make_buildings, pois):
+        artifact = BuildingArtifact.from_geodataframe(make_buildings(20), pois)
+        in_poi = artifact.poi_ids != NO_POI
+        colors = [[1, 2, 3, 4]] * len(artifact)
+        features = artifact.features(artifact.heights * 2, colors, mask=in_poi)
+        assert len(features) == in_poi.sum()
+        assert features[0]['height'] == pytest.approx(2 * artifact.heights[in_poi][0])
+
+        near = artifact.near([artifact.centroids[3], (0, 0)], 1e-9)
+        assert near[3] == 0 and (np.delete(near, 3) == -1).all()
+
+    def test_multipart_and_missing_geometries(self, pois):
+        buildings = gpd.GeoDataFrame({'height': [10, 12, 5]}, geometry=[
+            MultiPolygon([box(34.796, 31.26, 34.797, 31.261), box(34.80, 31.256, 34.801, 31.257)]),
+            None,
+            box(34.70, 31.20, 34.701, 31.201)
+        ], crs="EPSG:4326")
+        artifact = BuildingArtifact.from_geodataframe(buildings, pois)
+        assert artifact.poi_ids.tolist() == [7, 11, NO_POI]
+        assert artifact.heights.tolist() == [10, 10, 5]
+        assert artifact.offsets.tolist() == [0, 5, 10, 15]
+
+    def test_cached_rebuilds_when_stale(self, make_buildings, pois, tmp_path):
+        source = str(tmp_path / "buildings.geojson")
+        path = str(tmp_path / "buildings_artifact.npz")
+        make_buildings(10).to_file(source, driver='GeoJSON')
+
+        artifact = BuildingArtifact.cached(path, source, pois)
+        assert os.path.exists(path)
+        assert artifact.crs == "EPSG:4326"
+
+        # A subset of the tagged POIs reuses the artifact, an untagged one rebuilds it
+        loaded = BuildingArtifact.cached(path, source, pois.iloc[:1])
+        np.testing.assert_array_equal(loaded.poi_ids, artifact.poi_ids)
+        mtime = os.path.getmtime(path)
+        other = pois.assign(ID=[7, 12])
+        assert (BuildingArtifact.cached(path, source, other).poi_ids != 11).all()
+
+        # A newer buildings file rebuilds it
+        make_buildings(12).to_file(source, driver='GeoJSON')
+        os.utime(source, (mtime + 10, mtime + 10))
+        assert len(BuildingArtifact.cached(path, source)) == 12
@@ -0,0 +1,61 @@
+import math
+import numpy as np
+from utils.colormap import (
+    COLOR_SCHEMES, Colormap, get_colormap, road_usage_colors, temporal_load_colors
+)
+
+
+def interpolate_loop(stops, t):
+    """Per-value reference: linear interpolation between the enclosing color stops"""
+    lower = max(k for k in stops if k <= t)
+    upper = min(k for k in stops if k >= t)
+    ratio = (t - lower) / (upper - lower) if upper != lower else 0
+    return [stops[lower][c] + (stops[upper][c] - stops[lower][c]) * ratio for c in range(3)]
+
+
+def road_usage_loop(t, distance_ratio):
+    """Former per-segment road usage color"""
+    smoothing = math.exp(-4 * (distance_ratio - 0.5) ** 2)
+    brightness = 0.7 + 0.3 * smoothing
+    rgb = interpolate_loop(COLOR_SCHEMES['road_usage'], np.cbrt(t))
+    return [min(255, int(c * brightness)) for c in rgb] + [min(255, int(255 * brightness))]
+
+
+def temporal_load_loop(value, bins, temporal_weight):
+    """Former per-value hourly load color"""
+    position = (np.digitize(value, bins) - 1) / (len(bins) - 1)
+    position = 1 / (1 + np.exp(-5 * (position - 0.5)))
+    position = min(1.0, position * (1 + min(0.3, temporal_weight)))
+    rgb = interpolate_loop(COLOR_SCHEMES['temporal_load'], position)
+    boost = 1 + temporal_weight * 0.2
+    return [min(255, int(c * boost)) for c in rgb] + [min(255, int(200 + temporal_weight * 55))]
+
+
+class TestColormap:
+    def test_lut_hits_stops(self):
+        colormap = Colormap(COLOR_SCHEMES['road_usage'], size=11)
+        np.testing.assert_allclose(colormap.rgb([0.0, 0.2, 1.0]), [[20, 42, 120], [40, 80, 180], [255, 255, 0]])
+        assert get_colormap('road_usage') is get_colormap('road_usage')
+
+    def test_scales(self):
+        colormap = get_colormap('road_usage')
+        np.testing.assert_array_equal(colormap.rgb([0.008], scale='cbrt'), colormap.rgb([0.2]))
+        np.testing.assert_array_equal(colormap.rgb([1.0], scale='log'), colormap.rgb([1.0]))
+        # Out-of-range values are clipped to the ends of the table
+        np.testing.assert_array_equal(colormap.rgb([-1, 2]), colormap.rgb([0, 1]))
+
+    def test_road_usage_matches_loop(self):
+        rng = np.random.default_rng(0)
+        ratios, positions = rng.uniform(0, 1, 2000) ** 3, rng.uniform(0, 1, 2000)
+        colors = road_usage_colors(ratios, positions)
+        expected = np.array([road_usage_loop(t, d) for t, d in zip(ratios, positions)])
+        assert colors.dtype == np.uint8 and colors.shape == (2000, 4)
+        assert np.abs(colors.astype(int) - expected).max() <= 1
+
+    def test_temporal_load_matches_loop(self):
+        rng = np.random.default_rng(1)
+        bins = np.sort(rng.uniform(0, 1000, 11))
+        loads, weights = rng.uniform(0, 1000, 2000), rng.exponential(0.3, 2000)
+        colors = temporal_load_colors(loads, (0, 0, 1000, bins), weights)
+        expected = np.array([temporal_load_loop(v, bins, w) for v, w in zip(loads, weights)])
+        assert np.abs(colors.astype(int) - expected).max() <= 1
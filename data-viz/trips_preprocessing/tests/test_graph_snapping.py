@@ -0,0 +1,41 @@
+import numpy as np
+from ..graph_snapping import GraphAccess, GraphSnapIndex, export_edges
+from .test_local_router import make_grid_edges, GRID_STEP
+
+
+class TestGraphSnapIndex:
+    def test_distance_to_edges(self):
+        """Points near a street are accessible, points in the middle of a block are not"""
+        index = GraphSnapIndex(make_grid_edges(), mode='car', max_distance=20.0, cell_size=5.0)
+        on_street = (31.25 + GRID_STEP, 34.79 + GRID_STEP * 0.5)
+        mid_block = (31.25 + GRID_STEP * 0.5, 34.79 + GRID_STEP * 0.5)
+        far_away = (31.30, 34.85)
+
+        result = index.accessible_many(*zip(on_street, mid_block, far_away))
+        np.testing.assert_array_equal(result, [True, False, False])
+
+        # Repeat queries in the same cell are served from the grid cache
+        assert index.accessible(*on_street)
+        assert index.hits == 1 and index.misses == 3
+
+    def test_mode_filter_and_export(self, tmp_path):
+        edges = make_grid_edges()
+        edges['highway'] = 'footway'
+        edges.to_parquet(tmp_path / "source.parquet")
+        path = export_edges(str(tmp_path / "source.parquet"), str(tmp_path / "edges.parquet"))
+        point = (31.25, 34.79 + GRID_STEP * 0.5)
+        assert GraphSnapIndex.from_file(path, mode='walk').accessible(*point)
+        assert not GraphSnapIndex.from_file(path, mode='car').accessible(*point)
+
+    def test_access_indexes_are_kept_per_mode(self, tmp_path):
+        """Each travel mode gets its own index, whichever mode is asked for first"""
+        edges = make_grid_edges()
+        edges['highway'] = 'footway'
+        edges.to_parquet(tmp_path / "edges.parquet")
+        access = GraphAccess(str(tmp_path / "edges.parquet"))
+        point = (31.25, 34.79 + GRID_STEP * 0.5)
+
+        assert access.accessible(*point, mode='walk')
+        assert not access.accessible(*point, mode='car')
+        assert access.accessible(*point, mode='walk')
+        assert set(access.indexes) == {'walk', 'car'}
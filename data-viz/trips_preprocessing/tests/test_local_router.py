@@ -0,0 +1,115 @@
+import pytest
+import geopandas as gpd
+import numpy as np
+import polyline
+from shapely.geometry import LineString, Polygon
+from ..local_router import LocalRouter
+
+GRID_STEP = 0.001  # about 100 meters
+
+
+def make_grid_edges(size=5):
+    """Residential street grid with (size x size) intersections"""
+    records = []
+
+    def node(i, j):
+        return i * size + j
+
+    for i in range(size):
+        for j in range(size):
+            x, y = 34.79 + j * GRID_STEP, 31.25 + i * GRID_STEP
+            if j + 1 < size:
+                records.append({'u': node(i, j), 'v': node(i, j + 1),
+                                'geometry': LineString([(x, y), (x + GRID_STEP, y)])})
+            if i + 1 < size:
+                records.append({'u': node(i, j), 'v': node(i + 1, j),
+                                'geometry': LineString([(x, y), (x, y + GRID_STEP)])})
+    edges = gpd.GeoDataFrame(records, crs="EPSG:4326")
+    edges['highway'] = 'residential'
+    edges['oneway'] = 'no'
+    edges['length'] = GRID_STEP * 111000
+    return edges
+
+
+class TestLocalRouter:
+    @pytest.fixture
+    def poi_polygons(self):
+        """Soroka polygon covering the centre of the grid"""
+        center = Polygon([
+            (34.7915, 31.2515), (34.7925, 31.2515),
+            (34.7925, 31.2525), (34.7915, 31.2525)
+        ])
+        return gpd.GeoDataFrame({'ID': [11]}, geometry=[center], crs="EPSG:4326")
+
+    @pytest.fixture
+    def router(self, poi_polygons):
+        return LocalRouter(edges=make_grid_edges(), poi_polygons=poi_polygons)
+
+    def test_response_matches_otp_shape(self, router):
+        """Responses decode the same way the trip generators decode OTP plans"""
+        route = router.get_walking_route(31.25, 34.79, 31.254, 34.794)
+        leg = route['plan']['itineraries'][0]['legs'][0]
+        points = polyline.decode(leg['legGeometry']['points'])
+
+        assert points[0] == pytest.approx((31.25, 34.79), abs=1e-5)
+        assert points[-1] == pytest.approx((31.254, 34.794), abs=1e-5)
+        # Eight blocks of ~111 m at walking speed
+        assert leg['duration'] == pytest.approx(8 * GRID_STEP * 111000 / 1.4)
+
+    def test_avoided_polygon_is_not_crossed(self, router, poi_polygons):
+        """Routes detour around POIs that are neither origin nor destination"""
+        route = router.get_walking_route(31.252, 34.79, 31.252, 34.794)
+        points = polyline.decode(route['plan']['itineraries'][0]['legs'][0]['legGeometry']['points'])
+        line = LineString([(lon, lat) for lat, lon in points])
+        assert not line.intersects(poi_polygons.geometry.iloc[0])
+
+        allowed = router.get_walking_route(
+            31.252, 34.79, 31.252, 34.794, destination_poi='Soroka-Medical-Center'
+        )
+        assert allowed['plan']['itineraries'][0]['duration'] < route['plan']['itineraries'][0]['duration']
+
+    def test_many_to_one_uses_single_tree(self, router):
+        """All origins routed to one entrance share one cached Dijkstra tree"""
+        origins = [(31.25, 34.79), (31.254, 34.79), (31.25, 34.794)]
+        routes = router.route_many_to_one('walk', origins, 31.254, 34.794)
+
+        assert all(r is not None for r in routes)
+        assert len(router._trees) == 1
+        durations = [r['plan']['itineraries'][0]['duration'] for r in routes]
+        assert np.argmax(durations) == 0
+
+    def test_parallel_arc_around_polygon_is_used(self, poi_polygons):
+        """Of two parallel arcs, a slower one that avoids the polygon beats a faster one through it"""
+        through = LineString([(34.790, 31.252), (34.794, 31.252)])
+        around = LineString([(34.790, 31.252), (34.792, 31.2535), (34.794, 31.252)])
+        edges = gpd.GeoDataFrame({'u': [0, 0], 'v': [1, 1]}, geometry=[through, around], crs="EPSG:4326")
+        edges['highway'] = 'residential'
+        edges['oneway'] = 'no'
+        edges['length'] = [400.0, 450.0]
+        router = LocalRouter(edges=edges, poi_polygons=poi_polygons)
+
+        route = router.get_walking_route(31.252, 34.790, 31.252, 34.794)
+        leg = route['plan']['itineraries'][0]['legs'][0]
+        line = LineString([(lon, lat) for lat, lon in polyline.decode(leg['legGeometry']['points'])])
+        assert not line.intersects(poi_polygons.geometry.iloc[0])
+        assert leg['duration'] == pytest.approx(450.0 / 1.4)
+
+        # Without avoidance the faster arc is still taken
+        allowed = router.get_walking_route(31.252, 34.790, 31.252, 34.794, destination_poi='Soroka-Medical-Center')
+        assert allowed['plan']['itineraries'][0]['duration'] == pytest.approx(400.0 / 1.4)
+
+    def test_route_through_polygon_without_detour_is_rejected(self, poi_polygons):
+        """When avoidance cannot find a detour the route is dropped, as the OTP clients drop it"""
+        through = LineString([(34.790, 31.252), (34.794, 31.252)])
+        edges = gpd.GeoDataFrame({'u': [0], 'v': [1]}, geometry=[through], crs="EPSG:4326")
+        edges['highway'] = 'residential'
+        edges['oneway'] = 'no'
+        edges['length'] = 400.0
+        router = LocalRouter(edges=edges, poi_polygons=poi_polygons)
+
+        assert router.get_walking_route(31.252, 34.790, 31.252, 34.794) is None
+        assert router.route_many_to_one('walk', [(31.252, 34.790)], 31.252, 34.794,
+                                        router.avoidance.walk()) == [None]
+        # Routes to the polygon's own POI may cross it
+        allowed = router.get_walking_route(31.252, 34.790, 31.252, 34.794, destination_poi='Soroka-Medical-Center')
+        assert allowed['plan']['itineraries'][0]['duration'] == pytest.approx(400.0 / 1.4)
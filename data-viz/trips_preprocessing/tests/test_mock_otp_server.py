@@ -0,0 +1,52 @@
+import json
+import pytest
+import polyline
+import requests
+from ..mock_otp_server import MockOTPServer, MockOTPConfig, FixtureStore
+
+
+def plan_params(from_place="31.25,34.79", to_place="31.26,34.80", mode='WALK'):
+    return {'fromPlace': from_place, 'toPlace': to_place, 'mode': mode}
+
+
+class TestMockOTPServer:
+    def test_synthetic_plan_matches_otp_shape(self):
+        """Synthetic plans decode the same way the trip generators decode OTP plans"""
+        with MockOTPServer() as server:
+            assert requests.get(f"{server.base_url}/serverinfo").status_code == 200
+            data = requests.get(f"{server.base_url}/plan", params=plan_params()).json()
+
+        leg = data['plan']['itineraries'][0]['legs'][0]
+        points = polyline.decode(leg['legGeometry']['points'])
+        assert points[0] == pytest.approx((31.25, 34.79), abs=1e-5)
+        assert points[-1] == pytest.approx((31.26, 34.80), abs=1e-5)
+        assert leg['duration'] == pytest.approx(leg['distance'] / 1.4)
+
+    def test_recorded_fixture_is_served(self, tmp_path):
+        """Recorded responses take precedence over the synthetic grid"""
+        recorded = {'plan': {'itineraries': []}, 'recorded': True}
+        fixtures = tmp_path / "plans.jsonl"
+        fixtures.write_text(json.dumps({'params': plan_params(), 'response': recorded}) + "\n")
+
+        config = MockOTPConfig(fixtures=FixtureStore(str(fixtures)), synthetic=False)
+        with MockOTPServer(config=config) as server:
+            hit = requests.get(f"{server.base_url}/plan", params={**plan_params(), 'time': '09:00:00'}).json()
+            miss = requests.get(f"{server.base_url}/plan", params=plan_params(mode='CAR')).json()
+            stats = server.stats
+
+        assert hit == recorded
+        assert 'error' in miss
+        assert stats == {'fixture': 1, 'missing': 1}
+
+    def test_fault_injection(self):
+        """Error and rate limit rates produce 500 and 429 responses"""
+        config = MockOTPConfig(rate_limit_rate=0.3, error_rate=0.2, seed=1)
+        with MockOTPServer(config=config) as server:
+            codes = [
+                requests.get(f"{server.base_url}/plan", params=plan_params()).status_code
+                for _ in range(200)
+            ]
+
+        assert {200, 429, 500} == set(codes)
+        assert 30 < codes.count(429) < 90
+        assert 15 < codes.count(500) < 70
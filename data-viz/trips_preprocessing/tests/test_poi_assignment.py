@@ -0,0 +1,45 @@
+import numpy as np
+import geopandas as gpd
+import pytest
+import shapely
+from shapely.geometry import LineString
+from utils.poi_assignment import assign_pois, route_endpoints, to_metric, METRIC_CRS
+
+
+class TestPoiAssignment:
+    @pytest.fixture
+    def routes(self):
+        """Straight routes from one origin to random ends around the POIs, on a non-default index"""
+        rng = np.random.default_rng(0)
+        ends = np.column_stack([rng.uniform(34.78, 34.83, 500), rng.uniform(31.24, 31.28, 500)])
+        return gpd.GeoDataFrame({'num_trips': rng.integers(1, 10, 500)},
+                                geometry=[LineString([(34.75, 31.2), tuple(end)]) for end in ends],
+                                index=np.arange(500) * 2, crs="EPSG:4326")
+
+    def test_matches_brute_force_nearest(self, routes, poi_boxes):
+        pois = poi_boxes
+        assigned = assign_pois(routes, pois, labels=['BGU', 'Soroka Hospital', 'Gav Yam'], radius=200)
+        assert (assigned.index == routes.index).all()
+
+        ends = routes.to_crs(METRIC_CRS).geometry.apply(lambda line: shapely.Point(line.coords[-1]))
+        distances = np.array([[end.distance(poi) for poi in pois.to_crs(METRIC_CRS).geometry] for end in ends])
+        labels = np.array(['BGU', 'Soroka Hospital', 'Gav Yam'], dtype=object)
+        expected = np.where(distances.min(axis=1) <= 200, labels[distances.argmin(axis=1)], None)
+        assert list(assigned) == list(expected)
+        assert assigned.notna().any() and assigned.isna().any()
+
+    def test_default_labels_and_start_points(self, poi_boxes):
+        pois = poi_boxes
+        routes = gpd.GeoDataFrame(geometry=[LineString([(34.80, 31.26), (34.70, 31.20)])], crs="EPSG:4326")
+        assert assign_pois(routes, pois).tolist() == [None]
+        assert assign_pois(routes, pois, end=False).tolist() == [7]
+
+    def test_missing_geometries_and_projected_pois(self, poi_boxes):
+        routes = gpd.GeoDataFrame(geometry=[None, LineString([(34.70, 31.20), (34.813, 31.264)])], crs="EPSG:4326")
+        pois = poi_boxes.to_crs(METRIC_CRS)
+        assert assign_pois(routes, pois).tolist() == [None, 12]
+
+        coords, index = route_endpoints(routes.geometry.values)
+        assert index.tolist() == [1]
+        np.testing.assert_allclose(coords, [[34.813, 31.264]])
+        assert to_metric(shapely.points(coords), "EPSG:4326")[0].x > 100000
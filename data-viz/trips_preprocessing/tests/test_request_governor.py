@@ -0,0 +1,68 @@
+import requests
+from ..request_governor import RequestGovernor, CLOSED, OPEN, HALF_OPEN
+from ..mock_otp_server import MockOTPServer, MockOTPConfig
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_governor(clock, **kwargs):
+    return RequestGovernor(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+class TestRequestGovernor:
+    def test_aimd_pacing(self):
+        """Successes add to the rate, failures halve it, and requests are spaced by 1/rate"""
+        clock = FakeClock()
+        governor = make_governor(clock, rate=4.0, increase=1.0, decrease=0.5)
+        governor.acquire()
+        governor.acquire()
+        assert clock.now == 0.25
+
+        governor.record(0.01, ok=True)
+        assert governor.rate == 5.0
+        governor.record(0.01, ok=False)
+        assert governor.rate == 2.5
+        governor.record(10.0, ok=True)  # Slow responses also back off
+        assert governor.rate == 1.25
+
+    def test_circuit_breaker_probes_before_resuming(self):
+        clock = FakeClock()
+        governor = make_governor(clock, failure_threshold=3, open_seconds=2.0)
+        for _ in range(3):
+            governor.acquire()
+            governor.record(0.01, ok=False)
+        assert governor.state == OPEN
+
+        # The probe waits out the cool-down; a failed probe doubles it
+        opened_at = clock.now
+        governor.acquire()
+        assert governor.state == HALF_OPEN and clock.now >= opened_at + 2.0
+        governor.record(0.01, ok=False)
+        assert governor.state == OPEN and governor.open_seconds == 4.0
+
+        governor.acquire()
+        governor.record(0.01, ok=True)
+        assert governor.state == CLOSED and governor.open_seconds == 2.0
+        assert governor.status()['circuit_opened'] == 2
+
+    def test_request_against_failing_server(self):
+        """Server errors are recorded as failures and show up in the status"""
+        config = MockOTPConfig(error_rate=1.0)
+        governor = RequestGovernor(rate=50.0, failure_threshold=100)
+        with MockOTPServer(config=config) as server, requests.Session() as session:
+            for _ in range(4):
+                response = governor.request(session, f"{server.base_url}/plan", {'fromPlace': '31.25,34.79'})
+                assert response.status_code == 500
+
+        status = governor.status()
+        assert status['error_rate'] == 1.0 and status['failures'] == 4
+        assert governor.postfix().startswith("otp=closed")
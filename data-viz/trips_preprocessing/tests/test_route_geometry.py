@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from shapely.geometry import LineString
+from utils.route_geometry import (
+    haversine_km, ragged_coordinates, route_lengths, truncate_routes
+)
+
+
+def truncate_loop(coords, max_km):
+    """Per-vertex reference: cut at the first vertex max_km along the route"""
+    total = 0
+    for i in range(1, len(coords)):
+        total += haversine_km(coords[i - 1][0], coords[i - 1][1], coords[i][0], coords[i][1])
+        if total >= max_km:
+            return coords[:i + 1], True
+    return coords, False
+
+
+class TestRouteGeometry:
+    @pytest.fixture
+    def routes(self, random_routes):
+        """Walks on a ~300 m grid, long enough that some pass 5 km"""
+        return random_routes(200, step=0.003)
+
+    def test_haversine(self):
+        # One degree of latitude is about 111.2 km
+        assert abs(haversine_km(34.8, 31.0, 34.8, 32.0) - 111.19) < 0.01
+        assert haversine_km(34.8, 31.2, 34.8, 31.2) == 0
+
+    def test_lengths_match_per_route_sum(self, routes):
+        coords, offsets = ragged_coordinates(routes)
+        for route, length in zip(routes, route_lengths(coords, offsets)):
+            xy = np.asarray(route.coords)
+            expected = haversine_km(xy[:-1, 0], xy[:-1, 1], xy[1:, 0], xy[1:, 1]).sum()
+            assert abs(length - expected) < 1e-9
+
+    def test_truncation_matches_loop(self, routes):
+        routes = routes + [None, LineString()]
+        coords, offsets = ragged_coordinates(routes)
+        cut_coords, cut_offsets, truncated = truncate_routes(coords, offsets, 5.0)
+        assert truncated.any() and not truncated.all()
+        for i, route in enumerate(routes):
+            expected, was_truncated = truncate_loop([] if route is None else list(route.coords), 5.0)
+            assert truncated[i] == was_truncated
+            np.testing.assert_allclose(cut_coords[cut_offsets[i]:cut_offsets[i + 1]],
+                                       np.reshape(expected, (-1, 2)))
+
+    def test_interpolated_cut_is_exact(self, routes):
+        coords, offsets = ragged_coordinates(routes)
+        cut_coords, cut_offsets, truncated = truncate_routes(coords, offsets, 5.0, interpolate=True)
+        lengths = route_lengths(cut_coords, cut_offsets)
+        np.testing.assert_allclose(lengths[truncated], 5.0, atol=1e-3)
+        assert (lengths[~truncated] < 5.0).all()
@@ -3,6 +3,7 @@ import geopandas as gpd
 from shapely.geometry import LineString, Point
 import os
 from ..coordinate_utils import CoordinateValidator
+from utils.route_writer import load_routes
 
 class TestRouteValidation:
     @pytest.fixture
@@ -16,9 +17,9 @@ class TestRouteValidation:
     def sample_routes(self):
         """Fixture for sample route data"""
         return {
-            'inbound': gpd.read_file("data-viz/output/dashboard_data/walk_routes_inbound.geojson"),
-            'outbound': gpd.read_file("data-viz/output/dashboard_data/walk_routes_outbound.geojson"),
-            'car': gpd.read_file("data-viz/output/dashboard_data/car_routes_inbound.geojson")
+            'inbound': load_routes("data-viz/output/dashboard_data/walk_routes_inbound.geojson"),
+            'outbound': load_routes("data-viz/output/dashboard_data/walk_routes_outbound.geojson"),
+            'car': load_routes("data-viz/output/dashboard_data/car_routes_inbound.geojson")
         }
 
     def test_poi_intersection(self, sample_routes, poi_polygons):
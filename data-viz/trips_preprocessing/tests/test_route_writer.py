@@ -0,0 +1,138 @@
+import os
+from datetime import datetime, timedelta
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import LineString
+from utils.route_writer import (
+    RouteWriter, RouteTableWriter, load_routes, load_route_table, route_path, geometry_key,
+    WALK_ROUTE_FIELDS
+)
+
+
+@pytest.fixture
+def make_routes():
+    """Factory of walking route records, every other one with an amenity stop"""
+    departure = datetime(2024, 1, 1, 8)
+
+    def make_routes(n):
+        return [{
+            'route_id': f"9000000{i % 3}-Ben-Gurion-University-inbound-{i}",
+            'origin_zone': 90000000 + i % 3,
+            'destination': 'Ben-Gurion-University',
+            'entrance': 'Uni_North',
+            'direction': 'inbound',
+            'departure_time': departure,
+            'arrival_time': departure + timedelta(seconds=600 + i),
+            'num_trips': 1,
+            'origin_x': 34.79,
+            'origin_y': 31.25,
+            'has_amenity_stop': i % 2 == 1,
+            'zone_total_trips': 10.0,
+            'zone_ped_trips': 4.0,
+            **({'amenity_id': 12, 'amenity_type': 'food'} if i % 2 else {}),
+            'geometry': LineString([(34.79, 31.25), (34.80, 31.26 + i * 1e-5)])
+        } for i in range(n)]
+    return make_routes
+
+
+class TestRouteWriter:
+    @pytest.mark.parametrize("fmt", ["parquet", "fgb"])
+    def test_round_trip_in_batches(self, make_routes, tmp_path, fmt):
+        """Routes written across several row groups reload with their attributes"""
+        routes = make_routes(25)
+        writer = RouteWriter(route_path(tmp_path, "walk_routes_inbound", fmt), WALK_ROUTE_FIELDS,
+                             batch_size=10, sum_fields=('num_trips', 'has_amenity_stop'))
+        writer.write_many(routes)
+        writer.close()
+
+        assert writer.rows == 25
+        assert writer.sums == {'num_trips': 25, 'has_amenity_stop': 12}
+        assert sorted(os.listdir(tmp_path)) == [f"walk_routes_inbound.{fmt}"]
+
+        loaded = load_routes(os.path.join(tmp_path, "walk_routes_inbound.geojson"))
+        # FlatGeobuf stores features in spatial index order
+        loaded = loaded.set_index('route_id').loc[[r['route_id'] for r in routes]]
+        assert loaded.crs.to_string() == "EPSG:4326"
+        assert loaded['amenity_type'].notna().sum() == 12
+        assert loaded.geometry.iloc[-1].equals(routes[-1]['geometry'])
+
+    def test_geojson_export_and_older_files(self, make_routes, tmp_path, caplog):
+        """GeoJSON is only an optional export; outputs from other formats are kept with a warning"""
+        older = tmp_path / "walk_routes_inbound.fgb"
+        older.write_bytes(b"old")
+
+        with RouteWriter(route_path(tmp_path, "walk_routes_inbound"), WALK_ROUTE_FIELDS,
+                         geojson_export=True) as writer:
+            writer.write_many(make_routes(3))
+
+        assert sorted(os.listdir(tmp_path)) == [
+            "walk_routes_inbound.fgb", "walk_routes_inbound.geojson", "walk_routes_inbound.parquet"
+        ]
+        assert older.read_bytes() == b"old"
+        assert str(older) in caplog.text
+        assert len(load_routes(os.path.join(tmp_path, "walk_routes_inbound.geojson"))) == 3
+
+    def test_zone_ids_are_written_without_decimals(self, make_routes, tmp_path):
+        """Zone IDs read as floats or NumPy integers keep their integer text form"""
+        routes = make_routes(3)
+        routes[0]['origin_zone'] = 90000000.0
+        routes[1]['origin_zone'] = np.int64(90000001)
+        routes[2]['destination'] = np.float64(90000002)
+
+        with RouteWriter(route_path(tmp_path, "walk_routes_inbound"), WALK_ROUTE_FIELDS) as writer:
+            writer.write_many(routes)
+
+        loaded = load_routes(os.path.join(tmp_path, "walk_routes_inbound.geojson"))
+        assert list(loaded['origin_zone']) == ['90000000', '90000001', '90000002']
+        assert list(loaded['destination']) == ['Ben-Gurion-University', 'Ben-Gurion-University', '90000002']
+
+    def test_empty_writer_creates_no_file(self, tmp_path):
+        writer = RouteWriter(route_path(tmp_path, "walk_routes_outbound"), WALK_ROUTE_FIELDS)
+        assert writer.close() is None
+        assert os.listdir(tmp_path) == []
+
+
+class TestRouteTableWriter:
+    def test_duplicate_geometries_are_stored_once(self, make_routes, tmp_path):
+        """Trips on the same path share one route row and reload as one row per trip"""
+        routes = make_routes(6)
+        for route in routes:
+            route['geometry'] = LineString([(34.79, 31.25), (34.80, 31.26 + (route['origin_zone'] % 3) * 1e-5)])
+
+        with RouteTableWriter(route_path(tmp_path, "walk_routes_inbound"), WALK_ROUTE_FIELDS) as writer:
+            writer.write_many(routes)
+
+        assert writer.rows == 6
+        assert writer.unique_routes == 3
+        assert sorted(os.listdir(tmp_path)) == ["walk_routes_inbound.parquet", "walk_routes_inbound_trips.parquet"]
+
+        geometries, trips = load_route_table(os.path.join(tmp_path, "walk_routes_inbound.geojson"))
+        assert len(geometries) == 3 and len(trips) == 6
+        assert set(trips['route_key']) == set(geometries.index)
+
+        loaded = load_routes(os.path.join(tmp_path, "walk_routes_inbound.geojson"))
+        assert list(loaded['route_id']) == [r['route_id'] for r in routes]
+        assert all(g.equals(r['geometry']) for g, r in zip(loaded.geometry, routes))
+
+    def test_geometry_key_ignores_float_noise(self):
+        line = LineString([(34.79, 31.25), (34.80, 31.26)])
+        assert geometry_key(line) == geometry_key(LineString([(34.79 + 1e-9, 31.25), (34.80, 31.26)]))
+        assert geometry_key(line) != geometry_key(LineString([(34.79, 31.25), (34.80, 31.27)]))
+
+    @pytest.mark.parametrize("fmt", ["parquet", "fgb"])
+    def test_geojson_export_streams_joined_trips(self, make_routes, tmp_path, fmt):
+        """The GeoJSON export has one feature per trip with its route's geometry"""
+        routes = make_routes(25)
+        for route in routes:
+            route['geometry'] = LineString([(34.79, 31.25), (34.80, 31.26 + (route['origin_zone'] % 3) * 1e-5)])
+
+        with RouteTableWriter(route_path(tmp_path, "walk_routes_inbound", fmt), WALK_ROUTE_FIELDS,
+                              batch_size=10, geojson_export=True) as writer:
+            writer.write_many(routes)
+
+        exported = gpd.read_file(tmp_path / "walk_routes_inbound.geojson")
+        assert list(exported['route_id']) == [r['route_id'] for r in routes]
+        assert all(g.equals(r['geometry']) for g, r in zip(exported.geometry, routes))
+        assert exported.crs.to_string() == "EPSG:4326"
+        assert exported['amenity_type'].notna().sum() == 12
@@ -0,0 +1,86 @@
+import json
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pytest
+from shapely.geometry import LineString
+from utils.temporal_cube import TemporalCube
+from ..scenario_engine import Scenario, RouteSetLoads, ScenarioComparison
+
+POIS = ['Ben-Gurion-University', 'Soroka-Medical-Center']
+
+
+class TestScenarioEngine:
+    @pytest.fixture
+    def make_cube(self):
+        """Factory of cubes with BGU inbound car trips all at 8:00, Soroka inbound car trips all at 7:00"""
+        def make_cube(bin_minutes=60):
+            counts = np.zeros((2, 2, 2, 24 * 60 // bin_minutes))
+            counts[0, 0, 0, 8 * 60 // bin_minutes] = 10
+            counts[1, 0, 0, 7 * 60 // bin_minutes] = 10
+            return TemporalCube(counts, POIS, ['inbound', 'outbound'], ['car', 'pedestrian'], bin_minutes)
+        return make_cube
+
+    @pytest.fixture
+    def trips(self):
+        """Two BGU trips sharing one route and a Soroka trip whose route overlaps it"""
+        shared = LineString([(34.78, 31.25), (34.79, 31.25)])
+        return gpd.GeoDataFrame({
+            'origin_zone': ['1', '2', '3'],
+            'destination': ['Ben-Gurion-University', 'Ben-Gurion-University', 'Soroka-Medical-Center'],
+            'direction': 'inbound',
+            'num_trips': [10, 5, 4],
+            'route_key': ['a', 'a', 'b']
+        }, geometry=[shared, shared, LineString([(34.79, 31.25), (34.78, 31.25), (34.78, 31.26)])],
+            crs="EPSG:4326")
+
+    def test_baseline_loads(self, trips, make_cube):
+        route_set = RouteSetLoads('car', trips, make_cube())
+        assert route_set.n_routes == 2
+
+        loads = route_set.segment_loads(route_set.baseline)
+        # The shared segment carries BGU's 15 trips at 8:00 and Soroka's 4 at 7:00
+        assert loads.shape == (2, 24)
+        assert loads[0, 8] == 15 and loads[0, 7] == 4
+        assert loads[1].sum() == 4
+
+    def test_scale_and_shift(self, trips, make_cube):
+        route_set = RouteSetLoads('car', trips, make_cube(15))
+        scenario = Scenario('what_if', [
+            {'poi': 'Ben-Gurion-University', 'mode': 'car', 'scale': 0.8},
+            {'poi': 'Soroka-Medical-Center', 'shift_hours': 1},
+            {'mode': 'walk', 'scale': 0}
+        ])
+        weights = route_set.apply(scenario)
+
+        assert np.isclose(weights[:2].sum(), 12)
+        assert weights[2, 8 * 4] == 4 and weights[2, 7 * 4] == 0
+        # Baseline is untouched
+        assert route_set.baseline.sum() == 19
+
+    def test_hour_filtered_scale(self, trips, make_cube):
+        route_set = RouteSetLoads('car', trips, make_cube())
+        weights = route_set.apply(Scenario('peak', [{'hours': [8, 9], 'scale': 0.5}]))
+        assert np.isclose(weights.sum(), 7.5 + 4)
+
+    def test_comparison_outputs(self, trips, make_cube, tmp_path):
+        route_sets = {'car_inbound': RouteSetLoads('car', trips, make_cube(),
+                                                   incidence_path=str(tmp_path / "incidence.npz"))}
+        comparison = ScenarioComparison(Scenario('bgu_transit', [{'poi': 'Ben-Gurion-University', 'scale': 0.8}]),
+                                        route_sets)
+        comparison.write(str(tmp_path))
+
+        segments = gpd.read_parquet(tmp_path / "bgu_transit_car_inbound_segments.parquet")
+        assert list(segments['delta']) == pytest.approx([-3, 0])
+        hourly = pd.read_csv(tmp_path / "bgu_transit_hourly.csv")
+        assert hourly.loc[hourly['minute'] == 480, 'delta'].item() == pytest.approx(-3)
+        with open(tmp_path / "bgu_transit_summary.json") as f:
+            summary = json.load(f)
+        assert summary['route_sets']['car_inbound']['delta_trips'] == pytest.approx(-3)
+        assert summary['route_sets']['car_inbound']['baseline']['peak_minute'] == 480
+
+    def test_invalid_rules(self):
+        with pytest.raises(ValueError):
+            Scenario('bad', [{'poi': 'Ben-Gurion-University'}])
+        with pytest.raises(ValueError):
+            Scenario('bad', [{'scale': 0.5, 'zone': '1'}])
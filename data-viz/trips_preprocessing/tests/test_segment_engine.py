@@ -0,0 +1,101 @@
+from collections import defaultdict
+import numpy as np
+import geopandas as gpd
+import pytest
+from shapely.geometry import LineString, MultiLineString
+from utils.segment_engine import aggregate_segments, ragged_coords, SegmentIncidence
+
+
+def reference_segments(geometries, weights):
+    """Per-route dict aggregation the road usage scripts used before the engine"""
+    segments = defaultdict(float)
+    for geometry, num_trips in zip(geometries, weights):
+        coords = list(geometry.coords)
+        for i in range(len(coords) - 1):
+            segments[tuple(sorted([coords[i], coords[i + 1]]))] += num_trips
+    return segments
+
+
+@pytest.fixture
+def routes(random_routes):
+    """Walks on a coarse ~100 m grid"""
+    return random_routes(step=0.001)
+
+
+@pytest.fixture
+def weights(routes):
+    return np.random.default_rng(1).random(len(routes)) * 5
+
+
+class TestSegmentEngine:
+    def test_matches_dict_aggregation(self, routes, weights):
+        segments = aggregate_segments(routes, weights)
+        expected = reference_segments(routes, weights)
+
+        assert len(segments) == len(expected)
+        result = dict(segments.items())
+        for key, trips in expected.items():
+            assert np.isclose(result[key], trips)
+        # Same first-appearance order as the dict
+        assert list(result) == list(expected)
+
+    def test_direction_and_near_duplicates_merge(self):
+        forward = LineString([(34.0, 31.0), (34.001, 31.0)])
+        backward = LineString([(34.001 + 1e-9, 31.0), (34.0, 31.0 - 1e-9)])
+        segments = aggregate_segments([forward, backward], [2.0, 3.0])
+
+        assert len(segments) == 1
+        assert segments.trips[0] == 5.0
+        assert tuple(segments.start[0]) == (34.0, 31.0)
+        assert list(segments.first_route) == [0]
+
+    def test_multilines_do_not_join_parts(self):
+        multi = MultiLineString([[(0, 0), (1, 0)], [(5, 5), (6, 5), (6, 6)]])
+        coords, offsets, part_geometry = ragged_coords(gpd.GeoSeries([LineString([(0, 0), (0, 1)]), multi]).values)
+
+        assert list(offsets) == [0, 2, 4, 7]
+        assert list(part_geometry) == [0, 1, 1]
+        segments = aggregate_segments([multi], [1.0])
+        assert len(segments) == 3
+        assert ((0.0, 0.0), (1.0, 0.0)) in dict(segments.items())
+
+
+class TestSegmentIncidence:
+    def test_loads_match_aggregation(self, routes, weights):
+        incidence = SegmentIncidence.from_routes(routes)
+        segments = aggregate_segments(routes, weights)
+
+        assert incidence.matrix.shape == (len(segments), len(routes))
+        np.testing.assert_array_equal(incidence.start, segments.start)
+        np.testing.assert_allclose(incidence.loads(weights), segments.trips)
+
+        # A (routes x hours) weight matrix gives every hour's loads at once
+        hourly = np.outer(weights, np.linspace(0, 1, 17))
+        loads = incidence.loads(hourly)
+        assert loads.shape == (len(segments), 17)
+        np.testing.assert_allclose(loads[:, 5], aggregate_segments(routes, hourly[:, 5]).trips)
+
+    def test_directed_segments(self):
+        forward = LineString([(0, 0), (1, 0)])
+        backward = LineString([(1, 0), (0, 0)])
+        assert len(SegmentIncidence.from_routes([forward, backward])) == 1
+        directed = SegmentIncidence.from_routes([forward, backward], directed=True)
+        assert len(directed) == 2
+        np.testing.assert_allclose(directed.loads([1.0, 2.0]), [1.0, 2.0])
+
+    def test_cache_is_reused_for_same_routes(self, random_routes, tmp_path):
+        routes = random_routes(50)
+        weights = np.random.default_rng(1).random(len(routes)) * 5
+        path = str(tmp_path / "incidence.npz")
+        built = SegmentIncidence.cached(routes, path)
+        loaded = SegmentIncidence.cached(routes, path)
+
+        assert loaded.key == built.key
+        assert (loaded.matrix != built.matrix).nnz == 0
+        np.testing.assert_allclose(loaded.loads(weights), built.loads(weights))
+
+        # A different route set (or different segment settings) rebuilds the cache
+        other = SegmentIncidence.cached(routes[:10], path)
+        assert other.matrix.shape[1] == 10
+        assert SegmentIncidence.load(path).key == other.key
+        assert SegmentIncidence.cached(routes[:10], path, directed=True).key != other.key
@@ -0,0 +1,54 @@
+import json
+import numpy as np
+import pytest
+from utils.segment_engine import SegmentIncidence
+from utils.segment_tiles import build_levels, merge_chains, write_level_files, zoom_tolerance
+
+
+def weighted_length(level, weights):
+    return (level.loads(weights) * np.linalg.norm(level.end - level.start, axis=1)).sum()
+
+
+class TestSegmentTiles:
+    @pytest.fixture
+    def routes(self, random_routes):
+        return random_routes()
+
+    @pytest.fixture
+    def weights(self, routes):
+        return np.random.default_rng(1).integers(1, 20, len(routes)).astype(float)
+
+    def test_zoom_tolerance_halves_per_zoom(self):
+        assert np.isclose(zoom_tolerance(0, pixels=512), 360)
+        assert np.isclose(zoom_tolerance(13), zoom_tolerance(12) / 2)
+
+    def test_merge_chains_joins_runs_with_same_routes(self):
+        # A straight run of three segments, then a branch at (2, 0) where the signature changes
+        start = np.array([[0, 0], [1, 0], [2, 0], [2, 0]], dtype=float)
+        end = np.array([[1, 0], [2, 0], [3, 0], [2, 1]], dtype=float)
+        signature = np.array([[1, 1], [1, 1], [2, 2], [3, 3]], dtype=float)
+        chain = merge_chains(start, end, signature)
+        assert chain[0] == chain[1]
+        assert len(set(chain.tolist())) == 3
+
+    def test_raw_level_is_segment_incidence(self, routes, weights):
+        raw = build_levels(routes, zooms=(0, 14))[-1]
+        incidence = SegmentIncidence.from_routes(np.asarray(routes))
+        np.testing.assert_array_equal(raw.start, incidence.start)
+        np.testing.assert_allclose(raw.loads(weights), incidence.loads(weights))
+
+    def test_coarse_levels_are_smaller_and_keep_loads(self, routes, weights):
+        levels = build_levels(routes, zooms=(0, 12, 14))
+        sizes = [len(level) for level in levels]
+        assert sizes[0] < sizes[1] <= sizes[2]
+        # Trip-weighted network length is re-aggregated, not lost, by merging and simplification
+        raw_length = weighted_length(levels[-1], weights)
+        for level in levels[:-1]:
+            assert abs(weighted_length(level, weights) / raw_length - 1) < 0.1
+
+    def test_only_coarsest_level_is_inlined(self, tmp_path):
+        level_data = [[{'trips': 1}], [{'trips': 2}], [{'trips': 3}]]
+        inline, urls = write_level_files(str(tmp_path / 'page.html'), level_data)
+        assert inline == [level_data[0], None, None]
+        assert urls == [None, 'page_lod1.json', 'page_lod2.json']
+        assert json.loads((tmp_path / 'page_lod2.json').read_text()) == level_data[2]
@@ -0,0 +1,44 @@
+import json
+from ..telemetry import RunTelemetry
+
+
+class TestRunTelemetry:
+    def test_report_and_summary(self, tmp_path):
+        """Zone records stream to the report; the summary aggregates requests and failures"""
+        report = tmp_path / "report.jsonl"
+        telemetry = RunTelemetry(str(report))
+        for latency in [0.005, 0.02, 0.03, 0.2]:
+            telemetry.request('walk', latency, 200)
+        telemetry.request('walk', 12.0, 'timeout')
+        telemetry.retry('walk')
+        telemetry.point_failure("Inside POI polygon")
+        telemetry.route_failure("Crosses avoided polygon 7")
+        with telemetry.zone(zone_id=1, direction='inbound') as record:
+            record['routes'] = 3
+        telemetry.close()
+
+        events = [json.loads(line) for line in report.read_text().splitlines()]
+        assert [e['event'] for e in events] == ['zone', 'summary']
+        assert events[0]['routes'] == 3 and events[0]['seconds'] >= 0
+
+        walk = events[1]['requests']['walk']
+        assert walk['requests'] == 5 and walk['retries'] == 1
+        assert walk['statuses'] == {'200': 4, 'timeout': 1}
+        assert walk['p50_latency'] == 0.05 and walk['latency_buckets']['inf'] == 1
+        assert events[1]['point_failures'] == {"Inside POI polygon": 1}
+        assert "route failed: Crosses avoided polygon 7" in telemetry.summary_table()['metric'].values
+
+    def test_merge_worker_snapshots(self):
+        worker, parent = RunTelemetry(), RunTelemetry()
+        worker.request('walk', 0.02, 200)
+        worker.cache_lookup('walk', hit=True)
+        with worker.zone(zone_id=2):
+            pass
+        parent.request('walk', 0.02, 429)
+        parent.merge(worker.drain())
+
+        assert worker.summary()['zones'] == 0
+        summary = parent.summary()
+        assert summary['zones'] == 1
+        assert summary['requests']['walk']['statuses'] == {'200': 1, '429': 1}
+        assert summary['requests']['walk']['cache_hits'] == 1
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils.temporal_cube import TemporalCube, build_temporal_cube, MODE_MAPPING, CUBE_MODES
+from ..temporal_preprocessing import POI_MAPPING
+
+
+def reference_distributions(df, raw_name, trip_type):
+    """Per-POI, per-mode filter and groupby, as the CSVs were computed before the cube"""
+    name_col = 'to_name' if trip_type == 'inbound' else 'from_name'
+    poi_trips = df[df[name_col] == raw_name]
+    result = {}
+    for mode, raw_modes in MODE_MAPPING.items():
+        hourly = poi_trips[poi_trips['mode'].isin(raw_modes)].groupby('hour')['count'].sum()
+        total = hourly.sum()
+        result[mode] = [hourly.get(h, 0) / total if total > 0 else 0 for h in range(24)]
+    return result
+
+
+class TestTemporalCube:
+    @pytest.fixture
+    def make_raw_trips(self):
+        """Factory of raw trip counts between the POIs and elsewhere, over all raw modes and minutes"""
+        def make_raw_trips(n=2000):
+            rng = np.random.default_rng(0)
+            names = list(POI_MAPPING.values()) + ['Elsewhere']
+            return pd.DataFrame({
+                'from_name': rng.choice(names, n),
+                'to_name': rng.choice(names, n),
+                'mode': rng.choice(['car', 'ped', 'bus', 'train', 'link', 'bike', 'taxi'], n),
+                'minute': rng.integers(0, 24 * 60, n),
+                'count': rng.random(n) * 10
+            }).assign(hour=lambda df: df['minute'] // 60)
+        return make_raw_trips
+
+    def test_matches_per_poi_groupby(self, make_raw_trips):
+        df = make_raw_trips()
+        cube = build_temporal_cube(df, POI_MAPPING)
+        assert cube.counts.shape == (len(POI_MAPPING), 2, len(CUBE_MODES), 24)
+
+        for poi, raw_name in POI_MAPPING.items():
+            for trip_type in ['inbound', 'outbound']:
+                expected = reference_distributions(df, raw_name, trip_type)
+                frame = cube.poi_frame(poi, trip_type, MODE_MAPPING)
+                for mode in MODE_MAPPING:
+                    np.testing.assert_allclose(frame[f'{mode}_dist'], expected[mode])
+
+    def test_unmapped_modes_and_empty_groups(self, make_raw_trips):
+        df = make_raw_trips()
+        df.loc[df['mode'] == 'bike', 'mode'] = 'taxi'
+        cube = build_temporal_cube(df, POI_MAPPING)
+
+        poi = cube.pois.index('Soroka-Medical-Center')
+        taxi = df[(df['mode'] == 'taxi') & (df['to_name'] == 'Soroka Hospital')]['count'].sum()
+        assert np.isclose(cube.counts[poi, 0, CUBE_MODES.index('other')].sum(), taxi)
+        # No bike trips left: a zero distribution rather than NaN
+        assert (cube.distributions()[:, :, CUBE_MODES.index('bike')] == 0).all()
+
+    def test_save_and_load(self, make_raw_trips, tmp_path):
+        cube = build_temporal_cube(make_raw_trips(200), POI_MAPPING)
+        path = str(tmp_path / "cube.npz")
+        cube.save(path)
+        loaded = TemporalCube.load(path)
+
+        # Counts are stored as float32
+        np.testing.assert_allclose(loaded.counts, cube.counts, rtol=1e-6)
+        assert loaded.pois == cube.pois
+        assert loaded.modes == list(CUBE_MODES)
+        assert loaded.bin_minutes == 60
+        pd.testing.assert_frame_equal(loaded.poi_frame('Ben-Gurion-University', 'outbound'),
+                                      cube.poi_frame('Ben-Gurion-University', 'outbound'), rtol=1e-6)
+
+    @pytest.mark.parametrize('bin_minutes', [15, 30])
+    def test_sub_hour_bins(self, make_raw_trips, bin_minutes, tmp_path):
+        df = make_raw_trips()
+        cube = build_temporal_cube(df, POI_MAPPING, bin_minutes=bin_minutes)
+        assert cube.counts.shape[-1] == 24 * 60 // bin_minutes
+        np.testing.assert_allclose(cube.hourly().counts, build_temporal_cube(df, POI_MAPPING).counts)
+
+        frame = cube.poi_frame('Soroka-Medical-Center', 'inbound', ['car'])
+        assert list(frame['minute'][:3]) == [0, bin_minutes, 2 * bin_minutes]
+        assert np.isclose(frame['car_dist'].sum(), 1.0)
+
+        path = str(tmp_path / "cube.npz")
+        cube.save(path)
+        assert TemporalCube.load(path).bin_minutes == bin_minutes
+
+    def test_invalid_bin_width(self, make_raw_trips):
+        with pytest.raises(ValueError):
+            build_temporal_cube(make_raw_trips(10), POI_MAPPING, bin_minutes=25)
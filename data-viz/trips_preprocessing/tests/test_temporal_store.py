@@ -0,0 +1,78 @@
+import pandas as pd
+import geopandas as gpd
+import pytest
+from shapely.geometry import LineString
+from utils.temporal_store import TemporalStore, write_temporal_store, store_paths
+from ..walk_temporal import process_temporal_patterns
+
+
+class TestTemporalStore:
+    @pytest.fixture
+    def routes(self):
+        """Three routes to BGU and Soroka, one with an intermediate vertex"""
+        return gpd.GeoDataFrame({
+            'route_id': ['r0', 'r1', 'r2'],
+            'destination': ['BGU', 'BGU', 'Soroka'],
+        }, geometry=[
+            LineString([(34.78, 31.25), (34.79, 31.26)]),
+            LineString([(34.77, 31.24), (34.78, 31.25), (34.80, 31.26)]),
+            LineString([(34.81, 31.27), (34.80, 31.258)])
+        ], crs="EPSG:4326")
+
+    def test_round_trip_and_hour_range(self, routes, tmp_path):
+        base = str(tmp_path / "arcs")
+        schedule = pd.DataFrame({
+            'route_id': ['r0', 'r1', 'r0', 'r2', 'r0'],
+            'departure_seconds': [7 * 3600, 7 * 3600 + 60, 8 * 3600, 9 * 3600 + 59, 7 * 3600]
+        })
+        write_temporal_store(base, routes, schedule)
+        store = TemporalStore(base)
+
+        full = store.schedule()
+        assert full['count'].sum() == 5
+        assert full['departure_seconds'].is_monotonic_increasing
+        # Duplicate route/departure rows are merged into a count
+        assert full[(full['route_id'] == 'r0') & (full['departure_seconds'] == 7 * 3600)]['count'].item() == 2
+
+        morning = store.schedule(7, 8)
+        assert set(morning['route_id']) == {'r0', 'r1'}
+        assert morning['count'].sum() == 3
+
+    def test_routes_without_geometry(self, routes, tmp_path):
+        base = str(tmp_path / "arcs")
+        write_temporal_store(base, routes, pd.DataFrame({'route_id': ['r1'], 'departure_seconds': [0]}))
+        store = TemporalStore(base)
+
+        stored = store.routes(geometry=False)
+        assert 'geometry' not in stored.columns
+        r1 = stored.set_index('route_id').loc['r1']
+        assert (r1['source_lon'], r1['source_lat']) == (34.77, 31.24)
+        assert (r1['target_lon'], r1['target_lat']) == (34.80, 31.26)
+
+        trips = store.trips(columns=['destination'])
+        assert list(trips.columns) == ['route_id', 'departure_seconds', 'count', 'destination']
+
+        with_geometry = store.routes(route_ids=['r2'])
+        assert list(with_geometry['route_id']) == ['r2']
+        assert with_geometry.geometry.iloc[0].equals(routes.geometry.iloc[2])
+
+    def test_missing_store(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            TemporalStore(str(tmp_path / "missing"))
+
+    def test_walk_temporal_writes_store(self, walk_inputs, tmp_path):
+        trips, temporal = walk_inputs
+        geometries = gpd.GeoDataFrame(
+            geometry=[LineString([(i, 0), (i, 1)]) for i in range(4)],
+            index=pd.Index(['a', 'b', 'c', 'd'], name='route_key'), crs="EPSG:4326"
+        )
+        base = str(tmp_path / "temporal_arcs")
+        schedule = process_temporal_patterns(trips, temporal, base, geometries)
+        store = TemporalStore(base)
+
+        assert store.schedule()['count'].sum() == len(schedule)
+        routes = store.routes()
+        assert set(routes['route_id']) == set(schedule['route_id'])
+        assert all(p.endswith('.parquet') for p in store_paths(base))
+        hours = store.schedule()['departure_seconds'] // 3600
+        assert set(hours) <= {7, 8, 9, 10}
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from ..walk_temporal import allocate_largest_remainder, spread_minutes, expand_schedule
+
+
+class TestTemporalExpansion:
+    def test_largest_remainder_rows_sum_to_totals(self):
+        rng = np.random.default_rng(0)
+        weights = rng.random(7)
+        weights /= weights.sum()
+        totals = rng.integers(1, 50, size=30)
+        allocation = allocate_largest_remainder(totals, weights)
+
+        np.testing.assert_array_equal(allocation.sum(axis=1), totals)
+        assert (allocation >= 0).all()
+        assert (np.abs(allocation - np.outer(totals, weights)) < 1).all()
+
+    def test_minutes_match_linspace(self):
+        counts = np.array([1, 2, 5, 60, 7])
+        expected = np.concatenate([np.linspace(0, 59, n, dtype=int) for n in counts])
+        np.testing.assert_array_equal(spread_minutes(counts), expected)
+
+    def test_schedule_per_zone_and_hour(self, walk_inputs):
+        routes, temporal = walk_inputs
+        schedule = expand_schedule(routes, temporal)
+
+        # Zone 1 has 4 trips to BGU: one per active hour, split 1:2:1 across its routes overall
+        zone1 = schedule[schedule['route_index'].isin([0, 1, 2])]
+        assert sorted(zone1['departure_minute'] // 60) == [7, 8, 9, 10]
+        # Every hour gets at least one trip, even for a single-trip zone
+        assert sorted(schedule.loc[schedule['route_index'] == 3, 'departure_minute'] // 60) == [7, 8, 9, 10]
+        # Soroka's 3 trips all leave at 9, spread over the hour
+        assert list(schedule.loc[schedule['route_index'] == 4, 'departure_minute']) == [540, 569, 599]
+        assert list(schedule['route_key']) == list(routes['route_key'].iloc[schedule['route_index']])
+
+    def test_sub_hour_bins_keep_hourly_totals(self, walk_inputs):
+        routes, temporal = walk_inputs
+        # Quarter-hour bins: BGU trips only in each hour's second quarter, Soroka's split evenly
+        temporal = temporal.reset_index(drop=True)
+        quarters = temporal.loc[temporal.index.repeat(4)].reset_index(drop=True)
+        quarters['minute'] = quarters['hour'] * 60 + np.tile(np.arange(4) * 15, len(temporal))
+        bgu = quarters['destination'] == 'BGU'
+        quarters.loc[bgu, 'pedestrian_dist'] *= (quarters.loc[bgu, 'minute'] % 60 == 15) * 1.0
+        quarters.loc[~bgu, 'pedestrian_dist'] /= 4
+
+        hourly = expand_schedule(routes, temporal)
+        binned = expand_schedule(routes, quarters, bin_minutes=15)
+
+        assert len(binned) == len(hourly)
+        pd.testing.assert_series_equal(
+            (binned['departure_minute'] // 60).groupby(binned['route_index']).value_counts().sort_index(),
+            (hourly['departure_minute'] // 60).groupby(hourly['route_index']).value_counts().sort_index()
+        )
+        bgu_minutes = binned.loc[binned['route_index'] < 4, 'departure_minute'] % 60
+        assert bgu_minutes.between(15, 29).all()
+        # Soroka's 3 trips at 9 land in three different quarters
+        assert sorted(binned.loc[binned['route_index'] == 4, 'departure_minute'] // 15) == [36, 37, 38]
@@ -0,0 +1,93 @@
+import os
+import sys
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Point, box
+from .test_local_router import make_grid_edges
+
+# otp_walk is a script importing its sibling modules by name
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import otp_walk
+from graph_snapping import GraphSnapIndex
+
+
+class TestZoneSharding:
+    @pytest.fixture
+    def zones(self):
+        """Two zones side by side on the street grid"""
+        return gpd.GeoDataFrame({'YISHUV_STAT11': [1, 2]}, geometry=[
+            box(34.7902, 31.2502, 34.7919, 31.2538), box(34.7921, 31.2502, 34.7938, 31.2538)
+        ], crs="EPSG:4326")
+
+    @pytest.fixture
+    def jobs(self):
+        """Inbound and outbound jobs for both zones to BGU"""
+        trips = pd.DataFrame({'tract': [1, 2], 'total_trips': [6, 4], 'mode_ped': [100.0, 100.0]})
+        trip_data = {('Ben-Gurion-University', direction): trips.copy() for direction in ['inbound', 'outbound']}
+        return otp_walk.collect_zone_jobs(trip_data, ['Ben-Gurion-University'])
+
+    @pytest.fixture
+    def make_generator(self, zones):
+        """Factory of trip generators routing on the grid with a local router"""
+        entrances = gpd.GeoDataFrame({'Name': ['Uni_North', 'Uni_East']},
+                                     geometry=[Point(34.792, 31.254), Point(34.794, 31.252)], crs="EPSG:4326")
+        amenities = gpd.GeoDataFrame({'top_classi': ['food'] * 4}, geometry=[
+            Point(34.791, 31.251), Point(34.79101, 31.251), Point(34.793, 31.253), Point(34.79301, 31.253)
+        ], crs="EPSG:4326")
+        poi_polygons = gpd.GeoDataFrame({'ID': [7]}, geometry=[box(34.7935, 31.2535, 34.7945, 31.2545)],
+                                        crs="EPSG:4326")
+
+        def make_generator():
+            router = otp_walk.LocalRouter(edges=make_grid_edges(), poi_polygons=poi_polygons)
+            generator = otp_walk.ImprovedTripGenerator(zones, router, otp_walk.EntranceManager(entrances), amenities)
+            generator.progress = False
+            return generator
+        return make_generator
+
+    @staticmethod
+    def sampled(routes):
+        return [(r['route_id'], r['origin_x'], r['origin_y'], r['entrance'], r.get('amenity_id'), r['geometry'].wkt)
+                for r in routes]
+
+    def test_serial_runs_are_reproducible(self, jobs, make_generator):
+        first = [trip for trips in otp_walk.generate_serial(make_generator(), jobs, seed=3) for trip in trips]
+        second = [trip for trips in otp_walk.generate_serial(make_generator(), jobs, seed=3) for trip in trips]
+        other = [trip for trips in otp_walk.generate_serial(make_generator(), jobs, seed=4) for trip in trips]
+        assert len(first) == sum(job['num_trips'] for job in jobs)
+        assert self.sampled(first) == self.sampled(second)
+        assert self.sampled(first) != self.sampled(other)
+
+    def test_serial_samples_match_zone_shards(self, jobs, make_generator, monkeypatch):
+        serial = dict(zip([job['order'] for job in jobs], otp_walk.generate_serial(make_generator(), jobs, seed=3)))
+
+        monkeypatch.setattr(otp_walk, '_worker_generator', make_generator())
+        sharded = {}
+        for zone_id in np.unique([job['zone_id'] for job in jobs]):
+            results, _ = otp_walk._run_zone_shard(zone_id, [job for job in jobs if job['zone_id'] == zone_id], 3)
+            sharded.update(results)
+        assert sorted(sharded) == sorted(serial)
+        for order, trips in serial.items():
+            assert [t[:5] for t in self.sampled(trips)] == [t[:5] for t in self.sampled(sharded[order])]
+
+    def test_sampled_points_have_graph_access(self, zones, make_generator):
+        """Candidates out of reach of the walk network are rejected by the local snap index"""
+        generator = make_generator()
+        index = GraphSnapIndex(make_grid_edges(), mode='walk', max_distance=20.0, cell_size=5.0)
+        generator.otp_client = otp_walk.OTPClient(poi_polygons=generator.otp_client.poi_polygons, snap_index=index)
+        zone = zones.geometry.iloc[0]
+        points = [generator._generate_unique_point(1, zone) for _ in range(10)]
+
+        assert all(point is not None and index.accessible(point.y, point.x) for point in points)
+        assert generator.telemetry.point_failures['No graph access'] > 0
+
+    def test_missing_street_network_accepts_points(self, tmp_path, monkeypatch, caplog):
+        """Without a street network file screening is disabled, with a single warning"""
+        monkeypatch.setattr(otp_walk, 'OSM_EXTRACT_FILE', str(tmp_path / "missing.osm.pbf"))
+        client = otp_walk.OTPClient(poi_polygons=gpd.GeoDataFrame({'ID': [7]}, geometry=[box(0, 0, 1, 1)],
+                                                                  crs="EPSG:4326"))
+        assert client.test_point_access(31.25, 34.79)
+        assert client.test_point_access(31.25, 34.79, mode='car')
+        assert client.graph_access.disabled
+        assert caplog.text.count("graph access screening is disabled") == 1
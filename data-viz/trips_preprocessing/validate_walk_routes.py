@@ -1,15 +1,17 @@
 import geopandas as gpd
+import pandas as pd
 import logging
-from shapely.geometry import LineString
 import os
+import sys
+from avoidance import AvoidanceIndex
+
+# Add parent directory to Python path to access shared utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.route_writer import load_routes
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-poi_name_to_id = {
-            'Ben-Gurion-University': 7,
-            'Soroka-Medical-Center': 11
-        }
 
 def load_poi_polygons():
     """Load POI polygons from shapefile"""
@@ -20,38 +22,51 @@ def load_poi_polygons():
         poi_polygons = poi_polygons.to_crs("EPSG:4326")
     return poi_polygons
 
+def find_route_crossings(routes_gdf, poi_polygons, allowed_pois):
+    """ID of the unauthorized POI each route crosses (-1 for valid routes).
+
+    allowed_pois is the POI each route may cross, either one name for the whole
+    frame or a per-route sequence. All routes are checked in one vectorized call.
+    """
+    if isinstance(allowed_pois, str) or allowed_pois is None:
+        allowed_pois = [allowed_pois] * len(routes_gdf)
+    index = AvoidanceIndex(poi_polygons)
+    return pd.Series(
+        index.crossings(routes_gdf.geometry.values, allowed_pois),
+        index=routes_gdf.index
+    )
+
 def validate_routes(routes_gdf, poi_polygons, destination_poi):
     """Validate that routes don't cross through unauthorized areas"""
-    valid_routes = 0
-    total_routes = len(routes_gdf)
-    poi_name_to_id = {
-        'Ben-Gurion-University': 7,
-        'Soroka-Medical-Center': 11
-    }
+    crossings = find_route_crossings(routes_gdf, poi_polygons, destination_poi)
+    for idx, poi_id in crossings[crossings >= 0].items():
+        logger.warning(f"Route {idx} intersects unauthorized POI {poi_id}")
     
-    for idx, route in routes_gdf.iterrows():
-        route_line = route.geometry
-        is_valid = True
-        
-        # Check intersection with unauthorized polygons
-        for _, poi in poi_polygons.iterrows():
-            # Skip if this is the destination POI
-            if destination_poi and poi_name_to_id.get(destination_poi) == poi['ID']:
-                continue
-                
-            if route_line.intersects(poi.geometry):
-                logger.warning(f"Route {idx} intersects unauthorized POI {poi['ID']}")
-                is_valid = False
-                break
+    return int((crossings < 0).sum()), len(routes_gdf)
+
+def log_validation(routes, crossings, group_column, label, endpoint_label):
+    """Log per-group success rates and sample invalid routes"""
+    for key, group in routes.groupby(group_column):
+        group_crossings = crossings.loc[group.index]
+        total = len(group)
+        valid = int((group_crossings < 0).sum())
+        logger.info(f"""
+        {label}: {key}
+        - Total routes: {total}
+        - Valid routes: {valid}
+        - Success rate: {(valid/total)*100:.1f}%
+        """)
         
-        if is_valid:
-            valid_routes += 1
-            
-        # Print progress every 100 routes
-        if (idx + 1) % 100 == 0:
-            logger.info(f"Processed {idx + 1}/{total_routes} routes...")
-    
-    return valid_routes, total_routes
+        # Sample invalid routes for inspection (limit to 5 examples)
+        invalid = group_crossings[group_crossings >= 0].head(5)
+        for idx, poi_id in invalid.items():
+            route = group.loc[idx]
+            logger.warning(f"""
+                    Invalid route example:
+                    - Route ID: {route['route_id']}
+                    - {endpoint_label}: ({route['origin_x']}, {route['origin_y']})
+                    - Intersects with POI: {poi_id}
+                    """)
 
 def main():
     # Load POI polygons
@@ -63,65 +78,17 @@ def main():
     inbound_file = os.path.join(input_dir, "walk_routes_inbound.geojson")
     outbound_file = os.path.join(input_dir, "walk_routes_outbound.geojson")
     
-    # Process inbound routes
+    # Process inbound routes, each may cross its destination POI
     logger.info("\nValidating inbound routes...")
-    inbound_routes = gpd.read_file(inbound_file)
-    
-    # Group by destination and validate
-    for dest, group in inbound_routes.groupby('destination'):
-        valid, total = validate_routes(group, poi_polygons, dest)
-        logger.info(f"""
-        Destination: {dest}
-        - Total routes: {total}
-        - Valid routes: {valid}
-        - Success rate: {(valid/total)*100:.1f}%
-        """)
-        
-        # Sample invalid routes for inspection
-        invalid_count = 0
-        for idx, route in group.iterrows():
-            if invalid_count >= 5:  # Limit to 5 examples
-                break
-            for _, poi in poi_polygons.iterrows():
-                if poi_name_to_id.get(dest) != poi['ID'] and route.geometry.intersects(poi.geometry):
-                    logger.warning(f"""
-                    Invalid route example:
-                    - Route ID: {route['route_id']}
-                    - Origin: ({route['origin_x']}, {route['origin_y']})
-                    - Intersects with POI: {poi['ID']}
-                    """)
-                    invalid_count += 1
-                    break
+    inbound_routes = load_routes(inbound_file)
+    crossings = find_route_crossings(inbound_routes, poi_polygons, inbound_routes['destination'])
+    log_validation(inbound_routes, crossings, 'destination', 'Destination', 'Origin')
     
-    # Process outbound routes
+    # Process outbound routes, each may cross its origin POI
     logger.info("\nValidating outbound routes...")
-    outbound_routes = gpd.read_file(outbound_file)
-    
-    # Group by origin and validate
-    for orig, group in outbound_routes.groupby('origin_zone'):
-        valid, total = validate_routes(group, poi_polygons, orig)
-        logger.info(f"""
-        Origin: {orig}
-        - Total routes: {total}
-        - Valid routes: {valid}
-        - Success rate: {(valid/total)*100:.1f}%
-        """)
-        
-        # Sample invalid routes
-        invalid_count = 0
-        for idx, route in group.iterrows():
-            if invalid_count >= 5:  # Limit to 5 examples
-                break
-            for _, poi in poi_polygons.iterrows():
-                if poi_name_to_id.get(orig) != poi['ID'] and route.geometry.intersects(poi.geometry):
-                    logger.warning(f"""
-                    Invalid route example:
-                    - Route ID: {route['route_id']}
-                    - Destination: ({route['origin_x']}, {route['origin_y']})
-                    - Intersects with POI: {poi['ID']}
-                    """)
-                    invalid_count += 1
-                    break
+    outbound_routes = load_routes(outbound_file)
+    crossings = find_route_crossings(outbound_routes, poi_polygons, outbound_routes['origin_zone'])
+    log_validation(outbound_routes, crossings, 'origin_zone', 'Origin', 'Destination')
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
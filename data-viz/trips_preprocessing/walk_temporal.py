@@ -9,18 +9,21 @@ import sys
 # Add parent directory to Python path to access data_loader
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from data_loader import DataLoader
-from config import OUTPUT_DIR
+from config import OUTPUT_DIR, ROUTE_GEOJSON_EXPORT, TEMPORAL_CUBE_FILE
+from utils.route_writer import load_route_table
+from utils.temporal_store import write_temporal_store
+from utils.temporal_cube import TemporalCube, check_bin_minutes
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def load_walking_routes(input_file):
-    """Load walking routes from GeoJSON file"""
+    """Load the walking route table (distinct geometries) and the trips referencing it"""
     logger.info(f"Loading walking routes from {input_file}")
     try:
-        routes_gdf = gpd.read_file(input_file)
-        logger.info(f"Loaded {len(routes_gdf)} walking routes")
+        route_geometries, routes_gdf = load_route_table(input_file)
+        logger.info(f"Loaded {len(routes_gdf)} walking routes over {len(route_geometries)} distinct geometries")
         print(routes_gdf.head())
         print(routes_gdf.columns)
         # Group by origin zone and destination
@@ -36,126 +39,184 @@ def load_walking_routes(input_file):
                        f"{row['num_trips']:.1f} trips "
                        f"({row['num_trips']/row['zone_ped_trips']*100:.1f}% of pedestrian trips)")
         
-        return routes_gdf
+        return route_geometries, routes_gdf
         
     except Exception as e:
         logger.error(f"Failed to load walking routes: {str(e)}")
         raise
 
-def process_temporal_patterns(routes_gdf, temporal_data, output_file):
+def allocate_largest_remainder(totals, weights):
+    """Split each total across routes in proportion to weights.
+
+    Returns an integer (len(totals) x len(weights)) matrix whose rows sum
+    exactly to totals: every route gets the floor of its quota and the rows'
+    leftover trips go to the routes with the largest fractional remainders.
     """
-    Process temporal patterns at zone level for each destination
+    quotas = np.outer(totals, weights)
+    allocation = np.floor(quotas).astype(int)
+    leftover = np.asarray(totals) - allocation.sum(axis=1)
+    # Rank routes by remainder within each row (stable, so ties go to the earlier route)
+    order = np.argsort(allocation - quotas, axis=1, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(quotas.shape[1])[None, :], axis=1)
+    allocation += ranks < leftover[:, None]
+    return allocation
+
+def spread_minutes(counts, width=60):
+    """Minute offsets for cells of counts trips, spaced like np.linspace(0, width - 1, n, dtype=int)"""
+    counts = np.asarray(counts)
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    n = np.repeat(counts, counts)
+    k = np.arange(counts.sum()) - starts
+    step = (width - 1) / np.maximum(n - 1, 1)
+    minutes = (k * step).astype(int)
+    minutes[(k == n - 1) & (n > 1)] = width - 1  # linspace pins the endpoint
+    return minutes
+
+def expand_schedule(routes_gdf, temporal_data, bin_minutes=60):
+    """Departure schedule of individual trips for each zone and destination.
+
+    Each zone/destination pair's trips are split over the hours by the
+    destination's pedestrian_dist and over the zone's routes by their
+    num_trips share. With sub-hour bins (temporal_data then has a minute
+    column with each bin's start) each hour's trips are further split over
+    its bins by their share of the hour. Trips are then spread across their
+    bin's minutes. Returns a table with one row per trip: the position of its
+    route in routes_gdf (route_index), route_id, route_key and the departure
+    minute of the day.
     """
-    logger.info("Processing temporal patterns at zone level...")
-    
-    # First, aggregate trips by origin zone and destination
-    zone_aggregation = routes_gdf.groupby(['origin_zone', 'destination']).agg({
-        'num_trips': 'sum',
-        'zone_total_trips': 'first',
-        'zone_ped_trips': 'first'
-    }).reset_index()
+    bin_minutes = check_bin_minutes(bin_minutes)
+    per_hour = 60 // bin_minutes
+    routes = routes_gdf.reset_index(drop=True)
+    route_trips = routes['num_trips'].to_numpy(dtype=float)
+    minute = temporal_data['minute'] if 'minute' in temporal_data.columns else temporal_data['hour'] * 60
+    binned = temporal_data.assign(bin=minute // bin_minutes).pivot_table(
+        index='destination', columns='bin', values='pedestrian_dist', aggfunc='first'
+    ).reindex(columns=range(24 * per_hour)).fillna(0)
     
-    # Create base datetime for today
-    base_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    temporal_routes = []
-    
-    # Process each zone-destination pair
-    for _, zone_group in zone_aggregation.iterrows():
-        zone_id = zone_group['origin_zone']
-        destination = zone_group['destination']
-        total_zone_trips = zone_group['num_trips']
-        
+    route_index, departure_minutes = [], []
+    for (zone_id, destination), idx in routes.groupby(['origin_zone', 'destination'], sort=True).indices.items():
+        total_zone_trips = route_trips[idx].sum()
         logger.info(f"Processing zone {zone_id} trips to {destination} ({total_zone_trips:.1f} trips)")
         
-        # Get all routes for this zone-destination pair
-        zone_routes = routes_gdf[
-            (routes_gdf['origin_zone'] == zone_id) & 
-            (routes_gdf['destination'] == destination)
-        ].copy()
-        
-        # Convert to numpy arrays for calculations
-        route_trips_original = zone_routes['num_trips'].values
-        route_weights = route_trips_original / route_trips_original.sum()
+        bin_factors = binned.loc[destination].to_numpy().reshape(24, per_hour)
+        factors = bin_factors.sum(axis=1)
+        hours = np.nonzero(factors != 0)[0]
+        hour_trips = np.maximum(1, np.round(total_zone_trips * factors[hours]).astype(int))
         
-        # Process each hour
-        for hour in range(24):
-            # Get temporal factor for this hour
-            temporal_factor = temporal_data.loc[
-                (temporal_data['hour'] == hour) & 
-                (temporal_data['destination'] == destination),
-                'pedestrian_dist'
-            ].iloc[0]
-            
-            if temporal_factor == 0:
-                continue
-            
-            # Calculate trips for this hour
-            hour_trips = max(1, int(round(total_zone_trips * temporal_factor)))
-            
-            # Distribute hour_trips across routes based on weights
-            route_trips = np.round(route_weights * hour_trips).astype(int)
-            
-            # Adjust for rounding errors
-            if route_trips.sum() != hour_trips:
-                diff = hour_trips - route_trips.sum()
-                # Get indices of routes with highest weights
-                indices = np.argsort(route_weights)[-abs(diff):]
-                route_trips[indices] += np.sign(diff)
-            
-            # Create copies of routes with updated times
-            for route_idx, num_trips in enumerate(route_trips):
-                if num_trips == 0:
-                    continue
-                
-                route = zone_routes.iloc[route_idx].copy()
-                
-                # Distribute trips across minutes
-                minutes = np.linspace(0, 59, num_trips, dtype=int)
-                
-                for minute in minutes:
-                    route_copy = route.copy()
-                    departure_time = base_date + pd.Timedelta(hours=hour, minutes=minute)
-                    route_copy['departure_time'] = departure_time
-                    route_copy['arrival_time'] = departure_time
-                    route_copy['num_trips'] = 1  # Each route now represents one trip
-                    temporal_routes.append(route_copy)
+        # (hour x route) trip counts, then each cell split over the hour's bins
+        allocation = allocate_largest_remainder(hour_trips, route_trips[idx] / total_zone_trips)
+        cell_hour, cell_route = np.nonzero(allocation)
+        cell_bins = np.zeros((len(cell_hour), per_hour), dtype=int)
+        for h in np.unique(cell_hour):
+            rows = cell_hour == h
+            hour = hours[h]
+            cell_bins[rows] = allocate_largest_remainder(
+                allocation[h, cell_route[rows]], bin_factors[hour] / factors[hour]
+            )
+        cell, sub_bin = np.nonzero(cell_bins)
+        counts = cell_bins[cell, sub_bin]
+        route_index.append(np.repeat(idx[cell_route[cell]], counts))
+        bin_start = hours[cell_hour[cell]] * 60 + sub_bin * bin_minutes
+        departure_minutes.append(np.repeat(bin_start, counts) + spread_minutes(counts, bin_minutes))
+    
+    route_index = np.concatenate(route_index) if route_index else np.array([], dtype=int)
+    schedule = pd.DataFrame({
+        'route_index': route_index,
+        'route_id': routes['route_id'].to_numpy()[route_index],
+        'route_key': routes['route_key'].to_numpy()[route_index],
+        'departure_minute': np.concatenate(departure_minutes) if departure_minutes else np.array([], dtype=int)
+    })
+    return schedule
+
+def process_temporal_patterns(routes_gdf, temporal_data, output_base, route_geometries, bin_minutes=60):
+    """
+    Process temporal patterns at zone level for each destination.
     
-    # Create new GeoDataFrame with temporal routes
-    temporal_gdf = gpd.GeoDataFrame(temporal_routes, crs=routes_gdf.crs)
-    logger.info(f"Generated {len(temporal_gdf)} temporal routes")
+    routes_gdf is the trip table and route_geometries its distinct geometries
+    by route_key. The result is written as a temporal store at output_base
+    (see utils.temporal_store): each scheduled route once, with its geometry,
+    plus one schedule row per route and departure second. With
+    ROUTE_GEOJSON_EXPORT the expanded per-trip GeoJSON is written as well.
+    """
+    logger.info("Processing temporal patterns at zone level...")
     
-    # Save processed data
-    temporal_gdf.to_file(output_file, driver="GeoJSON")
-    logger.info(f"Saved processed routes to {output_file}")
+    schedule = expand_schedule(routes_gdf, temporal_data, bin_minutes)
+    
+    # Each scheduled route is stored once, with the attributes of its trip table row
+    route_index = np.unique(schedule['route_index'].to_numpy())
+    routes = routes_gdf.reset_index(drop=True).iloc[route_index].reset_index(drop=True)
+    routes = gpd.GeoDataFrame(
+        routes,
+        geometry=route_geometries.geometry.loc[routes['route_key']].values,
+        crs=route_geometries.crs
+    )
+    write_temporal_store(output_base, routes, pd.DataFrame({
+        'route_id': schedule['route_id'],
+        'departure_seconds': schedule['departure_minute'] * 60
+    }))
+    logger.info(f"Generated {len(schedule)} temporal routes over {len(routes)} distinct routes")
+    
+    if ROUTE_GEOJSON_EXPORT:
+        export_temporal_geojson(routes_gdf, schedule, route_geometries, output_base + '.geojson')
     
     # Log temporal distribution statistics
-    hour_dist = temporal_gdf.groupby([temporal_gdf['departure_time'].dt.hour, 'destination']).size().unstack(fill_value=0)
+    destinations = routes_gdf['destination'].to_numpy()[schedule['route_index'].to_numpy()]
+    hour_dist = pd.crosstab(schedule['departure_minute'].to_numpy() // 60, destinations)
     logger.info("\nTemporal distribution of processed routes by destination:")
     logger.info(hour_dist)
     
-    return temporal_gdf
+    return schedule
+
+def export_temporal_geojson(routes_gdf, schedule, route_geometries, output_file):
+    """Write the schedule as one GeoJSON feature per trip (the pre-store format)"""
+    # Create base datetime for today
+    base_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    departure_times = pd.Timestamp(base_date) + pd.to_timedelta(schedule['departure_minute'].to_numpy(), unit='m')
+    
+    # Each expanded row represents one trip on its route
+    temporal_df = routes_gdf.reset_index(drop=True).iloc[schedule['route_index'].to_numpy()].reset_index(drop=True)
+    temporal_df['departure_time'] = departure_times
+    temporal_df['arrival_time'] = departure_times
+    temporal_df['num_trips'] = 1
+    temporal_gdf = gpd.GeoDataFrame(
+        temporal_df,
+        geometry=route_geometries.geometry.loc[schedule['route_key']].values,
+        crs=route_geometries.crs
+    )
+    temporal_gdf.to_file(output_file, driver="GeoJSON")
+    logger.info(f"Saved {len(temporal_gdf)} temporal routes to {output_file}")
 
 def main():
     # Input files from config
     input_file = os.path.join(OUTPUT_DIR, "walk_routes_inbound.geojson")
     bgu_temporal_file = os.path.join(OUTPUT_DIR, "ben_gurion_university_inbound_temporal.csv")
     soroka_temporal_file = os.path.join(OUTPUT_DIR, "soroka_medical_center_inbound_temporal.csv")
-    output_file = os.path.join(OUTPUT_DIR, "temporal_arcs.json")
+    output_base = os.path.join(OUTPUT_DIR, "temporal_arcs")
     
     # Load walking routes
-    routes_gdf = load_walking_routes(input_file)
-    
-    # Load and combine temporal distributions
-    bgu_temporal = pd.read_csv(bgu_temporal_file)
-    bgu_temporal['destination'] = 'Ben-Gurion-University'
-    soroka_temporal = pd.read_csv(soroka_temporal_file)
-    soroka_temporal['destination'] = 'Soroka-Medical-Center'
+    route_geometries, routes_gdf = load_walking_routes(input_file)
     
-    temporal_data = pd.concat([bgu_temporal, soroka_temporal])
+    # Load and combine temporal distributions: the temporal cube's bins if it exists, else the hourly CSVs
+    destinations = ['Ben-Gurion-University', 'Soroka-Medical-Center']
+    if os.path.exists(TEMPORAL_CUBE_FILE):
+        cube = TemporalCube.load(TEMPORAL_CUBE_FILE)
+        logger.info(f"Using {cube.bin_minutes}-minute temporal bins from {TEMPORAL_CUBE_FILE}")
+        temporal_data = pd.concat([
+            cube.poi_frame(destination, 'inbound', ['pedestrian']).assign(destination=destination)
+            for destination in destinations
+        ])
+        bin_minutes = cube.bin_minutes
+    else:
+        bgu_temporal = pd.read_csv(bgu_temporal_file)
+        bgu_temporal['destination'] = 'Ben-Gurion-University'
+        soroka_temporal = pd.read_csv(soroka_temporal_file)
+        soroka_temporal['destination'] = 'Soroka-Medical-Center'
+        temporal_data = pd.concat([bgu_temporal, soroka_temporal])
+        bin_minutes = 60
     
     # Process temporal patterns
-    arc_data = process_temporal_patterns(routes_gdf, temporal_data, output_file)
+    process_temporal_patterns(routes_gdf, temporal_data, output_base, route_geometries, bin_minutes)
     
     logger.info("Processing complete")
 
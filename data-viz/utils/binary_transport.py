@@ -0,0 +1,271 @@
+"""
+Binary data transport for the deck.gl HTML outputs.
+
+Instead of inlining trips, buildings and segments as JSON, a generator packs
+them into typed columnar tables (Float32 positions, Uint32/Float32
+timestamps, Uint8 colors, start-index offsets for paths and polygons). A
+BinaryBundle writes the tables either to one sidecar .bin file next to the
+page ('bin', which the browser must fetch over HTTP) or as base64 chunks in
+the page itself ('base64', which also works from file://). The page gets a
+small JSON manifest and BINARY_LOADER_JS, which turns the buffers back into
+typed arrays and into deck.gl binary attribute data for the layers.
+"""
+import os
+import json
+import base64
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TRANSPORT_MODES = ('json', 'bin', 'base64')
+
+# NumPy dtype -> JavaScript typed array constructor
+TYPED_ARRAYS = {
+    'float32': 'Float32Array',
+    'float64': 'Float64Array',
+    'uint8': 'Uint8Array',
+    'uint16': 'Uint16Array',
+    'uint32': 'Uint32Array',
+    'int32': 'Int32Array'
+}
+
+# Buffers start on multiples of this many bytes, so every typed array view is aligned
+ALIGNMENT = 8
+
+
+def check_transport(mode):
+    """Validate an HTML data transport mode"""
+    if mode not in TRANSPORT_MODES:
+        raise ValueError(f"Unknown HTML data transport {mode!r}, expected one of {TRANSPORT_MODES}")
+    return mode
+
+
+def flatten_paths(paths, dims=2):
+    """Flattened (n, dims) float32 positions and (len(paths) + 1) vertex offsets of a list of coordinate lists"""
+    lengths = np.fromiter((len(path) for path in paths), dtype=np.int64, count=len(paths))
+    offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    positions = np.zeros((offsets[-1], dims), dtype=np.float32)
+    for path, start in zip(paths, offsets[:-1].tolist()):
+        if len(path):
+            coords = np.asarray(path, dtype=np.float32)[:, :dims]
+            positions[start:start + len(coords), :coords.shape[1]] = coords
+    return positions, offsets
+
+
+def counter_clockwise(positions, offsets):
+    """Positions with every clockwise ring reversed, as deck.gl expects for unnormalized polygons.
+
+    Rings must be closed (last vertex equal to the first).
+    """
+    ring = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    x, y = positions[:, 0].astype(float), positions[:, 1].astype(float)
+    # Shoelace terms of the edges between consecutive vertices of the same ring
+    same_ring = ring[:-1] == ring[1:]
+    terms = (x[:-1] * y[1:] - x[1:] * y[:-1])[same_ring]
+    area = np.bincount(ring[:-1][same_ring], weights=terms, minlength=len(offsets) - 1)
+
+    order = np.arange(len(positions))
+    for start, end in zip(offsets[:-1][area < 0].tolist(), offsets[1:][area < 0].tolist()):
+        order[start:end] = order[start:end][::-1]
+    return positions[order]
+
+
+def per_vertex(values, offsets):
+    """Repeat per-object values (n,) or (n, k) onto the vertices of ragged paths with the given offsets"""
+    return np.repeat(np.asarray(values), np.diff(offsets), axis=0)
+
+
+class BinaryTable:
+    """Typed columns of one dataset.
+
+    Columns have one row per object (length) or, for path and polygon
+    tables, one row per vertex (offsets[-1]); 2-D columns have one
+    attribute of size columns[key].shape[1] per row.
+    """
+
+    def __init__(self, length, offsets=None):
+        self.length = int(length)
+        self.offsets = None if offsets is None else np.asarray(offsets, dtype=np.int64)
+        self.columns = {}
+        self.float_columns = set()
+
+    def add(self, key, values, dtype, as_float=False):
+        """Add a column stored as dtype; as_float columns are converted to Float32Array on load.
+
+        as_float lets integer data (e.g. millisecond timestamps) travel as
+        compact Uint32 while deck.gl still gets float attributes.
+        """
+        values = np.ascontiguousarray(values, dtype=dtype)
+        rows = {self.length} if self.offsets is None else {self.length, int(self.offsets[-1])}
+        if values.shape[0] not in rows:
+            raise ValueError(f"Column {key} has {values.shape[0]} rows, expected one of {sorted(rows)}")
+        if values.dtype.name not in TYPED_ARRAYS:
+            raise ValueError(f"Column {key} has unsupported dtype {values.dtype.name}")
+        self.columns[key] = values
+        if as_float:
+            self.float_columns.add(key)
+        return self
+
+    @property
+    def nbytes(self):
+        start_bytes = 0 if self.offsets is None else 4 * self.length
+        return start_bytes + sum(values.nbytes for values in self.columns.values())
+
+
+class BinaryBundle:
+    """Named BinaryTables written together as one sidecar file or as base64 chunks"""
+
+    def __init__(self):
+        self.tables = {}
+
+    def add_table(self, name, length, offsets=None):
+        self.tables[name] = BinaryTable(length, offsets)
+        return self.tables[name]
+
+    def add_paths(self, name, paths, dims=2):
+        """Table of paths with their Float32 'positions' column; add per-vertex attributes to it"""
+        positions, offsets = flatten_paths(paths, dims)
+        return self.add_table(name, len(paths), offsets).add('positions', positions, np.float32)
+
+    def add_polygons(self, name, rings, dims=2):
+        """Table of closed, counter-clockwise polygon rings with their Float32 'positions' column"""
+        positions, offsets = flatten_paths(rings, dims)
+        positions = counter_clockwise(positions, offsets)
+        return self.add_table(name, len(rings), offsets).add('positions', positions, np.float32)
+
+    def add_polygon_features(self, name, features):
+        """Table of deck.gl polygon records (polygon, height, color) with per-vertex heights and colors"""
+        table = self.add_polygons(name, [feature['polygon'] for feature in features])
+        heights = np.array([feature['height'] for feature in features], dtype=float)
+        colors = np.array([feature['color'] for feature in features], dtype=np.uint8).reshape(len(features), -1)
+        table.add('heights', per_vertex(heights, table.offsets), np.float32)
+        table.add('colors', per_vertex(colors, table.offsets), np.uint8)
+        return table
+
+    @property
+    def nbytes(self):
+        return sum(table.nbytes for table in self.tables.values())
+
+    def _buffers(self):
+        """(table, column, array) for every buffer, start indices first"""
+        for name, table in self.tables.items():
+            if table.offsets is not None:
+                yield name, 'startIndices', table.offsets[:-1].astype(np.uint32), table
+            for key, values in table.columns.items():
+                yield name, key, values, table
+
+    def write(self, html_path, mode):
+        """Write the buffers for the page at html_path and return its JSON-able manifest.
+
+        'bin' writes <page>.bin next to it and references it by file name;
+        'base64' embeds every buffer as its own base64 chunk.
+        """
+        check_transport(mode)
+        if mode == 'json':
+            raise ValueError("A binary bundle needs the 'bin' or 'base64' transport")
+        manifest = {'tables': {}, 'buffers': []}
+        for name, table in self.tables.items():
+            manifest['tables'][name] = {'length': table.length, 'paths': table.offsets is not None}
+
+        chunks = []
+        offset = 0
+        for name, key, values, table in self._buffers():
+            entry = {
+                'table': name, 'column': key, 'type': TYPED_ARRAYS[values.dtype.name],
+                'count': int(values.size), 'size': int(values.shape[1]) if values.ndim > 1 else 1,
+                'float': key in table.float_columns
+            }
+            data = values.tobytes()
+            if mode == 'bin':
+                padding = -offset % ALIGNMENT
+                chunks.append(b'\0' * padding + data)
+                offset += padding
+                entry['offset'] = offset
+                offset += len(data)
+            else:
+                entry['base64'] = base64.b64encode(data).decode('ascii')
+            manifest['buffers'].append(entry)
+
+        if mode == 'bin':
+            bin_path = os.path.splitext(html_path)[0] + '.bin'
+            with open(bin_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            manifest['url'] = os.path.basename(bin_path)
+            logger.info(f"Wrote {offset / 1e6:.1f} MB of binary layer data to {bin_path}")
+        return manifest
+
+    def report(self, json_payload, manifest):
+        """Compare the size of the JSON payload these tables replace with their transported size.
+
+        Only sizes are reported here; the page logs the browser-side load time
+        of the binary tables (loadBinaryTables).
+        """
+        stats = {
+            'json_bytes': len(json_payload.encode()),
+            'page_bytes': len(json.dumps(manifest)),
+            'sidecar_bytes': self.nbytes if 'url' in manifest else 0
+        }
+        logger.info(f"Layer data: JSON {stats['json_bytes'] / 1e6:.1f} MB vs binary "
+                    f"{stats['page_bytes'] / 1e6:.1f} MB in page + {stats['sidecar_bytes'] / 1e6:.1f} MB sidecar")
+        return stats
+
+
+# Page-side loader: loadBinaryTables(manifest) resolves to {tables, ms}, where each
+# table is {length, startIndices, columns}; binaryLayerData(table, accessors) maps
+# columns to deck.gl binary attributes, e.g. {getPath: 'positions', getColor: 'colors'}.
+BINARY_LOADER_JS = """
+        async function loadBinaryTables(manifest) {
+            const started = performance.now();
+            let sidecar = null;
+            if (manifest.url) {
+                const response = await fetch(manifest.url);
+                if (!response.ok) {
+                    throw new Error(`Could not load ${manifest.url}: ${response.status}`);
+                }
+                sidecar = await response.arrayBuffer();
+            }
+            const tables = {};
+            Object.entries(manifest.tables).forEach(([name, info]) => {
+                tables[name] = {length: info.length, startIndices: null, columns: {}, sizes: {}};
+            });
+            await Promise.all(manifest.buffers.map(async entry => {
+                let buffer, byteOffset = 0;
+                if (sidecar) {
+                    buffer = sidecar;
+                    byteOffset = entry.offset;
+                } else {
+                    const response = await fetch(`data:application/octet-stream;base64,${entry.base64}`);
+                    buffer = await response.arrayBuffer();
+                }
+                let values = new globalThis[entry.type](buffer, byteOffset, entry.count);
+                if (entry.float) {
+                    values = Float32Array.from(values);
+                }
+                const table = tables[entry.table];
+                if (entry.column === 'startIndices') {
+                    table.startIndices = values;
+                } else {
+                    table.columns[entry.column] = values;
+                    table.sizes[entry.column] = entry.size;
+                }
+            }));
+            const ms = performance.now() - started;
+            console.log(`Loaded binary layer data in ${ms.toFixed(0)} ms`);
+            return {tables, ms};
+        }
+
+        function binaryLayerData(table, accessors) {
+            const attributes = {};
+            Object.entries(accessors).forEach(([accessor, column]) => {
+                attributes[accessor] = {value: table.columns[column], size: table.sizes[column]};
+            });
+            const data = {length: table.length, attributes};
+            if (table.startIndices) {
+                data.startIndices = table.startIndices;
+            }
+            return data;
+        }
+"""
@@ -0,0 +1,134 @@
+"""
+Preprocessed building footprints for the 3D building layers.
+
+buildings.geojson is read once, every building is tagged with the POI
+polygon it intersects through a single spatial join, and the footprints are
+stored as one flattened exterior-ring coordinate array plus per-building
+offsets, with height, centroid and POI ID arrays, in a compressed .npz.
+Visualization scripts load it in milliseconds and derive their display
+heights and colors with array operations instead of per-building loops.
+"""
+import os
+import logging
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+logger = logging.getLogger(__name__)
+
+# POI ID of buildings outside every POI polygon
+NO_POI = -1
+# Height used for buildings without a height attribute
+DEFAULT_HEIGHT = 20.0
+# Color of buildings outside the POIs in every building layer
+DEFAULT_BUILDING_COLOR = [74, 80, 87, 160]
+
+
+class BuildingArtifact:
+    """Building footprints as flat arrays.
+
+    Building i's exterior ring is coords[offsets[i]:offsets[i + 1]];
+    heights are the raw height attribute, centroids the footprint centroids
+    and poi_ids the ID of the first POI polygon the building intersects
+    (NO_POI if none). Coordinates are in crs.
+    """
+
+    def __init__(self, coords, offsets, heights, centroids, poi_ids, crs=None):
+        self.coords = np.asarray(coords, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.heights = np.asarray(heights, dtype=float)
+        self.centroids = np.asarray(centroids, dtype=float)
+        self.poi_ids = np.asarray(poi_ids, dtype=np.int64)
+        self.crs = crs
+
+    def __len__(self):
+        return len(self.heights)
+
+    @classmethod
+    def from_geodataframe(cls, buildings_gdf, poi_polygons):
+        """Flatten building polygons and tag them with POI polygon IDs in one sjoin"""
+        buildings = buildings_gdf[~(buildings_gdf.geometry.isna() | buildings_gdf.geometry.is_empty)]
+        # Multi-part buildings become one footprint per part
+        buildings = buildings.explode(index_parts=False).reset_index(drop=True)
+        buildings = buildings[buildings.geom_type == 'Polygon'].reset_index(drop=True)
+
+        if 'height' in buildings.columns:
+            heights = pd.to_numeric(buildings['height'], errors='coerce').to_numpy(dtype=float)
+        else:
+            heights = np.full(len(buildings), DEFAULT_HEIGHT)
+
+        # First intersecting POI polygon (in poi_polygons order) for every building
+        poi_ids = np.full(len(buildings), NO_POI, dtype=np.int64)
+        if poi_polygons is not None and len(poi_polygons):
+            pois = poi_polygons[['ID', 'geometry']].reset_index(drop=True)
+            if buildings.crs is not None and pois.crs is not None:
+                pois = pois.to_crs(buildings.crs)
+            joined = gpd.sjoin(buildings[['geometry']], pois, how='inner', predicate='intersects')
+            first_poi = joined['index_right'].groupby(level=0).min()
+            poi_ids[first_poi.index.to_numpy()] = pois['ID'].to_numpy(dtype=np.int64)[first_poi.to_numpy()]
+
+        exteriors = shapely.get_exterior_ring(buildings.geometry.values)
+        coords, ring_index = shapely.get_coordinates(exteriors, return_index=True)
+        offsets = np.zeros(len(buildings) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ring_index, minlength=len(buildings)), out=offsets[1:])
+        centroids = shapely.get_coordinates(shapely.centroid(buildings.geometry.values))
+
+        logger.info(f"Flattened {len(buildings)} buildings, {np.count_nonzero(poi_ids != NO_POI)} in POI polygons")
+        crs = buildings.crs.to_string() if buildings.crs is not None else None
+        return cls(coords, offsets, heights, centroids, poi_ids, crs=crs)
+
+    @classmethod
+    def cached(cls, path, buildings_file, poi_polygons=None):
+        """Artifact at path, rebuilt from buildings_file if it is missing or older.
+
+        With poi_polygons it is also rebuilt unless it was tagged with (at
+        least) their IDs; without, any existing artifact is used as is.
+        """
+        poi_set = None if poi_polygons is None else sorted(int(poi_id) for poi_id in poi_polygons['ID'])
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(buildings_file):
+            artifact, saved_poi_set = cls.load(path, with_poi_set=True)
+            if poi_set is None or set(poi_set) <= set(saved_poi_set):
+                logger.info(f"Loaded {len(artifact)} buildings from {path}")
+                return artifact
+            logger.info(f"POI polygons changed, rebuilding building artifact at {path}")
+        artifact = cls.from_geodataframe(gpd.read_file(buildings_file), poi_polygons)
+        artifact.save(path, poi_set or ())
+        return artifact
+
+    def rings(self):
+        """Exterior ring of every building as a list of [x, y] lists"""
+        coords = self.coords.tolist()
+        offsets = self.offsets.tolist()
+        return [coords[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def poi_names(self, id_map):
+        """Name of every building's POI from an ID -> name map (None outside the mapped POIs)"""
+        return np.array([id_map.get(poi_id) for poi_id in self.poi_ids.tolist()], dtype=object)
+
+    def near(self, points, radius):
+        """Index of the first of points (n, 2) within radius of each building's centroid, -1 if none"""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        distances = np.linalg.norm(self.centroids[:, None, :] - points[None, :, :], axis=-1)
+        within = distances <= radius
+        return np.where(within.any(axis=1), within.argmax(axis=1), -1)
+
+    def features(self, heights, colors, mask=None):
+        """deck.gl PolygonLayer records (polygon, height, color), for the buildings in mask if given"""
+        rings = self.rings()
+        heights = np.broadcast_to(np.asarray(heights, dtype=float), (len(self),)).tolist()
+        index = range(len(self)) if mask is None else np.nonzero(mask)[0].tolist()
+        return [{"polygon": rings[i], "height": heights[i], "color": colors[i]} for i in index]
+
+    def save(self, path, poi_set=()):
+        np.savez_compressed(path, coords=self.coords, offsets=self.offsets, heights=self.heights,
+                            centroids=self.centroids, poi_ids=self.poi_ids, crs=self.crs or '',
+                            poi_set=np.array(sorted(int(poi_id) for poi_id in poi_set), dtype=np.int64))
+
+    @classmethod
+    def load(cls, path, with_poi_set=False):
+        with np.load(path) as data:
+            artifact = cls(data['coords'], data['offsets'], data['heights'], data['centroids'],
+                           data['poi_ids'], crs=str(data['crs']) or None)
+            poi_set = data['poi_set'].tolist()
+        return (artifact, poi_set) if with_poi_set else artifact
@@ -0,0 +1,96 @@
+"""
+Lookup-table color mapping for the segment and trip layers.
+
+Each color scheme is a list of color stops on [0, 1]. A Colormap
+interpolates them once into a LUT_SIZE-entry RGB table; mapping an array of
+normalized values (optionally cube-root or log scaled first) is then a
+single NumPy indexing operation instead of a stop search per value. With
+1024 entries the lookup differs from exact interpolation by at most a
+couple of color levels.
+"""
+from functools import lru_cache
+import numpy as np
+
+# Entries of every precomputed color table
+LUT_SIZE = 1024
+
+# Color stops (position -> RGB) of the named schemes
+COLOR_SCHEMES = {
+    # Road usage: dark blue -> light blue -> blue-green -> yellow, by cube-root trip ratio
+    'road_usage': {
+        0.0: [20, 42, 120],     # Dark blue
+        0.2: [40, 80, 180],     # Medium blue
+        0.4: [65, 182, 196],    # Light blue
+        0.6: [120, 200, 150],   # Blue-green
+        0.8: [200, 220, 100],   # Yellow-green
+        1.0: [255, 255, 0]      # Bright yellow
+    },
+    # Hourly segment loads: blues -> cyan -> green -> gold -> red-orange, by load bin
+    'temporal_load': {
+        0.0: [10, 20, 90],      # Dark blue
+        0.15: [65, 105, 225],   # Royal blue
+        0.3: [30, 144, 255],    # Dodger blue
+        0.45: [0, 191, 255],    # Deep sky blue
+        0.6: [0, 255, 255],     # Cyan
+        0.7: [50, 205, 50],     # Lime green
+        0.8: [255, 215, 0],     # Gold
+        0.9: [255, 140, 0],     # Dark orange
+        1.0: [255, 69, 0]       # Red-orange
+    }
+}
+
+# Value scalings applied before the lookup, all mapping [0, 1] onto [0, 1]
+SCALES = {
+    'linear': lambda values: values,
+    'cbrt': np.cbrt,
+    'log': lambda values: np.log10(1 + 9 * values)
+}
+
+
+class Colormap:
+    """RGB lookup table interpolated from color stops"""
+
+    def __init__(self, stops, size=LUT_SIZE):
+        positions = np.array(sorted(stops), dtype=float)
+        colors = np.array([stops[position] for position in sorted(stops)], dtype=float)
+        grid = np.linspace(0, 1, size)
+        self.lut = np.column_stack([np.interp(grid, positions, colors[:, channel]) for channel in range(3)])
+
+    def rgb(self, values, scale='linear'):
+        """Float RGB (n, 3) of normalized values, clipped to [0, 1] after scaling"""
+        values = np.clip(SCALES[scale](np.asarray(values, dtype=float)), 0, 1)
+        return self.lut[np.rint(values * (len(self.lut) - 1)).astype(np.intp)]
+
+    def rgba(self, values, alpha, scale='linear', brightness=1.0):
+        """uint8 RGBA (n, 4) of normalized values, RGB multiplied by brightness and truncated"""
+        rgb = self.rgb(values, scale) * np.asarray(brightness, dtype=float).reshape(-1, 1)
+        alpha = np.broadcast_to(np.asarray(alpha, dtype=float), (len(rgb),))
+        return np.column_stack([np.minimum(255, rgb.astype(np.int64)), np.minimum(255, alpha.astype(np.int64))]).astype(np.uint8)
+
+
+@lru_cache(maxsize=None)
+def get_colormap(name, size=LUT_SIZE):
+    """Colormap of a named scheme, built once per process"""
+    return Colormap(COLOR_SCHEMES[name], size)
+
+
+def road_usage_colors(trip_ratios, distance_ratios):
+    """RGBA of road segments by trip ratio (cube-root scaled), brighter and more opaque mid-segment"""
+    smoothing = np.exp(-4 * (np.asarray(distance_ratios, dtype=float) - 0.5) ** 2)
+    brightness = 0.7 + 0.3 * smoothing
+    return get_colormap('road_usage').rgba(trip_ratios, 255 * brightness, scale='cbrt', brightness=brightness)
+
+
+def temporal_load_colors(loads, color_scale, temporal_weights):
+    """RGBA of hourly segment loads by their bin in color_scale (mean, std, max, bin edges).
+
+    The bin position is sigmoid-stretched and raised by up to 30% with the
+    temporal weight, which also boosts saturation and opacity.
+    """
+    bins = np.asarray(color_scale[3], dtype=float)
+    temporal_weights = np.asarray(temporal_weights, dtype=float)
+    position = (np.digitize(loads, bins) - 1) / (len(bins) - 1)
+    position = 1 / (1 + np.exp(-5 * (position - 0.5)))
+    position = np.minimum(1.0, position * (1 + np.minimum(0.3, temporal_weights)))
+    return get_colormap('temporal_load').rgba(position, 200 + temporal_weights * 55,
+                                              brightness=1 + temporal_weights * 0.2)
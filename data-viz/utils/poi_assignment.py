@@ -0,0 +1,55 @@
+"""
+Vectorized assignment of routes to the POI polygons they start or end at.
+
+All route endpoints are taken as one coordinate array and projected, with
+the POI polygons, to the Israeli TM grid so the radius is in meters. Each
+endpoint is then matched to its nearest POI with a single STRtree
+query_nearest call bounded by max_distance.
+"""
+import logging
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+logger = logging.getLogger(__name__)
+
+# Israeli Transverse Mercator, for metric distances around Beer Sheva
+METRIC_CRS = "EPSG:2039"
+# Default distance (meters) a route endpoint may lie from a POI polygon to be assigned to it
+DEFAULT_POI_RADIUS_M = 200.0
+
+
+def route_endpoints(geometries, end=True):
+    """Last (or first) coordinate of every route as an (n, 2) array, plus the route position of each.
+
+    Missing and empty geometries have no endpoint and are left out.
+    """
+    points = shapely.get_point(np.asarray(geometries), -1 if end else 0)
+    return shapely.get_coordinates(points, return_index=True)
+
+
+def to_metric(geometries, crs):
+    """Geometries (in crs, default WGS84) transformed to METRIC_CRS"""
+    transformer = Transformer.from_crs(crs or "EPSG:4326", METRIC_CRS, always_xy=True)
+    return shapely.transform(np.asarray(geometries), lambda xy: np.column_stack(transformer.transform(xy[:, 0], xy[:, 1])))
+
+
+def assign_pois(routes_gdf, poi_polygons, labels=None, radius=DEFAULT_POI_RADIUS_M, end=True):
+    """POI of every route: the nearest polygon within radius meters of its endpoint.
+
+    labels gives one name per POI polygon (default: the polygons' ID column).
+    Returns a Series aligned with routes_gdf, None where no POI is in range.
+    """
+    labels = np.asarray(list(poi_polygons['ID'] if labels is None else labels), dtype=object)
+    assigned = np.full(len(routes_gdf), None, dtype=object)
+
+    coords, route_index = route_endpoints(routes_gdf.geometry.values, end=end)
+    if len(coords) and len(poi_polygons):
+        points = to_metric(shapely.points(coords), routes_gdf.crs)
+        tree = shapely.STRtree(to_metric(poi_polygons.geometry.values, poi_polygons.crs))
+        point_index, poi_index = tree.query_nearest(points, max_distance=radius)
+        assigned[route_index[point_index]] = labels[poi_index]
+
+    logger.debug(f"Assigned {pd.notna(assigned).sum()} of {len(routes_gdf)} routes to a POI")
+    return pd.Series(assigned, index=routes_gdf.index, name='poi', dtype=object)
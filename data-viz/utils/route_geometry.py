@@ -0,0 +1,94 @@
+"""
+Vectorized geodesic lengths and truncation of WGS84 routes.
+
+Routes are handled as one ragged coordinate array: all vertices stacked in
+an (n, 2) lon/lat array, with route i's vertices at
+coords[offsets[i]:offsets[i + 1]]. Haversine segment lengths, cumulative
+lengths and truncation points are computed for every route in a single
+NumPy pass instead of per-vertex Python loops.
+"""
+import numpy as np
+import shapely
+
+# Mean earth radius (kilometers) used by the haversine formula
+EARTH_RADIUS_KM = 6371.0
+
+
+def ragged_coordinates(geometries):
+    """Stacked (n, 2) coordinates and (len(geometries) + 1) vertex offsets of line geometries.
+
+    Missing and empty geometries become routes without vertices.
+    """
+    geometries = np.asarray(geometries)
+    coords, route_index = shapely.get_coordinates(geometries, return_index=True)
+    offsets = np.zeros(len(geometries) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(route_index, minlength=len(geometries)), out=offsets[1:])
+    return coords, offsets
+
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    """Great-circle distance in kilometers between arrays of lon/lat points (degrees)"""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def cumulative_lengths(coords, offsets):
+    """Distance in kilometers along its route of every vertex (0 at each route's first vertex)"""
+    coords = np.asarray(coords, dtype=float)
+    segments = np.zeros(len(coords))
+    if len(coords) > 1:
+        segments[1:] = haversine_km(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    # Segments that span two routes do not count
+    starts = np.asarray(offsets[:-1])
+    segments[starts[starts < len(coords)]] = 0
+    cumulative = np.cumsum(segments)
+    route = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    return cumulative - cumulative[np.asarray(offsets)[route]] if len(coords) else cumulative
+
+
+def route_lengths(coords, offsets):
+    """Length in kilometers of every route"""
+    offsets = np.asarray(offsets)
+    lengths = np.zeros(len(offsets) - 1)
+    nonempty = np.diff(offsets) > 0
+    lengths[nonempty] = cumulative_lengths(coords, offsets)[offsets[1:][nonempty] - 1]
+    return lengths
+
+
+def truncate_routes(coords, offsets, max_km, interpolate=False):
+    """Routes cut at the first vertex that reaches max_km along them.
+
+    Returns the truncated ragged coordinates, their offsets and a boolean
+    per route telling whether it reached max_km. The vertex that reaches
+    max_km is kept; with interpolate it is moved back along its segment to
+    the exact max_km point.
+    """
+    coords = np.asarray(coords, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    route = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    cumulative = cumulative_lengths(coords, offsets)
+
+    # First vertex after the start at or beyond max_km, per route
+    reached = cumulative >= max_km
+    reached[offsets[:-1][np.diff(offsets) > 0]] = False
+    hit_routes, first = np.unique(route[reached], return_index=True)
+    last = np.nonzero(reached)[0][first]
+
+    ends = offsets[1:].copy()
+    ends[hit_routes] = last + 1
+    truncated = np.zeros(len(offsets) - 1, dtype=bool)
+    truncated[hit_routes] = True
+
+    kept = np.arange(len(coords)) < ends[route]
+    new_offsets = np.zeros_like(offsets)
+    np.cumsum(ends - offsets[:-1], out=new_offsets[1:])
+    new_coords = coords[kept]
+
+    if interpolate and len(last):
+        before, after = cumulative[last - 1], cumulative[last]
+        fraction = np.divide(max_km - before, after - before, out=np.ones(len(last)), where=after > before)
+        new_coords[new_offsets[hit_routes + 1] - 1] = (
+            coords[last - 1] + fraction[:, None] * (coords[last] - coords[last - 1])
+        )
+    return new_coords, new_offsets, truncated
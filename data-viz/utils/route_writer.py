@@ -0,0 +1,382 @@
+"""
+Streaming writer and loader for generated route files.
+
+Route generators hand records to a RouteWriter one at a time. Records are
+buffered in small batches and appended as Parquet row groups, so memory stays
+flat however many routes are generated. On close the spool is kept as
+GeoParquet or streamed into a FlatGeobuf file (with spatial index, which
+stores features in index order), and a GeoJSON copy can be exported on request.
+
+RouteTableWriter splits the output into a route table holding each distinct
+geometry once, keyed by a hash of its coordinates, and a trip table whose rows
+reference a route_key and carry the trip attributes and weights.
+"""
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import shapely
+from pyproj import CRS
+
+logger = logging.getLogger(__name__)
+
+ROUTE_FORMAT_EXTENSIONS = {
+    'parquet': '.parquet',
+    'fgb': '.fgb',
+    'geojson': '.geojson'
+}
+
+# Arrow types for the schema field names used below
+FIELD_TYPES = {
+    'string': pa.string(),
+    'int64': pa.int64(),
+    'float64': pa.float64(),
+    'bool': pa.bool_(),
+    'timestamp': pa.timestamp('us')
+}
+
+# In both route schemas origin_zone and destination hold a zone ID or a POI
+# name depending on the trip direction, so they are stored as text
+WALK_ROUTE_FIELDS = {
+    'route_id': 'string',
+    'origin_zone': 'string',
+    'destination': 'string',
+    'entrance': 'string',
+    'direction': 'string',
+    'departure_time': 'timestamp',
+    'arrival_time': 'timestamp',
+    'num_trips': 'int64',
+    'origin_x': 'float64',
+    'origin_y': 'float64',
+    'has_amenity_stop': 'bool',
+    'zone_total_trips': 'float64',
+    'zone_ped_trips': 'float64',
+    'amenity_id': 'int64',
+    'amenity_type': 'string'
+}
+
+CAR_ROUTE_FIELDS = {
+    'route_id': 'string',
+    'origin_zone': 'string',
+    'destination': 'string',
+    'direction': 'string',
+    'departure_time': 'timestamp',
+    'arrival_time': 'timestamp',
+    'num_trips': 'int64'
+}
+
+
+def _text(value) -> str:
+    """String form of a field value, with integral numbers (zone IDs read as floats) written without a decimal part"""
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def route_path(output_dir: str, name: str, fmt: str = 'parquet') -> str:
+    """Output path for a route file in the given format"""
+    if fmt not in ROUTE_FORMAT_EXTENSIONS:
+        raise ValueError(f"Unknown route format '{fmt}', expected one of {list(ROUTE_FORMAT_EXTENSIONS)}")
+    return os.path.join(output_dir, name + ROUTE_FORMAT_EXTENSIONS[fmt])
+
+
+def trips_path(path: str) -> str:
+    """Trip table path belonging to a route table"""
+    return os.path.splitext(path)[0] + '_trips' + ROUTE_FORMAT_EXTENSIONS['parquet']
+
+
+def geometry_key(geometry, precision: int = 6) -> str:
+    """Stable hash of a geometry's coordinates rounded to precision decimals"""
+    coords = np.round(shapely.get_coordinates(geometry), precision) + 0.0  # Normalize -0.0
+    return hashlib.blake2b(coords.tobytes(), digest_size=8).hexdigest()
+
+
+def _load_geometries(path: str, columns: Optional[List[str]] = None) -> gpd.GeoDataFrame:
+    base = os.path.splitext(path)[0]
+    for fmt in ['parquet', 'fgb', 'geojson']:
+        candidate = base + ROUTE_FORMAT_EXTENSIONS[fmt]
+        if os.path.exists(candidate):
+            logger.info(f"Loading routes from {candidate}")
+            if fmt == 'parquet':
+                if columns is not None and 'geometry' not in columns:
+                    columns = list(columns) + ['geometry']
+                return gpd.read_parquet(candidate, columns=columns)
+            return gpd.read_file(candidate, columns=columns)
+    raise FileNotFoundError(f"No route file found for {base} (.parquet, .fgb or .geojson)")
+
+
+def load_route_table(path: str) -> Tuple[gpd.GeoDataFrame, pd.DataFrame]:
+    """Load a route table and its trip table.
+
+    Returns the distinct route geometries indexed by route_key and the trips
+    referencing them. Files written without a trip table are returned as one
+    route per row, keyed by geometry hash.
+    """
+    routes = _load_geometries(path)
+    trip_file = trips_path(path)
+    if os.path.exists(trip_file):
+        trips = pd.read_parquet(trip_file)
+        routes = routes.set_index('route_key')
+    else:
+        # Per-trip file from before route tables: split it on the fly
+        trips = pd.DataFrame(routes.drop(columns='geometry'))
+        trips['route_key'] = [geometry_key(g) for g in routes.geometry]
+        routes = routes[['geometry']].set_index(trips['route_key'].values)
+        routes = routes[~routes.index.duplicated()]
+        routes.index.name = 'route_key'
+    logger.info(f"Loaded {len(trips)} trips over {len(routes)} distinct routes")
+    return routes, trips
+
+
+def load_routes(path: str, columns: Optional[List[str]] = None) -> gpd.GeoDataFrame:
+    """Load routes as one row per trip, whatever format they were written in.
+
+    Prefers GeoParquet, then FlatGeobuf, then GeoJSON; the extension of path is
+    ignored, so callers can keep passing the historical .geojson paths. Route
+    tables are joined with their trip table, sharing one geometry object per
+    distinct route.
+    """
+    trip_file = trips_path(path)
+    if not os.path.exists(trip_file):
+        return _load_geometries(path, columns)
+    routes, trips = load_route_table(path)
+    if columns is not None:
+        trips = trips[[c for c in trips.columns if c in columns or c == 'route_key']]
+    geometry = routes.geometry.loc[trips['route_key']].values
+    return gpd.GeoDataFrame(trips, geometry=geometry, crs=routes.crs)
+
+
+class RouteWriter:
+    """Incrementally write route records to GeoParquet or FlatGeobuf.
+
+    With geometry_type=None the records are written as a plain Parquet table.
+    """
+
+    def __init__(self, path: str, fields: Dict[str, str], batch_size: int = 1000,
+                 crs: str = "EPSG:4326", geometry_type: str = "LineString",
+                 geojson_export: bool = False, sum_fields: Iterable[str] = ('num_trips',)):
+        base, ext = os.path.splitext(path)
+        self.fmt = {v: k for k, v in ROUTE_FORMAT_EXTENSIONS.items()}.get(ext)
+        if self.fmt is None:
+            raise ValueError(f"Unsupported route file extension '{ext}'")
+        if geometry_type is None and self.fmt != 'parquet':
+            raise ValueError("Tables without geometry can only be written as Parquet")
+        self.path = path
+        self.base = base
+        self.fields = fields
+        self.batch_size = batch_size
+        self.crs = CRS.from_user_input(crs)
+        self.geometry_type = geometry_type
+        self.geojson_export = geojson_export
+
+        self.schema = self._build_schema()
+        self.spool_path = base + ROUTE_FORMAT_EXTENSIONS['parquet'] if self.fmt == 'parquet' \
+            else base + '.spool.parquet'
+        self._writer = None
+        self._batch = []
+
+        # Running counters, available without reloading the output
+        self.rows = 0
+        self.sums = {name: 0 for name in sum_fields}
+
+    def _build_schema(self):
+        fields = [pa.field(name, FIELD_TYPES[kind]) for name, kind in self.fields.items()]
+        if self.geometry_type is None:
+            return pa.schema(fields)
+        geo = {
+            'version': '1.0.0',
+            'primary_column': 'geometry',
+            'columns': {
+                'geometry': {
+                    'encoding': 'WKB',
+                    'geometry_types': [self.geometry_type],
+                    'crs': self.crs.to_json_dict()
+                }
+            }
+        }
+        fields.append(pa.field('geometry', pa.binary()))
+        return pa.schema(fields, metadata={'geo': json.dumps(geo)})
+
+    def _column(self, name, kind):
+        values = [record.get(name) for record in self._batch]
+        if kind == 'string':
+            values = [None if v is None else _text(v) for v in values]
+        elif kind in ('int64', 'float64', 'bool'):
+            values = [None if v is None or v != v else v for v in values]
+        return pa.array(values, type=FIELD_TYPES[kind])
+
+    def write(self, record: dict):
+        """Buffer one route record; geometry must be a shapely geometry"""
+        self._batch.append(record)
+        self.rows += 1
+        for name in self.sums:
+            value = record.get(name)
+            if value is not None:
+                self.sums[name] += value
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, records: Iterable[dict]):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        """Append buffered records as one Parquet row group"""
+        if not self._batch:
+            return
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.spool_path, self.schema)
+        columns = [self._column(name, kind) for name, kind in self.fields.items()]
+        if self.geometry_type is not None:
+            columns.append(pa.array(
+                shapely.to_wkb([record['geometry'] for record in self._batch]), type=pa.binary()
+            ))
+        self._writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=self.schema))
+        self._batch = []
+
+    def _stream_to(self, path, driver):
+        """Stream the spooled row groups into an OGR format without loading them all"""
+        import pyogrio.raw
+        parquet = pq.ParquetFile(self.spool_path)
+        reader = pa.RecordBatchReader.from_batches(
+            parquet.schema_arrow, parquet.iter_batches(batch_size=self.batch_size)
+        )
+        if os.path.exists(path):
+            os.remove(path)
+        pyogrio.raw.write_arrow(
+            reader, path, driver=driver, geometry_name='geometry',
+            geometry_type=self.geometry_type, crs=self.crs.to_wkt()
+        )
+
+    def close(self) -> Optional[str]:
+        """Finish the output file; returns its path, or None if nothing was written"""
+        self.flush()
+        if self._writer is None:
+            return None
+        self._writer.close()
+        self._writer = None
+
+        if self.fmt == 'fgb':
+            self._stream_to(self.path, 'FlatGeobuf')
+        elif self.fmt == 'geojson':
+            self._stream_to(self.path, 'GeoJSON')
+        if self.geojson_export and self.fmt != 'geojson' and self.geometry_type is not None:
+            self._stream_to(self.base + ROUTE_FORMAT_EXTENSIONS['geojson'], 'GeoJSON')
+        if self.spool_path != self.path:
+            os.remove(self.spool_path)
+
+        produced = {self.path}
+        if self.geojson_export and self.geometry_type is not None:
+            produced.add(self.base + ROUTE_FORMAT_EXTENSIONS['geojson'])
+        for ext in ROUTE_FORMAT_EXTENSIONS.values():
+            older = self.base + ext
+            if older not in produced and os.path.exists(older):
+                logger.warning(f"Keeping route file {older} from an earlier run in another format; "
+                               f"load_routes reads .parquet, then .fgb, then .geojson")
+        logger.info(f"Wrote {self.rows} routes to {self.path}")
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RouteTableWriter:
+    """Write distinct route geometries and the trips that use them as two tables"""
+
+    def __init__(self, path: str, trip_fields: Dict[str, str], batch_size: int = 1000,
+                 crs: str = "EPSG:4326", geojson_export: bool = False,
+                 sum_fields: Iterable[str] = ('num_trips',)):
+        self.path = path
+        self.geojson_export = geojson_export
+        self.routes = RouteWriter(path, {'route_key': 'string'}, batch_size=batch_size,
+                                  crs=crs, sum_fields=())
+        self.trips = RouteWriter(trips_path(path), {**trip_fields, 'route_key': 'string'},
+                                 batch_size=batch_size, geometry_type=None, sum_fields=sum_fields)
+        self._seen = set()
+
+    @property
+    def rows(self):
+        return self.trips.rows
+
+    @property
+    def sums(self):
+        return self.trips.sums
+
+    @property
+    def unique_routes(self):
+        return self.routes.rows
+
+    def write(self, record: dict):
+        """Record one trip; its geometry is stored only the first time it is seen"""
+        key = geometry_key(record['geometry'])
+        if key not in self._seen:
+            self._seen.add(key)
+            self.routes.write({'route_key': key, 'geometry': record['geometry']})
+        self.trips.write({**record, 'route_key': key})
+
+    def write_many(self, records: Iterable[dict]):
+        for record in records:
+            self.write(record)
+
+    def close(self) -> Optional[str]:
+        """Finish both tables; returns the route table path, or None if empty"""
+        output_file = self.routes.close()
+        self.trips.close()
+        if output_file is None:
+            return None
+        if self.rows:
+            logger.info(f"{self.rows} trips share {self.unique_routes} distinct routes "
+                        f"(duplication factor {self.rows / self.unique_routes:.2f})")
+        if self.geojson_export and self.routes.fmt != 'geojson':
+            # The GeoJSON export keeps the one-feature-per-trip layout
+            self._stream_geojson(output_file, os.path.splitext(output_file)[0] + ROUTE_FORMAT_EXTENSIONS['geojson'])
+        return output_file
+
+    def _route_geometries(self, output_file):
+        """route_key and WKB geometry columns of the finished route table"""
+        if self.routes.fmt == 'parquet':
+            table = pq.read_table(output_file, columns=['route_key', 'geometry'])
+            return table['route_key'], table['geometry']
+        import pyogrio.raw
+        meta, table = pyogrio.raw.read_arrow(output_file, columns=['route_key'])
+        return table['route_key'], table[meta['geometry_name'] or 'wkb_geometry']
+
+    def _stream_geojson(self, output_file, geojson_file):
+        """Stream the trips joined with their route geometry into GeoJSON, one trip batch at a time.
+
+        Only the distinct route geometries are held in memory, not the joined table.
+        """
+        import pyogrio.raw
+        keys, geometries = self._route_geometries(output_file)
+        parquet = pq.ParquetFile(self.trips.path)
+        schema = parquet.schema_arrow.append(pa.field('geometry', pa.binary()))
+
+        def joined_batches():
+            for batch in parquet.iter_batches(batch_size=self.trips.batch_size):
+                route = pc.index_in(batch.column('route_key'), value_set=keys)
+                yield pa.RecordBatch.from_arrays(
+                    batch.columns + [pc.take(geometries, route).combine_chunks()], schema=schema
+                )
+
+        if os.path.exists(geojson_file):
+            os.remove(geojson_file)
+        pyogrio.raw.write_arrow(
+            pa.RecordBatchReader.from_batches(schema, joined_batches()), geojson_file, driver='GeoJSON',
+            geometry_name='geometry', geometry_type=self.routes.geometry_type, crs=self.routes.crs.to_wkt()
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
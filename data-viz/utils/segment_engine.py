@@ -0,0 +1,192 @@
+"""
+Vectorized aggregation of route trip counts onto road segments.
+
+Routes are flattened to one ragged coordinate array (coordinates plus
+per-line offsets). Segment endpoints are quantized to an integer grid of
+`precision` degrees and numbered as nodes, and each segment is canonicalized
+so its lexicographically smaller endpoint comes first, which makes A->B and
+B->A the same segment. Identical segments are then found with np.unique on
+one integer key per segment and their trips summed with np.bincount.
+SegmentIncidence keeps the route-to-segment mapping as a sparse matrix, so
+loads under any route weighting (e.g. per hour) are one matrix product.
+"""
+import os
+import hashlib
+import logging
+import numpy as np
+import shapely
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# Grid size (degrees) that segment endpoints are snapped to when matching segments, ~1 cm
+COORD_PRECISION = 1e-7
+
+
+def ragged_coords(geometries):
+    """Coordinates of every line part as one array, plus offsets and the source geometry of each part.
+
+    Part i spans coords[offsets[i]:offsets[i + 1]]; multi-part geometries
+    are split so no segment joins two parts.
+    """
+    parts, part_geometry = shapely.get_parts(np.asarray(geometries), return_index=True)
+    keep = ~shapely.is_empty(parts)
+    parts, part_geometry = parts[keep], part_geometry[keep]
+    coords, coord_part = shapely.get_coordinates(parts, return_index=True)
+    offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(coord_part, minlength=len(parts)), out=offsets[1:])
+    return coords, offsets, part_geometry
+
+
+class RouteSegments:
+    """Distinct road segments with the summed trips of the routes using them.
+
+    start and end are (n, 2) lon/lat arrays with start <= end
+    lexicographically, trips holds the summed weights and first_route the
+    position of the first route that contains each segment. Segments are in
+    order of first appearance.
+    """
+
+    def __init__(self, start, end, trips, first_route):
+        self.start = start
+        self.end = end
+        self.trips = trips
+        self.first_route = first_route
+
+    def __len__(self):
+        return len(self.trips)
+
+    def items(self):
+        """((start, end), trips) pairs with coordinates as tuples, like a segment dict"""
+        for start, end, trips in zip(map(tuple, self.start.tolist()), map(tuple, self.end.tolist()), self.trips.tolist()):
+            yield (start, end), trips
+
+
+def index_segments(geometries, precision=COORD_PRECISION, directed=False):
+    """Number the distinct segments of the routes.
+
+    Returns (start, end, segment_route, segment_index): the distinct segments'
+    endpoints in order of first appearance, and for every route segment its
+    route position and the index of its distinct segment. Unless directed,
+    A->B and B->A are one segment whose start is the smaller endpoint.
+    """
+    coords, offsets, part_geometry = ragged_coords(geometries)
+
+    # A segment starts at every coordinate except the last one of each part
+    is_start = np.ones(len(coords), dtype=bool)
+    is_start[offsets[1:] - 1] = False
+    first = np.nonzero(is_start)[0]
+    segment_route = np.repeat(part_geometry, np.diff(offsets) - 1)
+
+    # Grid points become node ids; packing (x, y) keeps their lexicographic order
+    grid = np.round(coords / precision).astype(np.int64)
+    grid -= grid.min(axis=0) if len(grid) else 0
+    point_keys = grid[:, 0] * (int(grid[:, 1].max(initial=0)) + 1) + grid[:, 1]
+    nodes, node = np.unique(point_keys, return_inverse=True)
+
+    # Canonical direction: the endpoint with the smaller (x, y) comes first
+    a, b = node[first], node[first + 1]
+    swap = np.zeros(len(first), dtype=bool) if directed else a > b
+    segment_keys = np.where(swap, b, a) * len(nodes) + np.where(swap, a, b)
+
+    _, first_index, inverse = np.unique(segment_keys, return_index=True, return_inverse=True)
+
+    # Number segments in order of first appearance, with the first occurrence's exact coordinates
+    order = np.argsort(first_index, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    index = first_index[order]
+    start = np.where(swap[index, None], coords[first[index] + 1], coords[first[index]])
+    end = np.where(swap[index, None], coords[first[index]], coords[first[index] + 1])
+    return start, end, segment_route, rank[inverse.reshape(-1)]
+
+
+def aggregate_segments(geometries, weights, precision=COORD_PRECISION):
+    """Sum weights (e.g. num_trips per route) onto the distinct segments of the routes"""
+    start, end, segment_route, segment_index = index_segments(geometries, precision)
+    weights = np.asarray(weights, dtype=float)
+    trips = np.bincount(segment_index, weights=weights[segment_route], minlength=len(start))
+    _, first_use = np.unique(segment_index, return_index=True)
+    first_route = segment_route[first_use]
+    logger.debug(f"Aggregated {len(segment_index)} route segments into {len(start)} distinct segments")
+    return RouteSegments(start, end, trips, first_route)
+
+
+def load_color_scale(loads):
+    """Mean, standard deviation, max and logarithmic bin edges of segment loads, for layer color scaling"""
+    all_trips = np.asarray(loads, dtype=float).ravel()
+    global_mean = np.mean(all_trips)
+    global_std = np.std(all_trips)
+    global_max = np.max(all_trips)
+
+    # Logarithmic bins: finer below the mean, coarser above it
+    lower_bins = np.logspace(0, np.log10(global_mean), num=5)
+    upper_bins = np.logspace(np.log10(global_mean), np.log10(global_max), num=3)
+    bins = np.unique(np.concatenate([lower_bins, upper_bins]))
+    return global_mean, global_std, global_max, bins
+
+
+def route_set_key(geometries, precision=COORD_PRECISION, directed=False):
+    """Fingerprint of a route set and segment settings, for validating cached incidence matrices"""
+    coords, offsets, part_geometry = ragged_coords(geometries)
+    digest = hashlib.blake2b(f"{precision}:{directed}".encode(), digest_size=16)
+    for array in (coords, offsets, part_geometry):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+class SegmentIncidence:
+    """Sparse (segments x routes) matrix of how often each route traverses each segment.
+
+    Segment loads for any route weighting are a single sparse product:
+    loads(num_trips) gives one load per segment, and a (routes x hours)
+    weight matrix gives a (segments x hours) load array.
+    """
+
+    def __init__(self, matrix, start, end, key=None):
+        self.matrix = sparse.csr_matrix(matrix)
+        self.start = start
+        self.end = end
+        self.key = key
+
+    @classmethod
+    def from_routes(cls, geometries, precision=COORD_PRECISION, directed=False):
+        start, end, segment_route, segment_index = index_segments(geometries, precision, directed)
+        matrix = sparse.coo_matrix(
+            (np.ones(len(segment_index)), (segment_index, segment_route)),
+            shape=(len(start), len(geometries))
+        ).tocsr()  # duplicate entries (a route crossing a segment twice) are summed
+        logger.info(f"Built {matrix.shape[0]} x {matrix.shape[1]} segment incidence matrix "
+                    f"({matrix.nnz} entries)")
+        return cls(matrix, start, end, key=route_set_key(geometries, precision, directed))
+
+    @classmethod
+    def cached(cls, geometries, path, precision=COORD_PRECISION, directed=False):
+        """Incidence for the routes, reusing the matrix saved at path if it was built from the same routes"""
+        if os.path.exists(path):
+            incidence = cls.load(path)
+            if incidence.key == route_set_key(geometries, precision, directed):
+                logger.info(f"Loaded segment incidence matrix from {path}")
+                return incidence
+            logger.info(f"Route set changed, rebuilding segment incidence matrix at {path}")
+        incidence = cls.from_routes(geometries, precision, directed)
+        incidence.save(path)
+        return incidence
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def loads(self, weights):
+        """Segment loads for per-route weights of shape (routes,) or (routes, k)"""
+        return np.asarray(self.matrix @ np.asarray(weights, dtype=float))
+
+    def save(self, path):
+        matrix = self.matrix.tocsr()
+        np.savez_compressed(path, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                            shape=matrix.shape, start=self.start, end=self.end, key=self.key or '')
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            matrix = sparse.csr_matrix((data['data'], data['indices'], data['indptr']), shape=tuple(data['shape']))
+            return cls(matrix, data['start'], data['end'], key=str(data['key']) or None)
@@ -0,0 +1,214 @@
+"""
+Zoom levels of detail for the road-usage segment layers.
+
+City-wide views do not need every raw OTP vertex segment. Each level of
+detail is shown from its minimum zoom up to the next level's, with a
+tolerance of about PIXEL_TOLERANCE screen pixels at the level's highest
+zoom: segment endpoints are snapped to a grid of that tolerance, so nearby
+segments of different routes merge, runs of segments used by the same
+routes are merged into chains and simplified, and loads are re-aggregated
+through the level's own segment incidence matrix. The last level keeps the
+raw segments. Pages get one chunk of segments per level and
+switch between them as the zoom changes (LEVEL_SELECT_JS). JSON pages
+inline only the coarsest level; write_level_files puts the finer ones in
+files next to the page, which LEVEL_LOADER_JS fetches the first time the
+zoom reaches them.
+"""
+import os
+import json
+import logging
+import numpy as np
+import shapely
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from utils.segment_engine import SegmentIncidence, COORD_PRECISION, ragged_coords
+
+logger = logging.getLogger(__name__)
+
+# Minimum zoom of each level of detail, coarsest first; the last level is the raw segments
+DEFAULT_LOD_ZOOMS = (0, 12, 14)
+# Simplification error allowed at a level's highest zoom, in screen pixels
+PIXEL_TOLERANCE = 1.5
+# deck.gl web-mercator world width in pixels at zoom 0
+WORLD_PIXELS = 512
+
+
+def zoom_tolerance(zoom, pixels=PIXEL_TOLERANCE):
+    """Degrees of longitude covered by pixels screen pixels at a zoom level"""
+    return pixels * 360.0 / (WORLD_PIXELS * 2.0 ** zoom)
+
+
+class SegmentLevel:
+    """Merged segments of the routes at one level of detail, shown from min_zoom.
+
+    incidence maps the routes onto the level's segments, so loads(weights)
+    re-aggregates any route weighting at this level; start and end are its
+    (n, 2) segment endpoints.
+    """
+
+    def __init__(self, min_zoom, tolerance, incidence):
+        self.min_zoom = min_zoom
+        self.tolerance = tolerance
+        self.incidence = incidence
+
+    def __len__(self):
+        return len(self.incidence)
+
+    @property
+    def start(self):
+        return self.incidence.start
+
+    @property
+    def end(self):
+        return self.incidence.end
+
+    def loads(self, weights):
+        """Segment loads for per-route weights of shape (routes,) or (routes, k)"""
+        return self.incidence.loads(weights)
+
+    @classmethod
+    def from_routes(cls, geometries, min_zoom, tolerance=0.0, directed=False, cache_path=None):
+        """Level of the routes' segment network simplified by tolerance degrees (0 keeps the raw segments)"""
+        precision = tolerance if tolerance > 0 else COORD_PRECISION
+        incidence = (SegmentIncidence.cached(geometries, cache_path, precision, directed) if cache_path
+                     else SegmentIncidence.from_routes(geometries, precision, directed))
+        if tolerance > 0:
+            incidence = simplify_network(incidence, tolerance)
+        return cls(min_zoom, tolerance, incidence)
+
+
+def merge_chains(start, end, signature):
+    """Chain index of every segment: runs joined at nodes of degree two with equal route signatures"""
+    n = len(start)
+    _, node = np.unique(np.vstack([start, end]), axis=0, return_inverse=True)
+    node = node.reshape(-1)
+    segment = np.concatenate([np.arange(n), np.arange(n)])
+
+    # The two segment ends at every node of degree two, as consecutive entries
+    degree = np.bincount(node)
+    at_joint = np.nonzero(degree[node] == 2)[0]
+    at_joint = at_joint[np.argsort(node[at_joint], kind='stable')]
+    a, b = segment[at_joint[0::2]], segment[at_joint[1::2]]
+    joined = (a != b) & np.all(np.isclose(signature[a], signature[b], rtol=1e-9, atol=0), axis=1)
+
+    graph = sparse.coo_matrix((np.ones(joined.sum()), (a[joined], b[joined])), shape=(n, n))
+    return connected_components(graph, directed=False)[1]
+
+
+def simplify_network(incidence, tolerance):
+    """Incidence of the segment network simplified for a level of detail.
+
+    Segment endpoints are snapped to a grid of tolerance degrees and
+    zero-length segments dropped. Runs of segments joined at nodes of degree
+    two and used by the same routes become one chain, which is simplified by
+    tolerance and split back into segments sharing its incidence row, so the
+    re-aggregated loads are those of the merged segments.
+    """
+    start = np.round(incidence.start / tolerance) * tolerance
+    end = np.round(incidence.end / tolerance) * tolerance
+    keep = np.any(start != end, axis=1)
+    matrix, start, end = incidence.matrix[keep], start[keep], end[keep]
+    if not len(start):
+        return SegmentIncidence(matrix, start, end, key=incidence.key)
+
+    # Random projections of the incidence rows: equal for segments used by the same routes
+    signature = matrix @ np.random.default_rng(0).random((matrix.shape[1], 2))
+    chain = merge_chains(start, end, np.asarray(signature))
+
+    order = np.argsort(chain, kind='stable')
+    lines = shapely.multilinestrings(shapely.linestrings(np.stack([start, end], axis=1))[order], indices=chain[order])
+    chains = shapely.simplify(shapely.line_merge(lines), tolerance, preserve_topology=False)
+
+    # Segments of the simplified chains, each with its chain's incidence row
+    coords, offsets, part_chain = ragged_coords(chains)
+    is_start = np.ones(len(coords), dtype=bool)
+    is_start[offsets[1:] - 1] = False
+    first = np.nonzero(is_start)[0]
+    segment_chain = np.repeat(part_chain, np.diff(offsets) - 1)
+    _, chain_row = np.unique(chain, return_index=True)
+    return SegmentIncidence(matrix[chain_row[segment_chain]], coords[first], coords[first + 1], key=incidence.key)
+
+
+def build_levels(geometries, zooms=DEFAULT_LOD_ZOOMS, directed=False, pixels=PIXEL_TOLERANCE, cache_prefix=None):
+    """SegmentLevels of the routes for the given minimum zooms, coarsest first and raw last.
+
+    Only the raw level keeps directed segments; coarser levels merge both
+    directions of a road. With cache_prefix every level's snapped incidence
+    matrix is cached at <cache_prefix>_z<zoom>.npz.
+    """
+    geometries = np.asarray(geometries)
+    zooms = sorted(zooms)
+    levels = []
+    for i, zoom in enumerate(zooms):
+        raw = i + 1 == len(zooms)
+        tolerance = 0.0 if raw else zoom_tolerance(zooms[i + 1], pixels)
+        cache_path = f"{cache_prefix}_z{zoom}.npz" if cache_prefix else None
+        levels.append(SegmentLevel.from_routes(geometries, zoom, tolerance, directed and raw, cache_path))
+        logger.info(f"Level of detail from zoom {zoom}: {len(levels[-1])} segments")
+    return levels
+
+
+def used_segments(level, matched):
+    """Mask of the level's segments traversed by any route in the boolean route mask matched"""
+    return level.loads(np.asarray(matched, dtype=float)) > 0
+
+
+def write_level_files(html_path, level_data):
+    """Write every level of detail but the coarsest to <page>_lod<i>.json next to the page at html_path.
+
+    Returns the level data to inline, with only the coarsest level filled in
+    (None for the others), and the file names the page fetches the finer
+    levels from (None for the inlined level).
+    """
+    base = os.path.splitext(html_path)[0]
+    inline, urls = [], []
+    for i, data in enumerate(level_data):
+        if i == 0:
+            inline.append(data)
+            urls.append(None)
+            continue
+        path = f"{base}_lod{i}.json"
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        inline.append(None)
+        urls.append(os.path.basename(path))
+        logger.info(f"Wrote level of detail {i} ({os.path.getsize(path) / 1e6:.1f} MB) to {path}")
+    return inline, urls
+
+
+# Page-side level selection: levelForZoom(minZooms, zoom) is the index of the
+# last level whose minimum zoom the view has reached
+LEVEL_SELECT_JS = """
+        function levelForZoom(minZooms, zoom) {
+            let level = 0;
+            minZooms.forEach((minZoom, i) => {
+                if (zoom >= minZoom) level = i;
+            });
+            return level;
+        }
+"""
+
+
+# Page-side loading of the finer levels: shownLevel(levels, urls, level, onLoad) starts
+# fetching urls[level] the first time the level is wanted and calls onLoad(level) once it
+# is in levels; until then (or if the fetch fails, e.g. from file://) it returns the
+# finest loaded level below it, down to the inlined coarsest one
+LEVEL_LOADER_JS = """
+        const levelRequests = {};
+        function shownLevel(levels, urls, level, onLoad) {
+            if (levels[level] == null && urls[level] && !levelRequests[level]) {
+                levelRequests[level] = fetch(urls[level])
+                    .then(response => {
+                        if (!response.ok) throw new Error(`${urls[level]}: ${response.status}`);
+                        return response.json();
+                    })
+                    .then(data => {
+                        levels[level] = data;
+                        onLoad(level);
+                    })
+                    .catch(error => console.warn(`Level of detail ${level} not loaded (${error}), showing a coarser one`));
+            }
+            while (level > 0 && levels[level] == null) level--;
+            return level;
+        }
+"""
@@ -0,0 +1,127 @@
+"""
+Trip counts by POI, direction, mode group and time-of-day bin.
+
+A TemporalCube is a dense (POI x direction x mode x bin) array whose last axis
+splits the day into bins of bin_minutes (15, 30 or 60), with labels for the
+first three axes. It is stored as one compressed .npz (float32 counts), from
+which hourly distributions or the finer per-bin ones can be taken directly.
+build_temporal_cube sums raw trips into one. The EDA temporal preprocessing
+builds its own cube per raw POI name and saves it in the same .npz layout, so
+TemporalCube.load reads both.
+"""
+import numpy as np
+import pandas as pd
+
+MINUTES_PER_DAY = 24 * 60
+
+# Mode groups of the raw trip modes
+MODE_MAPPING = {
+    'car': ['car'],
+    'pedestrian': ['ped'],
+    'public_transit': ['bus', 'train', 'link'],
+    'bike': ['bike']
+}
+
+DIRECTIONS = ('inbound', 'outbound')
+# Mode axis of the temporal cube: the MODE_MAPPING groups plus raw modes outside them
+CUBE_MODES = tuple(MODE_MAPPING) + ('other',)
+
+
+def check_bin_minutes(bin_minutes):
+    """Validate a bin width: it must divide an hour"""
+    if bin_minutes <= 0 or 60 % bin_minutes:
+        raise ValueError(f"Temporal bin width must divide 60 minutes, got {bin_minutes}")
+    return int(bin_minutes)
+
+
+class TemporalCube:
+    """Trip counts by (POI, direction, mode group, time bin) with labelled axes"""
+
+    def __init__(self, counts, pois, directions, modes, bin_minutes=60):
+        self.bin_minutes = check_bin_minutes(bin_minutes)
+        self.counts = np.asarray(counts, dtype=float)
+        if self.counts.shape[-1] != MINUTES_PER_DAY // self.bin_minutes:
+            raise ValueError(f"Expected {MINUTES_PER_DAY // self.bin_minutes} bins of "
+                             f"{self.bin_minutes} minutes, got {self.counts.shape[-1]}")
+        self.pois = list(pois)
+        self.directions = list(directions)
+        self.modes = list(modes)
+
+    @property
+    def bin_starts(self):
+        """Start of each bin in minutes since midnight"""
+        return np.arange(self.counts.shape[-1]) * self.bin_minutes
+
+    def hourly(self):
+        """The same cube with its bins summed to hours"""
+        per_hour = 60 // self.bin_minutes
+        counts = self.counts.reshape(self.counts.shape[:-1] + (24, per_hour)).sum(axis=-1)
+        return TemporalCube(counts, self.pois, self.directions, self.modes, bin_minutes=60)
+
+    def distributions(self):
+        """Per-bin distributions: counts divided by their daily total (0 where there are no trips)"""
+        totals = self.counts.sum(axis=-1, keepdims=True)
+        return np.divide(self.counts, totals, out=np.zeros_like(self.counts), where=totals > 0)
+
+    def distribution(self, poi, direction, mode):
+        """Per-bin distribution of one POI, direction and mode group"""
+        return self.distributions()[self.pois.index(poi), self.directions.index(direction), self.modes.index(mode)]
+
+    def mode_distributions(self, poi, direction, modes=None):
+        """Per-bin distribution for each mode group of one POI and direction"""
+        dist = self.distributions()[self.pois.index(poi), self.directions.index(direction)]
+        return {mode: dist[self.modes.index(mode)] for mode in (modes or self.modes)}
+
+    def poi_frame(self, poi, direction, modes=None):
+        """Temporal table: hour (plus the bin's start minute for sub-hour bins) and one <mode>_dist column per mode"""
+        columns = {'hour': self.bin_starts // 60}
+        if self.bin_minutes < 60:
+            columns['minute'] = self.bin_starts
+        columns.update({f'{mode}_dist': dist for mode, dist in self.mode_distributions(poi, direction, modes).items()})
+        return pd.DataFrame(columns)
+
+    def save(self, path):
+        np.savez_compressed(path, counts=self.counts.astype(np.float32), pois=self.pois,
+                            directions=self.directions, modes=self.modes, bin_minutes=self.bin_minutes)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            bin_minutes = int(data['bin_minutes']) if 'bin_minutes' in data else 60
+            return cls(data['counts'], data['pois'].tolist(), data['directions'].tolist(),
+                       data['modes'].tolist(), bin_minutes=bin_minutes)
+
+
+def build_temporal_cube(df, poi_mapping, bin_minutes=60):
+    """Sum raw trip counts into a TemporalCube in a single groupby.
+
+    poi_mapping maps each cube POI to its raw name. Inbound trips are matched
+    on to_name and outbound trips on from_name; raw modes outside MODE_MAPPING
+    are counted under 'other'. Trips are binned by their minute of day (or
+    hour, if the data has no minute column) into bins of bin_minutes.
+    """
+    bin_minutes = check_bin_minutes(bin_minutes)
+    minute = df['minute'] if 'minute' in df.columns else df['hour'] * 60
+    pois = list(poi_mapping)
+    poi_codes = {raw_name: i for i, raw_name in enumerate(poi_mapping.values())}
+    mode_codes = {raw_mode: CUBE_MODES.index(mode) for mode, raw_modes in MODE_MAPPING.items() for raw_mode in raw_modes}
+
+    # Each trip contributes once as inbound (to its destination) and once as outbound (from its origin)
+    other = CUBE_MODES.index('other')
+    mode = df['mode'].map(mode_codes).fillna(other).astype(int)
+    long = pd.concat([
+        pd.DataFrame({
+            'poi': df[name_col].map(poi_codes),
+            'direction': direction,
+            'mode': mode,
+            'bin': minute // bin_minutes,
+            'count': df['count']
+        })
+        for direction, name_col in enumerate(['to_name', 'from_name'])
+    ], ignore_index=True).dropna(subset=['poi'])
+
+    grouped = long.groupby(['poi', 'direction', 'mode', 'bin'])['count'].sum()
+    counts = np.zeros((len(pois), len(DIRECTIONS), len(CUBE_MODES), MINUTES_PER_DAY // bin_minutes))
+    index = tuple(grouped.index.get_level_values(level).to_numpy(dtype=int) for level in range(4))
+    counts[index] = grouped.to_numpy()
+    return TemporalCube(counts, pois, DIRECTIONS, CUBE_MODES, bin_minutes=bin_minutes)
@@ -0,0 +1,111 @@
+"""
+Two-table Parquet storage for scheduled (temporal) trips.
+
+A temporal store is a pair of files sharing a base path:
+
+    <base>_routes.parquet    GeoParquet, one row per route_id: attributes,
+                             endpoint coordinates and geometry
+    <base>_schedule.parquet  route_id, departure_seconds (since midnight) and
+                             count, sorted by departure time
+
+TemporalStore reads them back. Schedule queries take an hour range that is
+pushed down to the Parquet row-group statistics, and routes can be read with
+or without their geometry, so readers that only need departure times or
+endpoints never decode a route geometry.
+"""
+import os
+import logging
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyarrow.parquet as pq
+import shapely
+
+logger = logging.getLogger(__name__)
+
+# Schedule rows per Parquet row group; smaller groups make hour-range reads more selective
+SCHEDULE_ROW_GROUP_SIZE = 65536
+
+ENDPOINT_COLUMNS = ['source_lon', 'source_lat', 'target_lon', 'target_lat']
+
+
+def store_paths(base: str):
+    """Routes and schedule file paths for a store base path"""
+    base = os.path.splitext(base)[0]
+    return base + '_routes.parquet', base + '_schedule.parquet'
+
+
+def write_temporal_store(base: str, routes: gpd.GeoDataFrame, schedule: pd.DataFrame):
+    """Write a routes table and a schedule table.
+
+    routes needs a route_id column and geometry; endpoint columns are added
+    from the geometry. schedule needs route_id and departure_seconds, and an
+    optional count (default 1); rows with the same route and departure are merged.
+    """
+    routes_file, schedule_file = store_paths(base)
+    os.makedirs(os.path.dirname(os.path.abspath(routes_file)), exist_ok=True)
+
+    routes = routes.copy()
+    geometries = routes.geometry.values
+    start = shapely.get_coordinates(shapely.get_point(geometries, 0))
+    end = shapely.get_coordinates(shapely.get_point(geometries, -1))
+    routes['source_lon'], routes['source_lat'] = start[:, 0], start[:, 1]
+    routes['target_lon'], routes['target_lat'] = end[:, 0], end[:, 1]
+    routes.to_parquet(routes_file, index=False)
+
+    if 'count' not in schedule.columns:
+        schedule = schedule.assign(count=1)
+    schedule = (
+        schedule.groupby(['departure_seconds', 'route_id'], sort=True)['count'].sum()
+        .reset_index()[['route_id', 'departure_seconds', 'count']]
+    )
+    schedule['departure_seconds'] = schedule['departure_seconds'].astype(np.int32)
+    schedule['count'] = schedule['count'].astype(np.int32)
+    schedule.to_parquet(schedule_file, index=False, row_group_size=SCHEDULE_ROW_GROUP_SIZE)
+
+    logger.info(f"Saved {len(routes)} routes to {routes_file} and "
+                f"{int(schedule['count'].sum())} scheduled trips to {schedule_file}")
+    return routes_file, schedule_file
+
+
+class TemporalStore:
+    """Reader for a routes + schedule temporal store"""
+
+    def __init__(self, base: str):
+        self.routes_file, self.schedule_file = store_paths(base)
+        for path in (self.routes_file, self.schedule_file):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Temporal store file not found: {path}")
+
+    def schedule(self, start_hour: float = 0, end_hour: float = 24) -> pd.DataFrame:
+        """Scheduled departures with start_hour <= departure < end_hour"""
+        filters = [
+            ('departure_seconds', '>=', int(start_hour * 3600)),
+            ('departure_seconds', '<', int(end_hour * 3600))
+        ]
+        return pd.read_parquet(self.schedule_file, filters=filters)
+
+    def routes(self, columns: Optional[List[str]] = None, geometry: bool = True,
+               route_ids=None) -> pd.DataFrame:
+        """Route table, optionally restricted to some columns and route IDs.
+
+        With geometry=False the geometry column is never read and a plain
+        DataFrame is returned.
+        """
+        if columns is not None:
+            columns = ['route_id'] + [c for c in columns if c not in ('route_id', 'geometry')]
+        filters = [('route_id', 'in', list(route_ids))] if route_ids is not None else None
+        if geometry:
+            read_columns = None if columns is None else columns + ['geometry']
+            return gpd.read_parquet(self.routes_file, columns=read_columns, filters=filters)
+        if columns is None:
+            columns = [c for c in pq.read_schema(self.routes_file).names if c != 'geometry']
+        return pd.read_parquet(self.routes_file, columns=columns, filters=filters)
+
+    def trips(self, start_hour: float = 0, end_hour: float = 24,
+              columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Scheduled departures in an hour range joined with route attributes (no geometry)"""
+        schedule = self.schedule(start_hour, end_hour)
+        routes = self.routes(columns=columns, geometry=False, route_ids=schedule['route_id'].unique())
+        return schedule.merge(routes, on='route_id', how='left')